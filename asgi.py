@@ -0,0 +1,1136 @@
+"""ASGI entrypoint for the MongoDB Atlas API Web App.
+
+Serves the Atlas-backed /api/* routes with async handlers on an asyncio
+upstream client (httpx), so one process can keep hundreds of Atlas calls in
+flight instead of one per worker thread. Fan-out routes (inventory, bulk
+actions, stats summary, pagination) use asyncio.gather() under semaphores.
+The live processor stream waits on the event loop rather than holding a
+thread. Every other route (the page, stats sampler and stats endpoints) is
+handed to the Flask app of web_api_client.py on a thread
+pool. The handlers only do the I/O: requests are validated and documents
+built by the helpers in the "Route Requests" section of web_api_client.py,
+so request and response bodies are the same under either server.
+
+    python asgi.py
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Caching, rate limiting, listing versions, metrics and tracing are shared
+with web_api_client.py and configured by the same environment variables.
+"""
+
+import asyncio
+import functools
+import itertools
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_accept_header
+
+from web_api_client import (
+    ACTION_COMPLETED_BODY, ATLAS_MAX_RETRIES, ATLAS_PAGE_SIZE, ATLAS_PAGE_WORKERS, ATLAS_POOL_IDLE_TIMEOUT,
+    ATLAS_RETRY_MAX_DELAY, BATCH_MAX_UPSTREAM_CALLS, DIGEST_AUTH_CACHE_SIZE,
+    InventoryDocument, INVENTORY_MAX_PARALLEL, ListingPageWriter, PRIORITY_BULK, RequestRejected,
+    SERVER_TIMING_ENABLED, SessionStoreUnavailable, SESSION_EXPIRED_ERROR, SESSION_STORE_UNAVAILABLE_ERROR,
+    StatsSummary, STREAM_HEARTBEAT_INTERVAL, SWR_WAIT_TIMEOUT, UpstreamBudget, app as flask_app,
+    atlas_cache_key, atlas_endpoint_family, atlas_error_payload, atlas_session_pool, batch_document,
+    batch_operation_body, batch_record, batch_result_record, bearer_token, bulk_document, bulk_result, cache_invalidator,
+    cache_readable, cache_revalidator, cached_entry, charge_upstream_budget, connection_details_target,
+    create_connection_call, create_processor_call, create_spi_call, credential_fingerprint, current_trace,
+    delete_spi_call, digest_auth_stats, env_int, invalidate_cached, is_json_mimetype, listing_ndjson_chunks,
+    listing_request, listing_target,
+    manage_connection_call, manage_processor_call, merged_listing, metrics, ndjson_lines, new_request_trace,
+    parse_batch_request, parse_bulk_request, parse_summary_request, passthrough_headers,
+    processor_action_target, processor_stats_target, project_body, rate_limit_delay, record_upstream_call,
+    refresh_cached, request_data_error, required_fields, stats_history_result,
+    scheduler_key, select_bulk_targets, session_lookups, shared_exception, sse_event, store_fetched,
+    stored_session_credentials, subscribe_processor_watcher, trace_span, unsubscribe_processor_watcher,
+    upstream_budget_scope, upstream_gets, upstream_priority, upstream_priority_scope, upstream_scheduler,
+    versioned_listing,
+)
+
+# --- Configuration ---
+# Settings shared with the Flask app are imported above; these only apply here.
+
+# Upper bound on open connections to Atlas from this process.
+ASYNC_MAX_CONNECTIONS = env_int('ASYNC_MAX_CONNECTIONS', 200)
+# Idle keep-alive connections to Atlas kept open.
+ASYNC_MAX_KEEPALIVE = env_int('ASYNC_MAX_KEEPALIVE', 100)
+# httpx clients the connections are spread over; httpcore slows down with large pools.
+ASYNC_CLIENT_SHARDS = env_int('ASYNC_CLIENT_SHARDS', 8)
+# Threads serving the routes that are handled by the Flask app.
+ASGI_WSGI_THREADS = env_int('ASGI_WSGI_THREADS', 32)
+ASGI_HOST = os.getenv('ASGI_HOST', '0.0.0.0')
+ASGI_PORT = env_int('ASGI_PORT', 5000)
+ASGI_WORKERS = env_int('ASGI_WORKERS', 1)
+
+# --- Async Upstream Client ---
+
+class AsyncAtlasClient:
+    """httpx.AsyncClient shards shared by the process, plus one digest auth per credential.
+
+    httpcore's pool scans every connection of a client whenever a request
+    starts or finishes, which gets slow with hundreds of connections, so
+    the connections are split over a few small clients and each request
+    goes to the least busy one. Callers beyond max_connections wait on a
+    semaphore rather than queueing inside httpcore.
+
+    httpx.DigestAuth keeps the last challenge and signs later requests with
+    it up front. Sharing one per credential means only the first request (or
+    one after a stale nonce) pays the 401 round trip, like CachedDigestAuth.
+    """
+
+    def __init__(self, max_connections, max_keepalive, idle_timeout, shards, max_auths):
+        shards = max(1, min(shards, max_connections))
+        self.max_connections = max_connections
+        self.limits = httpx.Limits(max_connections=-(-max_connections // shards),
+                                   max_keepalive_connections=-(-max_keepalive // shards),
+                                   keepalive_expiry=idle_timeout)
+        self.max_auths = max_auths
+        self._slots = asyncio.Semaphore(max_connections)
+        self._clients = [None] * shards
+        self._busy = [0] * shards
+        self._auths = OrderedDict()
+        self.in_flight = 0
+        self.preemptive = 0
+        self.challenged = 0
+
+    async def request(self, method, url, **kwargs):
+        """Sends a request on the least busy client once a connection slot is free; the body is read."""
+        async with self._slots:
+            shard = self._least_busy()
+            self._busy[shard] += 1
+            try:
+                return await self._clients[shard].request(method, url, **kwargs)
+            finally:
+                self._busy[shard] -= 1
+
+    @asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        """Like request(), but the body is left for the caller to read inside the context.
+
+        The connection slot is held until the context exits.
+        """
+        async with self._slots:
+            shard = self._least_busy()
+            self._busy[shard] += 1
+            try:
+                async with self._clients[shard].stream(method, url, **kwargs) as response:
+                    yield response
+            finally:
+                self._busy[shard] -= 1
+
+    def _least_busy(self):
+        shard = min(range(len(self._clients)), key=self._busy.__getitem__)
+        if self._clients[shard] is None:
+            self._clients[shard] = httpx.AsyncClient(limits=self.limits, timeout=30, follow_redirects=True)
+        return shard
+
+    def auth(self, atlas_host, public_key, private_key):
+        key = (atlas_host,) + credential_fingerprint(public_key, private_key)
+        auth = self._auths.get(key)
+        if auth is None:
+            auth = self._auths[key] = httpx.DigestAuth(public_key, private_key)
+            while len(self._auths) > self.max_auths:
+                self._auths.popitem(last=False)
+        else:
+            self._auths.move_to_end(key)
+        return auth
+
+    def record_signature(self, response):
+        # A 401 in the history means the request had to be re-signed after a challenge.
+        if response.history:
+            self.challenged += 1
+        else:
+            self.preemptive += 1
+
+    async def close(self):
+        for shard, client in enumerate(self._clients):
+            if client is not None:
+                await client.aclose()
+                self._clients[shard] = None
+
+    def stats(self):
+        return {
+            "max_connections": self.max_connections,
+            "clients": sum(client is not None for client in self._clients),
+            "in_flight": self.in_flight,
+            "digest_auth": {"credentials": len(self._auths), "preemptive": self.preemptive,
+                            "challenged": self.challenged},
+            "coalescing": async_gets.stats(),
+        }
+
+class AsyncSingleFlight:
+    """Shares one in-flight coroutine among concurrent callers asking for the same key."""
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, func):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            self.calls += 1
+
+            def finish(_):
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+            task.add_done_callback(finish)
+        else:
+            self.coalesced += 1
+        # A caller that is cancelled must not cancel the call the others wait for.
+        try:
+            return await asyncio.shield(task)
+        except Exception as error:
+            raise shared_exception(error) from error
+
+    def stats(self):
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
+
+async_atlas_client = AsyncAtlasClient(ASYNC_MAX_CONNECTIONS, ASYNC_MAX_KEEPALIVE, ATLAS_POOL_IDLE_TIMEOUT,
+                                      ASYNC_CLIENT_SHARDS, DIGEST_AUTH_CACHE_SIZE)
+async_gets = AsyncSingleFlight()
+
+async def acquire_upstream(key, priority):
+    """Waits for the upstream scheduler to admit a call, without blocking the event loop.
+
+    The task queues in the same priority order as the Flask threads and is
+    woken whenever the queue changes. A task cancelled while it waits
+    leaves the queue without taking a token.
+    """
+    if upstream_scheduler.rate <= 0:
+        return
+    loop = asyncio.get_running_loop()
+    woken = asyncio.Event()
+    bucket, entry, started = upstream_scheduler.enqueue(key, priority, lambda: loop.call_soon_threadsafe(woken.set))
+    try:
+        while True:
+            woken.clear()
+            with bucket.condition:
+                delay = upstream_scheduler.poll(key, bucket, entry, started)
+            if delay is None:
+                break
+            try:
+                await asyncio.wait_for(woken.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        upstream_scheduler.dequeue(bucket, entry)
+    upstream_scheduler.record_admission(priority, started)
+
+def record_async_upstream_call(labels, method, started, status, response=None):
+    """record_upstream_call for httpx responses."""
+    record_upstream_call(labels, method, started, status)
+    if response is None:
+        return
+    if response.request.content:
+        metrics.inc('asp_ui_upstream_request_bytes_total', labels, len(response.request.content))
+    length = response.headers.get('Content-Length')
+    if length and length.isdigit():
+        metrics.inc('asp_ui_upstream_response_bytes_total', labels, int(length))
+
+def record_async_upstream_spans(response, started, url):
+    """Adds the digest challenge (if one happened) and Atlas round trip of a call to the trace."""
+    trace = current_trace.get()
+    if trace is None:
+        return
+    ended = time.perf_counter()
+    if response is not None and response.history:
+        challenge = min(response.history[0].elapsed.total_seconds(), ended - started)
+        trace.add('digest', started, challenge)
+        started += challenge
+    trace.add('upstream', started, ended - started, endpoint=atlas_endpoint_family(url))
+
+async def send_atlas_request_async(method, url, public_key, private_key, accept_header, json_body=None, content_type_header=None, params=None, stream=None):
+    """Async counterpart of send_atlas_request; returns an httpx.Response with its body read.
+
+    Raises httpx.HTTPStatusError for error statuses. Admission, 429
+    retries, metrics and tracing work as in send_atlas_request. With stream,
+    an AsyncExitStack, a successful response is returned with its body
+    unread and stays open until the caller closes the stack.
+    """
+    key = scheduler_key(url)
+    priority = upstream_priority.get()
+    labels = (('endpoint', atlas_endpoint_family(url)),)
+    attempt = 0
+    while True:
+        with trace_span('queue'):
+            await acquire_upstream(key, priority)
+        started = time.perf_counter()
+        metrics.inc('asp_ui_upstream_in_flight', labels)
+        async_atlas_client.in_flight += 1
+        try:
+            response = await send_atlas_request_once_async(method, url, public_key, private_key, accept_header,
+                                                           json_body, content_type_header, params, stream)
+        except httpx.HTTPStatusError as http_err:
+            record_async_upstream_call(labels, method, started, http_err.response.status_code, http_err.response)
+            if http_err.response.status_code != 429:
+                raise
+            delay = rate_limit_delay(http_err.response, attempt)
+            if attempt >= ATLAS_MAX_RETRIES or delay > ATLAS_RETRY_MAX_DELAY:
+                upstream_scheduler.record_gave_up()
+                raise
+            metrics.inc('asp_ui_upstream_retries_total', labels)
+            await asyncio.sleep(upstream_scheduler.penalize(key, delay))
+            attempt += 1
+        except httpx.TimeoutException:
+            record_async_upstream_call(labels, method, started, 'timeout')
+            metrics.inc('asp_ui_upstream_timeouts_total', labels)
+            raise
+        except Exception:
+            record_async_upstream_call(labels, method, started, 'error')
+            raise
+        else:
+            record_async_upstream_call(labels, method, started, response.status_code, response)
+            return response
+        finally:
+            async_atlas_client.in_flight -= 1
+            metrics.inc('asp_ui_upstream_in_flight', labels, -1)
+
+async def send_atlas_request_once_async(method, url, public_key, private_key, accept_header, json_body, content_type_header, params, stream):
+    """Makes a single attempt of send_atlas_request_async."""
+    headers = {"Accept": accept_header, "Content-Type": content_type_header or "application/json"}
+    auth = async_atlas_client.auth(urlsplit(url).netloc, public_key, private_key)
+    started = time.perf_counter()
+    response = None
+    async with AsyncExitStack() as attempt:
+        try:
+            if stream is None:
+                response = await async_atlas_client.request(method, url, headers=headers, auth=auth,
+                                                            json=json_body, params=params)
+            else:
+                response = await attempt.enter_async_context(
+                    async_atlas_client.stream(method, url, headers=headers, auth=auth, json=json_body, params=params))
+        finally:
+            record_async_upstream_spans(response, started, url)
+        async_atlas_client.record_signature(response)
+        if response.status_code >= 400:
+            # The error payload is built from the body, so it is read before the response closes.
+            await response.aread()
+            raise httpx.HTTPStatusError(f"{response.status_code} {response.reason_phrase} for url: {url}",
+                                        request=response.request, response=response)
+        if stream is not None:
+            stream.push_async_exit(attempt.pop_all())
+    return response
+
+def coalesced_get_async(url, public_key, private_key, accept_header, params=None):
+    """Sends a GET through send_atlas_request_async, sharing it with identical concurrent GETs of the same priority."""
+    key = (url, tuple(sorted((params or {}).items())), accept_header, upstream_priority.get(),
+           *credential_fingerprint(public_key, private_key))
+    return async_gets.do(key, lambda: send_atlas_request_async('GET', url, public_key, private_key, accept_header, params=params))
+
+def async_error_payload(error):
+    """Converts an exception raised by an async Atlas call into an (error_details, status_code) tuple."""
+    if isinstance(error, httpx.HTTPStatusError):
+        response = error.response
+        error_details = {"error": f"HTTP Error: {response.status_code} {response.reason_phrase}"}
+        try:
+            error_details['details'] = response.json()
+        except json.JSONDecodeError:
+            error_details['details'] = response.text
+        error_details['debug_info'] = {
+            'method': error.request.method,
+            'url': str(error.request.url),
+            'headers': dict(error.request.headers),
+        }
+        return error_details, response.status_code
+    if isinstance(error, httpx.HTTPError):
+        return {"error": "A network error occurred.", "details": str(error)}, 500
+    return atlas_error_payload(error)
+
+async def atlas_request_async(method, url, public_key, private_key, accept_header, json_body=None, content_type_header=None, params=None):
+    """Async counterpart of atlas_request; returns a (payload, status_code) tuple."""
+    try:
+        charge_upstream_budget()
+        if method == 'GET':
+            response = await coalesced_get_async(url, public_key, private_key, accept_header, params=params)
+        else:
+            response = await send_atlas_request_async(method, url, public_key, private_key, accept_header,
+                                                      json_body=json_body, content_type_header=content_type_header,
+                                                      params=params)
+        if response.status_code == 204:
+            return {"success": True, "message": "Action completed successfully."}, 200
+        with trace_span('decode'):
+            return response.json(), 200
+    except Exception as e:
+        return async_error_payload(e)
+
+async def atlas_request_raw_async(method, url, public_key, private_key, accept_header, json_body=None, content_type_header=None):
+    """Async counterpart of atlas_request_raw; successful bodies are returned unparsed."""
+    try:
+        charge_upstream_budget()
+        if method == 'GET':
+            response = await coalesced_get_async(url, public_key, private_key, accept_header)
+        else:
+            response = await send_atlas_request_async(method, url, public_key, private_key, accept_header,
+                                                      json_body=json_body, content_type_header=content_type_header)
+        if response.status_code == 204:
+            return (ACTION_COMPLETED_BODY, "application/json"), 200
+        return (response.content, response.headers.get('Content-Type', 'application/json')), 200
+    except Exception as e:
+        return async_error_payload(e)
+
+async def make_atlas_request_async(method, url, public_key, private_key, accept_header, json_body=None, content_type_header=None, accepts_encoding=None):
+    """Async counterpart of make_atlas_request: streams a successful Atlas body through unparsed.
+
+    accepts_encoding(coding) says whether the client takes a body still
+    compressed with that coding (see passthrough_headers); without it,
+    compressed bodies are decoded.
+    """
+    upstream = AsyncExitStack()
+    try:
+        charge_upstream_budget()
+        response = await send_atlas_request_async(method, url, public_key, private_key, accept_header,
+                                                  json_body=json_body, content_type_header=content_type_header,
+                                                  stream=upstream)
+    except Exception as e:
+        await upstream.aclose()
+        return json_response(*async_error_payload(e))
+    if response.status_code == 204:
+        await upstream.aclose()
+        return Response(ACTION_COMPLETED_BODY, media_type='application/json')
+
+    headers, encoded = passthrough_headers(response.headers, accepts_encoding or (lambda coding: False))
+    chunks = response.aiter_raw() if encoded else response.aiter_bytes()
+
+    async def generate():
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await upstream.aclose()
+    headers['Content-Type'] = response.headers.get('Content-Type', 'application/json')
+    # The background task releases the connection should the body never be sent.
+    return StreamingResponse(generate(), headers=headers, background=BackgroundTask(upstream.aclose))
+
+async def run_concurrently_async(func, items, limit):
+    """Awaits func for every item, at most limit at a time, and returns the results in input order."""
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(item):
+        async with semaphore:
+            return await func(item)
+    return await asyncio.gather(*(run(item) for item in items))
+
+async def iter_concurrently_async(func, items, limit):
+    """Awaits func for every item, at most limit at a time, yielding results as they complete.
+
+    The next item is started as a result is handed on, like iter_concurrently.
+    Closing the generator early cancels the calls that have not finished.
+    """
+    remaining = iter(items)
+    pending = {asyncio.ensure_future(func(item)) for item in itertools.islice(remaining, max(1, limit))}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.update(asyncio.ensure_future(func(item)) for item in itertools.islice(remaining, 1))
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def iter_in_order_async(func, items, limit):
+    """Async counterpart of iter_in_order: at most limit calls run ahead of the one handed on next."""
+    remaining = iter(items)
+    window = deque(asyncio.ensure_future(func(item)) for item in itertools.islice(remaining, max(1, limit)))
+    try:
+        while window:
+            result = await window.popleft()
+            window.extend(asyncio.ensure_future(func(item)) for item in itertools.islice(remaining, 1))
+            yield result
+    finally:
+        for task in window:
+            task.cancel()
+
+async def fetch_all_pages_async(url, public_key, private_key, accept_header):
+    """Async counterpart of fetch_all_pages; the remaining pages are gathered concurrently."""
+    async def fetch_page(page_num):
+        params = {'pageNum': page_num, 'itemsPerPage': ATLAS_PAGE_SIZE, 'includeCount': 'true'}
+        return await atlas_request_async('GET', url, public_key, private_key, accept_header, params=params)
+
+    payload, status_code = await fetch_page(1)
+    if status_code != 200:
+        return payload, status_code
+    results = list(payload.get('results', []))
+
+    if 'totalCount' not in payload:
+        page_num = 1
+        page = payload
+        while len(page.get('results', [])) == ATLAS_PAGE_SIZE:
+            page_num += 1
+            page, status_code = await fetch_page(page_num)
+            if status_code != 200:
+                return page, status_code
+            results.extend(page.get('results', []))
+        return merged_listing(payload, results, len(results)), 200
+
+    total_count = payload['totalCount']
+    page_count = -(-total_count // ATLAS_PAGE_SIZE)
+    for page, status_code in await run_concurrently_async(fetch_page, range(2, page_count + 1), ATLAS_PAGE_WORKERS):
+        if status_code != 200:
+            return page, status_code
+        results.extend(page.get('results', []))
+    return merged_listing(payload, results, total_count), 200
+
+async def iter_listing_pages_async(url, public_key, private_key, accept_header):
+    """Async counterpart of iter_listing_pages."""
+    async def fetch_page(page_num):
+        params = {'pageNum': page_num, 'itemsPerPage': ATLAS_PAGE_SIZE, 'includeCount': 'true'}
+        return await atlas_request_async('GET', url, public_key, private_key, accept_header, params=params)
+
+    page, status_code = await fetch_page(1)
+    yield page, status_code
+    if status_code != 200:
+        return
+
+    if 'totalCount' not in page:
+        page_num = 1
+        while len(page.get('results', [])) == ATLAS_PAGE_SIZE:
+            page_num += 1
+            page, status_code = await fetch_page(page_num)
+            yield page, status_code
+            if status_code != 200:
+                return
+        return
+
+    page_count = -(-page['totalCount'] // ATLAS_PAGE_SIZE)
+    pages = iter_in_order_async(fetch_page, range(2, page_count + 1), ATLAS_PAGE_WORKERS)
+    try:
+        async for page, status_code in pages:
+            yield page, status_code
+            if status_code != 200:
+                return
+    finally:
+        await pages.aclose()
+
+# --- Async Response Cache ---
+
+async def cached_atlas_payload_async(data, cache_key, ttl, fetch):
+    """Async counterpart of cached_atlas_payload; fetch is a coroutine function.
+
+    Stale entries are refreshed by the shared revalidator, whose thread runs
+    fetch() on this event loop.
+    """
+    cached = await cached_lookup_async(data, cache_key, ttl, fetch)
+    if cached is not None:
+        return cached
+
+    payload, status_code = await fetch()
+    return payload, status_code, store_fetched(data, cache_key, ttl, payload, status_code)
+
+async def cached_lookup_async(data, cache_key, ttl, fetch):
+    """Async counterpart of cached_lookup."""
+    if not cache_readable(data, ttl):
+        return None
+    if data.get('wait_for_revalidation'):
+        await asyncio.to_thread(cache_revalidator.wait, cache_key, SWR_WAIT_TIMEOUT)
+    if cache_invalidator.behind():
+        await asyncio.to_thread(cache_invalidator.sync)
+    loop = asyncio.get_running_loop()
+    refresh = lambda: refresh_cached(cache_key, ttl, lambda: asyncio.run_coroutine_threadsafe(fetch(), loop).result())
+    return cached_entry(data, cache_key, refresh)
+
+async def fetch_listing_async(data, instance_name, resource):
+    """Async counterpart of fetch_listing."""
+    url, accept_header, ttl = listing_target(data, instance_name, resource)
+    cache_key = atlas_cache_key(data, instance_name, resource)
+    return await cached_atlas_payload_async(data, cache_key, ttl,
+                                            lambda: fetch_all_pages_async(url, data['public_key'], data['private_key'], accept_header))
+
+async def listing_result_async(data, resource):
+    """Async counterpart of listing_result."""
+    instance_name, query = listing_request(data, resource)
+    payload, status_code, cache_headers = await fetch_listing_async(data, instance_name, resource)
+    if status_code == 200:
+        payload = versioned_listing(atlas_cache_key(data, instance_name, resource), payload, data.get('since'), query)
+    return payload, status_code, cache_headers
+
+async def listing_response_async(request, data, resource):
+    """Async counterpart of listing_response."""
+    if wants_ndjson_async(request):
+        instance_name, query = listing_request(data, resource)
+        return await listing_ndjson_response_async(data, instance_name, resource, query)
+    return result_response(await listing_result_async(data, resource))
+
+async def listing_ndjson_response_async(data, instance_name, resource, query):
+    """Async counterpart of listing_ndjson_response."""
+    url, accept_header, ttl = listing_target(data, instance_name, resource)
+    cache_key = atlas_cache_key(data, instance_name, resource)
+    fetch = lambda: fetch_all_pages_async(url, data['public_key'], data['private_key'], accept_header)
+    cached = await cached_lookup_async(data, cache_key, ttl, fetch)
+    if cached is None and query is None and not data.get('since'):
+        pages = iter_listing_pages_async(url, data['public_key'], data['private_key'], accept_header)
+        first_page, status_code = await anext(pages)
+        if status_code != 200:
+            await pages.aclose()
+            return json_response(first_page, status_code)
+        writer = ListingPageWriter(data, cache_key, ttl, first_page)
+
+        async def generate():
+            try:
+                yield writer.page(first_page)
+                async for page, status_code in pages:
+                    if status_code != 200:
+                        yield writer.failed(page, status_code)
+                        return
+                    yield writer.page(page)
+            finally:
+                await pages.aclose()
+            yield writer.finish()
+        headers = {'X-Cache': 'MISS'} if ttl > 0 else {}
+        return StreamingResponse(generate(), media_type='application/x-ndjson', headers=headers)
+
+    if cached is None:
+        payload, status_code = await fetch()
+        cache_headers = store_fetched(data, cache_key, ttl, payload, status_code)
+    else:
+        payload, status_code, cache_headers = cached
+    if status_code != 200:
+        return json_response(payload, status_code)
+    document = versioned_listing(cache_key, payload, data.get('since'), query)
+
+    async def chunks():
+        for chunk in listing_ndjson_chunks(document):
+            yield chunk
+    return StreamingResponse(chunks(), media_type='application/x-ndjson', headers=cache_headers)
+
+async def cached_document_result_async(data, target):
+    """Async counterpart of cached_document_result."""
+    url, accept_header, cache_key, ttl, fields = target
+    payload, status_code, cache_headers = await cached_atlas_payload_async(
+        data, cache_key, ttl, lambda: atlas_request_raw_async('GET', url, data['public_key'], data['private_key'], accept_header))
+    if status_code != 200:
+        return payload, status_code, {}
+    body, content_type = payload
+    if fields is not None:
+        body, content_type = project_body(cache_key, body, content_type, fields, ttl)
+    return body, 200, {**cache_headers, 'Content-Type': content_type}
+
+async def mutation_response_async(request, data, call, invalidate):
+    """Async counterpart of mutation_response."""
+    method, url, accept_header, json_body, content_type_header = call
+    accept_encodings = parse_accept_header(request.headers.get('Accept-Encoding'))
+    response = await make_atlas_request_async(method, url, data['public_key'], data['private_key'], accept_header,
+                                              json_body=json_body, content_type_header=content_type_header,
+                                              accepts_encoding=lambda coding: bool(accept_encodings[coding]))
+    await asyncio.to_thread(invalidate)
+    return response
+
+# --- Request Handling ---
+
+routes = []
+flask_asgi = WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS)
+
+class FlaskFallback:
+    """Response that lets the Flask app answer a request whose body was already read.
+
+    Used for bodies the async handlers do not accept (not JSON, or not an
+    object), so error responses stay exactly those of the Flask app.
+    """
+
+    def __init__(self, body):
+        self.body = body
+
+    async def __call__(self, scope, receive, send):
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            replayed = True
+            return {"type": "http.request", "body": self.body, "more_body": False}
+        await flask_asgi(scope, replay, send)
+
+def json_response(payload, status_code=200, headers=None):
+    """Serializes like Flask's jsonify(), so both servers send identical bodies."""
+    body = flask_app.json.dumps(payload, separators=(",", ":")) + "\n"
+    response = Response(body, status_code=status_code, media_type='application/json')
+    response.headers.update(headers or {})
+    return response
+
+def result_response(result):
+    """Counterpart of the Flask app's result_response."""
+    payload, status_code, headers = result
+    if not isinstance(payload, bytes):
+        return json_response(payload, status_code, headers)
+    return Response(payload, status_code=status_code, headers=headers)
+
+async def get_request_data_async(request):
+    """Async counterpart of get_request_data: returns (data, error_response).
+
+    When the body is not a JSON object, a FlaskFallback is returned as the
+    error response.
+    """
+    body = await request.body()
+    with trace_span('parse'):
+        try:
+            data = json.loads(body) if is_json_mimetype(request.headers.get('Content-Type', '')) else None
+        except ValueError:
+            data = None
+    if not isinstance(data, dict):
+        return None, FlaskFallback(body)
+    token = bearer_token(request.headers.get('Authorization'))
+    credentials = session_lookups.get(token) if token else {}
+    try:
+        # A miss asks the session store, which with several workers lives in another
+        # process, so it must not block the loop.
+        if credentials is None:
+            credentials = await asyncio.to_thread(stored_session_credentials, token)
+    except SessionStoreUnavailable as error:
+        return None, json_response({**SESSION_STORE_UNAVAILABLE_ERROR, "details": str(error)}, 503)
+    if credentials is None:
+        return None, json_response(SESSION_EXPIRED_ERROR, 401)
+    data.update(credentials)
+    error = request_data_error(data)
+    if error:
+        return None, json_response(error, 400)
+    return data, None
+
+def accept_quality(accept, mimetype):
+    """Quality the Accept header gives a mimetype, taken from its most specific matching entry."""
+    kind = mimetype.split('/')[0]
+    best = (-1, 0.0)
+    for entry in accept.split(','):
+        value, *params = entry.split(';')
+        value = value.strip().lower()
+        specificity = 2 if value == mimetype else 1 if value == f"{kind}/*" else 0 if value == '*/*' else -1
+        if specificity < best[0]:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, number = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        best = (specificity, quality)
+    return best[1] if best[0] >= 0 else 0.0
+
+def wants_ndjson_async(request):
+    """Same negotiation as wants_ndjson: NDJSON only when the client prefers it to JSON."""
+    accept = request.headers.get('Accept', '')
+    return accept_quality(accept, 'application/x-ndjson') > accept_quality(accept, 'application/json')
+
+def api_route(path, methods=('POST',)):
+    """Registers an async handler, with the request metrics and tracing of the Flask hooks.
+
+    A RequestRejected raised by the handler is answered like the Flask
+    app's error handler does.
+    """
+    def decorator(handler):
+        labels = (('route', path),)
+
+        async def respond(request):
+            try:
+                return await handler(request)
+            except RequestRejected as rejected:
+                return json_response(rejected.payload, rejected.status_code)
+
+        async def endpoint(request):
+            started = time.perf_counter()
+            metrics.inc('asp_ui_http_requests_in_flight', labels)
+            trace = new_request_trace(request.headers.get('X-Request-ID', ''))
+            token = current_trace.set(trace) if trace is not None else None
+            status_code = 500
+            response = None
+            try:
+                response = await respond(request)
+                if isinstance(response, FlaskFallback):
+                    return response
+                status_code = response.status_code
+                if trace is not None:
+                    response.headers['X-Request-ID'] = trace.request_id
+                    if SERVER_TIMING_ENABLED:
+                        response.headers['Server-Timing'] = trace.server_timing()
+                return response
+            finally:
+                metrics.inc('asp_ui_http_requests_in_flight', labels, -1)
+                if not isinstance(response, FlaskFallback):
+                    # The Flask app records the requests it answers itself.
+                    metrics.inc('asp_ui_http_requests_total',
+                                labels + (('method', request.method), ('status', str(status_code))))
+                    metrics.observe('asp_ui_http_request_duration_seconds', labels, time.perf_counter() - started)
+                    request_length = request.headers.get('Content-Length')
+                    if request_length and request_length.isdigit() and int(request_length):
+                        metrics.inc('asp_ui_http_request_bytes_total', labels, int(request_length))
+                    response_length = response.headers.get('Content-Length') if response is not None else None
+                    if response_length and response_length.isdigit() and int(response_length):
+                        metrics.inc('asp_ui_http_response_bytes_total', labels, int(response_length))
+                    if trace is not None and trace.sampled:
+                        trace.log(path, request.method, status_code)
+                if token is not None:
+                    current_trace.reset(token)
+
+        routes.append(Route(path, endpoint, methods=list(methods)))
+        return handler
+    return decorator
+
+# --- Async Routes ---
+
+@api_route('/api/fetch_data')
+async def fetch_data(request):
+    """API endpoint to fetch all stream processors, across every page."""
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    return await listing_response_async(request, data, 'processors')
+
+@api_route('/api/manage_processor')
+async def manage_processor(request):
+    """API endpoint to Start, Stop, or Delete a stream processor."""
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    return await mutation_response_async(request, data, *manage_processor_call(data))
+
+@api_route('/api/bulk_manage_processors')
+async def bulk_manage_processors(request):
+    """API endpoint to Start, Stop, or Delete many stream processors concurrently.
+
+    Same request fields and results as the Flask route; the actions run as
+    tasks, at most "max_parallel" at a time.
+    """
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    instance_name, action, processor_names, matches, max_parallel = parse_bulk_request(data)
+    if matches is not None:
+        list_url, list_accept_header, _ = listing_target(data, instance_name, 'processors')
+        payload, status_code = await fetch_all_pages_async(list_url, data['public_key'], data['private_key'], list_accept_header)
+        if status_code != 200:
+            return json_response(payload, status_code)
+        processor_names = select_bulk_targets(payload, matches, processor_names)
+
+    accept_header = "application/vnd.atlas.2024-05-30+json"
+
+    async def run_action(processor_name):
+        method, url = processor_action_target(data, instance_name, processor_name, action)
+        with upstream_priority_scope(PRIORITY_BULK):
+            result, status_code = await atlas_request_async(method, url, data['public_key'], data['private_key'], accept_header)
+        await asyncio.to_thread(invalidate_cached, data, instance_name, ('processors',), ('processor', processor_name))
+        return bulk_result(processor_name, action, result, status_code)
+
+    results = iter_concurrently_async(run_action, dict.fromkeys(processor_names), max_parallel)
+    if wants_ndjson_async(request):
+        async def generate():
+            async for record in results:
+                yield ndjson_lines([record])
+        return StreamingResponse(generate(), media_type='application/x-ndjson')
+    return json_response(bulk_document([result async for result in results]))
+
+@api_route('/api/create_processor')
+async def create_processor(request):
+    """API endpoint to create a new stream processor."""
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    return await mutation_response_async(request, data, *create_processor_call(data))
+
+@api_route('/api/get_processor_stats')
+async def get_processor_stats(request):
+    """API endpoint to get stats for a single stream processor.
+
+    "fields" (see parse_fields) trims the document to the given paths.
+    """
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    return result_response(await cached_document_result_async(data, processor_stats_target(data)))
+
+@api_route('/api/create_spi')
+async def create_spi(request):
+    """API endpoint to create a new stream processing instance."""
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    return await mutation_response_async(request, data, *create_spi_call(data))
+
+@api_route('/api/delete_spi')
+async def delete_spi(request):
+    """API endpoint to delete a stream processing instance."""
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    return await mutation_response_async(request, data, *delete_spi_call(data))
+
+@api_route('/api/create_connection')
+async def create_connection(request):
+    """API endpoint to create a new stream connection."""
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    return await mutation_response_async(request, data, *create_connection_call(data))
+
+@api_route('/api/list_connections')
+async def list_connections(request):
+    """API endpoint to list all connections for a stream instance."""
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    return await listing_response_async(request, data, 'connections')
+
+@api_route('/api/get_connection_details')
+async def get_connection_details(request):
+    """API endpoint to get details for a single connection.
+
+    "fields" (see parse_fields) trims the document to the given paths.
+    """
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    return result_response(await cached_document_result_async(data, connection_details_target(data)))
+
+@api_route('/api/manage_connection')
+async def manage_connection(request):
+    """API endpoint to delete a connection."""
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    return await mutation_response_async(request, data, *manage_connection_call(data))
+
+@api_route('/api/list_spis')
+async def list_spis(request):
+    """API endpoint to list all stream processing instances in a project."""
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    return await listing_response_async(request, data, 'spis')
+
+@api_route('/api/inventory')
+async def inventory(request):
+    """API endpoint to list every stream processing instance with its connections and processors.
+
+    The per-instance listings are gathered concurrently, at most
+    INVENTORY_MAX_PARALLEL at a time.
+    """
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    started = time.perf_counter()
+    spis, status_code, _ = await fetch_listing_async(data, None, 'spis')
+    if status_code != 200:
+        return json_response(spis, status_code)
+    document = InventoryDocument(data, spis, started)
+
+    async def load(job):
+        instance_name, resource = job
+        job_started = time.perf_counter()
+        payload, status_code, _ = await fetch_listing_async(data, instance_name, resource)
+        return instance_name, resource, payload, status_code, (time.perf_counter() - job_started) * 1000
+
+    if wants_ndjson_async(request):
+        async def generate():
+            yield ndjson_lines(document.instance_records())
+            results = iter_concurrently_async(load, document.jobs, INVENTORY_MAX_PARALLEL)
+            try:
+                async for result in results:
+                    yield ndjson_lines([document.add(*result)])
+            finally:
+                await results.aclose()
+            yield ndjson_lines([{"_meta": document.meta()}])
+        return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+    for result in await run_concurrently_async(load, document.jobs, INVENTORY_MAX_PARALLEL):
+        document.add(*result)
+    return json_response(document.document())
+
+@api_route('/api/instance_stats_summary')
+async def instance_stats_summary(request):
+    """API endpoint aggregating the stats of every processor of an instance.
+
+    Same request fields and result as the Flask route; the stats requests
+    are gathered concurrently, at most "max_parallel" at a time.
+    """
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    instance_name, top_n, max_parallel, percentiles, matches = parse_summary_request(data)
+
+    started = time.perf_counter()
+    listing, status_code, _ = await fetch_listing_async(data, instance_name, 'processors')
+    if status_code != 200:
+        return json_response(listing, status_code)
+    summary = StatsSummary(data, instance_name, listing, matches, top_n, percentiles, started)
+    accept_header = "application/vnd.atlas.2024-05-30+json"
+
+    async def fetch(name):
+        with upstream_priority_scope(PRIORITY_BULK):
+            return name, await atlas_request_async('GET', summary.stats_url(name), data['public_key'], data['private_key'], accept_header)
+
+    async def collect():
+        """Files each processor's stats as they arrive, yielding its name."""
+        results = iter_concurrently_async(fetch, summary.processor_names, max_parallel)
+        try:
+            async for name, (payload, status_code) in results:
+                summary.add(name, payload, status_code)
+                yield name
+        finally:
+            await results.aclose()
+
+    if wants_ndjson_async(request):
+        async def generate():
+            async for name in collect():
+                yield ndjson_lines([summary.record(name)])
+            yield ndjson_lines([{"_meta": summary.document()}])
+        return StreamingResponse(generate(), media_type='application/x-ndjson')
+    async for _ in collect():
+        pass
+    return json_response(summary.document())
+
+# Async counterparts of BATCH_OPERATIONS. The stats history is read from the session store, so it
+# runs on a thread.
+BATCH_OPERATIONS_ASYNC = {
+    'fetch_data': functools.partial(listing_result_async, resource='processors'),
+    'list_connections': functools.partial(listing_result_async, resource='connections'),
+    'list_spis': functools.partial(listing_result_async, resource='spis'),
+    'get_processor_stats': lambda data: cached_document_result_async(data, processor_stats_target(data)),
+    'get_connection_details': lambda data: cached_document_result_async(data, connection_details_target(data)),
+    'get_stats_history': lambda data: asyncio.to_thread(stats_history_result, data),
+}
+
+async def run_batch_operation_async(data, index, operation, budget):
+    """Async counterpart of run_batch_operation."""
+    op = operation['op']
+    try:
+        with upstream_budget_scope(budget):
+            try:
+                result = await BATCH_OPERATIONS_ASYNC[op](batch_operation_body(data, operation))
+            except RequestRejected as rejected:
+                result = rejected.payload, rejected.status_code, {}
+        return batch_result_record(index, op, result)
+    except Exception as e:
+        flask_app.logger.exception("Batch operation %s failed", op)
+        body = json.dumps({"error": "Batch operation failed.", "details": str(e)}).encode('utf-8')
+        return index, 500, batch_record(index, op, 500, None, body, True)
+
+@api_route('/api/batch')
+async def batch(request):
+    """API endpoint running several read operations in one round trip.
+
+    Same request fields and results as the Flask route; the operations run
+    as tasks, at most "max_parallel" at a time.
+    """
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    operations, max_parallel = parse_batch_request(data)
+
+    budget = UpstreamBudget(BATCH_MAX_UPSTREAM_CALLS)
+    results = iter_concurrently_async(lambda item: run_batch_operation_async(data, *item, budget), enumerate(operations),
+                                      max_parallel)
+    if wants_ndjson_async(request):
+        async def generate():
+            async for _, _, record in results:
+                yield record + b"\n"
+        return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+    results = [result async for result in results]
+    with trace_span('serialize'):
+        body = batch_document(results, len(operations))
+    return Response(body, media_type='application/json')
+
+@api_route('/api/stream/processors')
+async def stream_processors(request):
+    """API endpoint streaming live processor state/stats changes as Server-Sent Events.
+
+    Same events as the Flask route. The watcher thread wakes the stream
+    through the event loop, so an open stream does not hold a thread.
+    """
+    data, error_response = await get_request_data_async(request)
+    if error_response: return error_response
+
+    instance_name, = required_fields(data, ('instance_name',), "Missing 'instance_name' for streaming processors.")
+
+    # Also verifies the credentials before any shared state is handed out.
+    listing, status_code, _ = await fetch_listing_async(data, instance_name, 'processors')
+    if status_code != 200:
+        return json_response(listing, status_code)
+
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+    watcher, subscriber = subscribe_processor_watcher(data, instance_name, listing,
+                                                      lambda: loop.call_soon_threadsafe(ready.set))
+
+    async def generate():
+        try:
+            yield sse_event('snapshot', {"results": watcher.snapshot()})
+            while True:
+                try:
+                    await asyncio.wait_for(ready.wait(), STREAM_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                ready.clear()
+                events, needs_snapshot = subscriber.drain(0)
+                if needs_snapshot:
+                    yield sse_event('snapshot', {"results": watcher.snapshot()})
+                    continue
+                if not events:
+                    yield ": keep-alive\n\n"
+                for event, payload in events:
+                    yield sse_event(event, payload)
+        finally:
+            unsubscribe_processor_watcher(data, instance_name, watcher, subscriber)
+
+    return StreamingResponse(generate(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@api_route('/api/pool_stats', methods=('GET',))
+async def pool_stats(request):
+    """API endpoint reporting the upstream pool counters, plus those of the async client under "async_client"."""
+    stats = atlas_session_pool.stats()
+    stats['digest_auth'] = digest_auth_stats()
+    stats['coalescing'] = upstream_gets.stats()
+    stats['async_client'] = async_atlas_client.stats()
+    return json_response(stats)
+
+# --- ASGI Application ---
+
+@asynccontextmanager
+async def lifespan(_):
+    yield
+    await async_atlas_client.close()
+
+# Routes without an async handler (and requests the handlers pass on) are served by the Flask app.
+app = Starlette(routes=routes + [Mount('/', app=flask_asgi)], lifespan=lifespan)
+
+
+# --- Main Execution Block ---
+
+if __name__ == '__main__':
+    import uvicorn
+    from session_store import start_session_store
+
+    tls_cert_path = os.getenv('TLS_CERT_PATH')
+    tls_key_path = os.getenv('TLS_KEY_PATH')
+    ssl_options = {}
+    if tls_cert_path and tls_key_path and os.path.exists(tls_cert_path) and os.path.exists(tls_key_path):
+        print("TLS certificate and key found. Starting secure ASGI server (HTTPS)...")
+        ssl_options = {'ssl_certfile': tls_cert_path, 'ssl_keyfile': tls_key_path}
+    else:
+        print("Warning: TLS certificate/key not found or invalid.")
+        print("Starting insecure ASGI server (HTTP)...")
+    print(f"  - Workers: {ASGI_WORKERS}, listening on {ASGI_HOST}:{ASGI_PORT}")
+    # Each worker takes its share of the upstream rate limit.
+    os.environ['SERVER_WORKERS'] = str(ASGI_WORKERS)
+    # Login sessions, cache invalidations and metrics totals are shared by every worker through the store process.
+    session_store = start_session_store() if ASGI_WORKERS > 1 else None
+    try:
+        uvicorn.run('asgi:app', host=ASGI_HOST, port=ASGI_PORT, workers=ASGI_WORKERS, **ssl_options)
+    finally:
+        if session_store is not None:
+            session_store.terminate()
@@ -0,0 +1,423 @@
+"""Local mock of the Atlas Stream Processing API, for benchmarks.
+
+Serves the /api/atlas/v2/groups/{id}/streams... endpoints used by
+web_api_client.py over plain HTTP, behind digest authentication (MD5,
+qop=auth) like the real Atlas API. Latency, payload size, page size and
+429 injection are configurable, so the app can be measured offline:
+
+    python bench/mock_atlas.py --port 8080 --processors 500 --latency 0.05
+
+Point the app at it with ATLAS_API_SCHEME=http and atlas_host=127.0.0.1:8080.
+bench/run_bench.py starts it in-process with start_mock_atlas().
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+REALM = 'MMS Public API'
+API_PREFIX = '/api/atlas/v2/groups/'
+PROCESSOR_STATE_CYCLE = ('STARTED', 'STARTED', 'STOPPED', 'CREATED', 'FAILED')
+MAX_ITEMS_PER_PAGE = 500
+
+def md5_hex(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+def parse_digest_header(header):
+    """Parses the parameters of a 'Digest ...' Authorization header into a dict."""
+    return {key: quoted if quoted else bare
+            for key, quoted, bare in re.findall(r'(\w+)=(?:"([^"]*)"|([^\s,]*))', header[len('Digest '):])}
+
+
+class MockAtlasConfig:
+    """Settings of a mock Atlas server; every field can be changed while it runs."""
+
+    def __init__(self, public_key='bench-public', private_key='bench-private', project_id='bench-project',
+                 instances=1, processors=200, connections=5, latency=0.0, jitter=0.0, payload_bytes=0,
+                 rate_limit_ratio=0.0, retry_after=1, max_items_per_page=MAX_ITEMS_PER_PAGE,
+                 nonce_ttl=300, gzip=False, error_pages=(), throttle_next=0):
+        self.public_key = public_key
+        self.private_key = private_key
+        self.project_id = project_id
+        self.instances = instances
+        self.processors = processors
+        self.connections = connections
+        # Seconds added to every authenticated response, plus up to `jitter` more.
+        self.latency = latency
+        self.jitter = jitter
+        # Size of the padding string added to each processor's pipeline.
+        self.payload_bytes = payload_bytes
+        # Fraction of authenticated requests answered with 429 Too Many Requests.
+        self.rate_limit_ratio = rate_limit_ratio
+        # Retry-After value (seconds) sent with injected 429s; None omits the header.
+        self.retry_after = retry_after
+        self.max_items_per_page = max_items_per_page
+        # Seconds a nonce stays valid before the server answers stale=true.
+        self.nonce_ttl = nonce_ttl
+        self.gzip = gzip
+        # pageNum values that every list endpoint answers with 500 Internal Server Error.
+        self.error_pages = error_pages
+        # Number of the next authenticated requests answered with 429, whatever rate_limit_ratio is.
+        self.throttle_next = throttle_next
+
+
+class MockAtlasState:
+    """Instances, connections and processors of the mock project, plus request counters."""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.nonces = {}
+        self.started_at = time.time()
+        self.counters = {'requests': 0, 'challenges': 0, 'stale_nonces': 0, 'throttled': 0, 'not_found': 0}
+        self.instances = {}
+        for i in range(config.instances):
+            name = f"bench-spi-{i}"
+            self.instances[name] = {
+                "spec": {"name": name, "dataProcessRegion": {"cloudProvider": "AWS", "region": "VIRGINIA_USA"},
+                         "streamConfig": {"tier": "SP30"}, "hostnames": [f"{name}.mock.local"]},
+                "connections": {f"conn-{j}": self.make_connection(f"conn-{j}") for j in range(config.connections)},
+                "processors": {f"proc-{j:05d}": self.make_processor(f"proc-{j:05d}", j) for j in range(config.processors)},
+            }
+
+    def count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def make_connection(self, name, body=None):
+        connection = {"name": name, "type": "Kafka", "bootstrapServers": "broker-1.mock.local:9092",
+                      "security": {"protocol": "SASL_SSL"}, "authentication": {"mechanism": "PLAIN"}}
+        connection.update(body or {})
+        connection['name'] = name
+        return connection
+
+    def make_processor(self, name, seed, pipeline=None):
+        padding = 'x' * self.config.payload_bytes
+        return {
+            "_id": hashlib.sha1(name.encode()).hexdigest()[:24],
+            "name": name,
+            "state": PROCESSOR_STATE_CYCLE[seed % len(PROCESSOR_STATE_CYCLE)],
+            "pipeline": pipeline or [{"$source": {"connectionName": "conn-0", "topic": f"topic-{seed % 50}"}},
+                                     {"$match": {"padding": padding}},
+                                     {"$emit": {"connectionName": "conn-0", "topic": f"out-{seed % 50}"}}],
+            "rate": 1 + seed % 97,
+        }
+
+    def processor_view(self, processor, with_stats):
+        """Returns the public form of a processor; stats counters grow with time while it is started."""
+        view = {key: value for key, value in processor.items() if key != 'rate'}
+        if with_stats:
+            elapsed = time.time() - self.started_at if processor['state'] == 'STARTED' else 0
+            rate = processor['rate']
+            view['stats'] = {
+                "name": processor['name'], "status": processor['state'],
+                "inputMessageCount": int(elapsed * rate * 10),
+                "outputMessageCount": int(elapsed * rate * 9),
+                "dlqMessageCount": int(elapsed * rate * 0.01),
+                "inputMessageSize": int(elapsed * rate * 10) * 512,
+                "outputMessageSize": int(elapsed * rate * 9) * 480,
+                "memoryTrackerBytes": 1024 * 1024 + rate * 4096,
+            }
+        return view
+
+
+class MockAtlasHandler(BaseHTTPRequestHandler):
+    """Request handler; `state` is bound by start_mock_atlas()."""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without TCP_NODELAY every
+    # response would wait out the client's delayed ACK (~40ms).
+    disable_nagle_algorithm = True
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def do_DELETE(self):
+        self.handle_request()
+
+    def send_body(self, status, payload=None, headers=None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.send_response(status)
+        if body and self.state.config.gzip and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=1)
+            self.send_header('Content-Encoding', 'gzip')
+        if body:
+            self.send_header('Content-Type', self.headers.get('Accept') or 'application/json')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_body(self, status, reason, detail):
+        self.send_body(status, {"error": status, "reason": reason, "detail": detail})
+
+    def challenge(self, stale=False):
+        nonce = os.urandom(16).hex()
+        with self.state.lock:
+            self.state.nonces[nonce] = time.monotonic()
+            self.state.counters['stale_nonces' if stale else 'challenges'] += 1
+        header = f'Digest realm="{REALM}", domain="", nonce="{nonce}", algorithm=MD5, qop="auth", stale={"true" if stale else "false"}'
+        self.send_body(401, {"error": 401, "reason": "Unauthorized", "detail": "You are not authorized for this resource."},
+                       {'WWW-Authenticate': header})
+
+    def authenticate(self):
+        """Checks the digest Authorization header; sends a challenge and returns False when it fails."""
+        config = self.state.config
+        header = self.headers.get('Authorization', '')
+        if not header.startswith('Digest '):
+            self.challenge()
+            return False
+        params = parse_digest_header(header)
+        with self.state.lock:
+            issued_at = self.state.nonces.get(params.get('nonce'))
+            if issued_at is not None and time.monotonic() - issued_at > config.nonce_ttl:
+                del self.state.nonces[params['nonce']]
+                issued_at = None
+        if issued_at is None:
+            self.challenge(stale=True)
+            return False
+        ha1 = md5_hex(f"{config.public_key}:{REALM}:{config.private_key}")
+        ha2 = md5_hex(f"{self.command}:{params.get('uri', '')}")
+        expected = md5_hex(f"{ha1}:{params['nonce']}:{params.get('nc', '')}:{params.get('cnonce', '')}:auth:{ha2}")
+        if params.get('username') != config.public_key or params.get('response') != expected:
+            self.challenge()
+            return False
+        return True
+
+    def handle_request(self):
+        self.state.count('requests')
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length else b''
+        if not self.authenticate():
+            return
+
+        config = self.state.config
+        if config.latency or config.jitter:
+            time.sleep(config.latency + random.uniform(0, config.jitter))
+        with self.state.lock:
+            throttled = config.throttle_next > 0
+            config.throttle_next -= throttled
+        if throttled or config.rate_limit_ratio and random.random() < config.rate_limit_ratio:
+            self.state.count('throttled')
+            headers = {'Retry-After': str(config.retry_after)} if config.retry_after is not None else {}
+            self.send_body(429, {"error": 429, "reason": "Too Many Requests", "detail": "Rate limit exceeded."}, headers)
+            return
+
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            body = json.loads(raw_body) if raw_body else None
+        except ValueError:
+            self.send_error_body(400, "Bad Request", "Malformed JSON body.")
+            return
+        if not url.path.startswith(API_PREFIX):
+            self.send_error_body(404, "Not Found", "Unknown path.")
+            return
+        parts = [unquote(part) for part in url.path[len(API_PREFIX):].split('/')]
+        if len(parts) < 2 or parts[0] != config.project_id or parts[1] != 'streams':
+            self.state.count('not_found')
+            self.send_error_body(404, "Not Found", f"Group {parts[0]} not found.")
+            return
+        self.route(parts[2:], query, body)
+
+    def route(self, parts, query, body):
+        state = self.state
+        method = self.command
+        if not parts:
+            if method == 'GET':
+                with state.lock:
+                    specs = [instance['spec'] for instance in state.instances.values()]
+                return self.send_page(specs, query)
+            if method == 'POST':
+                name = (body or {}).get('name')
+                if not name:
+                    return self.send_error_body(400, "Bad Request", "Missing instance name.")
+                with state.lock:
+                    if name in state.instances:
+                        return self.send_error_body(409, "Conflict", f"Instance {name} already exists.")
+                    spec = dict(body, hostnames=[f"{name}.mock.local"])
+                    state.instances[name] = {"spec": spec, "connections": {}, "processors": {}}
+                return self.send_body(200, spec)
+            return self.send_error_body(405, "Method Not Allowed", method)
+
+        with state.lock:
+            instance = state.instances.get(parts[0])
+        if instance is None:
+            state.count('not_found')
+            return self.send_error_body(404, "Not Found", f"Instance {parts[0]} not found.")
+        rest = parts[1:]
+        if not rest:
+            if method == 'GET':
+                return self.send_body(200, instance['spec'])
+            if method == 'DELETE':
+                with state.lock:
+                    state.instances.pop(parts[0], None)
+                return self.send_body(202, {})
+            return self.send_error_body(405, "Method Not Allowed", method)
+        if rest[0] == 'connections':
+            return self.route_connections(instance, rest[1:], query, body)
+        if rest[0] == 'processors' and len(rest) == 1 and method == 'GET':
+            with state.lock:
+                processors = list(instance['processors'].values())
+            return self.send_page([state.processor_view(processor, with_stats=False) for processor in processors], query)
+        if rest[0] == 'processor':
+            return self.route_processor(instance, rest[1:], body)
+        state.count('not_found')
+        return self.send_error_body(404, "Not Found", "Unknown path.")
+
+    def route_connections(self, instance, rest, query, body):
+        state = self.state
+        method = self.command
+        if not rest:
+            if method == 'GET':
+                with state.lock:
+                    connections = list(instance['connections'].values())
+                return self.send_page(connections, query)
+            if method == 'POST':
+                name = (body or {}).get('name')
+                if not name:
+                    return self.send_error_body(400, "Bad Request", "Missing connection name.")
+                with state.lock:
+                    connection = instance['connections'][name] = state.make_connection(name, body)
+                return self.send_body(200, connection)
+            return self.send_error_body(405, "Method Not Allowed", method)
+        with state.lock:
+            connection = instance['connections'].get(rest[0])
+            if connection is not None and method == 'DELETE':
+                del instance['connections'][rest[0]]
+        if connection is None:
+            state.count('not_found')
+            return self.send_error_body(404, "Not Found", f"Connection {rest[0]} not found.")
+        if method == 'DELETE':
+            return self.send_body(202, {})
+        return self.send_body(200, connection)
+
+    def route_processor(self, instance, rest, body):
+        state = self.state
+        method = self.command
+        if not rest:
+            if method != 'POST':
+                return self.send_error_body(405, "Method Not Allowed", method)
+            name = (body or {}).get('name')
+            if not name:
+                return self.send_error_body(400, "Bad Request", "Missing processor name.")
+            with state.lock:
+                processor = state.make_processor(name, len(instance['processors']), (body or {}).get('pipeline'))
+                processor['state'] = 'CREATED'
+                instance['processors'][name] = processor
+            return self.send_body(200, state.processor_view(processor, with_stats=False))
+
+        name, _, action = rest[0].partition(':')
+        with state.lock:
+            processor = instance['processors'].get(name)
+            if processor is not None:
+                if method == 'DELETE':
+                    del instance['processors'][name]
+                elif method == 'POST' and action in ('start', 'stop'):
+                    processor['state'] = 'STARTED' if action == 'start' else 'STOPPED'
+        if processor is None:
+            state.count('not_found')
+            return self.send_error_body(404, "Not Found", f"Processor {name} not found.")
+        if method == 'DELETE':
+            return self.send_body(204)
+        if method == 'POST':
+            if action not in ('start', 'stop'):
+                return self.send_error_body(400, "Bad Request", f"Unknown action {action!r}.")
+            return self.send_body(200, {})
+        return self.send_body(200, state.processor_view(processor, with_stats=True))
+
+    def send_page(self, items, query):
+        """Sends one page of a list endpoint, honouring pageNum, itemsPerPage and includeCount."""
+        try:
+            page_num = max(1, int(query.get('pageNum', 1)))
+            items_per_page = min(max(1, int(query.get('itemsPerPage', 100))), self.state.config.max_items_per_page)
+        except ValueError:
+            return self.send_error_body(400, "Bad Request", "Invalid pagination parameters.")
+        if page_num in self.state.config.error_pages:
+            return self.send_error_body(500, "Internal Server Error", f"Page {page_num} failed.")
+        start = (page_num - 1) * items_per_page
+        page = {"results": items[start:start + items_per_page],
+                "links": [{"rel": "self", "href": f"http://{self.headers.get('Host')}{self.path}"}]}
+        if query.get('includeCount', 'true').lower() != 'false':
+            page['totalCount'] = len(items)
+        return self.send_body(200, page)
+
+
+class MockAtlasServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_mock_atlas(config=None, host='127.0.0.1', port=0):
+    """Starts a mock Atlas server on a background thread and returns it.
+
+    The server's `state` attribute holds the data and counters; call
+    shutdown() to stop it.
+    """
+    state = MockAtlasState(config or MockAtlasConfig())
+    handler = type('BoundMockAtlasHandler', (MockAtlasHandler,), {'state': state})
+    server = MockAtlasServer((host, port), handler)
+    server.state = state
+    threading.Thread(target=server.serve_forever, name='mock-atlas', daemon=True).start()
+    return server
+
+def add_config_arguments(parser):
+    """Adds the MockAtlasConfig options to an argparse parser (shared with run_bench.py)."""
+    defaults = MockAtlasConfig()
+    parser.add_argument('--public-key', default=defaults.public_key)
+    parser.add_argument('--private-key', default=defaults.private_key)
+    parser.add_argument('--project-id', default=defaults.project_id)
+    parser.add_argument('--instances', type=int, default=defaults.instances, help="stream processing instances")
+    parser.add_argument('--processors', type=int, default=defaults.processors, help="processors per instance")
+    parser.add_argument('--connections', type=int, default=defaults.connections, help="connections per instance")
+    parser.add_argument('--latency', type=float, default=defaults.latency, help="seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=defaults.jitter, help="up to this many extra random seconds")
+    parser.add_argument('--payload-bytes', type=int, default=defaults.payload_bytes,
+                        help="padding added to each processor's pipeline")
+    parser.add_argument('--rate-limit-ratio', type=float, default=defaults.rate_limit_ratio,
+                        help="fraction of requests answered with 429")
+    parser.add_argument('--retry-after', type=int, default=defaults.retry_after,
+                        help="Retry-After seconds on injected 429s (negative omits the header)")
+    parser.add_argument('--max-items-per-page', type=int, default=defaults.max_items_per_page)
+    parser.add_argument('--nonce-ttl', type=float, default=defaults.nonce_ttl)
+    parser.add_argument('--gzip', action='store_true', help="gzip responses when the client accepts it")
+
+def config_from_args(args):
+    return MockAtlasConfig(
+        public_key=args.public_key, private_key=args.private_key, project_id=args.project_id,
+        instances=args.instances, processors=args.processors, connections=args.connections,
+        latency=args.latency, jitter=args.jitter, payload_bytes=args.payload_bytes,
+        rate_limit_ratio=args.rate_limit_ratio, retry_after=args.retry_after if args.retry_after >= 0 else None,
+        max_items_per_page=args.max_items_per_page, nonce_ttl=args.nonce_ttl, gzip=args.gzip)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local mock of the Atlas Stream Processing API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    server = start_mock_atlas(config_from_args(args), args.host, args.port)
+    print(f"Mock Atlas listening on http://{args.host}:{server.server_address[1]} "
+          f"(project {args.project_id}, keys {args.public_key}/{args.private_key})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
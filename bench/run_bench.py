@@ -0,0 +1,439 @@
+"""Benchmarks every route of web_api_client.py against the local Atlas mock.
+
+Starts bench/mock_atlas.py in-process, launches the app (gunicorn by
+default) pointed at it, and drives each route at the requested
+concurrency levels. For every scenario it reports requests/sec,
+p50/p95/p99 latency, errors and the app's memory, and saves the results
+as JSON. Pass --baseline with an earlier result file to flag regressions:
+
+    python bench/run_bench.py --concurrency 1,16 --requests 200
+    python bench/run_bench.py --baseline bench/results/20260101-120000.json
+
+Use --target to measure an app that is already running; it must have been
+started with ATLAS_API_SCHEME=http so it can reach the mock.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_atlas import add_config_arguments, config_from_args, start_mock_atlas
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'bench', 'results')
+INSTANCE = 'bench-spi-0'
+
+# Settings the spawned app always gets; --app-env entries override them.
+# The upstream rate limiter is off by default so the numbers measure this
+# service rather than the configured Atlas budget.
+DEFAULT_APP_ENV = {
+    'ATLAS_API_SCHEME': 'http',
+    'TLS_CERT_PATH': '',
+    'TLS_KEY_PATH': '',
+    'ATLAS_RATE_LIMIT_PER_SECOND': '0',
+    'GUNICORN_ACCESS_LOG': os.devnull,
+    'GUNICORN_LOG_LEVEL': 'warning',
+    'GUNICORN_GRACEFUL_TIMEOUT': '5',
+}
+
+
+class Scenario:
+    """One benchmarked route.
+
+    body(i, bench) returns the JSON body of the i-th request (None for GET).
+    `scale` shrinks the request count of expensive routes, and `stream`
+    reads only the first Server-Sent Event before closing the response.
+    """
+
+    def __init__(self, name, method, path, body=None, scale=1.0, stream=False, expect=(200,)):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.scale = scale
+        self.stream = stream
+        self.expect = expect
+
+
+class Bench:
+    """Shared state of a run: the mock server, app URL, credentials and name counters."""
+
+    def __init__(self, mock, base_url):
+        self.mock = mock
+        self.base_url = base_url.rstrip('/')
+        config = mock.state.config
+        self.credentials = {
+            'public_key': config.public_key,
+            'private_key': config.private_key,
+            'project_id': config.project_id,
+            'atlas_host': f"127.0.0.1:{mock.server_address[1]}",
+        }
+        self.processor_count = config.processors
+        self.sequence = itertools.count()
+        self.since_version = None
+
+    def request(self, **fields):
+        return {**self.credentials, **fields}
+
+    def unique(self, prefix):
+        return f"{prefix}-{os.getpid()}-{next(self.sequence)}"
+
+    def processor(self, i):
+        return f"proc-{i % self.processor_count:05d}"
+
+    def seed(self, kind, name):
+        """Creates an instance, connection or processor directly in the mock, for the delete scenarios."""
+        state = self.mock.state
+        with state.lock:
+            if kind == 'spi':
+                state.instances[name] = {"spec": {"name": name}, "connections": {}, "processors": {}}
+            elif kind == 'connection':
+                state.instances[INSTANCE]['connections'][name] = state.make_connection(name)
+            else:
+                state.instances[INSTANCE]['processors'][name] = state.make_processor(name, 0)
+        return name
+
+
+def seeded_body(kind, field, **extra):
+    def body(i, bench):
+        return bench.request(instance_name=INSTANCE, **{field: bench.seed(kind, bench.unique(f"del-{kind}"))}, **extra)
+    return body
+
+def delete_spi_body(i, bench):
+    return bench.request(instance_name=bench.seed('spi', bench.unique('del-spi')))
+
+def since_body(i, bench):
+    return bench.request(instance_name=INSTANCE, since=bench.since_version)
+
+
+SCENARIOS = [
+    Scenario('index', 'GET', '/'),
+    Scenario('list_spis', 'POST', '/api/list_spis', lambda i, b: b.request()),
+    Scenario('fetch_data', 'POST', '/api/fetch_data', lambda i, b: b.request(instance_name=INSTANCE)),
+    Scenario('fetch_data_since', 'POST', '/api/fetch_data', since_body),
+    Scenario('fetch_data_filtered', 'POST', '/api/fetch_data',
+             lambda i, b: b.request(instance_name=INSTANCE, filter={"name_prefix": "proc-000", "state": "STARTED"},
+                                    sort='-name', limit=50)),
+    Scenario('list_connections', 'POST', '/api/list_connections', lambda i, b: b.request(instance_name=INSTANCE)),
+    Scenario('get_connection_details', 'POST', '/api/get_connection_details',
+             lambda i, b: b.request(instance_name=INSTANCE, connection_name='conn-0')),
+    Scenario('get_processor_stats', 'POST', '/api/get_processor_stats',
+             lambda i, b: b.request(instance_name=INSTANCE, processor_name=b.processor(i))),
+    Scenario('manage_processor', 'POST', '/api/manage_processor',
+             lambda i, b: b.request(instance_name=INSTANCE, processor_name=b.processor(i),
+                                    action='start' if i % 2 else 'stop')),
+    Scenario('create_processor', 'POST', '/api/create_processor',
+             lambda i, b: b.request(instance_name=INSTANCE, processor_body={
+                 "name": b.unique('new-proc'), "pipeline": [{"$source": {"connectionName": "conn-0"}}]})),
+    Scenario('delete_processor', 'POST', '/api/manage_processor',
+             seeded_body('processor', 'processor_name', action='delete')),
+    Scenario('create_spi', 'POST', '/api/create_spi',
+             lambda i, b: b.request(spi_body={"name": b.unique('new-spi'), "streamConfig": {"tier": "SP10"},
+                                              "dataProcessRegion": {"cloudProvider": "AWS", "region": "VIRGINIA_USA"}})),
+    Scenario('delete_spi', 'POST', '/api/delete_spi', delete_spi_body),
+    Scenario('create_connection', 'POST', '/api/create_connection',
+             lambda i, b: b.request(instance_name=INSTANCE, connection_body={
+                 "name": b.unique('new-conn'), "type": "Kafka", "bootstrapServers": "broker.mock.local:9092"})),
+    Scenario('delete_connection', 'POST', '/api/manage_connection',
+             seeded_body('connection', 'connection_name', action='delete')),
+    Scenario('bulk_manage_processors', 'POST', '/api/bulk_manage_processors',
+             lambda i, b: b.request(instance_name=INSTANCE, action='start' if i % 2 else 'stop',
+                                    filter={"name_prefix": "proc-0000"}), scale=0.25),
+    Scenario('inventory', 'POST', '/api/inventory', lambda i, b: b.request(), scale=0.5),
+    Scenario('start_stats_sampler', 'POST', '/api/start_stats_sampler',
+             lambda i, b: b.request(instance_name=INSTANCE, interval_seconds=30,
+                                    processor_names=[b.processor(n) for n in range(20)])),
+    Scenario('get_stats_history', 'POST', '/api/get_stats_history',
+             lambda i, b: b.request(instance_name=INSTANCE, window_seconds=300)),
+    # Removing a processor that is not sampled keeps the sampler running for later requests.
+    Scenario('stop_stats_sampler', 'POST', '/api/stop_stats_sampler',
+             lambda i, b: b.request(instance_name=INSTANCE, processor_names=['not-sampled'])),
+    Scenario('instance_stats_summary', 'POST', '/api/instance_stats_summary',
+             lambda i, b: b.request(instance_name=INSTANCE), scale=0.1),
+    Scenario('stream_processors', 'POST', '/api/stream/processors',
+             lambda i, b: b.request(instance_name=INSTANCE), scale=0.25, stream=True),
+    Scenario('pool_stats', 'GET', '/api/pool_stats'),
+    Scenario('cache_stats', 'GET', '/api/cache_stats'),
+    Scenario('scheduler_stats', 'GET', '/api/scheduler_stats'),
+    Scenario('metrics', 'GET', '/metrics'),
+]
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+def send(session, bench, scenario, i):
+    """Sends one request and returns (latency_seconds, ok)."""
+    body = scenario.body(i, bench) if scenario.body else None
+    started = time.perf_counter()
+    try:
+        response = session.request(scenario.method, bench.base_url + scenario.path, json=body,
+                                   stream=scenario.stream, timeout=120)
+        if scenario.stream:
+            # The first event (the snapshot) ends at the first blank line.
+            buffered = b''
+            for chunk in response.iter_content(chunk_size=None):
+                buffered += chunk
+                if b'\n\n' in buffered:
+                    break
+            response.close()
+        else:
+            response.content
+        ok = response.status_code in scenario.expect
+    except requests.RequestException:
+        ok = False
+    return time.perf_counter() - started, ok
+
+def run_scenario(bench, scenario, concurrency, request_count, duration):
+    """Runs a scenario on `concurrency` client threads; returns the latencies and error count."""
+    counter = itertools.count()
+    deadline = time.monotonic() + duration if duration else None
+    local = threading.local()
+
+    def worker(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        latencies, errors = [], 0
+        while True:
+            i = next(counter)
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            if deadline is None and i >= request_count:
+                break
+            latency, ok = send(session, bench, scenario, i)
+            latencies.append(latency)
+            errors += not ok
+        return latencies, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(latency for worker_latencies, _ in outcomes for latency in worker_latencies)
+    return latencies, sum(errors for _, errors in outcomes), elapsed
+
+def process_tree(pid):
+    """Returns pid and the pids of all its descendants (gunicorn workers)."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        pending.extend(children.get(current, []))
+    return pids
+
+def memory_mb(pid):
+    """Sums VmRSS and VmHWM (peak RSS) in MB over a process tree; None when /proc is unavailable."""
+    if pid is None or not os.path.isdir(f'/proc/{pid}'):
+        return None
+    totals = {'VmRSS': 0, 'VmHWM': 0}
+    for process in process_tree(pid):
+        try:
+            with open(f'/proc/{process}/status') as f:
+                for line in f:
+                    field, _, value = line.partition(':')
+                    if field in totals:
+                        totals[field] += int(value.split()[0])
+        except OSError:
+            continue
+    return {"rss_mb": round(totals['VmRSS'] / 1024, 1), "peak_rss_mb": round(totals['VmHWM'] / 1024, 1)}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_app(args):
+    """Launches the app under gunicorn, asgi.py or the Flask development server; returns (process, base_url)."""
+    port = free_port()
+    env = {**os.environ, **DEFAULT_APP_ENV, 'GUNICORN_BIND': f'127.0.0.1:{port}',
+           'ASGI_HOST': '127.0.0.1', 'ASGI_PORT': str(port)}
+    for setting in args.app_env:
+        name, _, value = setting.partition('=')
+        env[name] = value
+    if args.server == 'gunicorn':
+        env.setdefault('GUNICORN_WORKERS', str(args.workers))
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'web_api_client:app']
+    elif args.server == 'asgi':
+        command = [sys.executable, 'asgi.py']
+    else:
+        command = [sys.executable, '-m', 'flask', '--app', 'web_api_client', 'run', '--port', str(port), '--with-threads']
+    log = open(args.server_log, 'a') if args.server_log else subprocess.DEVNULL
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"The app exited with status {process.returncode} during startup.")
+        try:
+            requests.get(base_url + '/api/pool_stats', timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("The app did not start listening within 30 seconds.")
+
+def compare(results, baseline, threshold):
+    """Prints rps and p95 changes against a baseline; returns the regressed scenario keys."""
+    regressions = []
+    print(f"\nComparison with baseline (threshold {threshold:.0%}):")
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if not previous or not previous.get('rps') or not previous.get('p95_ms'):
+            continue
+        rps_change = result['rps'] / previous['rps'] - 1
+        p95_change = result['p95_ms'] / previous['p95_ms'] - 1
+        regressed = rps_change < -threshold or p95_change > threshold
+        if regressed:
+            regressions.append(key)
+        print(f"  {key:<36} rps {rps_change:+7.1%}  p95 {p95_change:+7.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark web_api_client.py against a local Atlas mock.")
+    parser.add_argument('--concurrency', default='1,8,32', help="comma-separated client concurrency levels")
+    parser.add_argument('--requests', type=int, default=200, help="requests per scenario and concurrency level")
+    parser.add_argument('--duration', type=float, default=0,
+                        help="seconds per scenario and concurrency level (overrides --requests)")
+    parser.add_argument('--warmup', type=int, default=5, help="untimed requests sent before each scenario")
+    parser.add_argument('--scenarios', help="comma-separated scenario names (default: all)")
+    parser.add_argument('--server', choices=('gunicorn', 'asgi', 'flask'), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=1, help="gunicorn workers")
+    parser.add_argument('--app-env', action='append', default=[], metavar='NAME=VALUE',
+                        help="extra environment for the app, e.g. ATLAS_RATE_LIMIT_PER_SECOND=10")
+    parser.add_argument('--server-log', help="append the app's output to this file")
+    parser.add_argument('--target', help="URL of an already running app instead of starting one")
+    parser.add_argument('--pid', type=int, help="with --target, the app's pid for memory readings")
+    parser.add_argument('--output', help="result file (default: bench/results/<timestamp>.json)")
+    parser.add_argument('--baseline', help="earlier result file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="relative rps drop or p95 increase that counts as a regression")
+    parser.add_argument('--list', action='store_true', help="list the scenarios and exit")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    if args.list:
+        for scenario in SCENARIOS:
+            print(f"{scenario.name:<26} {scenario.method:<5} {scenario.path}")
+        return 0
+    scenarios = SCENARIOS
+    if args.scenarios:
+        wanted = args.scenarios.split(',')
+        unknown = set(wanted) - {scenario.name for scenario in SCENARIOS}
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+        scenarios = [scenario for scenario in SCENARIOS if scenario.name in wanted]
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    mock = start_mock_atlas(config_from_args(args))
+    process = None
+    if args.target:
+        base_url, app_pid = args.target, args.pid
+    else:
+        process, base_url = start_app(args)
+        app_pid = process.pid
+    bench = Bench(mock, base_url)
+
+    results = {}
+    try:
+        warm = requests.post(bench.base_url + '/api/fetch_data', json=bench.request(instance_name=INSTANCE), timeout=120)
+        if warm.status_code != 200:
+            raise SystemExit(f"The app cannot reach the mock (status {warm.status_code}): {warm.text[:200]}")
+        bench.since_version = warm.json().get('version')
+        print(f"{'scenario':<36} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'rss MB':>8}")
+        for scenario in scenarios:
+            with requests.Session() as session:
+                for i in range(args.warmup):
+                    send(session, bench, scenario, i)
+            for concurrency in levels:
+                count = max(concurrency, int(args.requests * scenario.scale))
+                latencies, errors, elapsed = run_scenario(bench, scenario, concurrency, count, args.duration)
+                memory = memory_mb(app_pid) or {}
+                key = f"{scenario.name}@c{concurrency}"
+                results[key] = {
+                    "scenario": scenario.name,
+                    "concurrency": concurrency,
+                    "requests": len(latencies),
+                    "errors": errors,
+                    "seconds": round(elapsed, 3),
+                    "rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+                    **{f"p{p}_ms": round(percentile(latencies, p) * 1000, 2) if latencies else None
+                       for p in (50, 95, 99)},
+                    **memory,
+                }
+                result = results[key]
+                print(f"{key:<36} {result['rps']:>9} {result['p50_ms']:>9} {result['p95_ms']:>9} "
+                      f"{result['p99_ms']:>9} {errors:>7} {memory.get('rss_mb', '-'):>8}")
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        mock.shutdown()
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    mock_config = vars(mock.state.config)
+    with open(output, 'w') as f:
+        json.dump({
+            "meta": {
+                "created": datetime.now().isoformat(timespec='seconds'),
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "server": 'external' if args.target else args.server,
+                "workers": args.workers,
+                "app_env": args.app_env,
+                "mock": {**mock_config, "private_key": '***'},
+                "mock_counters": mock.state.counters,
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} scenario(s) regressed.")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
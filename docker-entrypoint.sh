@@ -0,0 +1,17 @@
+#!/bin/sh
+# Container entrypoint for the MongoDB Atlas API Web App.
+#
+# SERVER_MODE=production (the default) serves the app with gunicorn using
+# gunicorn.conf.py; SERVER_MODE=asgi serves it with uvicorn through asgi.py;
+# SERVER_MODE=development uses Flask's built-in server.
+set -e
+
+if [ "${SERVER_MODE:-production}" = "development" ]; then
+    exec python web_api_client.py
+fi
+
+if [ "${SERVER_MODE}" = "asgi" ]; then
+    exec python asgi.py
+fi
+
+exec gunicorn -c gunicorn.conf.py web_api_client:app
@@ -0,0 +1,73 @@
+# Gunicorn configuration for the MongoDB Atlas API Web App
+#
+# Used by the container entrypoint in production mode:
+#    gunicorn -c gunicorn.conf.py web_api_client:app
+#
+# Every setting can be overridden from the environment or the .env file.
+# The response cache, the rate limiter's share and GET coalescing live in
+# the worker process, so one worker is the default and the server scales
+# with threads: they spend most of their time waiting on the Atlas API.
+# Sessions, cache invalidations and metrics totals are shared through the
+# session store process started below.
+
+import os
+from dotenv import load_dotenv, find_dotenv
+from session_store import start_session_store
+
+load_dotenv(find_dotenv(usecwd=True))
+
+def env_int(name, default):
+    """Reads an integer setting from the environment, falling back to a default."""
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Threaded workers, so one slow Atlas call only occupies a single thread.
+worker_class = 'gthread'
+workers = env_int('GUNICORN_WORKERS', 1)
+threads = env_int('GUNICORN_THREADS', 32)
+
+# Atlas calls time out after 30s, so allow a worker longer than that.
+timeout = env_int('GUNICORN_TIMEOUT', 60)
+# Seconds in-flight requests get to finish after SIGTERM before workers are killed.
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+# Seconds an idle browser connection is held open for reuse.
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+
+# Recycle workers after this many requests (0 disables), with jitter so they don't restart together.
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 0)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', 50)
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+# Same TLS handling as the development server: HTTPS only when both files exist.
+tls_cert_path = os.getenv('TLS_CERT_PATH')
+tls_key_path = os.getenv('TLS_KEY_PATH')
+if tls_cert_path and tls_key_path and os.path.exists(tls_cert_path) and os.path.exists(tls_key_path):
+    certfile = tls_cert_path
+    keyfile = tls_key_path
+
+def on_starting(server):
+    if server.cfg.certfile:
+        print("TLS certificate and key found. Starting secure gunicorn server (HTTPS)...")
+        print(f"  - Certificate: {server.cfg.certfile}")
+        print(f"  - Key: {server.cfg.keyfile}")
+    else:
+        print("Warning: TLS certificate/key not found or invalid.")
+        print("Starting insecure gunicorn server (HTTP)...")
+    print(f"  - Workers: {server.cfg.workers} x {server.cfg.threads} threads")
+    # Each worker takes its share of the upstream rate limit.
+    os.environ['SERVER_WORKERS'] = str(server.cfg.workers)
+    if server.cfg.workers > 1:
+        # Login sessions, cache invalidations and metrics totals are shared by every worker through the store process.
+        server.session_store = start_session_store()
+
+def on_exit(server):
+    store = getattr(server, 'session_store', None)
+    if store is not None:
+        store.terminate()
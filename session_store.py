@@ -0,0 +1,536 @@
+"""Login session store for the MongoDB Atlas API Web App.
+
+Maps the opaque tokens handed out by /api/login to the Atlas credentials
+they stand for, so browsers send the token instead of the keys. A session
+expires SESSION_IDLE_TIMEOUT seconds after it was last used, and
+SESSION_MAX_LIFETIME seconds after login at the latest.
+
+A server that forks several worker processes (gunicorn, or asgi.py with
+ASGI_WORKERS > 1) calls start_session_store() first: the store then lives
+in one small process that every worker reaches over a unix socket, so a
+token works whichever worker answers. It also keeps the log of response
+cache invalidations (see InvalidationLog), so a mutation handled by one
+worker clears the cached listings of all of them, and the metrics totals
+of every worker (see MetricsBoard). A single process keeps all of them in
+memory. Should it exit, the server starts a new one at the same
+address and the workers reconnect to it (see SharedStoreClient); the
+sessions are lost, so their users log in again.
+
+Objects that need the app, like the stats samplers and the live update
+pollers, are not run by the store: one worker is elected to serve them to
+the others instead (see ElectedService). This module never imports the
+app, so the store process and the server's master process stay small.
+"""
+
+import os
+import sys
+import mmap
+import time
+import fcntl
+import struct
+import shutil
+import signal
+import secrets
+import functools
+import tempfile
+import threading
+import subprocess
+from collections import OrderedDict, deque
+from multiprocessing.managers import BaseManager, BaseProxy, RemoteError
+from dotenv import load_dotenv, find_dotenv
+
+load_dotenv(find_dotenv(usecwd=True))
+
+def env_int(name, default):
+    """Reads an integer setting from the environment, falling back to a default."""
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+def env_float(name, default):
+    """Reads a float setting from the environment, falling back to a default."""
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+# Seconds a login session stays valid without being used, and at most after login.
+SESSION_IDLE_TIMEOUT = env_float('SESSION_IDLE_TIMEOUT', 1800)
+SESSION_MAX_LIFETIME = env_float('SESSION_MAX_LIFETIME', 8 * 3600)
+# Maximum concurrent login sessions (least recently used are dropped).
+SESSION_MAX_ENTRIES = env_int('SESSION_MAX_ENTRIES', 1024)
+# Cache invalidations kept for workers to catch up on; one further behind clears its whole cache.
+INVALIDATION_LOG_SIZE = env_int('INVALIDATION_LOG_SIZE', 1024)
+# Seconds between the metrics pushes of each worker; gauges of a worker silent for three pushes are dropped.
+METRICS_PUSH_INTERVAL = env_float('METRICS_PUSH_INTERVAL', 5)
+
+class SessionStore:
+    """Thread-safe map from opaque session tokens to credential dicts.
+
+    Beyond max_entries the least recently used sessions are dropped.
+    Expired sessions are removed when looked up, and swept on login.
+    """
+
+    def __init__(self, max_entries, idle_timeout, max_lifetime):
+        self.max_entries = max_entries
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self._lock = threading.Lock()
+        # token -> [credentials, created, last_used]
+        self._sessions = OrderedDict()
+        self._last_sweep = time.monotonic()
+        self.created = 0
+        self.resolved = 0
+        self.rejected = 0
+        self.expired = 0
+        self.evicted = 0
+        self.revoked = 0
+
+    def _expired(self, entry, now):
+        return now - entry[2] > self.idle_timeout or now - entry[1] > self.max_lifetime
+
+    def _sweep(self, now):
+        """Drops every expired session. Caller holds the lock."""
+        doomed = [token for token, entry in self._sessions.items() if self._expired(entry, now)]
+        for token in doomed:
+            del self._sessions[token]
+        self.expired += len(doomed)
+        self._last_sweep = now
+
+    def create(self, credentials):
+        """Starts a session for already verified credentials and returns its token."""
+        now = time.monotonic()
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            if now - self._last_sweep > self.idle_timeout:
+                self._sweep(now)
+            self._sessions[token] = [dict(credentials), now, now]
+            self.created += 1
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+        return token
+
+    def get(self, token):
+        """Returns a session's credentials and extends its idle timeout, or None when unknown or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is not None and self._expired(entry, now):
+                del self._sessions[token]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.rejected += 1
+                return None
+            entry[2] = now
+            self._sessions.move_to_end(token)
+            self.resolved += 1
+            return entry[0]
+
+    def revoke(self, token):
+        """Ends a session; returns whether it existed."""
+        with self._lock:
+            if self._sessions.pop(token, None) is None:
+                return False
+            self.revoked += 1
+            return True
+
+    def stats(self):
+        """Returns a snapshot of the session counters."""
+        with self._lock:
+            return {
+                "active": len(self._sessions),
+                "max_entries": self.max_entries,
+                "created": self.created,
+                "resolved": self.resolved,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "revoked": self.revoked,
+            }
+
+# --- Cache Invalidation Log ---
+
+class SharedCounter:
+    """A 64-bit counter in a small file that every process maps into memory.
+
+    Reading it makes no system call, so workers can check it before each
+    cache lookup. Only the store process writes it.
+    """
+
+    def __init__(self, path):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < 8:
+                os.ftruncate(fd, 8)
+            self._map = mmap.mmap(fd, 8)
+        finally:
+            os.close(fd)
+
+    def value(self):
+        return struct.unpack_from('<Q', self._map)[0]
+
+    def set(self, value):
+        struct.pack_into('<Q', self._map, 0, value)
+
+def invalidation_counter_path(address):
+    """The counter file of the invalidation log served at a store address."""
+    return os.path.join(os.path.dirname(address), 'invalidations')
+
+class InvalidationLog:
+    """Numbered log of the response cache entries the workers dropped.
+
+    Entries are ('key', cache_key) or ('prefix', key_prefix) tuples. Each
+    publish() moves the shared counter to the last sequence number, so a
+    worker whose own number differs knows it is behind and calls since().
+    Only the last max_entries are kept; a worker further behind than that,
+    or one last in step with an earlier store process (another epoch), is
+    told to clear its whole cache instead.
+    """
+
+    def __init__(self, counter, max_entries):
+        self.counter = counter
+        self.epoch = secrets.token_hex(8)
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=max_entries)
+        # Carries on from the counter of an earlier store process, one past it so every worker resyncs.
+        self.sequence = counter.value() + 1
+        counter.set(self.sequence)
+
+    def publish(self, entries):
+        """Appends the entries; returns (epoch, sequence) of the last one."""
+        with self._lock:
+            for entry in entries:
+                self.sequence += 1
+                self._entries.append((self.sequence, tuple(entry)))
+            self.counter.set(self.sequence)
+            return self.epoch, self.sequence
+
+    def since(self, epoch, sequence):
+        """Returns (epoch, sequence, entries) for a worker in step up to the given point.
+
+        entries is None when the log no longer covers that point.
+        """
+        with self._lock:
+            oldest = self._entries[0][0] if self._entries else self.sequence + 1
+            if epoch != self.epoch or sequence + 1 < oldest:
+                return self.epoch, self.sequence, None
+            return self.epoch, self.sequence, [entry for number, entry in self._entries if number > sequence]
+
+# --- Shared Metrics ---
+
+class MetricsBoard:
+    """Totals of the metrics that every worker process pushes.
+
+    Counters and histograms are pushed as what they gained since the
+    worker's last push, so the totals keep counting what a worker recorded
+    after it exits. Gauges are pushed as they stand and summed over the
+    workers heard from within gauge_timeout seconds, so the requests an
+    exited worker had in flight do not stay up forever.
+    """
+
+    def __init__(self, gauge_timeout):
+        self.gauge_timeout = gauge_timeout
+        self._lock = threading.Lock()
+        self._values = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def push(self, worker, values, histograms, gauges):
+        """Adds a worker's increments and replaces its gauges; returns totals()."""
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+            for key, counts in histograms.items():
+                merged = self._histograms.get(key)
+                if merged is None:
+                    self._histograms[key] = list(counts)
+                else:
+                    for index, count in enumerate(counts):
+                        merged[index] += count
+            self._gauges[worker] = (time.monotonic(), gauges)
+        return self.totals()
+
+    def totals(self):
+        """Returns (workers, values, histograms) summed over every worker, with the gauges of the live ones."""
+        now = time.monotonic()
+        with self._lock:
+            values = dict(self._values)
+            histograms = {key: list(counts) for key, counts in self._histograms.items()}
+            for worker, (pushed, gauges) in list(self._gauges.items()):
+                if now - pushed > self.gauge_timeout:
+                    del self._gauges[worker]
+                    continue
+                for key, value in gauges.items():
+                    values[key] = values.get(key, 0) + value
+            return len(self._gauges), values, histograms
+
+# --- Shared Store Process ---
+
+class SessionStoreManager(BaseManager):
+    """Serves one SessionStore to every worker process of a server."""
+
+shared_store = None
+invalidation_log = None
+metrics_board = None
+
+def get_shared_store():
+    """Returns the store served by this (store) process, creating it on first use."""
+    global shared_store
+    if shared_store is None:
+        shared_store = SessionStore(SESSION_MAX_ENTRIES, SESSION_IDLE_TIMEOUT, SESSION_MAX_LIFETIME)
+    return shared_store
+
+def get_invalidation_log():
+    """Returns the cache invalidation log served by this (store) process."""
+    return invalidation_log
+
+def get_metrics_board():
+    """Returns the metrics totals served by this (store) process, creating them on first use."""
+    global metrics_board
+    if metrics_board is None:
+        metrics_board = MetricsBoard(3 * METRICS_PUSH_INTERVAL)
+    return metrics_board
+
+SessionStoreManager.register('store', callable=get_shared_store)
+SessionStoreManager.register('invalidations', callable=get_invalidation_log)
+SessionStoreManager.register('metrics', callable=get_metrics_board)
+
+def serve(address, authkey):
+    """Runs the shared store on a unix socket until it is terminated or its parent exits."""
+    global invalidation_log
+    invalidation_log = InvalidationLog(SharedCounter(invalidation_counter_path(address)), INVALIDATION_LOG_SIZE)
+    server = SessionStoreManager(address=address, authkey=authkey).get_server()
+    parent = os.getppid()
+
+    def watch_parent():
+        while os.getppid() == parent:
+            time.sleep(1)
+        # Nobody is left to remove the directory.
+        shutil.rmtree(os.path.dirname(address), ignore_errors=True)
+        os._exit(0)
+
+    # The directory belongs to the server (see SessionStoreProcess); workers keep its counter mapped.
+    signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+    threading.Thread(target=watch_parent, name='session-store-parent', daemon=True).start()
+    server.serve_forever()
+
+class SessionStoreProcess:
+    """The shared store process of a server, restarted whenever it exits on its own.
+
+    Sessions do not survive a restart, so their users have to log in
+    again, but workers reconnect to the new process at the same address.
+    The directory of the socket, which also holds the invalidation counter
+    every worker maps, outlives the store processes and is removed by
+    terminate().
+    """
+
+    def __init__(self):
+        self.authkey = secrets.token_bytes(32)
+        self.address = os.path.join(tempfile.mkdtemp(prefix='asp-ui-sessions-'), 'store.sock')
+        self._stopping = threading.Event()
+        self.process = self._spawn()
+        threading.Thread(target=self._supervise, name='session-store-supervisor', daemon=True).start()
+
+    def _spawn(self):
+        # A store that was killed leaves its socket behind; one that shut down removed the directory.
+        os.makedirs(os.path.dirname(self.address), mode=0o700, exist_ok=True)
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        # Its own session keeps Ctrl-C in the terminal from reaching the store.
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), self.address], start_new_session=True,
+                                   env={**os.environ, 'SESSION_STORE_AUTHKEY': self.authkey.hex()})
+        deadline = time.monotonic() + 10
+        while not os.path.exists(self.address):
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("The session store process did not start.")
+            time.sleep(0.05)
+        return process
+
+    def _supervise(self):
+        while True:
+            self.process.wait()
+            if self._stopping.is_set():
+                return
+            print("The session store process exited; restarting it.", file=sys.stderr)
+            # Keeps a store that fails right away from being restarted in a tight loop.
+            time.sleep(1)
+            try:
+                self.process = self._spawn()
+            except (OSError, RuntimeError) as error:
+                print(f"Could not restart the session store process: {error}", file=sys.stderr)
+
+    def terminate(self):
+        self._stopping.set()
+        self.process.terminate()
+        try:
+            self.process.wait(5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        shutil.rmtree(os.path.dirname(self.address), ignore_errors=True)
+
+def start_session_store():
+    """Starts the shared store process and tells worker processes started later how to reach it.
+
+    The socket address and key are passed on through the environment.
+    Returns the SessionStoreProcess, which exits with this process.
+    """
+    store = SessionStoreProcess()
+    os.environ['SESSION_STORE_ADDRESS'] = store.address
+    os.environ['SESSION_STORE_AUTHKEY'] = store.authkey.hex()
+    return store
+
+class SessionStoreUnavailable(RuntimeError):
+    """Raised when the shared store process cannot be reached."""
+
+class SharedStoreClient:
+    """Calls the methods of an object served by the shared store process.
+
+    When the connection fails (the store was restarted, or a socket broke)
+    the call is retried once on a new connection, and then fails with
+    SessionStoreUnavailable.
+    """
+
+    def __init__(self, typeid):
+        self.typeid = typeid
+        self.address = os.environ['SESSION_STORE_ADDRESS']
+        self._lock = threading.Lock()
+        self._proxy = None
+
+    def _connect(self):
+        return getattr(connect_manager(), self.typeid)()
+
+    def _reconnect(self, stale):
+        with self._lock:
+            # Threads that saw the same connection fail reconnect only once.
+            if self._proxy is stale:
+                # Proxies share one connection per thread and address, which would stay
+                # broken; dropping them makes every thread open a fresh one.
+                BaseProxy._address_to_local.pop(self.address, None)
+                self._proxy = self._connect()
+            return self._proxy
+
+    def _call(self, name, *args, **kwargs):
+        proxy = self._proxy
+        try:
+            if proxy is None:
+                proxy = self._reconnect(None)
+            return getattr(proxy, name)(*args, **kwargs)
+        except (OSError, EOFError, RemoteError):
+            # RemoteError here means a restarted store does not know the proxy.
+            pass
+        try:
+            return getattr(self._reconnect(proxy), name)(*args, **kwargs)
+        except (OSError, EOFError, RemoteError) as error:
+            raise SessionStoreUnavailable(f"The session store process cannot be reached ({error!r}).") from error
+
+    def __getattr__(self, name):
+        return functools.partial(self._call, name)
+
+# --- Elected Worker Services ---
+
+class ElectedServiceManager(BaseManager):
+    """Serves the objects of an elected worker to the other workers."""
+
+class ElectedService(SharedStoreClient):
+    """Calls the methods of an object that one elected worker serves to the others.
+
+    The first worker to call it takes a lock next to the store's socket,
+    creates the object with create() and serves it on a socket of its own;
+    the others call it there. When that worker exits its lock is released,
+    and the next worker to make a call takes over with a new object, so
+    whatever the old one held is lost. Unlike the store process, the
+    elected worker has the whole app loaded.
+    """
+
+    # Seconds a worker waits for a newly elected one to start serving.
+    CONNECT_TIMEOUT = 5
+
+    def __init__(self, typeid, create):
+        super().__init__(typeid)
+        directory = os.path.dirname(self.address)
+        self.address = os.path.join(directory, f'{typeid}.sock')
+        self.lock_path = os.path.join(directory, f'{typeid}.lock')
+        self.create = create
+        self.elected = None
+        self.server = None
+        # A class of its own keeps the registration from reaching other services.
+        self.manager = type('ElectedServiceManager', (ElectedServiceManager,), {})
+        self.manager.register(typeid, callable=lambda: self.elected)
+
+    def _elect(self):
+        """Takes the lock and starts serving a new object; returns whether this worker was elected."""
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        # The lock is held, through fd, until this process exits.
+        self.elected = self.create()
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        self.server = self.manager(address=self.address, authkey=bytes.fromhex(os.environ['SESSION_STORE_AUTHKEY'])).get_server()
+        threading.Thread(target=self.server.serve_forever, name=f'elected-{self.typeid}', daemon=True).start()
+        return True
+
+    def _connect(self):
+        if self.elected is not None or self._elect():
+            return self.elected
+        deadline = time.monotonic() + self.CONNECT_TIMEOUT
+        while True:
+            manager = self.manager(address=self.address, authkey=bytes.fromhex(os.environ['SESSION_STORE_AUTHKEY']))
+            try:
+                manager.connect()
+                return getattr(manager, self.typeid)()
+            except OSError:
+                # The elected worker exited, or has not started serving yet.
+                if self._elect():
+                    return self.elected
+                if time.monotonic() > deadline:
+                    raise
+            time.sleep(0.05)
+
+def connect_manager():
+    """Returns a manager connected to the store process named by SESSION_STORE_ADDRESS."""
+    manager = SessionStoreManager(address=os.environ['SESSION_STORE_ADDRESS'],
+                                  authkey=bytes.fromhex(os.environ['SESSION_STORE_AUTHKEY']))
+    manager.connect()
+    return manager
+
+def connect_session_store():
+    """Returns the shared store named by SESSION_STORE_ADDRESS, or an in-process store when there is none."""
+    if not os.getenv('SESSION_STORE_ADDRESS'):
+        return SessionStore(SESSION_MAX_ENTRIES, SESSION_IDLE_TIMEOUT, SESSION_MAX_LIFETIME)
+    return SharedStoreClient('store')
+
+def connect_invalidation_log():
+    """Returns (log, counter) of the shared store named by SESSION_STORE_ADDRESS, or None when there is none."""
+    address = os.getenv('SESSION_STORE_ADDRESS')
+    if not address:
+        return None
+    return SharedStoreClient('invalidations'), SharedCounter(invalidation_counter_path(address))
+
+def connect_metrics_board():
+    """Returns the metrics totals of the shared store named by SESSION_STORE_ADDRESS, or None when there is none."""
+    if not os.getenv('SESSION_STORE_ADDRESS'):
+        return None
+    return SharedStoreClient('metrics')
+
+def connect_stats_samplers(create_local):
+    """Returns the stats samplers of the elected worker, or create_local() when there is no shared store."""
+    if not os.getenv('SESSION_STORE_ADDRESS'):
+        return create_local()
+    return ElectedService('stats_samplers', create_local)
+
+def connect_processor_pollers(create_local):
+    """Returns the processor pollers of the elected worker, or create_local() when there is no shared store."""
+    if not os.getenv('SESSION_STORE_ADDRESS'):
+        return create_local()
+    return ElectedService('processor_pollers', create_local)
+
+if __name__ == '__main__':
+    serve(sys.argv[1], bytes.fromhex(os.environ['SESSION_STORE_AUTHKEY']))
@@ -0,0 +1,136 @@
+"""Shared setup of the tests: app settings, the bench Atlas mock, the Flask test client and gunicorn.
+
+Import this module before web_api_client, which reads its settings from the
+environment when it is imported.
+"""
+
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import time
+import unittest
+import warnings
+
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_ROOT, os.path.join(REPO_ROOT, 'bench')]
+
+# Settings the app is imported with. Like bench/run_bench.py, the upstream
+# rate limiter is off so only the tests that want it pay for it.
+APP_ENV = {
+    'ATLAS_API_SCHEME': 'http',
+    'TLS_CERT_PATH': '',
+    'TLS_KEY_PATH': '',
+    'ATLAS_RATE_LIMIT_PER_SECOND': '0',
+    'ATLAS_RETRY_BASE_DELAY': '0.01',
+}
+os.environ.update(APP_ENV)
+os.environ.pop('SESSION_STORE_ADDRESS', None)
+
+from mock_atlas import MockAtlasConfig, start_mock_atlas  # noqa: E402
+import web_api_client  # noqa: E402
+
+INSTANCE = 'bench-spi-0'
+
+
+class AppTestCase(unittest.TestCase):
+    """Runs each test against a fresh mock Atlas server and the Flask test client.
+
+    Every mock listens on a new port, and the app keys its caches, pools and
+    buckets by atlas_host, so tests do not see each other's state. Subclasses
+    set mock_config to MockAtlasConfig keyword arguments.
+    """
+
+    mock_config = {}
+
+    def setUp(self):
+        self.mock = start_mock_atlas(MockAtlasConfig(**self.mock_config))
+        self.addCleanup(self.mock.server_close)
+        self.addCleanup(self.mock.shutdown)
+        config = self.mock.state.config
+        self.credentials = {
+            'public_key': config.public_key,
+            'private_key': config.private_key,
+            'project_id': config.project_id,
+            'atlas_host': f"127.0.0.1:{self.mock.server_address[1]}",
+        }
+        self.client = web_api_client.app.test_client()
+
+    @property
+    def counters(self):
+        """A copy of the mock's request counters."""
+        with self.mock.state.lock:
+            return dict(self.mock.state.counters)
+
+    def post(self, path, headers=None, **fields):
+        """POSTs the test credentials plus fields to a route and returns the response."""
+        return self.client.post(path, json={**self.credentials, **fields}, headers=headers)
+
+    def processors(self, instance=INSTANCE):
+        """The mock's processors of an instance, by name."""
+        with self.mock.state.lock:
+            return dict(self.mock.state.instances[instance]['processors'])
+
+
+class GunicornServer:
+    """The app under gunicorn.conf.py in a subprocess, for behavior that spans worker processes."""
+
+    def __init__(self, workers, **env):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        env = {**os.environ, **APP_ENV, 'GUNICORN_BIND': f"127.0.0.1:{port}", 'GUNICORN_WORKERS': str(workers),
+               'GUNICORN_ACCESS_LOG': os.devnull, 'GUNICORN_LOG_LEVEL': 'warning', 'GUNICORN_GRACEFUL_TIMEOUT': '5',
+               **env}
+        self.process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'web_api_client:app'],
+                                        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                # Connections wait in the listen backlog until a worker has booted.
+                requests.get(f"{self.url}/api/cache_stats", timeout=5)
+                break
+            except requests.RequestException:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("gunicorn did not start.")
+                time.sleep(0.1)
+
+    def connection(self):
+        """A new keep-alive connection; the worker that accepts it answers all its requests."""
+        session = requests.Session()
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        return session
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+def requires_gunicorn(test):
+    """Skips a test when gunicorn is not installed."""
+    return unittest.skipUnless(importlib.util.find_spec('gunicorn'), "gunicorn is not installed")(test)
+
+
+def requires_asgi(test):
+    """Skips a test when the packages asgi.py runs on are not installed."""
+    installed = all(importlib.util.find_spec(name) for name in ('starlette', 'httpx', 'a2wsgi'))
+    return unittest.skipUnless(installed, "starlette, httpx or a2wsgi is not installed")(test)
+
+
+def asgi_test_client():
+    """A Starlette TestClient for asgi.app; enter it to run the app's lifespan."""
+    with warnings.catch_warnings():
+        # Newer Starlette releases would rather run the test client on httpx2.
+        warnings.filterwarnings('ignore', message='Using `httpx`')
+        from starlette.testclient import TestClient
+    import asgi
+    return TestClient(asgi.app)
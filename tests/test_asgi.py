@@ -0,0 +1,122 @@
+"""The async server of asgi.py: the same answers as the Flask app, and passthrough bodies streamed from Atlas."""
+
+import sys
+import unittest
+from unittest import mock
+
+from support import AppTestCase, INSTANCE, asgi_test_client, requires_asgi
+
+# Rejected bodies, one per route and check.
+REJECTED = [
+    ('/api/fetch_data', {}),
+    ('/api/manage_processor', {'instance_name': INSTANCE, 'processor_name': 'proc-00000'}),
+    ('/api/manage_processor', {'instance_name': INSTANCE, 'processor_name': 'proc-00000', 'action': 'pause'}),
+    ('/api/bulk_manage_processors', {'instance_name': INSTANCE, 'action': 'stop'}),
+    ('/api/bulk_manage_processors', {'instance_name': INSTANCE, 'action': 'stop', 'processor_names': 'proc-00000'}),
+    ('/api/bulk_manage_processors', {'instance_name': INSTANCE, 'action': 'stop', 'filter': {'name_regex': '('}}),
+    ('/api/create_spi', {'spi_body': ['name']}),
+    ('/api/manage_connection', {'instance_name': INSTANCE, 'connection_name': 'c', 'action': 'stop'}),
+    ('/api/get_processor_stats', {'instance_name': INSTANCE, 'processor_name': 'proc-00000', 'fields': 3}),
+    ('/api/get_connection_details', {'instance_name': INSTANCE}),
+    ('/api/list_connections', {'instance_name': INSTANCE, 'sort': 'size'}),
+    ('/api/instance_stats_summary', {'instance_name': INSTANCE, 'top_n': -1}),
+    ('/api/batch', {'operations': [{'op': 'manage_processor'}]}),
+    ('/api/stream/processors', {}),
+]
+
+
+class AsgiTestCase(AppTestCase):
+    """An AppTestCase that also serves asgi.app, through self.async_client."""
+
+    def setUp(self):
+        super().setUp()
+        self.async_client = self.enterContext(asgi_test_client())
+        self.asgi = sys.modules['asgi']
+
+    def post_async(self, path, headers=None, **fields):
+        return self.async_client.post(path, json={**self.credentials, **fields}, headers=headers)
+
+
+@requires_asgi
+class AsgiRoutesTest(AsgiTestCase):
+
+    mock_config = {'processors': 10}
+
+    def test_rejected_bodies_get_the_flask_answers(self):
+        for path, fields in REJECTED:
+            with self.subTest(path=path, **fields):
+                expected = self.post(path, **fields)
+                response = self.post_async(path, **fields)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual((response.status_code, response.json()), (expected.status_code, expected.get_json()))
+        self.assertEqual(self.counters['requests'], 0)
+
+    def test_missing_credentials_get_the_flask_answer(self):
+        response = self.async_client.post('/api/list_spis', json={'project_id': 'p'})
+        self.assertEqual((response.status_code, response.json()), (400, {"error": "Missing required fields."}))
+
+    def test_batch_operation_rejections_are_results(self):
+        response = self.post_async('/api/batch', operations=[{'op': 'fetch_data'}, {'op': 'list_spis'}])
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], [400, 200])
+        self.assertEqual(results[0]['body'], {"error": "Missing 'instance_name' for fetching processors."})
+
+    def test_batch_shares_one_budget_of_atlas_calls(self):
+        operations = [{'op': 'get_processor_stats', 'processor_name': name} for name in ('proc-00000', 'proc-00001')]
+        operations.append({'op': 'get_stats_history'})
+        with mock.patch.object(self.asgi, 'BATCH_MAX_UPSTREAM_CALLS', 1):
+            payload = self.post_async('/api/batch', instance_name=INSTANCE, max_parallel=1, operations=operations).json()
+        # The first call also verified the credentials, so the history needs no Atlas call of its own.
+        self.assertEqual([result['status'] for result in payload['results']], [200, 429, 404])
+        self.assertEqual(payload['results'][1]['body']['error'], "Too many Atlas calls for one request.")
+
+    def test_summary_has_the_flask_fields(self):
+        expected = self.post('/api/instance_stats_summary', instance_name=INSTANCE, top_n=3).get_json()
+        payload = self.post_async('/api/instance_stats_summary', instance_name=INSTANCE, top_n=3).json()
+        # The second summary also ranks by rate, and the mock's counters grow in between,
+        # so only the fields and the counts are compared.
+        self.assertLessEqual(set(expected), set(payload))
+        self.assertEqual([payload[key] for key in ('processorCount', 'sampled', 'states')],
+                         [expected[key] for key in ('processorCount', 'sampled', 'states')])
+
+    def test_mutation_body_is_streamed_and_the_connection_released(self):
+        response = self.post_async('/api/create_processor', instance_name=INSTANCE, processor_body={'name': 'new'})
+        self.assertEqual((response.status_code, response.json()['name']), (200, 'new'))
+        self.assertIn('new', self.processors())
+        client = self.asgi.async_atlas_client
+        self.assertEqual((client.in_flight, sum(client._busy)), (0, 0))
+
+    def test_action_without_content_is_completed(self):
+        response = self.post_async('/api/manage_processor', instance_name=INSTANCE, processor_name='proc-00000', action='stop')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.processors()['proc-00000']['state'], 'STOPPED')
+
+    def test_atlas_errors_are_passed_on(self):
+        response = self.post_async('/api/manage_processor', instance_name=INSTANCE, processor_name='missing', action='stop')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['details']['reason'], 'Not Found')
+        self.assertEqual(sum(self.asgi.async_atlas_client._busy), 0)
+
+
+@requires_asgi
+class AsgiCompressedPassthroughTest(AsgiTestCase):
+
+    mock_config = {'processors': 2, 'gzip': True}
+
+    def create(self, name, accept_encoding):
+        return self.async_client.post('/api/create_processor', headers={'Accept-Encoding': accept_encoding},
+                                      json={**self.credentials, 'instance_name': INSTANCE, 'processor_body': {'name': name}})
+
+    def test_compressed_body_is_forwarded_to_clients_that_take_it(self):
+        response = self.create('zipped', 'gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.json()['name'], 'zipped')
+
+    def test_compressed_body_is_decoded_for_other_clients(self):
+        response = self.create('plain', 'identity')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.json()['name'], 'plain')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""/api/batch: operations answered like their routes, in request order, within one budget of Atlas calls."""
+
+import json
+import unittest
+from unittest import mock
+
+from support import AppTestCase, INSTANCE
+import web_api_client
+
+
+class BatchTest(AppTestCase):
+
+    mock_config = {'processors': 10}
+
+    def batch(self, *operations, headers=None, **fields):
+        return self.post('/api/batch', headers=headers, operations=list(operations), **fields)
+
+    def test_results_come_in_request_order(self):
+        response = self.batch({'op': 'list_spis'},
+                              {'op': 'fetch_data', 'instance_name': INSTANCE},
+                              {'op': 'get_processor_stats', 'instance_name': INSTANCE, 'processor_name': 'proc-00003'},
+                              {'op': 'get_connection_details', 'instance_name': INSTANCE, 'connection_name': 'conn-1'})
+        payload = response.get_json()
+        self.assertEqual((response.status_code, payload['succeeded'], payload['failed']), (200, 4, 0))
+        results = payload['results']
+        self.assertEqual([(result['index'], result['op']) for result in results],
+                         [(0, 'list_spis'), (1, 'fetch_data'), (2, 'get_processor_stats'), (3, 'get_connection_details')])
+        self.assertEqual([spi['name'] for spi in results[0]['body']['results']], [INSTANCE])
+        self.assertEqual(len(results[1]['body']['results']), 10)
+        self.assertEqual(results[2]['body']['name'], 'proc-00003')
+        self.assertEqual(results[3]['body'], self.post('/api/get_connection_details', instance_name=INSTANCE,
+                                                       connection_name='conn-1').get_json())
+
+    def test_operation_fields_are_applied(self):
+        results = self.batch({'op': 'get_processor_stats', 'processor_name': 'proc-00001', 'fields': 'name,state'},
+                             instance_name=INSTANCE).get_json()['results']
+        self.assertEqual(results[0]['body'], {'name': 'proc-00001', 'state': self.processors()['proc-00001']['state']})
+
+    def test_failed_operations_do_not_fail_the_batch(self):
+        payload = self.batch({'op': 'fetch_data'},
+                             {'op': 'get_processor_stats', 'instance_name': INSTANCE, 'processor_name': 'missing'},
+                             {'op': 'get_stats_history', 'instance_name': INSTANCE},
+                             {'op': 'list_spis'}).get_json()
+        self.assertEqual([result['status'] for result in payload['results']], [400, 404, 404, 200])
+        self.assertEqual(payload['results'][0]['body'], {"error": "Missing 'instance_name' for fetching processors."})
+        self.assertEqual(payload['results'][2]['body'], {"error": f"No stats sampler is running for '{INSTANCE}'."})
+        self.assertEqual((payload['succeeded'], payload['failed']), (1, 3))
+
+    def test_cached_results_carry_their_cache_headers(self):
+        operation = {'op': 'fetch_data', 'instance_name': INSTANCE}
+        first = self.batch(operation).get_json()['results'][0]
+        second = self.batch(operation).get_json()['results'][0]
+        self.assertEqual((first['headers']['X-Cache'], second['headers']['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first['body'], second['body'])
+
+    def test_invalid_batch_is_rejected(self):
+        response = self.batch({'op': 'manage_processor', 'instance_name': INSTANCE, 'processor_name': 'proc-00000'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['error'], "Invalid batch.")
+        self.assertEqual(self.counters['requests'], 0)
+
+    def test_ndjson_streams_one_line_per_operation(self):
+        response = self.batch({'op': 'list_spis'}, {'op': 'fetch_data'}, headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        records = sorted((json.loads(line) for line in response.get_data().splitlines()), key=lambda record: record['index'])
+        self.assertEqual([(record['op'], record['status']) for record in records], [('list_spis', 200), ('fetch_data', 400)])
+
+
+class BatchBudgetTest(AppTestCase):
+
+    mock_config = {'processors': 10}
+
+    def stats_operations(self, *names):
+        return [{'op': 'get_processor_stats', 'processor_name': name} for name in names]
+
+    def authenticated_requests(self):
+        counters = self.counters
+        return counters['requests'] - counters['challenges'] - counters['stale_nonces']
+
+    def test_calls_beyond_the_budget_fail_with_429(self):
+        with mock.patch.object(web_api_client, 'BATCH_MAX_UPSTREAM_CALLS', 2):
+            payload = self.post('/api/batch', instance_name=INSTANCE, max_parallel=1,
+                                operations=self.stats_operations('proc-00000', 'proc-00001', 'proc-00002')).get_json()
+        self.assertEqual([result['status'] for result in payload['results']], [200, 200, 429])
+        self.assertEqual(payload['results'][2]['body']['error'], "Too many Atlas calls for one request.")
+        self.assertEqual(self.authenticated_requests(), 2)
+
+    def test_cache_hits_are_not_charged(self):
+        self.post('/api/get_processor_stats', instance_name=INSTANCE, processor_name='proc-00000')
+        with mock.patch.object(web_api_client, 'BATCH_MAX_UPSTREAM_CALLS', 1):
+            payload = self.post('/api/batch', instance_name=INSTANCE, max_parallel=1,
+                                operations=self.stats_operations('proc-00000', 'proc-00001', 'proc-00002')).get_json()
+        self.assertEqual([result['status'] for result in payload['results']], [200, 200, 429])
+        self.assertEqual(payload['results'][0]['headers']['X-Cache'], 'HIT')
+
+    def test_each_batch_gets_its_own_budget(self):
+        with mock.patch.object(web_api_client, 'BATCH_MAX_UPSTREAM_CALLS', 1):
+            for name in ('proc-00000', 'proc-00001'):
+                payload = self.post('/api/batch', instance_name=INSTANCE, operations=self.stats_operations(name)).get_json()
+                self.assertEqual(payload['results'][0]['status'], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""The benchmark harness: the Atlas mock's knobs, result comparison and a short run against gunicorn."""
+
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stdout
+
+import requests
+from requests.auth import HTTPDigestAuth
+
+from support import REPO_ROOT, requires_gunicorn
+from mock_atlas import API_PREFIX, MockAtlasConfig, start_mock_atlas
+import run_bench
+
+
+class MockAtlasTest(unittest.TestCase):
+
+    def start(self, **config):
+        mock = start_mock_atlas(MockAtlasConfig(processors=5, **config))
+        self.addCleanup(mock.server_close)
+        self.addCleanup(mock.shutdown)
+        self.counters = mock.state.counters
+        url = f"http://127.0.0.1:{mock.server_address[1]}{API_PREFIX}{mock.state.config.project_id}/streams"
+        return url + '/bench-spi-0/processors', HTTPDigestAuth(mock.state.config.public_key, mock.state.config.private_key)
+
+    def test_unsigned_requests_are_challenged(self):
+        url, _ = self.start()
+        response = requests.get(url)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('qop="auth"', response.headers['WWW-Authenticate'])
+        self.assertEqual(self.counters['challenges'], 1)
+
+    def test_signed_requests_get_pages(self):
+        url, auth = self.start()
+        with requests.Session() as session:
+            session.auth = auth
+            page = session.get(url, params={'itemsPerPage': 2, 'pageNum': 3}).json()
+        self.assertEqual(([entry['name'] for entry in page['results']], page['totalCount']), (['proc-00004'], 5))
+
+    def test_error_pages_fail(self):
+        url, auth = self.start(error_pages=(2,))
+        with requests.Session() as session:
+            session.auth = auth
+            self.assertEqual(session.get(url, params={'itemsPerPage': 2}).status_code, 200)
+            self.assertEqual(session.get(url, params={'itemsPerPage': 2, 'pageNum': 2}).status_code, 500)
+
+    def test_expired_nonces_are_challenged_as_stale(self):
+        url, auth = self.start(nonce_ttl=0.05)
+        with requests.Session() as session:
+            session.auth = auth
+            session.get(url)
+            time.sleep(0.1)
+            # requests answers a stale challenge by signing again with the new nonce.
+            self.assertEqual(session.get(url).status_code, 200)
+        self.assertEqual(self.counters['stale_nonces'], 1)
+
+
+class ResultsTest(unittest.TestCase):
+
+    def test_percentile_uses_the_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual([run_bench.percentile(values, p) for p in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(run_bench.percentile([7], 99), 7)
+        self.assertIsNone(run_bench.percentile([], 50))
+
+    def test_compare_flags_throughput_drops_and_slower_p95(self):
+        baseline = {'a@c1': {'rps': 100, 'p95_ms': 10}, 'b@c1': {'rps': 100, 'p95_ms': 10},
+                    'c@c1': {'rps': 100, 'p95_ms': 10}}
+        results = {'a@c1': {'rps': 95, 'p95_ms': 10.5}, 'b@c1': {'rps': 80, 'p95_ms': 10},
+                   'c@c1': {'rps': 100, 'p95_ms': 12}, 'new@c1': {'rps': 1, 'p95_ms': 1}}
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(run_bench.compare(results, baseline, threshold=0.10), ['b@c1', 'c@c1'])
+
+
+@requires_gunicorn
+class BenchRunTest(unittest.TestCase):
+
+    def test_short_run_saves_results_and_reports_a_regression(self):
+        directory = tempfile.mkdtemp(prefix='bench-test-')
+        self.addCleanup(shutil.rmtree, directory)
+        output, baseline = os.path.join(directory, 'run.json'), os.path.join(directory, 'baseline.json')
+        with open(baseline, 'w') as f:
+            json.dump({'results': {'list_spis@c2': {'rps': 10 ** 9, 'p95_ms': 10 ** -6}}}, f)
+        run = subprocess.run([sys.executable, 'bench/run_bench.py', '--scenarios', 'list_spis,metrics', '--concurrency', '2',
+                              '--requests', '10', '--warmup', '1', '--processors', '20', '--output', output,
+                              '--baseline', baseline], cwd=REPO_ROOT, capture_output=True, text=True, timeout=120)
+        self.assertEqual(run.returncode, 1, run.stdout + run.stderr)
+        self.assertIn('list_spis@c2', run.stdout.split('Comparison')[1])
+        with open(output) as f:
+            results = json.load(f)['results']
+        self.assertEqual(set(results), {'list_spis@c2', 'metrics@c2'})
+        self.assertEqual([(result['requests'], result['errors']) for result in results.values()], [(10, 0), (10, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Bulk processor actions with bounded concurrency."""
+
+import json
+import time
+import unittest
+
+from support import AppTestCase, INSTANCE
+
+
+class BulkActionsTest(AppTestCase):
+
+    mock_config = {'processors': 10}
+
+    def bulk(self, headers=None, **fields):
+        return self.post('/api/bulk_manage_processors', headers=headers, instance_name=INSTANCE, **fields)
+
+    def states(self):
+        return {name: processor['state'] for name, processor in self.processors().items()}
+
+    def test_named_processors_are_started(self):
+        names = ['proc-00002', 'proc-00003', 'proc-00004']
+        payload = self.bulk(action='start', processor_names=names).get_json()
+        self.assertEqual((payload['total'], payload['succeeded'], payload['failed']), (3, 3, 0))
+        self.assertEqual(sorted(result['processor_name'] for result in payload['results']), names)
+        self.assertEqual({self.states()[name] for name in names}, {'STARTED'})
+
+    def test_filter_selects_from_the_listing(self):
+        payload = self.bulk(action='start', filter={'state': 'STOPPED'}).get_json()
+        self.assertEqual(sorted(result['processor_name'] for result in payload['results']), ['proc-00002', 'proc-00007'])
+        self.assertNotIn('STOPPED', self.states().values())
+
+    def test_unnamed_listing_entries_are_skipped(self):
+        with self.mock.state.lock:
+            processors = self.mock.state.instances[INSTANCE]['processors']
+            unnamed = dict(processors['proc-00002'])
+            del unnamed['name']
+            processors['unnamed'] = unnamed
+        response = self.bulk(action='start', filter={'state': 'STOPPED'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(result['processor_name'] for result in response.get_json()['results']),
+                         ['proc-00002', 'proc-00007'])
+
+    def test_failures_are_reported_per_processor(self):
+        payload = self.bulk(action='stop', processor_names=['proc-00000', 'missing']).get_json()
+        self.assertEqual((payload['succeeded'], payload['failed']), (1, 1))
+        failed = next(result for result in payload['results'] if not result['ok'])
+        self.assertEqual((failed['processor_name'], failed['status_code']), ('missing', 404))
+
+    def test_results_stream_as_ndjson(self):
+        response = self.bulk(headers={'Accept': 'application/x-ndjson'}, action='stop',
+                             processor_names=['proc-00000', 'proc-00001'])
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(sorted(line['processor_name'] for line in lines), ['proc-00000', 'proc-00001'])
+
+    def test_parallelism_is_bounded(self):
+        self.bulk(action='stop', processor_names=['proc-00000'])
+        self.mock.state.config.latency = 0.1
+        started = time.monotonic()
+        self.bulk(action='stop', processor_names=[f"proc-{i:05d}" for i in range(8)], max_parallel=2)
+        # Eight 0.1s calls, two at a time.
+        self.assertGreaterEqual(time.monotonic() - started, 0.4)
+
+    def test_invalid_requests_are_rejected(self):
+        self.assertEqual(self.bulk(action='restart', processor_names=['proc-00000']).status_code, 400)
+        self.assertEqual(self.bulk(action='start').status_code, 400)
+        self.assertEqual(self.bulk(action='start', processor_names='proc-00000').status_code, 400)
+        self.assertEqual(self.bulk(action='start', filter={'name_regex': '('}).status_code, 400)
+        self.assertEqual(self.counters['requests'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""Coalescing of identical concurrent Atlas GETs into one call."""
+
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from support import AppTestCase, INSTANCE, web_api_client
+
+SingleFlight = web_api_client.SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def run_shared(self, flight, func, callers=4):
+        """Runs func through flight from several threads while the first call is held in flight."""
+        release = threading.Event()
+
+        def held():
+            release.wait(5)
+            return func()
+
+        def call(_):
+            try:
+                return flight.do('key', held)
+            except Exception as error:
+                return error
+
+        with ThreadPoolExecutor(callers) as executor:
+            futures = [executor.submit(call, index) for index in range(callers)]
+            while flight.stats()['coalesced'] < callers - 1:
+                threading.Event().wait(0.01)
+            release.set()
+            return [future.result() for future in futures]
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        results = self.run_shared(flight, lambda: {'value': 1})
+        self.assertEqual(results, [{'value': 1}] * 4)
+        self.assertEqual(flight.stats(), {'calls': 1, 'coalesced': 3, 'in_flight': 0})
+
+    def test_each_waiter_gets_its_own_exception(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError('upstream down')
+
+        errors = self.run_shared(flight, fail)
+        self.assertTrue(all(isinstance(error, ValueError) and error.args == ('upstream down',) for error in errors))
+        self.assertEqual(len({id(error) for error in errors}), 4)
+        # The waiters' copies point at the exception the call raised.
+        original = next(error for error in errors if error.__cause__ is None)
+        self.assertTrue(all(error.__cause__ is original for error in errors if error is not original))
+
+    def test_a_finished_call_is_not_reused(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do('key', lambda: 1), 1)
+        self.assertEqual(flight.do('key', lambda: 2), 2)
+        self.assertEqual(flight.stats()['calls'], 2)
+
+
+class CoalescedRoutesTest(AppTestCase):
+
+    mock_config = {'processors': 10, 'latency': 0.2}
+
+    def concurrently(self, processor_name, callers=5):
+        def stats(_):
+            return self.post('/api/get_processor_stats', instance_name=INSTANCE, processor_name=processor_name)
+
+        # Gets the digest challenge out of the way, so only the shared call is counted.
+        self.post('/api/list_spis')
+        before = self.counters['requests']
+        with ThreadPoolExecutor(callers) as executor:
+            responses = list(executor.map(stats, range(callers)))
+        return responses, self.counters['requests'] - before
+
+    def test_identical_gets_make_one_call(self):
+        responses, requests = self.concurrently('proc-00000')
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual(len({response.data for response in responses}), 1)
+        self.assertEqual(requests, 1)
+
+    def test_a_shared_failure_reaches_every_caller(self):
+        responses, requests = self.concurrently('missing')
+        self.assertEqual([response.status_code for response in responses], [404] * 5)
+        self.assertEqual(requests, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
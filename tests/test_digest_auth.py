@@ -0,0 +1,44 @@
+"""Digest challenge caching: Atlas calls are signed up front with a shared nonce."""
+
+import time
+import unittest
+
+from support import AppTestCase, INSTANCE
+from web_api_client import run_concurrently
+
+
+class DigestAuthCacheTest(AppTestCase):
+
+    def stats(self, name):
+        return self.post('/api/get_processor_stats', instance_name=INSTANCE, processor_name=name)
+
+    def test_sequential_calls_share_one_nonce(self):
+        for i in range(5):
+            self.assertEqual(self.stats(f"proc-{i:05d}").status_code, 200)
+        # One 401 challenge, then every call is signed up front.
+        self.assertEqual(self.counters['challenges'], 1)
+        self.assertEqual(self.counters['requests'], 6)
+
+    def test_concurrent_calls_share_the_nonce(self):
+        self.assertEqual(self.stats('proc-00000').status_code, 200)
+        statuses = run_concurrently(lambda i: self.stats(f"proc-{i:05d}").status_code, range(1, 21), 8)
+        self.assertEqual(statuses, [200] * 20)
+        self.assertEqual(self.counters['challenges'], 1)
+        self.assertEqual(self.counters['requests'], 22)
+
+    def test_stale_nonce_is_renewed(self):
+        self.mock.state.config.nonce_ttl = 0.2
+        self.assertEqual(self.stats('proc-00000').status_code, 200)
+        time.sleep(0.3)
+        self.assertEqual(self.stats('proc-00001').status_code, 200)
+        self.assertEqual(self.counters['stale_nonces'], 1)
+
+    def test_wrong_key_is_reported(self):
+        self.credentials['private_key'] = 'wrong'
+        response = self.stats('proc-00000')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('401', response.get_json()['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""The "fields" projection of processor stats and connection details: parsing, projection and rejections."""
+
+import unittest
+
+from support import AppTestCase, INSTANCE, web_api_client
+
+compile_projection, parse_fields = web_api_client.compile_projection, web_api_client.parse_fields
+
+DOCUMENT = {
+    "name": "p1",
+    "state": "STARTED",
+    "stats": {"inputMessageCount": 10, "outputMessageCount": 9, "name": "p1"},
+    "pipeline": [{"$source": {"connectionName": "c1", "topic": "t"}}, {"$emit": {"connectionName": "c2"}}],
+}
+
+
+class ParseFieldsTest(unittest.TestCase):
+
+    def test_strings_and_lists_are_normalized(self):
+        self.assertEqual(parse_fields("stats.inputMessageCount, name,name"), ('name', 'stats.inputMessageCount'))
+        self.assertEqual(parse_fields(['-pipeline', 'name']), ('-pipeline', 'name'))
+
+    def test_malformed_values_are_rejected(self):
+        for spec in (3, None, {'name': 1}, ['name', 2]):
+            with self.subTest(spec=spec):
+                self.assertRaises(TypeError, parse_fields, spec)
+        for spec in ('', ' , ', '--name', 'stats..name', '.name', 'stats.', '-'):
+            with self.subTest(spec=spec):
+                self.assertRaises(ValueError, parse_fields, spec)
+
+
+class ProjectionTest(unittest.TestCase):
+
+    def project(self, spec):
+        return compile_projection(parse_fields(spec))(DOCUMENT)
+
+    def test_included_paths_are_kept(self):
+        self.assertEqual(self.project("name,stats.inputMessageCount"),
+                         {"name": "p1", "stats": {"inputMessageCount": 10}})
+
+    def test_lists_are_projected_per_element(self):
+        self.assertEqual(self.project("pipeline.$source.connectionName"),
+                         {"pipeline": [{"$source": {"connectionName": "c1"}}, {}]})
+
+    def test_removals_apply_after_inclusions(self):
+        self.assertEqual(self.project("-pipeline,-stats.name"),
+                         {"name": "p1", "state": "STARTED", "stats": {"inputMessageCount": 10, "outputMessageCount": 9}})
+        self.assertEqual(self.project("stats,-stats.name"), {"stats": {"inputMessageCount": 10, "outputMessageCount": 9}})
+
+    def test_a_parent_path_covers_its_children(self):
+        self.assertEqual(self.project("stats,stats.name"), {"stats": DOCUMENT['stats']})
+
+
+class FieldsRouteTest(AppTestCase):
+
+    mock_config = {'processors': 3}
+
+    def stats(self, **fields):
+        return self.post('/api/get_processor_stats', instance_name=INSTANCE, processor_name='proc-00001', **fields)
+
+    def test_stats_are_projected(self):
+        response = self.stats(fields=['name', 'stats.status'])
+        self.assertEqual((response.status_code, response.mimetype), (200, 'application/json'))
+        self.assertEqual(response.get_json(), {'name': 'proc-00001', 'stats': {'status': self.processors()['proc-00001']['state']}})
+
+    def test_connection_details_are_projected(self):
+        response = self.post('/api/get_connection_details', instance_name=INSTANCE, connection_name='conn-0',
+                             fields='-security,-authentication')
+        self.assertEqual(set(response.get_json()), {'name', 'type', 'bootstrapServers'})
+
+    def test_projections_share_the_cached_document(self):
+        self.stats(fields='name')
+        requests = self.counters['requests']
+        response = self.stats(fields='-pipeline')
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        self.assertNotIn('pipeline', response.get_json())
+        self.assertIn('stats', response.get_json())
+        self.assertEqual(self.counters['requests'], requests)
+
+    def test_invalid_fields_are_rejected_before_calling_atlas(self):
+        for spec in (3, '', '--name', 'stats..name', ['name', None]):
+            with self.subTest(fields=spec):
+                response = self.stats(fields=spec)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.get_json()['error'], "Invalid fields.")
+                self.assertTrue(response.get_json()['details'])
+        self.assertEqual(self.counters['requests'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""Delivery of the pre-rendered, pre-compressed frontend page."""
+
+import gzip
+import unittest
+
+from support import web_api_client
+
+INDEX_PAGE, brotli = web_api_client.INDEX_PAGE, web_api_client.brotli
+
+
+class IndexPageTest(unittest.TestCase):
+
+    def get(self, **headers):
+        return web_api_client.app.test_client().get('/', headers=headers)
+
+    def test_page_is_served_uncompressed_by_default(self):
+        response = self.get(**{'Accept-Encoding': 'identity'})
+        self.assertEqual(response.mimetype, 'text/html')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn(b'<html', response.data.lower())
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+
+    def test_gzip_is_used_when_accepted(self):
+        response = self.get(**{'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.data), INDEX_PAGE['identity'][0])
+
+    @unittest.skipIf(brotli is None, "brotli is not installed")
+    def test_brotli_is_preferred(self):
+        response = self.get(**{'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.data), INDEX_PAGE['identity'][0])
+
+    def test_unchanged_page_is_revalidated_with_304(self):
+        etag = self.get(**{'Accept-Encoding': 'gzip'}).headers['ETag']
+        response = self.get(**{'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def test_each_coding_has_its_own_etag(self):
+        identity = self.get(**{'Accept-Encoding': 'identity'}).headers['ETag']
+        response = self.get(**{'Accept-Encoding': 'gzip', 'If-None-Match': identity})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], identity)
+
+
+if __name__ == '__main__':
+    unittest.main()
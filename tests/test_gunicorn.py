@@ -0,0 +1,52 @@
+"""The production gunicorn configuration: one threaded worker by default."""
+
+import os
+import runpy
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from support import AppTestCase, GunicornServer, INSTANCE, REPO_ROOT, requires_gunicorn
+
+
+@requires_gunicorn
+class GunicornConfigTest(unittest.TestCase):
+
+    def load(self, **env):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('GUNICORN_WORKERS', None)
+            os.environ.pop('GUNICORN_THREADS', None)
+            os.environ.update(env)
+            return runpy.run_path(os.path.join(REPO_ROOT, 'gunicorn.conf.py'))
+
+    def test_defaults_to_one_threaded_worker(self):
+        config = self.load()
+        self.assertEqual((config['workers'], config['worker_class'], config['threads']), (1, 'gthread', 32))
+
+    def test_workers_and_threads_come_from_the_environment(self):
+        config = self.load(GUNICORN_WORKERS='3', GUNICORN_THREADS='8')
+        self.assertEqual((config['workers'], config['threads']), (3, 8))
+
+
+@requires_gunicorn
+class ThreadedWorkerTest(AppTestCase):
+
+    def test_one_worker_serves_requests_concurrently(self):
+        server = GunicornServer(workers=1)
+        self.addCleanup(server.stop)
+        self.mock.state.config.latency = 0.3
+
+        def stats(i):
+            return server.connection().post(f"{server.url}/api/get_processor_stats", json={
+                **self.credentials, 'instance_name': INSTANCE, 'processor_name': f"proc-{i:05d}"}).status_code
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(8) as executor:
+            self.assertEqual(list(executor.map(stats, range(8))), [200] * 8)
+        # Eight 0.3s Atlas calls (plus one challenge) in well under their sequential 2.4s.
+        self.assertLess(time.monotonic() - started, 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
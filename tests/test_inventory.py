@@ -0,0 +1,50 @@
+"""Project inventory: every instance with its connections and processors, fetched concurrently."""
+
+import json
+import unittest
+
+from support import AppTestCase
+
+
+class InventoryTest(AppTestCase):
+
+    mock_config = {'instances': 3, 'processors': 4, 'connections': 2}
+
+    def add_instance(self, key, spec):
+        with self.mock.state.lock:
+            self.mock.state.instances[key] = {"spec": spec, "connections": {}, "processors": {}}
+
+    def test_every_instance_is_listed_with_its_resources(self):
+        payload = self.post('/api/inventory').get_json()
+        self.assertEqual(payload['instanceCount'], 3)
+        self.assertEqual(payload['failedInstances'], [])
+        for entry in payload['instances']:
+            self.assertEqual(len(entry['processors']), 4)
+            self.assertEqual(len(entry['connections']), 2)
+            self.assertEqual(set(entry['timings_ms']), {'connections', 'processors'})
+
+    def test_failed_listing_is_reported_with_its_instance(self):
+        # Listed, but gone by the time its resources are fetched.
+        self.add_instance('bench-spi-9', {"name": "deleted-spi"})
+        payload = self.post('/api/inventory').get_json()
+        self.assertEqual(payload['failedInstances'], ['deleted-spi'])
+        failed = next(entry for entry in payload['instances'] if entry['name'] == 'deleted-spi')
+        self.assertEqual(failed['errors']['processors']['status_code'], 404)
+
+    def test_unnamed_instance_is_skipped(self):
+        self.add_instance('bench-spi-9', {"dataProcessRegion": {}})
+        response = self.post('/api/inventory')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['instanceCount'], 3)
+
+    def test_ndjson_lists_instances_then_listings_then_meta(self):
+        response = self.post('/api/inventory', headers={'Accept': 'application/x-ndjson'})
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([set(line) for line in lines[:3]], [{'name', 'instance'}] * 3)
+        self.assertEqual(len(lines), 3 + 6 + 1)
+        self.assertTrue(all('results' in line for line in lines[3:9]))
+        self.assertEqual(lines[-1]['_meta']['instanceCount'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""Filtering, sorting and paging of listings, answered from a per-listing index."""
+
+import unittest
+
+from support import AppTestCase, INSTANCE, web_api_client
+
+ListingIndex, parse_listing_filter = web_api_client.ListingIndex, web_api_client.parse_listing_filter
+
+ENTRIES = [
+    {"name": "beta", "state": "STOPPED", "type": "Kafka"},
+    {"name": "alpha-2", "state": "STARTED"},
+    {"name": "alpha-1", "state": "STARTED", "type": "Cluster"},
+    {"name": "gamma", "state": "FAILED", "type": "Kafka"},
+]
+
+
+class ListingIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ListingIndex({"results": ENTRIES})
+
+    def names(self, spec=None, sort=None, offset=0, limit=None):
+        entries, matched = self.index.query(parse_listing_filter(spec or {}), sort, offset, limit)
+        return [entry['name'] for entry in entries], matched
+
+    def test_prefix_regex_and_states_combine(self):
+        self.assertEqual(self.names({'name_prefix': 'alpha'}), (['alpha-2', 'alpha-1'], 2))
+        self.assertEqual(self.names({'name_regex': 'a$'}), (['beta', 'gamma'], 2))
+        self.assertEqual(self.names({'state': ['STOPPED', 'FAILED']}), (['beta', 'gamma'], 2))
+        self.assertEqual(self.names({'name_prefix': 'alpha', 'name_regex': '1'}), (['alpha-1'], 1))
+        self.assertEqual(self.names({'name_prefix': 'delta'}), ([], 0))
+
+    def test_sort_breaks_ties_by_name_and_puts_missing_values_last(self):
+        self.assertEqual(self.names(sort='state')[0], ['gamma', 'alpha-1', 'alpha-2', 'beta'])
+        self.assertEqual(self.names(sort='-name')[0], ['gamma', 'beta', 'alpha-2', 'alpha-1'])
+        self.assertEqual(self.names(sort='type')[0], ['alpha-1', 'beta', 'gamma', 'alpha-2'])
+        self.assertEqual(self.names(sort='-type')[0], ['beta', 'gamma', 'alpha-1', 'alpha-2'])
+
+    def test_window_applies_after_filter_and_sort(self):
+        self.assertEqual(self.names(sort='name', offset=1, limit=2), (['alpha-2', 'beta'], 4))
+        self.assertEqual(self.names({'state': 'STARTED'}, sort='-name', limit=1), (['alpha-2'], 2))
+        self.assertEqual(self.names(offset=10), ([], 4))
+
+    def test_orders_are_built_once(self):
+        self.assertIs(self.index.order('-name'), self.index.order('-name'))
+
+    def test_invalid_filters_are_rejected(self):
+        with self.assertRaises(TypeError):
+            parse_listing_filter({'name_prefix': 3})
+        with self.assertRaises(ValueError):
+            parse_listing_filter({'name_regex': '(a+)+'})
+
+
+class ListingQueryRoutesTest(AppTestCase):
+
+    mock_config = {'processors': 10}
+
+    def query(self, **fields):
+        return self.post('/api/fetch_data', instance_name=INSTANCE, **fields)
+
+    def test_filtered_view_reports_its_counts(self):
+        payload = self.query(filter={'state': 'STOPPED'}).get_json()
+        self.assertEqual([entry['name'] for entry in payload['results']], ['proc-00002', 'proc-00007'])
+        self.assertEqual((payload['matchedCount'], payload['totalCount'], payload['offset'], payload['limit']), (2, 10, 0, None))
+
+    def test_sorted_page_comes_from_the_cached_listing(self):
+        self.query()
+        before = self.counters['requests']
+        payload = self.query(sort='-name', offset=1, limit=3).get_json()
+        self.assertEqual([entry['name'] for entry in payload['results']], ['proc-00008', 'proc-00007', 'proc-00006'])
+        self.assertEqual(self.counters['requests'], before)
+
+    def test_view_diff_covers_only_the_view(self):
+        since = self.query(filter={'state': 'STOPPED'}).get_json()['version']
+        self.post('/api/manage_processor', instance_name=INSTANCE, processor_name='proc-00000', action='stop')
+        self.post('/api/manage_processor', instance_name=INSTANCE, processor_name='proc-00002', action='start')
+        diff = self.query(filter={'state': 'STOPPED'}, since=since).get_json()
+        self.assertEqual([entry['name'] for entry in diff['added']], ['proc-00000'])
+        self.assertEqual(diff['removed'], ['proc-00002'])
+        self.assertEqual(diff['matchedCount'], 2)
+
+    def test_invalid_queries_are_rejected(self):
+        for fields in ({'sort': 'size'}, {'offset': -1}, {'limit': 'all'}, {'filter': 'STOPPED'},
+                       {'filter': {'name_regex': '('}}, {'filter': {'name_regex': '(a*)*'}}):
+            with self.subTest(**fields):
+                self.assertEqual(self.query(**fields).status_code, 400)
+        self.assertEqual(self.counters['requests'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Listing version tokens and the since= diffs answered from them."""
+
+import unittest
+
+from support import AppTestCase, INSTANCE, web_api_client
+
+ListingVersions, versioned_listing = web_api_client.ListingVersions, web_api_client.versioned_listing
+
+
+def listing(*entries):
+    return {"results": [dict(entry) for entry in entries], "totalCount": len(entries)}
+
+
+A, B, C = {"name": "a", "state": "STARTED"}, {"name": "b", "state": "STARTED"}, {"name": "c", "state": "STOPPED"}
+
+
+class VersionedListingTest(unittest.TestCase):
+
+    def setUp(self):
+        # A key of its own keeps the shared listing_versions of other tests apart.
+        self.key = ('versions-test', self.id())
+
+    def test_same_content_gets_the_same_version(self):
+        first = versioned_listing(self.key, listing(A, B))['version']
+        self.assertEqual(versioned_listing(self.key, listing(A, B))['version'], first)
+        self.assertNotEqual(versioned_listing(self.key, listing(A, C))['version'], first)
+
+    def test_diff_lists_added_changed_and_removed_entries(self):
+        since = versioned_listing(self.key, listing(A, B))['version']
+        current = listing({**A, "state": "STOPPED"}, C)
+        diff = versioned_listing(self.key, current, since)
+        self.assertNotIn('results', diff)
+        self.assertEqual(diff['since'], since)
+        self.assertEqual(diff['added'], [C])
+        self.assertEqual(diff['changed'], [{**A, "state": "STOPPED"}])
+        self.assertEqual(diff['removed'], ['b'])
+        self.assertEqual((diff['version'], diff['totalCount']), (versioned_listing(self.key, current)['version'], 2))
+
+    def test_diff_against_the_current_version_is_empty(self):
+        version = versioned_listing(self.key, listing(A, B))['version']
+        diff = versioned_listing(self.key, listing(A, B), version)
+        self.assertEqual((diff['added'], diff['changed'], diff['removed'], diff['version']), ([], [], [], version))
+
+    def test_unknown_version_gets_the_full_listing(self):
+        payload = versioned_listing(self.key, listing(A, B), 'no-such-version')
+        self.assertEqual(payload['results'], [A, B])
+        self.assertIn('version', payload)
+
+    def test_versions_are_per_listing(self):
+        version = versioned_listing(self.key, listing(A))['version']
+        self.assertIn('results', versioned_listing(self.key + ('other',), listing(B), version))
+
+    def test_index_of_a_shared_payload_is_reused(self):
+        versions = ListingVersions(max_snapshots=2)
+        payload = listing(A, B)
+        index = versions.index(self.key, payload)
+        self.assertIs(versions.index(self.key, payload), index)
+        self.assertIsNot(versions.index(self.key, listing(A, B)), index)
+
+    def test_reused_index_puts_back_an_evicted_snapshot(self):
+        versions = ListingVersions(max_snapshots=2)
+        payload = listing(A)
+        index = versions.index(self.key, payload)
+        versions.remember(('other', 1), 'v1', {})
+        versions.remember(('other', 2), 'v2', {})
+        self.assertIsNone(versions.snapshot(self.key, index.version))
+        versions.index(self.key, payload)
+        self.assertEqual(versions.snapshot(self.key, index.version), index.hashes)
+
+
+class VersionedRoutesTest(AppTestCase):
+
+    mock_config = {'processors': 10}
+
+    def fetch(self, since=None):
+        response = self.post('/api/fetch_data', instance_name=INSTANCE, since=since)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def manage(self, name, action):
+        self.post('/api/manage_processor', instance_name=INSTANCE, processor_name=name, action=action)
+
+    def test_changes_made_through_the_app_come_back_as_a_diff(self):
+        since = self.fetch()['version']
+        self.post('/api/create_processor', instance_name=INSTANCE, processor_body={"name": "new-proc", "pipeline": []})
+        self.manage('proc-00000', 'stop')
+        self.manage('proc-00001', 'delete')
+        diff = self.fetch(since)
+        self.assertEqual([entry['name'] for entry in diff['added']], ['new-proc'])
+        self.assertEqual([(entry['name'], entry['state']) for entry in diff['changed']], [('proc-00000', 'STOPPED')])
+        self.assertEqual(diff['removed'], ['proc-00001'])
+        self.assertEqual(diff['totalCount'], 10)
+
+    def test_cached_listing_keeps_its_version(self):
+        first = self.fetch()
+        diff = self.fetch(first['version'])
+        self.assertEqual((diff['version'], diff['added'], diff['changed'], diff['removed']), (first['version'], [], [], []))
+
+    def test_unknown_version_gets_the_full_listing(self):
+        payload = self.fetch('stale-token')
+        self.assertEqual(len(payload['results']), 10)
+
+    def test_diffs_are_counted(self):
+        before = self.client.get('/api/cache_stats').get_json()['listing_versions']
+        self.fetch(self.fetch()['version'])
+        after = self.client.get('/api/cache_stats').get_json()['listing_versions']
+        self.assertEqual((after['diffs'] - before['diffs'], after['full'] - before['full']), (1, 1))
+
+    def test_connections_and_instances_are_versioned(self):
+        for path, fields in (('/api/list_connections', {'instance_name': INSTANCE}), ('/api/list_spis', {})):
+            version = self.post(path, **fields).get_json()['version']
+            self.assertEqual(self.post(path, since=version, **fields).get_json()['added'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
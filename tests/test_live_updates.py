@@ -0,0 +1,137 @@
+"""Live processor updates: the Server-Sent Events stream and the pollers feeding it."""
+
+import json
+import time
+import unittest
+from unittest import mock
+
+from support import AppTestCase, GunicornServer, INSTANCE, requires_gunicorn, web_api_client
+
+
+def read_events(chunks):
+    """Yields (event, payload) from an event stream's chunks, skipping keep-alive comments."""
+    buffer = b''
+    for chunk in chunks:
+        buffer += chunk
+        while b'\n\n' in buffer:
+            message, buffer = buffer.split(b'\n\n', 1)
+            fields = dict(line.split(': ', 1) for line in message.decode().splitlines() if not line.startswith(':'))
+            if fields:
+                yield fields['event'], json.loads(fields['data'])
+
+
+class DeltaTest(unittest.TestCase):
+
+    def test_delta_is_applied_to_a_snapshot(self):
+        snapshot = {'a': {'name': 'a', 'state': 'STARTED', 'stats': None}, 'b': {'name': 'b', 'state': 'STARTED', 'stats': None}}
+        current = {'a': {'name': 'a', 'state': 'STOPPED', 'stats': None}, 'c': {'name': 'c', 'state': 'CREATED', 'stats': None}}
+        delta = web_api_client.processor_deltas(snapshot, current)
+        web_api_client.apply_processor_delta(snapshot, delta)
+        self.assertEqual(snapshot, current)
+        self.assertIsNone(web_api_client.processor_deltas(snapshot, current))
+
+
+class LiveStreamTest(AppTestCase):
+
+    mock_config = {'processors': 10}
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch.object(web_api_client, 'STREAM_POLL_INTERVAL', 0.05))
+        self.enterContext(mock.patch.object(web_api_client, 'STREAM_HEARTBEAT_INTERVAL', 0.1))
+
+    def open_stream(self):
+        response = self.client.post('/api/stream/processors', json={**self.credentials, 'instance_name': INSTANCE},
+                                    buffered=False)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.addCleanup(response.close)
+        return read_events(response.response)
+
+    def set_state(self, name, state):
+        with self.mock.state.lock:
+            self.mock.state.instances[INSTANCE]['processors'][name]['state'] = state
+
+    def test_snapshot_then_changes(self):
+        events = self.open_stream()
+        event, payload = next(events)
+        self.assertEqual((event, len(payload['results'])), ('snapshot', 10))
+        self.set_state('proc-00000', 'STOPPED')
+        self.assertEqual(next(events), ('delta', {'added': [], 'removed': [],
+                                                  'changed': [{'name': 'proc-00000', 'state': 'STOPPED'}]}))
+
+    def test_streams_of_one_instance_share_a_watcher(self):
+        first, second = self.open_stream(), self.open_stream()
+        next(first), next(second)
+        key = web_api_client.atlas_cache_key(self.credentials, INSTANCE)
+        self.assertEqual(len(web_api_client.processor_watchers[key].subscribers), 2)
+        self.set_state('proc-00001', 'STOPPED')
+        self.assertEqual(next(first)[0], 'delta')
+        self.assertEqual(next(second)[0], 'delta')
+
+    def test_closing_the_last_stream_stops_the_watcher(self):
+        response = self.client.post('/api/stream/processors', json={**self.credentials, 'instance_name': INSTANCE},
+                                    buffered=False)
+        next(read_events(response.response))
+        response.close()
+        self.assertNotIn(web_api_client.atlas_cache_key(self.credentials, INSTANCE), web_api_client.processor_watchers)
+
+    def test_failed_poll_is_sent_as_an_error(self):
+        events = self.open_stream()
+        next(events)
+        self.mock.state.config.error_pages = [1]
+        event, payload = next(events)
+        self.assertEqual((event, payload['status_code']), ('error', 500))
+
+    def test_unknown_instance_is_rejected_before_streaming(self):
+        response = self.post('/api/stream/processors', instance_name='missing')
+        self.assertEqual(response.status_code, 404)
+
+
+@requires_gunicorn
+class MultiWorkerLiveStreamTest(AppTestCase):
+
+    mock_config = {'processors': 10}
+
+    def setUp(self):
+        super().setUp()
+        self.server = GunicornServer(workers=2, CACHE_TTL_PROCESSORS='300', STREAM_POLL_INTERVAL='0.2',
+                                     STREAM_HEARTBEAT_INTERVAL='0.5')
+        self.addCleanup(self.server.stop)
+
+    def connections_to_both_workers(self):
+        """Two keep-alive connections answered by different workers; only a worker's first listing misses its cache."""
+        url = f"{self.server.url}/api/fetch_data"
+        fields = {**self.credentials, 'instance_name': INSTANCE}
+        first = self.server.connection()
+        self.assertEqual(first.post(url, json=fields).headers['X-Cache'], 'MISS')
+        for _ in range(200):
+            second = self.server.connection()
+            if second.post(url, json=fields).headers['X-Cache'] == 'MISS':
+                return first, second
+            second.close()
+        self.fail("One worker accepted every connection.")
+
+    def open_stream(self, connection):
+        response = connection.post(f"{self.server.url}/api/stream/processors", stream=True, timeout=5,
+                                   json={**self.credentials, 'instance_name': INSTANCE})
+        self.addCleanup(response.close)
+        events = read_events(response.iter_content(chunk_size=None))
+        self.assertEqual(next(events)[0], 'snapshot')
+        return events
+
+    def test_workers_share_one_poller(self):
+        streams = [self.open_stream(connection) for connection in self.connections_to_both_workers()]
+        time.sleep(0.5)
+        before = self.counters['requests']
+        time.sleep(1)
+        # One listing call per 0.2s interval, not one per worker.
+        self.assertLessEqual(self.counters['requests'] - before, 7)
+        with self.mock.state.lock:
+            self.mock.state.instances[INSTANCE]['processors']['proc-00000']['state'] = 'STOPPED'
+        for events in streams:
+            self.assertEqual(next(event for event in events if event[0] == 'delta')[1]['changed'],
+                             [{'name': 'proc-00000', 'state': 'STOPPED'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
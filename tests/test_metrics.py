@@ -0,0 +1,120 @@
+"""Prometheus metrics, and their totals over every worker process."""
+
+import time
+import unittest
+
+from support import AppTestCase, GunicornServer, requires_gunicorn, web_api_client
+from session_store import MetricsBoard
+
+ShardedMetrics, MetricsPublisher = web_api_client.ShardedMetrics, web_api_client.MetricsPublisher
+
+
+def samples(text):
+    """The samples of a scrape, by name and labels as they appear in it."""
+    return {line.rpartition(' ')[0]: float(line.rpartition(' ')[2])
+            for line in text.splitlines() if line and not line.startswith('#')}
+
+
+def worker_metrics():
+    metrics = ShardedMetrics()
+    metrics.declare('requests_total', 'counter', 'Requests.')
+    metrics.declare('in_flight', 'gauge', 'Requests in flight.')
+    metrics.declare('duration_seconds', 'histogram', 'Durations.', (0.1, 1.0))
+    return metrics
+
+
+class MetricsBoardTest(unittest.TestCase):
+
+    def test_increments_add_up_and_gauges_are_replaced(self):
+        board = MetricsBoard(gauge_timeout=60)
+        board.push('a', {('requests_total', ()): 2}, {('duration_seconds', ()): [1, 0, 0, 0.05]}, {('in_flight', ()): 3})
+        board.push('b', {('requests_total', ()): 1}, {('duration_seconds', ()): [0, 1, 0, 0.5]}, {('in_flight', ()): 1})
+        workers, values, histograms = board.push('a', {('requests_total', ()): 1}, {}, {('in_flight', ()): 0})
+        self.assertEqual(workers, 2)
+        self.assertEqual(values, {('requests_total', ()): 4, ('in_flight', ()): 1})
+        self.assertEqual(histograms, {('duration_seconds', ()): [1, 1, 0, 0.55]})
+
+    def test_gauges_of_silent_workers_are_dropped(self):
+        board = MetricsBoard(gauge_timeout=0.05)
+        board.push('gone', {('requests_total', ()): 5}, {}, {('in_flight', ()): 2})
+        time.sleep(0.1)
+        workers, values, _ = board.push('live', {}, {}, {('in_flight', ()): 1})
+        self.assertEqual(workers, 1)
+        self.assertEqual(values, {('requests_total', ()): 5, ('in_flight', ()): 1})
+
+
+class MetricsPublisherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.board = MetricsBoard(gauge_timeout=60)
+        self.first, self.second = worker_metrics(), worker_metrics()
+        self.publishers = [MetricsPublisher(metrics, self.board) for metrics in (self.first, self.second)]
+
+    def test_totals_cover_every_worker(self):
+        self.first.inc('requests_total', (('route', '/a'),), 2)
+        self.second.inc('requests_total', (('route', '/a'),), 3)
+        self.second.inc('in_flight', (), 1)
+        self.second.observe('duration_seconds', (), 0.5)
+        self.publishers[1].push([])
+        workers, values, histograms = self.publishers[0].push([])
+        self.assertEqual(workers, 2)
+        self.assertEqual(values, {('requests_total', (('route', '/a'),)): 5, ('in_flight', ()): 1})
+        self.assertEqual(histograms, {('duration_seconds', ()): [0, 1, 0, 0.5]})
+
+    def test_only_increments_are_pushed_again(self):
+        self.first.inc('requests_total', (), 2)
+        self.publishers[0].push([])
+        self.first.inc('requests_total', (), 1)
+        self.first.observe('duration_seconds', (), 2)
+        self.publishers[0].push([])
+        _, values, histograms = self.publishers[0].push([])
+        self.assertEqual(values, {('requests_total', ()): 3})
+        self.assertEqual(histograms, {('duration_seconds', ()): [0, 0, 1, 2]})
+
+    def test_extra_families_are_summed_by_kind(self):
+        extra = [('pool_total', 'counter', 'Checkouts.', [((), 4)]), ('pool_idle', 'gauge', 'Idle.', [((), 2)])]
+        self.publishers[0].push(extra)
+        self.publishers[0].push(extra)
+        _, values, _ = self.publishers[1].push(extra)
+        self.assertEqual(values, {('pool_total', ()): 8, ('pool_idle', ()): 4})
+
+
+class MetricsRouteTest(AppTestCase):
+
+    mock_config = {'processors': 10}
+
+    def test_scrape_reports_requests_and_upstream_calls(self):
+        self.post('/api/list_spis')
+        scrape = samples(self.client.get('/metrics').get_data(as_text=True))
+        self.assertGreaterEqual(
+            scrape['asp_ui_http_requests_total{route="/api/list_spis",method="POST",status="200"}'], 1)
+        self.assertGreaterEqual(
+            scrape['asp_ui_upstream_requests_total{endpoint="/streams",method="GET",status="200"}'], 1)
+        self.assertEqual(scrape['asp_ui_metrics_workers'], 1)
+
+    def test_scrape_has_help_and_type_lines(self):
+        self.post('/api/list_spis')
+        text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('# TYPE asp_ui_http_request_duration_seconds histogram', text)
+        self.assertIn('# TYPE asp_ui_cache_entries gauge', text)
+
+
+@requires_gunicorn
+class WorkerTotalsTest(unittest.TestCase):
+
+    def test_one_scrape_counts_the_requests_of_every_worker(self):
+        server = GunicornServer(workers=2, METRICS_PUSH_INTERVAL='0.2')
+        self.addCleanup(server.stop)
+        # A new connection for each request spreads them over both workers.
+        for _ in range(20):
+            with server.connection() as connection:
+                self.assertEqual(connection.get(f"{server.url}/api/scheduler_stats").status_code, 200)
+        time.sleep(0.5)
+        scrape = samples(server.connection().get(f"{server.url}/metrics").text)
+        self.assertEqual(scrape['asp_ui_metrics_workers'], 2)
+        self.assertEqual(
+            scrape['asp_ui_http_requests_total{route="/api/scheduler_stats",method="GET",status="200"}'], 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""Listing routes fetch and merge every page of an Atlas list endpoint."""
+
+import json
+import unittest
+from unittest import mock
+
+from support import AppTestCase, INSTANCE
+import web_api_client
+from web_api_client import ATLAS_PAGE_SIZE, ListingPageWriter
+
+
+class PaginationTest(AppTestCase):
+
+    mock_config = {'processors': ATLAS_PAGE_SIZE * 2 + 50, 'connections': 3}
+
+    def test_processor_pages_are_merged_in_order(self):
+        response = self.post('/api/fetch_data', instance_name=INSTANCE)
+        self.assertEqual(response.status_code, 200)
+        payload = response.get_json()
+        self.assertEqual(payload['totalCount'], ATLAS_PAGE_SIZE * 2 + 50)
+        self.assertEqual([entry['name'] for entry in payload['results']], sorted(self.processors()))
+        self.assertNotIn('links', payload)
+        # Three pages plus the first digest challenge.
+        self.assertEqual(self.counters['requests'], 4)
+
+    def test_single_page_listings(self):
+        connections = self.post('/api/list_connections', instance_name=INSTANCE).get_json()
+        self.assertEqual([entry['name'] for entry in connections['results']], ['conn-0', 'conn-1', 'conn-2'])
+        spis = self.post('/api/list_spis').get_json()
+        self.assertEqual([entry['name'] for entry in spis['results']], [INSTANCE])
+        self.assertEqual(spis['totalCount'], 1)
+
+    def test_failed_page_fails_the_listing(self):
+        self.mock.state.config.error_pages = (2,)
+        response = self.post('/api/fetch_data', instance_name=INSTANCE)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.get_json()['details']['detail'], "Page 2 failed.")
+
+    def test_missing_instance_is_rejected(self):
+        response = self.post('/api/fetch_data')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.counters['requests'], 0)
+
+
+class StreamedListingTest(AppTestCase):
+    """Listings asked for as NDJSON are streamed page by page while they are fetched."""
+
+    mock_config = {'processors': ATLAS_PAGE_SIZE * 2 + 50}
+
+    def stream(self):
+        response = self.post('/api/fetch_data', headers={'Accept': 'application/x-ndjson'}, instance_name=INSTANCE)
+        self.assertEqual((response.status_code, response.mimetype), (200, 'application/x-ndjson'))
+        *entries, meta = [json.loads(line) for line in response.get_data().splitlines()]
+        return response, entries, meta['_meta']
+
+    def authenticated_requests(self):
+        counters = self.counters
+        return counters['requests'] - counters['challenges'] - counters['stale_nonces']
+
+    def test_streamed_listing_is_cached(self):
+        response, entries, meta = self.stream()
+        self.assertEqual([entry['name'] for entry in entries], sorted(self.processors()))
+        self.assertEqual((response.headers['X-Cache'], meta['totalCount']), ('MISS', ATLAS_PAGE_SIZE * 2 + 50))
+        payload = self.post('/api/fetch_data', instance_name=INSTANCE)
+        self.assertEqual(payload.headers['X-Cache'], 'HIT')
+        self.assertEqual(payload.get_json()['version'], meta['version'])
+        self.assertEqual(self.authenticated_requests(), 3)
+
+    def test_failed_page_ends_with_an_error_line(self):
+        self.mock.state.config.error_pages = (2,)
+        _, entries, meta = self.stream()
+        self.assertEqual(len(entries), ATLAS_PAGE_SIZE)
+        self.assertEqual(meta['status_code'], 500)
+        self.assertEqual(meta['details']['detail'], "Page 2 failed.")
+        self.assertNotIn('version', meta)
+        # Nothing was cached, so the next request asks Atlas again.
+        self.assertEqual(self.post('/api/fetch_data', instance_name=INSTANCE).status_code, 500)
+
+    def test_listing_above_the_limit_is_streamed_without_caching(self):
+        expected = self.post('/api/fetch_data', instance_name=INSTANCE).get_json()['version']
+        web_api_client.response_cache.clear()
+        with mock.patch.object(web_api_client, 'CACHE_STREAMED_MAX_ENTRIES', ATLAS_PAGE_SIZE):
+            _, entries, meta = self.stream()
+        self.assertEqual((len(entries), meta['version']), (ATLAS_PAGE_SIZE * 2 + 50, expected))
+        calls = self.authenticated_requests()
+        self.assertEqual(self.post('/api/fetch_data', instance_name=INSTANCE).headers['X-Cache'], 'MISS')
+        self.assertEqual(self.authenticated_requests(), calls + 3)
+
+    def test_writer_stops_holding_entries_past_the_limit(self):
+        pages = [{'results': [{'name': f"p-{page}-{i}"} for i in range(3)]} for page in range(3)]
+        writers = [ListingPageWriter(self.credentials, ('writer', limit), 30, pages[0]) for limit in (4, 100)]
+        for limit, writer in zip((4, 100), writers):
+            with mock.patch.object(web_api_client, 'CACHE_STREAMED_MAX_ENTRIES', limit):
+                for page in pages:
+                    writer.page(page)
+        self.assertIsNone(writers[0].results)
+        self.assertEqual(len(writers[1].results), 9)
+        metas = [json.loads(writer.finish())['_meta'] for writer in writers]
+        self.assertEqual(metas[0], metas[1])
+        self.assertIsNone(web_api_client.response_cache.get(('writer', 4)))
+        self.assertIsNotNone(web_api_client.response_cache.get(('writer', 100)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""Atlas response bodies are forwarded as received, without being parsed and serialized again."""
+
+import gzip
+import json
+import unittest
+
+from support import AppTestCase, INSTANCE
+from web_api_client import ACTION_COMPLETED_BODY
+
+
+class PassthroughTest(AppTestCase):
+
+    def connection_bytes(self, name):
+        with self.mock.state.lock:
+            return json.dumps(self.mock.state.instances[INSTANCE]['connections'][name]).encode()
+
+    def test_details_are_forwarded_byte_for_byte(self):
+        response = self.post('/api/get_connection_details', instance_name=INSTANCE, connection_name='conn-1')
+        self.assertEqual(response.data, self.connection_bytes('conn-1'))
+        self.assertEqual(response.content_type, 'application/vnd.atlas.2023-02-01+json')
+        # The cached copy is the same bytes.
+        cached = self.post('/api/get_connection_details', instance_name=INSTANCE, connection_name='conn-1')
+        self.assertEqual((cached.headers['X-Cache'], cached.data), ('HIT', response.data))
+
+    def test_mutation_response_is_streamed_through(self):
+        response = self.post('/api/create_connection', instance_name=INSTANCE,
+                             connection_body={"name": "conn-new", "type": "Kafka"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.connection_bytes('conn-new'))
+        self.assertEqual(response.headers['Content-Length'], str(len(response.data)))
+
+    def test_no_content_becomes_a_success_body(self):
+        response = self.post('/api/manage_processor', instance_name=INSTANCE, processor_name='proc-00000', action='delete')
+        self.assertEqual(response.data, ACTION_COMPLETED_BODY)
+
+    def test_upstream_error_is_reported_as_json(self):
+        response = self.post('/api/manage_processor', instance_name=INSTANCE, processor_name='missing', action='stop')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.get_json()['details']['reason'], 'Not Found')
+
+
+class CompressedPassthroughTest(AppTestCase):
+
+    mock_config = {'gzip': True}
+
+    def create(self, headers):
+        return self.post('/api/create_processor', headers=headers, instance_name=INSTANCE,
+                         processor_body={"name": "new-proc", "pipeline": []})
+
+    def test_compressed_body_is_forwarded_compressed(self):
+        response = self.create({'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.data))['name'], 'new-proc')
+
+    def test_compressed_body_is_decoded_for_other_clients(self):
+        response = self.create({'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.get_json()['name'], 'new-proc')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""The upstream rate limiter and the retries of calls that Atlas answers with 429."""
+
+import time
+import unittest
+from unittest import mock
+
+from support import AppTestCase, GunicornServer, INSTANCE, requires_gunicorn, web_api_client
+
+UpstreamScheduler = web_api_client.UpstreamScheduler
+
+
+class SchedulerTest(unittest.TestCase):
+
+    key = ('atlas.example', 'project')
+
+    def test_calls_beyond_the_burst_wait_for_the_rate(self):
+        scheduler = UpstreamScheduler(rate=20, burst=2, max_wait=5)
+        started = time.monotonic()
+        for _ in range(6):
+            scheduler.acquire(self.key)
+        # Two at once, then four at 20 per second.
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+        self.assertEqual(scheduler.stats()['admitted']['interactive'], 6)
+
+    def test_a_429_holds_back_the_whole_bucket(self):
+        scheduler = UpstreamScheduler(rate=100, burst=100, max_wait=5)
+        self.assertEqual(scheduler.penalize(self.key, 0.2), 0)
+        started = time.monotonic()
+        scheduler.acquire(self.key)
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+        # Other projects are not held back.
+        started = time.monotonic()
+        scheduler.acquire(('atlas.example', 'other'))
+        self.assertLess(time.monotonic() - started, 0.1)
+
+    def test_waiting_longer_than_max_wait_fails(self):
+        scheduler = UpstreamScheduler(rate=1, burst=1, max_wait=0.1)
+        scheduler.acquire(self.key)
+        with self.assertRaises(web_api_client.UpstreamQueueTimeout):
+            scheduler.acquire(self.key)
+        self.assertEqual(scheduler.stats()['timeouts'], 1)
+
+
+class RetryTest(AppTestCase):
+
+    mock_config = {'processors': 10, 'retry_after': 0}
+
+    def setUp(self):
+        super().setUp()
+        self.scheduler = UpstreamScheduler(rate=0, burst=1, max_wait=5)
+        self.enterContext(mock.patch.object(web_api_client, 'upstream_scheduler', self.scheduler))
+
+    def stats(self):
+        return self.post('/api/get_processor_stats', instance_name=INSTANCE, processor_name='proc-00000')
+
+    def test_429_is_retried_after_retry_after(self):
+        self.mock.state.config.throttle_next = 2
+        self.assertEqual(self.stats().status_code, 200)
+        self.assertEqual(self.counters['throttled'], 2)
+        self.assertEqual(self.scheduler.stats()['retries'], 2)
+
+    def test_429_without_retry_after_backs_off(self):
+        self.mock.state.config.retry_after = None
+        self.mock.state.config.throttle_next = 1
+        self.assertEqual(self.stats().status_code, 200)
+        self.assertEqual(self.scheduler.stats()['retries'], 1)
+
+    def test_gives_up_after_the_last_retry(self):
+        self.mock.state.config.throttle_next = 100
+        response = self.stats()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.counters['throttled'], web_api_client.ATLAS_MAX_RETRIES + 1)
+        self.assertEqual(self.scheduler.stats()['gave_up'], 1)
+
+    def test_long_retry_after_is_returned_without_waiting(self):
+        self.mock.state.config.retry_after = web_api_client.ATLAS_RETRY_MAX_DELAY + 60
+        self.mock.state.config.throttle_next = 1
+        started = time.monotonic()
+        self.assertEqual(self.stats().status_code, 429)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(self.counters['throttled'], 1)
+
+    def test_retried_listing_pages_still_merge(self):
+        self.mock.state.config.throttle_next = 1
+        response = self.post('/api/fetch_data', instance_name=INSTANCE)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['results']), 10)
+
+
+@requires_gunicorn
+class WorkerShareTest(unittest.TestCase):
+
+    def scheduler_stats(self, workers):
+        server = GunicornServer(workers=workers, ATLAS_RATE_LIMIT_PER_SECOND='10', ATLAS_RATE_LIMIT_BURST='20')
+        self.addCleanup(server.stop)
+        return server.connection().get(f"{server.url}/api/scheduler_stats").json()
+
+    def test_each_worker_gets_its_share_of_the_limit(self):
+        stats = self.scheduler_stats(workers=2)
+        self.assertEqual((stats['rate_per_second'], stats['burst']), (5.0, 10))
+
+    def test_one_worker_gets_the_whole_limit(self):
+        stats = self.scheduler_stats(workers=1)
+        self.assertEqual((stats['rate_per_second'], stats['burst']), (10.0, 20))
+
+
+if __name__ == '__main__':
+    unittest.main()
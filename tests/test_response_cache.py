@@ -0,0 +1,160 @@
+"""The read-through response cache and its invalidation, within and across worker processes."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from support import AppTestCase, GunicornServer, INSTANCE, requires_gunicorn
+import web_api_client
+from session_store import InvalidationLog, SharedCounter
+from web_api_client import CacheInvalidator, TTLCache
+
+
+class TTLCacheTest(unittest.TestCase):
+
+    def test_entries_expire(self):
+        cache = TTLCache(10)
+        cache.set('key', 'value', 0.05)
+        self.assertEqual(cache.get('key'), 'value')
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache.get('a')
+        cache.set('c', 3, 60)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+
+    def test_prefix_invalidation(self):
+        cache = TTLCache(10)
+        cache.set(('host', 'project', 'spi-1', 'processors'), 1, 60)
+        cache.set(('host', 'project', 'spi-2', 'processors'), 2, 60)
+        cache.invalidate_prefix(('host', 'project', 'spi-1'))
+        self.assertIsNone(cache.get(('host', 'project', 'spi-1', 'processors')))
+        self.assertEqual(cache.get(('host', 'project', 'spi-2', 'processors')), 2)
+
+
+class CacheInvalidatorTest(unittest.TestCase):
+    """Two invalidators sharing one log stand in for two workers."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'invalidations')
+        self.log = InvalidationLog(SharedCounter(self.path), max_entries=4)
+        self.caches = [TTLCache(10), TTLCache(10)]
+        self.workers = [CacheInvalidator(cache, (self.log, SharedCounter(self.path))) for cache in self.caches]
+        for cache, worker in zip(self.caches, self.workers):
+            worker.sync()
+            cache.set(('a',), 1, 60)
+            cache.set(('b',), 2, 60)
+
+    def test_invalidation_reaches_the_other_worker(self):
+        self.workers[0].invalidate([('key', ('a',))])
+        self.assertTrue(self.workers[1].behind())
+        self.workers[1].sync()
+        self.assertIsNone(self.caches[1].get(('a',)))
+        self.assertEqual(self.caches[1].get(('b',)), 2)
+        self.assertFalse(self.workers[0].behind())
+
+    def test_worker_too_far_behind_clears_its_cache(self):
+        for _ in range(5):
+            self.workers[0].invalidate([('key', ('a',))])
+        self.workers[1].sync()
+        self.assertIsNone(self.caches[1].get(('b',)))
+        self.assertEqual(self.workers[1].stats()['resets'], 1)
+
+    def test_restarted_store_clears_every_cache(self):
+        self.workers[0].log = self.workers[1].log = InvalidationLog(SharedCounter(self.path), max_entries=4)
+        self.assertTrue(self.workers[1].behind())
+        self.workers[1].sync()
+        self.assertIsNone(self.caches[1].get(('b',)))
+
+
+class ResponseCacheTest(AppTestCase):
+
+    def listing(self, **fields):
+        return self.post('/api/fetch_data', instance_name=INSTANCE, **fields)
+
+    def test_listing_is_served_from_the_cache(self):
+        self.assertEqual(self.listing().headers['X-Cache'], 'MISS')
+        requests_made = self.counters['requests']
+        response = self.listing()
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        self.assertEqual(len(response.get_json()['results']), 200)
+        self.assertEqual(self.counters['requests'], requests_made)
+
+    def test_expired_entry_is_fetched_again(self):
+        with mock.patch.object(web_api_client, 'CACHE_TTL_PROCESSORS', 0.05):
+            self.listing()
+            time.sleep(0.1)
+            self.assertEqual(self.listing().headers['X-Cache'], 'MISS')
+
+    def test_mutation_invalidates_the_listing(self):
+        self.listing()
+        self.post('/api/manage_processor', instance_name=INSTANCE, processor_name='proc-00000', action='stop')
+        response = self.listing()
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(response.get_json()['results'][0]['state'], 'STOPPED')
+
+    def test_deleted_instance_drops_all_its_entries(self):
+        self.listing()
+        self.post('/api/list_spis')
+        self.post('/api/delete_spi', instance_name=INSTANCE)
+        self.assertEqual(self.post('/api/list_spis').get_json()['results'], [])
+        self.assertEqual(self.listing().status_code, 404)
+
+    def test_unverified_credential_does_not_read_the_cache(self):
+        self.listing()
+        self.credentials['private_key'] = 'wrong'
+        response = self.listing()
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn('X-Cache', response.headers)
+
+
+@requires_gunicorn
+class MultiWorkerInvalidationTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.server = GunicornServer(workers=2, CACHE_TTL_PROCESSORS='300')
+        self.addCleanup(self.server.stop)
+
+    def listing(self, connection):
+        response = connection.post(f"{self.server.url}/api/fetch_data", json={**self.credentials, 'instance_name': INSTANCE})
+        self.assertEqual(response.status_code, 200)
+        return response.headers['X-Cache'], response.json()['results'][0]['state']
+
+    def connections_to_both_workers(self):
+        """Returns two keep-alive connections answered by different workers.
+
+        Only the first listing a worker serves misses its cache, which tells
+        a connection to the second worker apart from more to the first one.
+        """
+        first = self.server.connection()
+        self.assertEqual(self.listing(first), ('MISS', 'STARTED'))
+        for _ in range(200):
+            second = self.server.connection()
+            if self.listing(second)[0] == 'MISS':
+                return first, second
+            second.close()
+        self.fail("One worker accepted every connection.")
+
+    def test_mutation_on_one_worker_invalidates_every_worker(self):
+        first, second = self.connections_to_both_workers()
+        self.assertEqual(self.listing(second), ('HIT', 'STARTED'))
+        response = first.post(f"{self.server.url}/api/manage_processor", json={
+            **self.credentials, 'instance_name': INSTANCE, 'processor_name': 'proc-00000', 'action': 'stop'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.listing(second), ('MISS', 'STOPPED'))
+        self.assertEqual(self.listing(first), ('MISS', 'STOPPED'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""Login sessions: tokens in place of the keys, and each worker's short-lived cache of their credentials."""
+
+import time
+import unittest
+from unittest import mock
+
+from support import AppTestCase, INSTANCE, asgi_test_client, requires_asgi, web_api_client
+
+
+class SessionTest(AppTestCase):
+
+    mock_config = {'processors': 5}
+
+    def setUp(self):
+        super().setUp()
+        response = self.post('/api/login')
+        self.assertEqual(response.status_code, 200)
+        self.headers = {'Authorization': f"Bearer {response.get_json()['session_token']}"}
+
+    def resolved(self):
+        """Tokens the session store has looked up so far."""
+        return web_api_client.credential_sessions.stats()['resolved']
+
+    def list_processors(self):
+        return self.client.post('/api/fetch_data', json={'instance_name': INSTANCE}, headers=self.headers)
+
+    def test_token_stands_in_for_the_keys(self):
+        response = self.list_processors()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['totalCount'], 5)
+
+    def test_cached_credentials_skip_the_store(self):
+        before = self.resolved()
+        for _ in range(3):
+            self.assertEqual(self.list_processors().status_code, 200)
+        self.assertEqual(self.resolved(), before)
+
+    def test_store_is_asked_again_once_the_cached_copy_expires(self):
+        self.enterContext(mock.patch.object(web_api_client, 'SESSION_CACHE_TTL', 0.1))
+        web_api_client.session_lookups.clear()
+        before = self.resolved()
+        self.list_processors()
+        self.list_processors()
+        time.sleep(0.2)
+        self.list_processors()
+        self.assertEqual(self.resolved(), before + 2)
+
+    def test_cache_can_be_turned_off(self):
+        self.enterContext(mock.patch.object(web_api_client, 'SESSION_CACHE_TTL', 0))
+        web_api_client.session_lookups.clear()
+        before = self.resolved()
+        self.list_processors()
+        self.list_processors()
+        self.assertEqual(self.resolved(), before + 2)
+
+    def test_session_ended_elsewhere_is_accepted_until_the_cached_copy_expires(self):
+        self.enterContext(mock.patch.object(web_api_client, 'SESSION_CACHE_TTL', 0.1))
+        web_api_client.session_lookups.clear()
+        self.list_processors()
+        # As if another worker had ended the session.
+        web_api_client.credential_sessions.revoke(self.headers['Authorization'].split()[1])
+        self.assertEqual(self.list_processors().status_code, 200)
+        time.sleep(0.2)
+        response = self.list_processors()
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(response.get_json()['session_expired'])
+
+    def test_logout_ends_the_session_at_once(self):
+        self.assertEqual(self.client.post('/api/logout', headers=self.headers).get_json(), {"logged_out": True})
+        self.assertEqual(self.list_processors().status_code, 401)
+
+    @requires_asgi
+    def test_async_server_reads_cached_credentials_on_the_loop(self):
+        client = self.enterContext(asgi_test_client())
+        before = self.resolved()
+        response = client.post('/api/fetch_data', json={'instance_name': INSTANCE}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.resolved(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Stale-while-revalidate: expired listings are served at once and refreshed in the background."""
+
+import time
+import unittest
+from unittest import mock
+
+from support import AppTestCase, INSTANCE
+import web_api_client
+
+
+class StaleWhileRevalidateTest(AppTestCase):
+
+    # A one-page listing, so that each refresh is a single Atlas call.
+    mock_config = {'processors': 50}
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(web_api_client, 'CACHE_TTL_PROCESSORS', 0.05)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def listing(self, **fields):
+        return self.post('/api/fetch_data', instance_name=INSTANCE, stale_while_revalidate=True, **fields)
+
+    def stop_in_atlas(self, name):
+        with self.mock.state.lock:
+            self.mock.state.instances[INSTANCE]['processors'][name]['state'] = 'STOPPED'
+
+    def test_expired_entry_is_served_stale_then_refreshed(self):
+        self.assertEqual(self.listing().headers['X-Cache'], 'MISS')
+        self.stop_in_atlas('proc-00000')
+        time.sleep(0.1)
+
+        stale = self.listing()
+        self.assertEqual(stale.headers['X-Cache'], 'STALE')
+        self.assertEqual(stale.headers['X-Cache-Revalidating'], '1')
+        self.assertIn('Age', stale.headers)
+        self.assertEqual(stale.get_json()['results'][0]['state'], 'STARTED')
+
+        fresh = self.listing(wait_for_revalidation=True)
+        self.assertEqual(fresh.get_json()['results'][0]['state'], 'STOPPED')
+
+    def test_concurrent_stale_reads_share_one_refresh(self):
+        self.listing()
+        time.sleep(0.1)
+        self.mock.state.config.latency = 0.2
+        requests_made = self.counters['requests']
+        for _ in range(5):
+            self.assertEqual(self.listing().headers['X-Cache'], 'STALE')
+        time.sleep(0.4)
+        self.assertEqual(self.counters['requests'] - requests_made, 1)
+        self.assertEqual(web_api_client.cache_revalidator.stats()['in_flight'], 0)
+
+    def test_entry_past_max_stale_is_fetched(self):
+        with mock.patch.object(web_api_client, 'SWR_MAX_STALE', 0.05):
+            self.listing()
+            time.sleep(0.15)
+            self.assertEqual(self.listing().headers['X-Cache'], 'MISS')
+
+    def test_without_opt_in_an_expired_entry_is_fetched(self):
+        self.listing()
+        time.sleep(0.1)
+        response = self.post('/api/fetch_data', instance_name=INSTANCE)
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""The opt-in processor stats sampler: ring buffers, rates, and its routes on one or several workers."""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from support import AppTestCase, GunicornServer, INSTANCE, REPO_ROOT, requires_gunicorn, web_api_client
+from session_store import ElectedService
+
+
+class RingBufferTest(unittest.TestCase):
+
+    def vector(self, count):
+        return [count] + [np.nan] * (len(web_api_client.STATS_FIELDS) - 1)
+
+    def test_oldest_samples_are_overwritten(self):
+        buffer = web_api_client.StatsRingBuffer(3)
+        for second in range(5):
+            buffer.append(float(second), self.vector(second * 10))
+        timestamps, values = buffer.window(0)
+        self.assertEqual(timestamps.tolist(), [2.0, 3.0, 4.0])
+        self.assertEqual(values[:, 0].tolist(), [20.0, 30.0, 40.0])
+        self.assertEqual(buffer.window(3.5)[0].tolist(), [4.0])
+
+    def test_rates_skip_counter_resets(self):
+        buffer = web_api_client.StatsRingBuffer(4)
+        for second, count in enumerate([0, 10, 30, 5]):
+            buffer.append(float(second), self.vector(count))
+        history = web_api_client.stats_history(buffer, 0)
+        self.assertEqual(history['rates_per_second']['inputMessageCount'], [10.0, 20.0, None])
+        self.assertIsNone(history['latest_rates_per_second']['inputMessageCount'])
+        self.assertEqual(history['samples']['stateSize'], [None] * 4)
+
+
+class StatsSamplerRoutesTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch.object(web_api_client, 'STATS_SAMPLER_MIN_INTERVAL', 0.05))
+        self.addCleanup(self.post, '/api/stop_stats_sampler', instance_name=INSTANCE)
+
+    def start(self, **fields):
+        return self.post('/api/start_stats_sampler', instance_name=INSTANCE, interval_seconds=0.05, **fields)
+
+    def history(self):
+        return self.post('/api/get_stats_history', instance_name=INSTANCE)
+
+    def test_history_has_samples_and_rates(self):
+        status = self.start(processor_names=['proc-00050', 'missing']).get_json()
+        self.assertEqual((status['running'], status['processors']), (True, ['missing', 'proc-00050']))
+        time.sleep(0.4)
+        payload = self.history().get_json()
+        sampled = payload['processors']['proc-00050']
+        self.assertGreaterEqual(len(sampled['timestamps']), 3)
+        self.assertGreater(sampled['latest_rates_per_second']['inputMessageCount'], 0)
+        self.assertEqual(payload['processors']['missing']['timestamps'], [])
+        self.assertEqual(payload['sampler']['errors']['missing']['status_code'], 404)
+
+    def test_stopping_every_processor_stops_the_sampler(self):
+        self.start(processor_names=['proc-00000', 'proc-00001'])
+        status = self.post('/api/stop_stats_sampler', instance_name=INSTANCE, processor_names=['proc-00000']).get_json()
+        self.assertEqual(status['processors'], ['proc-00001'])
+        self.post('/api/stop_stats_sampler', instance_name=INSTANCE, processor_names=['proc-00001'])
+        self.assertEqual(self.history().status_code, 404)
+
+    def test_too_many_samplers_are_refused(self):
+        with mock.patch.object(web_api_client, 'STATS_SAMPLER_MAX_INSTANCES', 0):
+            self.assertEqual(self.start(processor_names=['proc-00000']).status_code, 429)
+
+    def test_invalid_requests_are_rejected(self):
+        self.assertEqual(self.start().status_code, 400)
+        self.assertEqual(self.start(processor_names='proc-00000').status_code, 400)
+        self.assertEqual(self.post('/api/start_stats_sampler', instance_name=INSTANCE, processor_names=['proc-00000'],
+                                   interval_seconds='often').status_code, 400)
+        self.assertEqual(self.history().status_code, 404)
+
+
+class ElectedServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(mock.patch.dict(os.environ, {
+            'SESSION_STORE_ADDRESS': os.path.join(directory.name, 'store.sock'),
+            'SESSION_STORE_AUTHKEY': os.urandom(32).hex(),
+        }))
+
+    def test_first_caller_is_elected_and_serves_the_others(self):
+        created = []
+
+        def create():
+            created.append(web_api_client.StatsSamplerRegistry())
+            return created[-1]
+
+        elected, other = ElectedService('test_samplers', create), ElectedService('test_samplers', create)
+        self.assertIsNone(elected.history('key', None, 0))
+        # Removes the socket before its directory goes.
+        self.addCleanup(elected.server.listener.close)
+        # The lock is taken, so the other one calls the elected registry over its socket.
+        self.assertIsNone(other.history('key', None, 0))
+        self.assertEqual(len(created), 1)
+        self.assertIsNone(other.elected)
+
+    def test_store_process_does_not_load_the_app(self):
+        loaded = subprocess.run([sys.executable, '-c', 'import sys, session_store; print("web_api_client" in sys.modules)'],
+                                cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout
+        self.assertEqual(loaded.strip(), 'False')
+
+
+@requires_gunicorn
+class MultiWorkerSamplerTest(AppTestCase):
+
+    def test_sampler_is_shared_by_every_worker(self):
+        server = GunicornServer(workers=2, STATS_SAMPLER_MIN_INTERVAL='0.05')
+        self.addCleanup(server.stop)
+        fields = {**self.credentials, 'instance_name': INSTANCE}
+        response = server.connection().post(f"{server.url}/api/start_stats_sampler", json={
+            **fields, 'processor_names': ['proc-00000'], 'interval_seconds': 0.05})
+        self.assertEqual(response.status_code, 200)
+        time.sleep(0.3)
+        # New connections land on either worker; every one of them reads the same sampler.
+        for _ in range(10):
+            response = server.connection().post(f"{server.url}/api/get_stats_history", json=fields)
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(len(response.json()['processors']['proc-00000']['timestamps']), 0)
+        response = server.connection().post(f"{server.url}/api/stop_stats_sampler", json=fields)
+        self.assertEqual(response.status_code, 200)
+        response = server.connection().post(f"{server.url}/api/get_stats_history", json=fields)
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""The instance stats summary: concurrent stats fetches combined into totals, percentiles and rankings."""
+
+import json
+import time
+import unittest
+
+from support import AppTestCase, INSTANCE
+
+
+class StatsSummaryTest(AppTestCase):
+
+    mock_config = {'processors': 10}
+
+    def summary(self, headers=None, **fields):
+        return self.post('/api/instance_stats_summary', headers=headers, instance_name=INSTANCE, **fields)
+
+    def test_every_processor_is_sampled(self):
+        payload = self.summary(top_n=3).get_json()
+        self.assertEqual((payload['processorCount'], payload['sampled'], payload['failed']), (10, 10, 0))
+        self.assertEqual(sum(payload['states'].values()), 10)
+        self.assertEqual(payload['throughput_basis'], 'count')
+        self.assertEqual(len(payload['top']['throughput']), 3)
+
+    def test_second_summary_ranks_by_rate(self):
+        self.summary()
+        time.sleep(0.2)
+        payload = self.summary().get_json()
+        self.assertEqual(payload['throughput_basis'], 'rate')
+        self.assertGreater(payload['rate_interval_seconds'], 0)
+
+    def test_failed_stats_are_listed_and_left_out(self):
+        self.post('/api/fetch_data', instance_name=INSTANCE)
+        # Still in the cached listing, but gone from Atlas.
+        with self.mock.state.lock:
+            del self.mock.state.instances[INSTANCE]['processors']['proc-00003']
+        payload = self.summary().get_json()
+        self.assertEqual((payload['sampled'], payload['failed']), (9, 1))
+        self.assertEqual((payload['errors'][0]['processor_name'], payload['errors'][0]['status_code']), ('proc-00003', 404))
+
+    def test_unnamed_processors_are_skipped(self):
+        with self.mock.state.lock:
+            processors = self.mock.state.instances[INSTANCE]['processors']
+            unnamed = dict(processors['proc-00000'])
+            del unnamed['name']
+            processors['unnamed'] = unnamed
+        response = self.summary()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.get_json()['sampled'], response.get_json()['failed']), (10, 0))
+
+    def test_ndjson_streams_each_processor_then_meta(self):
+        response = self.summary(headers={'Accept': 'application/x-ndjson'}, filter={'state': 'STOPPED'})
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(sorted(line['processor_name'] for line in lines[:-1]), ['proc-00002', 'proc-00007'])
+        self.assertEqual(lines[-1]['_meta']['sampled'], 2)
+
+    def test_invalid_options_are_rejected(self):
+        for fields in ({'top_n': -1}, {'max_parallel': 0}, {'percentiles': [101]}, {'filter': {'name_regex': '('}}):
+            with self.subTest(**fields):
+                self.assertEqual(self.summary(**fields).status_code, 400)
+        self.assertEqual(self.counters['requests'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
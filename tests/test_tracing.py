@@ -0,0 +1,85 @@
+"""Request tracing: the Server-Timing header, request IDs and sampled JSON trace lines."""
+
+import json
+import time
+import unittest
+from unittest import mock
+
+from support import AppTestCase, INSTANCE, web_api_client
+
+RequestTrace = web_api_client.RequestTrace
+
+
+def phases(header):
+    """The phase names of a Server-Timing header, in order."""
+    return [part.split(';')[0] for part in header.split(', ')]
+
+
+class RequestTraceTest(unittest.TestCase):
+
+    def test_phases_are_summed_in_order_with_the_total_last(self):
+        trace = RequestTrace('id', sampled=False)
+        now = time.perf_counter()
+        trace.add('upstream', now, 0.010)
+        trace.add('parse', now, 0.001)
+        trace.add('upstream', now, 0.020)
+        header = trace.server_timing()
+        self.assertEqual(phases(header), ['parse', 'upstream', 'total'])
+        self.assertIn('upstream;dur=30.0;desc="2 spans"', header)
+        self.assertIn('parse;dur=1.0,', header)
+
+
+class TracedRoutesTest(AppTestCase):
+
+    mock_config = {'processors': 10}
+
+    def stats(self, headers=None, processor_name='proc-00000'):
+        return self.post('/api/get_processor_stats', headers=headers, instance_name=INSTANCE, processor_name=processor_name)
+
+    def test_first_call_reports_the_digest_challenge(self):
+        self.assertEqual(phases(self.stats().headers['Server-Timing']), ['parse', 'queue', 'digest', 'upstream', 'total'])
+        # Later calls sign preemptively, so there is no challenge round trip.
+        second = self.stats(processor_name='proc-00001')
+        self.assertEqual(phases(second.headers['Server-Timing']), ['parse', 'queue', 'upstream', 'total'])
+        self.assertEqual(self.counters['challenges'], 1)
+
+    def test_rebuilt_json_reports_serialize(self):
+        response = self.post('/api/fetch_data', instance_name=INSTANCE, filter={'state': 'STOPPED'})
+        self.assertIn('serialize', phases(response.headers['Server-Timing']))
+
+    def test_cached_response_makes_no_upstream_call(self):
+        self.post('/api/fetch_data', instance_name=INSTANCE)
+        response = self.post('/api/fetch_data', instance_name=INSTANCE)
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        self.assertNotIn('upstream', phases(response.headers['Server-Timing']))
+
+    def test_valid_request_id_is_reused(self):
+        self.assertEqual(self.stats({'X-Request-ID': 'client-42.a_b'}).headers['X-Request-ID'], 'client-42.a_b')
+
+    def test_malformed_request_id_is_replaced(self):
+        for request_id in ('has space', 'x' * 65, ''):
+            with self.subTest(request_id=request_id):
+                generated = self.stats({'X-Request-ID': request_id}).headers['X-Request-ID']
+                self.assertRegex(generated, r'^[0-9a-f]{32}$')
+
+    def test_server_timing_can_be_turned_off(self):
+        self.enterContext(mock.patch.object(web_api_client, 'SERVER_TIMING_ENABLED', 0))
+        response = self.stats()
+        self.assertNotIn('Server-Timing', response.headers)
+        self.assertNotIn('X-Request-ID', response.headers)
+
+    def test_sampled_request_is_logged_with_its_spans(self):
+        self.enterContext(mock.patch.object(web_api_client, 'TRACE_SAMPLE_RATE', 1))
+        with self.assertLogs('asp_ui.trace') as logs:
+            response = self.stats({'X-Request-ID': 'sampled-1'})
+        self.assertEqual(len(logs.records), 1)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['request_id'], line['route'], line['method'], line['status']),
+                         ('sampled-1', '/api/get_processor_stats', 'POST', response.status_code))
+        upstream = [span for span in line['spans'] if span['name'] == 'upstream']
+        self.assertEqual([span['endpoint'] for span in upstream], ['/streams/{instance}/processor/{name}'])
+        self.assertTrue(all(span['start_ms'] >= 0 for span in line['spans']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""Keep-alive session pooling of Atlas calls."""
+
+import unittest
+
+from support import AppTestCase, INSTANCE
+from web_api_client import AtlasSessionPool, atlas_session_pool
+
+
+class SessionPoolTest(unittest.TestCase):
+
+    def test_released_session_is_reused(self):
+        pool = AtlasSessionPool(max_idle=2, idle_timeout=60, max_lifetime=600)
+        session = pool.acquire('key')
+        pool.release('key', session)
+        self.assertIs(pool.acquire('key'), session)
+        self.assertEqual((pool.hits, pool.misses), (1, 1))
+
+    def test_discarded_session_is_not_reused(self):
+        pool = AtlasSessionPool(max_idle=2, idle_timeout=60, max_lifetime=600)
+        session = pool.acquire('key')
+        pool.release('key', session, discard=True)
+        self.assertIsNot(pool.acquire('key'), session)
+        self.assertEqual(pool.stats()['evictions'], 1)
+
+    def test_surplus_sessions_are_closed(self):
+        pool = AtlasSessionPool(max_idle=1, idle_timeout=60, max_lifetime=600)
+        first, second = pool.acquire('key'), pool.acquire('key')
+        pool.release('key', first)
+        pool.release('key', second)
+        self.assertEqual(pool.stats()['idle'], 1)
+
+    def test_expired_sessions_are_evicted(self):
+        pool = AtlasSessionPool(max_idle=2, idle_timeout=0, max_lifetime=600)
+        session = pool.acquire('key')
+        pool.release('key', session)
+        self.assertIsNot(pool.acquire('key'), session)
+
+
+class PooledUpstreamTest(AppTestCase):
+
+    def test_sequential_calls_share_one_session(self):
+        before = atlas_session_pool.stats()
+        for i in range(5):
+            response = self.post('/api/get_processor_stats', instance_name=INSTANCE, processor_name=f"proc-{i:05d}")
+            self.assertEqual(response.status_code, 200)
+        after = atlas_session_pool.stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 4)
+
+    def test_streamed_response_returns_its_session(self):
+        before = atlas_session_pool.stats()
+        response = self.post('/api/create_processor', instance_name=INSTANCE,
+                             processor_body={"name": "new-proc", "pipeline": []})
+        self.assertEqual(response.get_json()['name'], 'new-proc')
+        response.close()
+        after = atlas_session_pool.stats()
+        self.assertEqual(after['in_use'], before['in_use'])
+        self.assertEqual(after['evictions'], before['evictions'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,17 +20,168 @@
 # 2. Optionally, create the .env file as described above for HTTPS.
 # 3. Run the script from your terminal: python web_api_client.py
 # 4. Open your web browser and navigate to the URL shown in the terminal.
+#
+# For production, serve the app with gunicorn instead of the built-in
+# development server (see gunicorn.conf.py for the settings):
+#    gunicorn -c gunicorn.conf.py web_api_client:app
 
 import os
+import re
+import copy
+import gzip
 import json
+import uuid
+import time
+import heapq
+import random
+import logging
+import bisect
+import hashlib
+import functools
+import warnings
+import weakref
+import threading
+import itertools
+import contextvars
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPDigestAuth
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, g, request, jsonify, render_template_string
+from flask.json.provider import DefaultJSONProvider
 from dotenv import load_dotenv, find_dotenv
+from session_store import (METRICS_PUSH_INTERVAL, SESSION_IDLE_TIMEOUT, SESSION_MAX_ENTRIES, SESSION_MAX_LIFETIME,
+                           SessionStoreUnavailable, connect_invalidation_log, connect_metrics_board,
+                           connect_processor_pollers, connect_session_store, connect_stats_samplers)
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available.
+    brotli = None
 
 # --- Flask App Initialization ---
 app = Flask(__name__)
 
+# --- Configuration ---
+# Tuning settings are read from the environment. The .env file is loaded here
+# (not only in the main block) so the settings apply under any server.
+load_dotenv(find_dotenv(usecwd=True))
+
+def env_int(name, default):
+    """Reads an integer setting from the environment, falling back to a default."""
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+def env_float(name, default):
+    """Reads a float setting from the environment, falling back to a default."""
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+# Scheme used to reach the Atlas API; "http" is only meant for local mocks such as bench/mock_atlas.py.
+ATLAS_API_SCHEME = os.getenv('ATLAS_API_SCHEME', 'https')
+# Idle keep-alive sessions kept per (atlas_host, public_key).
+ATLAS_POOL_SIZE = env_int('ATLAS_POOL_SIZE', 10)
+# Seconds an idle session may sit in the pool before it is closed.
+ATLAS_POOL_IDLE_TIMEOUT = env_float('ATLAS_POOL_IDLE_TIMEOUT', 60)
+# Seconds after which a session is retired even if it is still in use.
+ATLAS_POOL_MAX_LIFETIME = env_float('ATLAS_POOL_MAX_LIFETIME', 600)
+# Items requested per page from Atlas list endpoints (Atlas allows up to 500).
+ATLAS_PAGE_SIZE = env_int('ATLAS_PAGE_SIZE', 100)
+# Concurrent page fetches per listing once the first page reports totalCount.
+ATLAS_PAGE_WORKERS = env_int('ATLAS_PAGE_WORKERS', 4)
+# Bytes per chunk when streaming Atlas response bodies through to the client.
+PASSTHROUGH_CHUNK_SIZE = env_int('PASSTHROUGH_CHUNK_SIZE', 64 * 1024)
+# Upper bound on concurrent Atlas calls made by one bulk processor action.
+BULK_MAX_PARALLEL = env_int('BULK_MAX_PARALLEL', 8)
+# Concurrent instance listings fetched by /api/inventory.
+INVENTORY_MAX_PARALLEL = env_int('INVENTORY_MAX_PARALLEL', 8)
+# Default seconds between background stats samples, and the smallest interval allowed.
+STATS_SAMPLER_INTERVAL = env_float('STATS_SAMPLER_INTERVAL', 10)
+STATS_SAMPLER_MIN_INTERVAL = env_float('STATS_SAMPLER_MIN_INTERVAL', 2)
+# Samples kept per processor (the ring buffer size).
+STATS_SAMPLER_CAPACITY = env_int('STATS_SAMPLER_CAPACITY', 720)
+# Limits on concurrently running samplers and processors sampled by each.
+STATS_SAMPLER_MAX_INSTANCES = env_int('STATS_SAMPLER_MAX_INSTANCES', 16)
+STATS_SAMPLER_MAX_PROCESSORS = env_int('STATS_SAMPLER_MAX_PROCESSORS', 200)
+# Concurrent stats requests made by one sampling round.
+STATS_SAMPLER_MAX_PARALLEL = env_int('STATS_SAMPLER_MAX_PARALLEL', 8)
+# A sampler whose history nobody has read for this many seconds stops itself.
+STATS_SAMPLER_IDLE_TIMEOUT = env_float('STATS_SAMPLER_IDLE_TIMEOUT', 3600)
+# Concurrent stats requests and processor limit of one /api/instance_stats_summary call.
+SUMMARY_MAX_PARALLEL = env_int('SUMMARY_MAX_PARALLEL', 8)
+SUMMARY_MAX_PROCESSORS = env_int('SUMMARY_MAX_PROCESSORS', 2000)
+# Longest top-N list a summary returns per ranking.
+SUMMARY_MAX_TOP_N = env_int('SUMMARY_MAX_TOP_N', 100)
+# Seconds a summary's stats table is kept to compute rates for the next summary.
+SUMMARY_RATE_WINDOW = env_float('SUMMARY_RATE_WINDOW', 900)
+# Seconds between server-side polls feeding /api/stream/processors.
+STREAM_POLL_INTERVAL = env_float('STREAM_POLL_INTERVAL', 5)
+# Seconds between keep-alive comments on an idle event stream.
+STREAM_HEARTBEAT_INTERVAL = env_float('STREAM_HEARTBEAT_INTERVAL', 15)
+# Events buffered per slow client before it is sent a full snapshot instead.
+STREAM_QUEUE_SIZE = env_int('STREAM_QUEUE_SIZE', 100)
+# Credentials whose digest challenge state is remembered between requests.
+DIGEST_AUTH_CACHE_SIZE = env_int('DIGEST_AUTH_CACHE_SIZE', 256)
+# Sustained Atlas calls per second and burst size allowed per (atlas_host, project); 0 disables the limit.
+ATLAS_RATE_LIMIT_PER_SECOND = env_float('ATLAS_RATE_LIMIT_PER_SECOND', 10)
+ATLAS_RATE_LIMIT_BURST = env_int('ATLAS_RATE_LIMIT_BURST', 20)
+# Worker processes of the server, set by gunicorn.conf.py and asgi.py. The buckets are per
+# process, so each worker gets an equal share of the rate and burst.
+SERVER_WORKERS = max(1, env_int('SERVER_WORKERS', 1))
+# Longest a call may queue for its project's rate limit before failing with 503.
+SCHEDULER_MAX_WAIT = env_float('SCHEDULER_MAX_WAIT', 60)
+# Retries of a call rejected with 429, and the backoff used when Atlas sends no Retry-After.
+ATLAS_MAX_RETRIES = env_int('ATLAS_MAX_RETRIES', 3)
+ATLAS_RETRY_BASE_DELAY = env_float('ATLAS_RETRY_BASE_DELAY', 1)
+ATLAS_RETRY_MAX_BACKOFF = env_float('ATLAS_RETRY_MAX_BACKOFF', 30)
+# A 429 asking to wait longer than this is returned to the caller instead of retried.
+ATLAS_RETRY_MAX_DELAY = env_float('ATLAS_RETRY_MAX_DELAY', 60)
+# Maximum number of cached GET responses (least recently used are evicted).
+CACHE_MAX_ENTRIES = env_int('CACHE_MAX_ENTRIES', 1024)
+# Per-route cache lifetimes in seconds; 0 disables caching for that route.
+CACHE_TTL_PROCESSORS = env_float('CACHE_TTL_PROCESSORS', 5)
+CACHE_TTL_PROCESSOR_STATS = env_float('CACHE_TTL_PROCESSOR_STATS', 2)
+CACHE_TTL_CONNECTIONS = env_float('CACHE_TTL_CONNECTIONS', 30)
+CACHE_TTL_CONNECTION_DETAILS = env_float('CACHE_TTL_CONNECTION_DETAILS', 30)
+CACHE_TTL_SPIS = env_float('CACHE_TTL_SPIS', 30)
+# Seconds past expiry a cached listing may still be served under stale-while-revalidate.
+SWR_MAX_STALE = env_float('SWR_MAX_STALE', 300)
+# Background workers refreshing stale cache entries.
+SWR_WORKERS = env_int('SWR_WORKERS', 4)
+# Seconds a "wait_for_revalidation" request waits for the background refresh.
+SWR_WAIT_TIMEOUT = env_float('SWR_WAIT_TIMEOUT', 30)
+# Seconds a credential that Atlas accepted may be served cached responses for its project.
+CACHE_AUTH_TTL = env_float('CACHE_AUTH_TTL', 300)
+# Seconds a worker reuses a login session's credentials before asking the session store again.
+SESSION_CACHE_TTL = env_float('SESSION_CACHE_TTL', 5)
+# Adds a Server-Timing header (parse/queue/digest/upstream/decode/serialize) to every response.
+SERVER_TIMING_ENABLED = env_int('SERVER_TIMING_ENABLED', 1)
+# Fraction of requests (0 to 1) logged as structured JSON trace lines with their spans.
+TRACE_SAMPLE_RATE = env_float('TRACE_SAMPLE_RATE', 0)
+# Largest listing an NDJSON stream holds on to so it can cache it; bigger ones keep only the
+# entries' hashes and are not cached.
+CACHE_STREAMED_MAX_ENTRIES = env_int('CACHE_STREAMED_MAX_ENTRIES', 5000)
+# Listing versions remembered for since= diffs (entry hashes, not the entries themselves).
+LISTING_SNAPSHOTS = env_int('LISTING_SNAPSHOTS', 128)
+# Longest "name_regex" a listing or bulk filter may use.
+LISTING_REGEX_MAX_LENGTH = env_int('LISTING_REGEX_MAX_LENGTH', 200)
+# Compiled "fields" projections kept for reuse.
+PROJECTION_CACHE_SIZE = env_int('PROJECTION_CACHE_SIZE', 256)
+# Operations accepted in one /api/batch call, and how many of them run at once.
+BATCH_MAX_OPERATIONS = env_int('BATCH_MAX_OPERATIONS', 50)
+BATCH_MAX_PARALLEL = env_int('BATCH_MAX_PARALLEL', 8)
+# Atlas calls all operations of one /api/batch call may make together.
+BATCH_MAX_UPSTREAM_CALLS = env_int('BATCH_MAX_UPSTREAM_CALLS', 100)
+
 # --- HTML & JavaScript Template ---
 # This single string contains the entire frontend for our web application.
 HTML_TEMPLATE = """
@@ -109,6 +260,9 @@ HTML_TEMPLATE = """
         #deleteSpiBtn:hover { background-color: #c62828; }
         #clearBtn { background-color: #607D8B; color: white; }
         #clearBtn:hover { background-color: #546E7A; }
+        #liveBtn { background-color: #3F51B5; color: white; }
+        #liveBtn:hover { background-color: #303F9F; }
+        #liveBtn.live-on { background-color: #E91E63; }
         #output { margin-top: 25px; }
         .spinner {
             border: 4px solid rgba(0, 0, 0, 0.1); width: 36px; height: 36px;
@@ -139,12 +293,31 @@ HTML_TEMPLATE = """
         .stop-btn { background-color: #f44336; }
         .delete-btn { background-color: #607D8B; }
         .stats-btn, .view-btn { background-color: #FFC107; }
+        .select-cell { width: 1%; text-align: center !important; }
+
+        #bulkActions {
+            display: none; flex-wrap: wrap; align-items: center; gap: 10px; margin-top: 20px;
+        }
+        #bulkActions input[type="search"], #bulkActions select {
+            padding: 8px; border: 1px solid #dddfe2; border-radius: 6px; font-size: 14px;
+        }
+        #bulkActions input[type="search"] { flex-basis: 220px; }
+        #processorsViewport { max-height: 70vh; overflow-y: auto; margin-top: 20px; }
+        #processorsViewport .results-table { margin-top: 0; }
+        #processorsViewport thead th { position: sticky; top: 0; z-index: 1; }
+        .spacer-row td { padding: 0 !important; border: none !important; }
+        #bulkActions span { flex-grow: 1; font-weight: 600; color: #606770; }
+        #bulkActions .action-btn { padding: 8px 14px; font-size: 14px; }
 
         #errorMessage {
             color: #d32f2f; background-color: #ffcdd2; border: 1px solid #d32f2f;
             padding: 15px; border-radius: 6px; margin-top: 20px;
             display: none; white-space: pre-wrap; font-family: "Courier New", Courier, monospace;
         }
+        #cacheStatus {
+            color: #606770; background-color: #fff8e1; border: 1px solid #FFC107;
+            padding: 8px 15px; border-radius: 6px; margin-top: 20px; display: none;
+        }
         /* Modal Styles */
         .modal {
             display: none; position: fixed; z-index: 1000; left: 0; top: 0;
@@ -170,6 +343,10 @@ HTML_TEMPLATE = """
             font-family: "Courier New", Courier, monospace;
         }
         .modal-error-message { color: #d32f2f; margin-bottom: 10px; }
+        #statsHistory { display: none; margin-bottom: 15px; }
+        #statsRates { font-weight: 600; color: #606770; margin-bottom: 5px; }
+        #statsSparkline { width: 100%; height: 60px; background-color: #f9f9f9; border: 1px solid #ddd; border-radius: 6px; }
+        #statsSparkline polyline { fill: none; stroke: #00684a; stroke-width: 1.5; }
         input[type="file"] { display: none; }
     </style>
 </head>
@@ -214,6 +391,7 @@ HTML_TEMPLATE = """
                     </div>
                     <div class="button-row">
                         <button type="button" id="clearBtn">Clear Output</button>
+                        <button type="button" id="liveBtn">Live Updates: Off</button>
                         <button type="button" id="deleteSpiBtn">Delete SPI</button>
                     </div>
                 </div>
@@ -222,6 +400,7 @@ HTML_TEMPLATE = """
         <div id="output">
             <div id="spinner" class="spinner"></div>
             <div id="errorMessage"></div>
+            <div id="cacheStatus"></div>
             <table id="spisTable" class="results-table" style="display:none;">
                 <thead>
                     <tr>
@@ -243,16 +422,40 @@ HTML_TEMPLATE = """
                 </thead>
                 <tbody id="connectionsBody"></tbody>
             </table>
-            <table id="processorsTable" class="results-table" style="display:none;">
-                <thead>
-                    <tr>
-                        <th>Processor Name</th>
-                        <th>State</th>
-                        <th style="text-align: center;">Actions</th>
-                    </tr>
-                </thead>
-                <tbody id="processorsBody"></tbody>
-            </table>
+            <div id="bulkActions">
+                <input type="search" id="processorFilter" placeholder="Name prefix, or /regex/">
+                <select id="processorStateFilter" title="Filter by state">
+                    <option value="">All states</option>
+                    <option value="CREATED">CREATED</option>
+                    <option value="STARTED">STARTED</option>
+                    <option value="STOPPED">STOPPED</option>
+                    <option value="FAILED">FAILED</option>
+                </select>
+                <select id="processorSort" title="Sort order">
+                    <option value="name">Name (A-Z)</option>
+                    <option value="-name">Name (Z-A)</option>
+                    <option value="state">State</option>
+                </select>
+                <span id="bulkStatus">0 selected</span>
+                <button type="button" class="action-btn start-btn" data-bulk-action="start">Start Selected</button>
+                <button type="button" class="action-btn stop-btn" data-bulk-action="stop">Stop Selected</button>
+                <button type="button" class="action-btn delete-btn" data-bulk-action="delete">Delete Selected</button>
+            </div>
+            <div id="processorsViewport">
+                <table id="processorsTable" class="results-table" style="display:none;">
+                    <thead>
+                        <tr>
+                            <th class="select-cell"><input type="checkbox" id="selectAllProcessors" title="Select all"></th>
+                            <th>Processor Name</th>
+                            <th>State</th>
+                            <th style="text-align: center;">Actions</th>
+                        </tr>
+                    </thead>
+                    <tbody id="processorsTopSpacer" class="spacer-row"><tr><td colspan="4"></td></tr></tbody>
+                    <tbody id="processorsBody"></tbody>
+                    <tbody id="processorsBottomSpacer" class="spacer-row"><tr><td colspan="4"></td></tr></tbody>
+                </table>
+            </div>
         </div>
     </div>
 
@@ -327,8 +530,16 @@ HTML_TEMPLATE = """
     <div id="statsModal" class="modal">
         <div class="modal-content">
             <div class="modal-header"><h2 id="statsModalTitle">Processor Stats</h2></div>
-            <div class="modal-body"><pre id="statsJsonOutput" class="json-output"></pre></div>
+            <div class="modal-body">
+                <div id="statsHistory">
+                    <div id="statsRates"></div>
+                    <svg id="statsSparkline" viewBox="0 0 300 60" preserveAspectRatio="none"><polyline points=""></polyline></svg>
+                </div>
+                <pre id="statsJsonOutput" class="json-output"></pre>
+            </div>
             <div class="modal-footer">
+                <button type="button" id="sampleStatsBtn">Sample Throughput</button>
+                <button type="button" id="fullStatsBtn">Show Full Document</button>
                 <button type="button" id="copyStatsBtn">Copy</button>
                 <button type="button" class="cancel-btn">Close</button>
             </div>
@@ -352,12 +563,35 @@ HTML_TEMPLATE = """
         const apiForm = document.getElementById('apiForm');
         const processorsTable = document.getElementById('processorsTable');
         const processorsBody = document.getElementById('processorsBody');
+        const processorsViewport = document.getElementById('processorsViewport');
+        const processorsTopSpacer = document.querySelector('#processorsTopSpacer td');
+        const processorsBottomSpacer = document.querySelector('#processorsBottomSpacer td');
+        const processorFilter = document.getElementById('processorFilter');
+        const processorStateFilter = document.getElementById('processorStateFilter');
+        const processorSort = document.getElementById('processorSort');
+        const bulkActions = document.getElementById('bulkActions');
+        const bulkStatus = document.getElementById('bulkStatus');
+        const selectAllProcessors = document.getElementById('selectAllProcessors');
         const connectionsTable = document.getElementById('connectionsTable');
         const connectionsBody = document.getElementById('connectionsBody');
         const spisTable = document.getElementById('spisTable');
         const spisBody = document.getElementById('spisBody');
         const spinner = document.getElementById('spinner');
         const errorMessage = document.getElementById('errorMessage');
+        const cacheStatus = document.getElementById('cacheStatus');
+        // Incremented by every listing so late background refreshes don't repaint another view.
+        let listingGeneration = 0;
+        // Version token of the rows shown per listing endpoint, so refreshes only fetch what changed.
+        const listingVersions = {};
+        // The processor table is virtualized: processorItems holds the whole (filtered, sorted)
+        // listing and only the rows scrolled into view exist in the DOM.
+        let processorItems = [];
+        let processorTotal = 0;
+        const selectedProcessors = new Set();
+        let processorRowHeight = 0;
+        let processorRenderQueued = false;
+        let processorFilterTimer = null;
+        const VIRTUAL_OVERSCAN = 10;
         
         const loadConfigModal = document.getElementById('loadConfigModal');
         const createProcessorModal = document.getElementById('createProcessorModal');
@@ -375,6 +609,14 @@ HTML_TEMPLATE = """
         const statsModal = document.getElementById('statsModal');
         const statsJsonOutput = document.getElementById('statsJsonOutput');
         const statsModalTitle = document.getElementById('statsModalTitle');
+        const statsHistory = document.getElementById('statsHistory');
+        const statsRates = document.getElementById('statsRates');
+        const statsSparkline = document.querySelector('#statsSparkline polyline');
+        const fullStatsBtn = document.getElementById('fullStatsBtn');
+        const liveBtn = document.getElementById('liveBtn');
+        let liveStream = null;
+        let statsProcessorName = null;
+        let statsHistoryTimer = null;
         
         const connectionDetailsModal = document.getElementById('connectionDetailsModal');
         const connectionJsonOutput = document.getElementById('connectionJsonOutput');
@@ -390,6 +632,51 @@ HTML_TEMPLATE = """
                 atlas_host: document.getElementById('atlasHost').value
             };
         }
+
+        // Keys are exchanged once for a session token; API calls then send only the token.
+        let session = null;
+
+        // Logs in with the form's keys unless a session for them exists; resolves to { token } or the failed { response }.
+        function ensureSession(credentials) {
+            const scope = [credentials.atlas_host, credentials.project_id, credentials.public_key, credentials.private_key].join('|');
+            if (!session || session.scope !== scope) {
+                const current = { scope };
+                current.login = fetch('/api/login', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify(credentials)
+                }).then(async response => {
+                    if (response.ok) return { token: (await response.json()).session_token };
+                    if (session === current) session = null;
+                    return { response };
+                }, error => {
+                    if (session === current) session = null;
+                    throw error;
+                });
+                session = current;
+            }
+            return session.login;
+        }
+
+        // POSTs to an API route with the session token, logging in first, and once more if the session expired.
+        async function postApi(endpoint, payload, options = {}) {
+            const credentials = getFormCredentials();
+            for (let attempt = 0; ; attempt++) {
+                const login = ensureSession(credentials);
+                const { token, response: failedLogin } = await login;
+                if (!token) return failedLogin;
+                const response = await fetch(endpoint, {
+                    ...options,
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json', ...options.headers, 'Authorization': `Bearer ${token}` },
+                    body: JSON.stringify({ instance_name: credentials.instance_name, ...payload })
+                });
+                if (response.status !== 401 || attempt > 0) return response;
+                const result = await response.clone().json().catch(() => ({}));
+                if (!result.session_expired) return response;
+                if (session && session.login === login) session = null;
+            }
+        }
         
         function handleApiError(result, errorElement) {
             let errorText = 'Error: ' + (result.error || 'Unknown server error');
@@ -406,12 +693,337 @@ HTML_TEMPLATE = """
 
         function clearOutput() {
             processorsTable.style.display = 'none';
-            processorsBody.innerHTML = '';
+            clearProcessorRows();
+            bulkActions.style.display = 'none';
             connectionsTable.style.display = 'none';
             connectionsBody.innerHTML = '';
             spisTable.style.display = 'none';
             spisBody.innerHTML = '';
             errorMessage.style.display = 'none';
+            cacheStatus.style.display = 'none';
+            listingGeneration++;
+            stopLiveUpdates();
+        }
+
+        // Hides every results table except the given one, whose rows are kept for in-place updates.
+        function hideTablesExcept(visibleTable) {
+            [processorsTable, connectionsTable, spisTable].forEach(table => {
+                if (table !== visibleTable) {
+                    table.style.display = 'none';
+                    if (table === processorsTable) {
+                        clearProcessorRows();
+                    } else {
+                        table.tBodies[0].innerHTML = '';
+                    }
+                }
+            });
+            if (visibleTable !== processorsTable) {
+                bulkActions.style.display = 'none';
+                stopLiveUpdates();
+            }
+            errorMessage.style.display = 'none';
+            cacheStatus.style.display = 'none';
+            return ++listingGeneration;
+        }
+
+        // Updates a table body to match items (keyed by name), reusing existing rows.
+        function reconcileRows(tbody, items, renderRow) {
+            const existing = new Map();
+            Array.from(tbody.rows).forEach(row => existing.set(row.dataset.name, row));
+            items.forEach((item, index) => {
+                let row = existing.get(item.name);
+                if (row) {
+                    existing.delete(item.name);
+                } else {
+                    row = document.createElement('tr');
+                    row.dataset.name = item.name;
+                }
+                renderRow(row, item);
+                if (tbody.rows[index] !== row) {
+                    tbody.insertBefore(row, tbody.rows[index] || null);
+                }
+            });
+            existing.forEach(row => row.remove());
+        }
+
+        function renderProcessorRow(row, processor) {
+            if (row.cells.length === 0) {
+                const selectCell = row.insertCell(0);
+                selectCell.className = 'select-cell';
+                selectCell.innerHTML = `<input type="checkbox" class="select-processor" data-name="${processor.name}">`;
+                row.insertCell(1).textContent = processor.name;
+                row.insertCell(2);
+                const actionsCell = row.insertCell(3);
+                actionsCell.className = 'actions-cell';
+                actionsCell.innerHTML = `
+                    <button class="action-btn start-btn" data-name="${processor.name}" data-action="start">Start</button>
+                    <button class="action-btn stop-btn" data-name="${processor.name}" data-action="stop">Stop</button>
+                    <button class="action-btn stats-btn" data-name="${processor.name}" data-action="stats">Stats</button>
+                    <button class="action-btn delete-btn" data-name="${processor.name}" data-action="delete">Delete</button>
+                `;
+            }
+            row.cells[0].firstElementChild.checked = selectedProcessors.has(processor.name);
+            const stateCell = row.cells[2];
+            stateCell.textContent = processor.state;
+            stateCell.className = `state-${processor.state}`;
+        }
+
+        function renderConnectionRow(row, connection) {
+            if (row.cells.length === 0) {
+                row.insertCell(0).textContent = connection.name;
+                row.insertCell(1);
+                const actionsCell = row.insertCell(2);
+                actionsCell.className = 'actions-cell';
+                actionsCell.innerHTML = `
+                    <button class="action-btn view-btn" data-name="${connection.name}" data-action="view">View</button>
+                    <button class="action-btn delete-btn" data-name="${connection.name}" data-action="delete">Delete</button>
+                `;
+            }
+            row.cells[1].textContent = connection.type;
+        }
+
+        // Patches rows in place from a since= diff; added rows go to the end of the table.
+        function applyRowDiff(tbody, diff, renderRow) {
+            const rows = new Map(Array.from(tbody.rows).map(row => [row.dataset.name, row]));
+            diff.removed.forEach(name => {
+                const row = rows.get(name);
+                if (row) row.remove();
+            });
+            diff.changed.concat(diff.added).forEach(item => {
+                let row = rows.get(item.name);
+                if (!row) {
+                    row = tbody.insertRow();
+                    row.dataset.name = item.name;
+                }
+                renderRow(row, item);
+            });
+        }
+
+        function listingScope(query) {
+            const credentials = getFormCredentials();
+            return [credentials.atlas_host, credentials.project_id, credentials.instance_name, credentials.public_key,
+                JSON.stringify(query || null)].join('|');
+        }
+
+        // Returns the version the shown rows are at, if they belong to the current form values and query.
+        function listingSince(endpoint, hasRows, query) {
+            const known = listingVersions[endpoint];
+            return known && known.scope === listingScope(query) && hasRows ? known.version : undefined;
+        }
+
+        function rememberListingVersion(endpoint, result, query) {
+            if (result.version) {
+                listingVersions[endpoint] = { scope: listingScope(query), version: result.version };
+            } else {
+                delete listingVersions[endpoint];
+            }
+        }
+
+        function showListing(result, table, tbody, renderRow, emptyMessage) {
+            if (result.results) {
+                reconcileRows(tbody, result.results, renderRow);
+            } else {
+                applyRowDiff(tbody, result, renderRow);
+            }
+            if (tbody.rows.length > 0) {
+                table.style.display = 'table';
+            } else {
+                table.style.display = 'none';
+                tbody.innerHTML = '';
+                errorMessage.textContent = emptyMessage;
+                errorMessage.style.display = 'block';
+            }
+        }
+
+        // The filter and sort sent to /api/fetch_data; "/.../" in the filter box is a regex.
+        function processorQuery() {
+            const text = processorFilter.value.trim();
+            const filter = {};
+            if (text.length > 2 && text.startsWith('/') && text.endsWith('/')) {
+                filter.name_regex = text.slice(1, -1);
+            } else if (text) {
+                filter.name_prefix = text;
+            }
+            if (processorStateFilter.value) filter.state = processorStateFilter.value;
+            return { filter, sort: processorSort.value };
+        }
+
+        function processorFilterActive() {
+            return Object.keys(processorQuery().filter).length > 0;
+        }
+
+        // Orders processors like the server does: missing values last, ties broken by name.
+        function compareProcessors(sort) {
+            const field = sort.replace(/^-/, '');
+            const direction = sort.startsWith('-') ? -1 : 1;
+            const compareText = (a, b) => (a < b ? -1 : a > b ? 1 : 0);
+            return (a, b) => {
+                const aMissing = a[field] === undefined || a[field] === null;
+                const bMissing = b[field] === undefined || b[field] === null;
+                if (aMissing !== bMissing) return aMissing - bMissing;
+                const result = aMissing ? 0 : direction * compareText(String(a[field]), String(b[field]));
+                return result || compareText(a.name, b.name);
+            };
+        }
+
+        function clearProcessorRows() {
+            processorItems = [];
+            processorTotal = 0;
+            selectedProcessors.clear();
+            processorsBody.innerHTML = '';
+            processorsTopSpacer.style.height = '0px';
+            processorsBottomSpacer.style.height = '0px';
+        }
+
+        // Renders only the processor rows in (or near) the scrolled viewport; spacers stand in for the rest.
+        function renderProcessorWindow() {
+            processorRenderQueued = false;
+            const rowHeight = processorRowHeight || 45;
+            const viewHeight = Math.max(processorsViewport.clientHeight, window.innerHeight);
+            let first = Math.max(0, Math.floor(processorsViewport.scrollTop / rowHeight) - VIRTUAL_OVERSCAN);
+            first -= first % 2;  // An even start keeps the zebra striping steady while scrolling.
+            const visible = processorItems.slice(first, first + Math.ceil(viewHeight / rowHeight) + 2 * VIRTUAL_OVERSCAN);
+            reconcileRows(processorsBody, visible, renderProcessorRow);
+            processorsTopSpacer.style.height = `${first * rowHeight}px`;
+            processorsBottomSpacer.style.height = `${(processorItems.length - first - visible.length) * rowHeight}px`;
+            if (!processorRowHeight && processorsBody.rows.length > 0 && processorsBody.rows[0].offsetHeight > 0) {
+                processorRowHeight = processorsBody.rows[0].offsetHeight;
+                scheduleProcessorRender();
+            }
+        }
+
+        function scheduleProcessorRender() {
+            if (processorRenderQueued) return;
+            processorRenderQueued = true;
+            requestAnimationFrame(renderProcessorWindow);
+        }
+
+        // Shows the rows of a processor listing that is still streaming in, merged into sorted order.
+        function previewProcessors(shown, rows) {
+            const compare = compareProcessors(processorSort.value);
+            rows = rows.slice().sort(compare);
+            const merged = [];
+            let i = 0, j = 0;
+            while (i < shown.length && j < rows.length) {
+                merged.push(compare(shown[i], rows[j]) <= 0 ? shown[i++] : rows[j++]);
+            }
+            processorItems = merged.concat(shown.slice(i), rows.slice(j));
+            processorTotal = processorItems.length;
+            processorsTable.style.display = 'table';
+            bulkStatus.textContent = `Loading... ${processorItems.length} processors so far`;
+            scheduleProcessorRender();
+            return processorItems;
+        }
+
+        // Shows a full processor listing, or applies a since= diff to the one shown.
+        function showProcessors(result) {
+            if (result.results) {
+                processorItems = result.results.slice();
+            } else {
+                const removed = new Set(result.removed);
+                const changed = new Map(result.changed.map(item => [item.name, item]));
+                processorItems = processorItems.filter(item => !removed.has(item.name))
+                    .map(item => changed.get(item.name) || item);
+                const known = new Set(processorItems.map(item => item.name));
+                result.added.forEach(item => { if (!known.has(item.name)) processorItems.push(item); });
+            }
+            processorItems.sort(compareProcessors(processorSort.value));
+            processorTotal = result.totalCount ?? processorItems.length;
+            const names = new Set(processorItems.map(item => item.name));
+            selectedProcessors.forEach(name => { if (!names.has(name)) selectedProcessors.delete(name); });
+
+            if (processorItems.length > 0) {
+                processorsTable.style.display = 'table';
+            } else {
+                processorsTable.style.display = 'none';
+                errorMessage.textContent = processorFilterActive()
+                    ? 'No stream processors match the filter.'
+                    : 'API returned successfully, but no stream processors were found.';
+                errorMessage.style.display = 'block';
+            }
+            bulkActions.style.display = 'flex';
+            renderProcessorWindow();
+            rememberListingVersion('/api/fetch_data', result, processorQuery());
+            updateSelectionCount();
+        }
+
+        function selectedProcessorNames() {
+            return Array.from(selectedProcessors);
+        }
+
+        function updateSelectionCount() {
+            const selected = selectedProcessors.size;
+            const total = processorItems.length;
+            const shown = total === processorTotal ? `${total} processors` : `${total} of ${processorTotal} processors`;
+            bulkStatus.textContent = `${selected} selected, ${shown}`;
+            selectAllProcessors.checked = total > 0 && selected === total;
+            selectAllProcessors.indeterminate = selected > 0 && selected < total;
+        }
+
+        // Reads a newline-delimited JSON response, calling onRecord for each line as it arrives
+        // and onChunk after each chunk of lines.
+        async function readNdjson(response, onRecord, onChunk = () => {}) {
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffered += decoder.decode(value, { stream: true });
+                const lines = buffered.split('\\n');
+                buffered = lines.pop();
+                lines.filter(line => line.trim()).forEach(line => onRecord(JSON.parse(line)));
+                onChunk();
+            }
+            if (buffered.trim()) onRecord(JSON.parse(buffered));
+        }
+
+        // Reads a listing response, JSON or NDJSON, passing streamed rows to onRows a chunk at a time.
+        // Resolves to { ok, result } with result shaped like the JSON response; a stream whose
+        // "_meta" line reports an error (or is missing) is not ok.
+        async function readListing(response, onRows) {
+            const ndjson = (response.headers.get('Content-Type') || '').startsWith('application/x-ndjson');
+            if (!response.ok || !ndjson) return { ok: response.ok, result: await response.json() };
+            const results = [];
+            let meta = null;
+            let pending = [];
+            await readNdjson(response, record => {
+                if (record._meta) {
+                    meta = record._meta;
+                } else {
+                    results.push(record);
+                    pending.push(record);
+                }
+            }, () => {
+                if (pending.length > 0) onRows(pending);
+                pending = [];
+            });
+            if (!meta || meta.error) return { ok: false, result: meta || { error: 'The listing ended before it was complete.' } };
+            return { ok: true, result: { ...meta, results } };
+        }
+
+        function showConnections(result) {
+            showListing(result, connectionsTable, connectionsBody, renderConnectionRow,
+                'API returned successfully, but no connections were found.');
+            rememberListingVersion('/api/list_connections', result);
+        }
+
+        // When the server answered from a stale cache entry, waits for its background refresh and repaints in place.
+        async function awaitRevalidation(response, endpoint, generation, render, query = {}) {
+            if (response.headers.get('X-Cache-Revalidating') !== '1') return;
+            cacheStatus.textContent = `Showing cached data from ${response.headers.get('Age')}s ago, refreshing...`;
+            cacheStatus.style.display = 'block';
+            try {
+                const freshResponse = await postApi(endpoint, { ...query, wait_for_revalidation: true });
+                const result = await freshResponse.json();
+                if (freshResponse.ok && generation === listingGeneration) {
+                    render(result);
+                }
+            } catch (error) {
+                console.error('Background refresh failed: ', error);
+            } finally {
+                if (generation === listingGeneration) cacheStatus.style.display = 'none';
+            }
         }
 
         function parseAndPopulateConfig(configText) {
@@ -441,85 +1053,111 @@ HTML_TEMPLATE = """
                 }
             });
             loadConfigModal.style.display = 'none';
+            bootstrapPage();
+        }
+
+        // Listing responses fetched ahead by bootstrapPage(), by endpoint.
+        const prefetchedResponses = {};
+        const PREFETCH_MAX_AGE_MS = 30000;
+
+        // Fetches the processor, connection and stream instance listings in one /api/batch round trip,
+        // then shows the processors; the other two answer the first click on their buttons.
+        async function bootstrapPage() {
+            const requests = [
+                ['/api/fetch_data', { ...processorQuery(), stale_while_revalidate: true }],
+                ['/api/list_connections', { stale_while_revalidate: true }],
+                ['/api/list_spis', {}]
+            ];
+            spinner.style.display = 'block';
+            try {
+                const response = await postApi('/api/batch', {
+                    operations: requests.map(([endpoint, payload]) => ({ ...payload, op: endpoint.slice('/api/'.length) }))
+                });
+                if (response.ok) {
+                    const credentials = getFormCredentials();
+                    const { results } = await response.json();
+                    // A listing the batch ran out of Atlas calls for is fetched on its own later.
+                    results.filter(record => record.status !== 429).forEach(record => {
+                        const [endpoint, payload] = requests[record.index];
+                        prefetchedResponses[endpoint] = { key: JSON.stringify([credentials, payload]), fetchedAt: Date.now(), record };
+                    });
+                }
+            } catch (error) {
+                console.error('Page bootstrap failed: ', error);
+            }
+            await listProcessors();
+        }
+
+        // Answers once from a listing bootstrapPage() fetched for the same request and credentials while it is fresh,
+        // and POSTs otherwise.
+        function prefetchedOrPost(endpoint, payload, options = {}) {
+            const entry = prefetchedResponses[endpoint];
+            delete prefetchedResponses[endpoint];
+            if (entry && entry.key === JSON.stringify([getFormCredentials(), payload]) && Date.now() - entry.fetchedAt < PREFETCH_MAX_AGE_MS) {
+                const { status, headers, body } = entry.record;
+                return Promise.resolve(new Response(JSON.stringify(body), {
+                    status,
+                    headers: { 'Content-Type': 'application/json', ...headers }
+                }));
+            }
+            return postApi(endpoint, payload, options);
         }
 
         // --- Core API Functions ---
         async function listProcessors() {
             spinner.style.display = 'block';
-            clearOutput();
+            try {
+                await loadProcessors(hideTablesExcept(processorsTable));
+            } finally {
+                spinner.style.display = 'none';
+            }
+        }
 
+        // Fetches the processor listing for the current filter and sort, as a diff when rows are shown.
+        async function loadProcessors(generation) {
+            const query = processorQuery();
+            const since = listingSince('/api/fetch_data', processorItems.length > 0, query);
             try {
-                const response = await fetch('/api/fetch_data', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(getFormCredentials())
+                // A full listing is streamed so the first rows show before the last page arrives; a diff is small.
+                const options = since ? {} : { headers: { 'Accept': 'application/x-ndjson' } };
+                const response = await prefetchedOrPost('/api/fetch_data', { ...query, stale_while_revalidate: true, since }, options);
+                let shown = [];
+                const { ok, result } = await readListing(response, rows => {
+                    if (generation === listingGeneration) shown = previewProcessors(shown, rows);
                 });
-                const result = await response.json();
-                if (response.ok) {
-                    if (result.results && result.results.length > 0) {
-                        result.results.forEach(processor => {
-                            const row = processorsBody.insertRow();
-                            row.insertCell(0).textContent = processor.name;
-                            const stateCell = row.insertCell(1);
-                            stateCell.textContent = processor.state;
-                            stateCell.className = `state-${processor.state}`;
-                            const actionsCell = row.insertCell(2);
-                            actionsCell.className = 'actions-cell';
-                            actionsCell.innerHTML = `
-                                <button class="action-btn start-btn" data-name="${processor.name}" data-action="start">Start</button>
-                                <button class="action-btn stop-btn" data-name="${processor.name}" data-action="stop">Stop</button>
-                                <button class="action-btn stats-btn" data-name="${processor.name}" data-action="stats">Stats</button>
-                                <button class="action-btn delete-btn" data-name="${processor.name}" data-action="delete">Delete</button>
-                            `;
-                        });
-                        processorsTable.style.display = 'table';
-                    } else {
-                        errorMessage.textContent = 'API returned successfully, but no stream processors were found.';
-                        errorMessage.style.display = 'block';
-                    }
+                if (generation !== listingGeneration) return;
+                if (ok) {
+                    showProcessors(result);
+                    awaitRevalidation(response, '/api/fetch_data', generation, showProcessors, query);
                 } else {
+                    hideTablesExcept(null);
+                    // Keep the filter controls so an invalid filter can be corrected.
+                    if (response.status === 400) bulkActions.style.display = 'flex';
                     handleApiError(result, errorMessage);
                 }
             } catch (error) {
+                hideTablesExcept(null);
                 handleApiError({ error: 'A network or client-side error occurred', details: error.message }, errorMessage);
-            } finally {
-                spinner.style.display = 'none';
             }
         }
 
         async function listConnections() {
             spinner.style.display = 'block';
-            clearOutput();
+            const generation = hideTablesExcept(connectionsTable);
+            const since = listingSince('/api/list_connections', connectionsBody.rows.length > 0);
 
             try {
-                const response = await fetch('/api/list_connections', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(getFormCredentials())
-                });
+                const response = await prefetchedOrPost('/api/list_connections', { stale_while_revalidate: true, since });
                 const result = await response.json();
                 if (response.ok) {
-                    if (result.results && result.results.length > 0) {
-                        result.results.forEach(connection => {
-                            const row = connectionsBody.insertRow();
-                            row.insertCell(0).textContent = connection.name;
-                            row.insertCell(1).textContent = connection.type;
-                            const actionsCell = row.insertCell(2);
-                            actionsCell.className = 'actions-cell';
-                            actionsCell.innerHTML = `
-                                <button class="action-btn view-btn" data-name="${connection.name}" data-action="view">View</button>
-                                <button class="action-btn delete-btn" data-name="${connection.name}" data-action="delete">Delete</button>
-                            `;
-                        });
-                        connectionsTable.style.display = 'table';
-                    } else {
-                        errorMessage.textContent = 'API returned successfully, but no connections were found.';
-                        errorMessage.style.display = 'block';
-                    }
+                    showConnections(result);
+                    awaitRevalidation(response, '/api/list_connections', generation, showConnections);
                 } else {
+                    hideTablesExcept(null);
                     handleApiError(result, errorMessage);
                 }
             } catch (error) {
+                hideTablesExcept(null);
                 handleApiError({ error: 'A network or client-side error occurred', details: error.message }, errorMessage);
             } finally {
                 spinner.style.display = 'none';
@@ -531,11 +1169,7 @@ HTML_TEMPLATE = """
             clearOutput();
 
             try {
-                const response = await fetch('/api/list_spis', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(getFormCredentials())
-                });
+                const response = await prefetchedOrPost('/api/list_spis', {});
                 const result = await response.json();
                 if (response.ok) {
                     if (result.results && result.results.length > 0) {
@@ -576,14 +1210,10 @@ HTML_TEMPLATE = """
             
             spinner.style.display = 'block';
             errorMessage.style.display = 'none';
-            const payload = { ...getFormCredentials(), processor_name: processorName, action: action };
+            const payload = { processor_name: processorName, action: action };
 
             try {
-                const response = await fetch('/api/manage_processor', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(payload)
-                });
+                const response = await postApi('/api/manage_processor', payload);
                 const result = await response.json();
                 if (response.ok) {
                     await listProcessors();
@@ -597,6 +1227,121 @@ HTML_TEMPLATE = """
             }
         }
 
+        // Reads a Server-Sent Events response, calling onEvent(name, data) for each event.
+        async function readEventStream(response, onEvent) {
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffered += decoder.decode(value, { stream: true });
+                const blocks = buffered.split('\\n\\n');
+                buffered = blocks.pop();
+                blocks.forEach(block => {
+                    let eventName = 'message';
+                    const dataLines = [];
+                    block.split('\\n').forEach(line => {
+                        if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+                    });
+                    if (dataLines.length > 0) onEvent(eventName, JSON.parse(dataLines.join('\\n')));
+                });
+            }
+        }
+
+        // Applies a live delta to the shown processors; a filtered view is re-queried from the server instead.
+        function applyProcessorDelta(delta) {
+            if (processorFilterActive()) {
+                loadProcessors(listingGeneration);
+                return;
+            }
+            const current = new Map(processorItems.map(item => [item.name, item]));
+            showProcessors({
+                added: delta.added,
+                removed: delta.removed,
+                changed: delta.changed.filter(change => current.has(change.name))
+                    .map(change => ({ ...current.get(change.name), ...change }))
+            });
+        }
+
+        function stopLiveUpdates() {
+            if (liveStream) liveStream.abort();
+            liveStream = null;
+            liveBtn.textContent = 'Live Updates: Off';
+            liveBtn.classList.remove('live-on');
+        }
+
+        // Subscribes to server-pushed processor changes and patches the table rows in place.
+        async function startLiveUpdates() {
+            await listProcessors();
+            if (processorsTable.style.display === 'none') return;
+            const controller = new AbortController();
+            liveStream = controller;
+            liveBtn.textContent = 'Live Updates: On';
+            liveBtn.classList.add('live-on');
+            try {
+                const response = await postApi('/api/stream/processors', {}, { signal: controller.signal });
+                if (!response.ok) {
+                    handleApiError(await response.json(), errorMessage);
+                    return;
+                }
+                await readEventStream(response, (eventName, payload) => {
+                    if (eventName === 'snapshot') {
+                        if (processorFilterActive()) loadProcessors(listingGeneration);
+                        else showProcessors(payload);
+                    } else if (eventName === 'delta') {
+                        applyProcessorDelta(payload);
+                    } else if (eventName === 'error') {
+                        handleApiError(payload, errorMessage);
+                    }
+                });
+            } catch (error) {
+                if (error.name !== 'AbortError') {
+                    handleApiError({ error: 'The live update stream failed', details: error.message }, errorMessage);
+                }
+            } finally {
+                if (liveStream === controller) stopLiveUpdates();
+            }
+        }
+
+        async function bulkProcessorAction(action) {
+            const names = selectedProcessorNames();
+            if (names.length === 0) {
+                alert('Select one or more processors first.');
+                return;
+            }
+            if (action === 'delete' && !confirm(`Are you sure you want to delete ${names.length} processor(s)? This cannot be undone.`)) return;
+
+            errorMessage.style.display = 'none';
+            let done = 0;
+            const failures = [];
+            bulkStatus.textContent = `${action}: 0 / ${names.length} done`;
+            try {
+                const response = await postApi('/api/bulk_manage_processors', { action: action, processor_names: names },
+                    { headers: { 'Accept': 'application/x-ndjson' } });
+                if (!response.ok) {
+                    handleApiError(await response.json(), errorMessage);
+                    return;
+                }
+                await readNdjson(response, result => {
+                    done++;
+                    if (!result.ok) failures.push(result);
+                    bulkStatus.textContent = `${action}: ${done} / ${names.length} done, ${failures.length} failed`;
+                });
+                if (failures.length > 0) {
+                    handleApiError({
+                        error: `${failures.length} of ${names.length} processor(s) failed to ${action}`,
+                        details: failures.map(f => `${f.processor_name}: ${f.result.error || f.status_code}`).join('\\n')
+                    }, errorMessage);
+                }
+            } catch (error) {
+                handleApiError({ error: 'A network or client-side error occurred', details: error.message }, errorMessage);
+            }
+            await listProcessors();
+            if (failures.length > 0) errorMessage.style.display = 'block';
+        }
+
         async function handleConnectionAction(event) {
             if (!event.target.classList.contains('action-btn')) return;
             const button = event.target;
@@ -608,7 +1353,7 @@ HTML_TEMPLATE = """
             spinner.style.display = 'block';
             errorMessage.style.display = 'none';
             
-            const payload = { ...getFormCredentials(), connection_name: connectionName, action: action };
+            const payload = { connection_name: connectionName, action: action };
 
             try {
                 let endpoint = '';
@@ -620,11 +1365,7 @@ HTML_TEMPLATE = """
                     return;
                 }
 
-                const response = await fetch(endpoint, {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(payload)
-                });
+                const response = await postApi(endpoint, payload);
 
                 const result = await response.json();
 
@@ -646,21 +1387,24 @@ HTML_TEMPLATE = """
             }
         }
         
-        async function getProcessorStats(processorName) {
+        // The stats modal opens on these fields; the pipeline and per-operator stats come with the full document.
+        const STATS_COMPACT_FIELDS = 'name,state,stats,-stats.operatorStats';
+
+        async function getProcessorStats(processorName, full = false) {
             spinner.style.display = 'block';
             errorMessage.style.display = 'none';
-            const payload = { ...getFormCredentials(), processor_name: processorName };
+            const payload = { processor_name: processorName };
+            if (!full) payload.fields = STATS_COMPACT_FIELDS;
 
             try {
-                const response = await fetch('/api/get_processor_stats', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(payload)
-                });
+                const response = await postApi('/api/get_processor_stats', payload);
                 const result = await response.json();
                 if (response.ok) {
+                    if (!full) stopStatsHistory();
+                    statsProcessorName = processorName;
                     statsModalTitle.textContent = `Stats for: ${processorName}`;
                     statsJsonOutput.textContent = JSON.stringify(result, null, 2);
+                    fullStatsBtn.style.display = full ? 'none' : '';
                     statsModal.style.display = 'flex';
                 } else {
                     handleApiError(result, errorMessage);
@@ -672,6 +1416,70 @@ HTML_TEMPLATE = """
             }
         }
         
+        function stopStatsHistory() {
+            clearInterval(statsHistoryTimer);
+            statsHistoryTimer = null;
+            statsHistory.style.display = 'none';
+        }
+
+        function formatRate(rate) {
+            return rate === null || rate === undefined ? '-' : rate.toFixed(1);
+        }
+
+        function renderStatsHistory(history) {
+            const latest = history.latest_rates_per_second;
+            statsRates.textContent = `msg/s in: ${formatRate(latest.inputMessageCount)}, out: ${formatRate(latest.outputMessageCount)}, DLQ: ${formatRate(latest.dlqMessageCount)} (${history.timestamps.length} samples)`;
+            const rates = history.rates_per_second.inputMessageCount;
+            const peak = Math.max(1, ...rates.filter(rate => rate !== null));
+            const step = rates.length > 1 ? 300 / (rates.length - 1) : 0;
+            statsSparkline.setAttribute('points', rates
+                .map((rate, index) => rate === null ? null : `${(index * step).toFixed(1)},${(60 - (rate / peak) * 58).toFixed(1)}`)
+                .filter(point => point !== null)
+                .join(' '));
+            statsHistory.style.display = 'block';
+        }
+
+        // Polls the server-side sampler (not Atlas) while the stats modal stays open.
+        async function refreshStatsHistory() {
+            if (statsModal.style.display === 'none') {
+                stopStatsHistory();
+                return;
+            }
+            let error;
+            try {
+                const response = await postApi('/api/get_stats_history', { processor_names: [statsProcessorName], window_seconds: 600 });
+                const result = await response.json();
+                if (response.ok) {
+                    if (result.processors[statsProcessorName]) {
+                        renderStatsHistory(result.processors[statsProcessorName]);
+                    }
+                    return;
+                }
+                error = result.error || 'Could not load the sampled stats';
+            } catch (e) {
+                error = e.message;
+            }
+            // The sampler is gone (e.g. it stopped after STATS_SAMPLER_IDLE_TIMEOUT); stop polling and say so.
+            clearInterval(statsHistoryTimer);
+            statsHistoryTimer = null;
+            statsRates.textContent = 'Error: ' + error;
+            statsHistory.style.display = 'block';
+        }
+
+        async function startStatsSampling() {
+            const response = await postApi('/api/start_stats_sampler', { processor_names: [statsProcessorName] });
+            const result = await response.json();
+            if (!response.ok) {
+                statsRates.textContent = 'Error: ' + (result.error || 'Could not start sampling');
+                statsHistory.style.display = 'block';
+                return;
+            }
+            statsRates.textContent = 'Sampling started, waiting for samples...';
+            statsHistory.style.display = 'block';
+            clearInterval(statsHistoryTimer);
+            statsHistoryTimer = setInterval(refreshStatsHistory, Math.max(2, result.interval_seconds) * 1000);
+        }
+
         async function deleteSpi() {
             const instanceName = document.getElementById('instanceName').value;
             if (!instanceName) {
@@ -684,14 +1492,9 @@ HTML_TEMPLATE = """
 
             spinner.style.display = 'block';
             errorMessage.style.display = 'none';
-            const payload = getFormCredentials();
 
             try {
-                const response = await fetch('/api/delete_spi', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(payload)
-                });
+                const response = await postApi('/api/delete_spi', {});
                 const result = await response.json();
                 if (response.ok) {
                     alert(`Successfully deleted instance: ${instanceName}`);
@@ -717,9 +1520,44 @@ HTML_TEMPLATE = """
         document.getElementById('deleteSpiBtn').addEventListener('click', deleteSpi);
         
         processorsBody.addEventListener('click', handleProcessorAction);
+        processorsBody.addEventListener('change', (event) => {
+            if (!event.target.classList.contains('select-processor')) return;
+            if (event.target.checked) {
+                selectedProcessors.add(event.target.dataset.name);
+            } else {
+                selectedProcessors.delete(event.target.dataset.name);
+            }
+            updateSelectionCount();
+        });
+        selectAllProcessors.addEventListener('change', () => {
+            if (selectAllProcessors.checked) {
+                processorItems.forEach(item => selectedProcessors.add(item.name));
+            } else {
+                selectedProcessors.clear();
+            }
+            renderProcessorWindow();
+            updateSelectionCount();
+        });
+        processorsViewport.addEventListener('scroll', scheduleProcessorRender);
+        window.addEventListener('resize', scheduleProcessorRender);
+        processorFilter.addEventListener('input', () => {
+            clearTimeout(processorFilterTimer);
+            processorFilterTimer = setTimeout(() => {
+                processorsViewport.scrollTop = 0;
+                listProcessors();
+            }, 300);
+        });
+        [processorStateFilter, processorSort].forEach(control => control.addEventListener('change', () => {
+            processorsViewport.scrollTop = 0;
+            listProcessors();
+        }));
+        bulkActions.querySelectorAll('[data-bulk-action]').forEach(button => {
+            button.addEventListener('click', () => bulkProcessorAction(button.dataset.bulkAction));
+        });
         connectionsBody.addEventListener('click', handleConnectionAction);
 
         document.getElementById('clearBtn').addEventListener('click', clearOutput);
+        liveBtn.addEventListener('click', () => liveStream ? stopLiveUpdates() : startLiveUpdates());
 
         // --- Modal Event Listeners ---
         document.getElementById('loadConfigBtn').addEventListener('click', () => {
@@ -758,13 +1596,9 @@ HTML_TEMPLATE = """
                 handleApiError({ error: 'Invalid JSON', details: e.message }, processorModalError);
                 return;
             }
-            const payload = { ...getFormCredentials(), processor_body: processorBody };
+            const payload = { processor_body: processorBody };
             try {
-                const response = await fetch('/api/create_processor', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(payload)
-                });
+                const response = await postApi('/api/create_processor', payload);
                 const result = await response.json();
                 if (response.ok) {
                     createProcessorModal.style.display = 'none';
@@ -794,13 +1628,9 @@ HTML_TEMPLATE = """
                 handleApiError({ error: 'Invalid JSON', details: e.message }, spiModalError);
                 return;
             }
-            const payload = { ...getFormCredentials(), spi_body: spiBody };
+            const payload = { spi_body: spiBody };
             try {
-                const response = await fetch('/api/create_spi', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(payload)
-                });
+                const response = await postApi('/api/create_spi', payload);
                 const result = await response.json();
                 if (response.ok) {
                     createSpiModal.style.display = 'none';
@@ -830,13 +1660,9 @@ HTML_TEMPLATE = """
                 handleApiError({ error: 'Invalid JSON', details: e.message }, connectionModalError);
                 return;
             }
-            const payload = { ...getFormCredentials(), connection_body: connectionBody };
+            const payload = { connection_body: connectionBody };
             try {
-                const response = await fetch('/api/create_connection', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(payload)
-                });
+                const response = await postApi('/api/create_connection', payload);
                 const result = await response.json();
                 if (response.ok) {
                     createConnectionModal.style.display = 'none';
@@ -877,6 +1703,8 @@ HTML_TEMPLATE = """
             });
         }
         setupCopyButton('copyStatsBtn', 'statsJsonOutput');
+        document.getElementById('sampleStatsBtn').addEventListener('click', startStatsSampling);
+        fullStatsBtn.addEventListener('click', () => getProcessorStats(statsProcessorName, true));
         setupCopyButton('copyConnectionBtn', 'connectionJsonOutput');
 
     </script>
@@ -884,81 +1712,3610 @@ HTML_TEMPLATE = """
 </html>
 """
 
-# --- Flask Routes ---
+# --- Upstream Connection Pool ---
 
-@app.route('/')
-def index():
-    """Renders the main HTML page."""
-    return render_template_string(HTML_TEMPLATE)
+class AtlasSessionPool:
+    """Thread-safe pool of keep-alive requests.Session objects.
 
-def make_atlas_request(method, url, public_key, private_key, accept_header, json_body=None, content_type_header=None):
-    """Helper function to make requests to the Atlas API."""
-    if content_type_header is None:
-        content_type_header = "application/json"
-        
-    headers = {"Accept": accept_header, "Content-Type": content_type_header}
+    Sessions are keyed by (atlas_host, public_key) and checked out by one
+    thread at a time, so each holds a single warm TCP+TLS connection. Idle
+    sessions are evicted after idle_timeout seconds and every session is
+    retired once it is older than max_lifetime seconds. Callers must
+    release() every session they acquire(), discarding it after a network
+    failure.
+    """
+
+    def __init__(self, max_idle, idle_timeout, max_lifetime):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._last_sweep = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.in_use = 0
+
+    def _new_session(self, now):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.pool_created_at = now
+        return session
+
+    def _expired(self, session, last_used, now):
+        return (now - session.pool_created_at > self.max_lifetime
+                or now - last_used > self.idle_timeout)
+
+    def _sweep(self, now):
+        """Removes expired idle sessions for every key. Caller holds the lock."""
+        stale = []
+        for key in list(self._idle):
+            keep = []
+            for session, last_used in self._idle[key]:
+                (stale if self._expired(session, last_used, now) else keep).append(session)
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+        self.evictions += len(stale)
+        self._last_sweep = now
+        return stale
+
+    def acquire(self, key):
+        """Checks out a warm session for the key, creating one on a miss."""
+        now = time.monotonic()
+        stale = []
+        with self._lock:
+            if now - self._last_sweep > self.idle_timeout:
+                stale = self._sweep(now)
+            session = None
+            entries = self._idle.get(key)
+            while entries:
+                candidate, last_used = entries.pop()
+                if self._expired(candidate, last_used, now):
+                    stale.append(candidate)
+                    self.evictions += 1
+                else:
+                    session = candidate
+                    break
+            if session is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self.in_use += 1
+        for old in stale:
+            old.close()
+        return session or self._new_session(now)
+
+    def release(self, key, session, discard=False):
+        """Returns a session to the pool, closing it if it is unusable or surplus."""
+        now = time.monotonic()
+        with self._lock:
+            self.in_use -= 1
+            entries = self._idle.setdefault(key, [])
+            if not discard and now - session.pool_created_at <= self.max_lifetime and len(entries) < self.max_idle:
+                entries.append((session, now))
+                return
+            if not entries:
+                del self._idle[key]
+            self.evictions += 1
+        session.close()
+
+    def stats(self):
+        """Returns a snapshot of the pool counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "in_use": self.in_use,
+                "idle": sum(len(entries) for entries in self._idle.values()),
+                "keys": len(self._idle),
+            }
+
+atlas_session_pool = AtlasSessionPool(ATLAS_POOL_SIZE, ATLAS_POOL_IDLE_TIMEOUT, ATLAS_POOL_MAX_LIFETIME)
+
+# --- Digest Auth State Cache ---
+
+class CachedDigestAuth(HTTPDigestAuth):
+    """HTTPDigestAuth whose challenge state is shared by every thread.
+
+    requests keeps the realm/nonce in thread-local storage, so each worker
+    thread would pay its own 401 round trip. Here the last challenge and its
+    nonce-count are shared under a lock: every request is signed up front
+    with the next nonce-count, and a new challenge is only adopted when the
+    server rejects the nonce (e.g. marks it stale) and requests retries.
+    """
+
+    def __init__(self, username, password):
+        super().__init__(username, password)
+        self._lock = threading.Lock()
+        self._shared_chal = {}
+        self._shared_nonce = ""
+        self._shared_count = 0
+        self.preemptive = 0
+        self.challenged = 0
+
+    def build_digest_header(self, method, url):
+        local = self._thread_local
+        with self._lock:
+            if local.chal and local.chal is not getattr(local, 'synced_chal', None):
+                # This thread just parsed a fresh challenge from a 401.
+                self._shared_chal = local.chal
+                self._shared_nonce = ""
+                self._shared_count = 0
+                self.challenged += 1
+            else:
+                local.chal = self._shared_chal
+                self.preemptive += 1
+            local.synced_chal = local.chal
+            local.last_nonce = self._shared_nonce
+            local.nonce_count = self._shared_count
+            header = super().build_digest_header(method, url)
+            self._shared_nonce = local.last_nonce
+            self._shared_count = local.nonce_count
+        return header
+
+    def handle_401(self, r, **kwargs):
+        if r.status_code == 401:
+            # Lets tracing split the challenge round trip from the signed retry.
+            self._thread_local.challenge_received = time.perf_counter()
+        return super().handle_401(r, **kwargs)
+
+    def start_timing(self):
+        """Forgets the last challenge time before this thread sends a new request."""
+        self.init_per_thread_state()
+        self._thread_local.challenge_received = None
+
+    def challenge_received_at(self):
+        """perf_counter() time at which this thread's last request got a 401 challenge, or None."""
+        return getattr(self._thread_local, 'challenge_received', None)
+
+    def __call__(self, r):
+        self.init_per_thread_state()
+        with self._lock:
+            if self._shared_nonce:
+                # Makes requests sign the request up front instead of waiting for a 401.
+                self._thread_local.last_nonce = self._shared_nonce
+        return super().__call__(r)
+
+digest_auth_cache = OrderedDict()
+digest_auth_cache_lock = threading.Lock()
+
+def credential_fingerprint(public_key, private_key):
+    """Identifies a credential without keeping the private key in dictionary keys."""
+    return public_key, hashlib.sha256(private_key.encode('utf-8')).hexdigest()
+
+def get_digest_auth(atlas_host, public_key, private_key):
+    """Returns the shared CachedDigestAuth for a credential, creating it if needed."""
+    key = (atlas_host,) + credential_fingerprint(public_key, private_key)
+    with digest_auth_cache_lock:
+        auth = digest_auth_cache.get(key)
+        if auth is None:
+            auth = CachedDigestAuth(public_key, private_key)
+            digest_auth_cache[key] = auth
+            while len(digest_auth_cache) > DIGEST_AUTH_CACHE_SIZE:
+                digest_auth_cache.popitem(last=False)
+        else:
+            digest_auth_cache.move_to_end(key)
+        return auth
+
+def digest_auth_stats():
+    """Returns how many requests were signed up front versus after a 401 challenge."""
+    with digest_auth_cache_lock:
+        auths = list(digest_auth_cache.values())
+    return {
+        "credentials": len(auths),
+        "preemptive": sum(auth.preemptive for auth in auths),
+        "challenged": sum(auth.challenged for auth in auths),
+    }
+
+# --- Upstream Scheduler ---
+
+# Priorities for Atlas calls; lower values are admitted first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BULK: "bulk", PRIORITY_BACKGROUND: "background"}
+
+# Priority of the Atlas calls made by the current request or task. Thread
+# pools started through run_concurrently/iter_concurrently inherit it.
+upstream_priority = contextvars.ContextVar('upstream_priority', default=PRIORITY_INTERACTIVE)
+
+@contextmanager
+def upstream_priority_scope(priority):
+    """Runs the enclosed Atlas calls at the given priority."""
+    token = upstream_priority.set(priority)
+    try:
+        yield
+    finally:
+        upstream_priority.reset(token)
+
+class UpstreamQueueTimeout(Exception):
+    """Raised when an Atlas call waited longer than SCHEDULER_MAX_WAIT for a token."""
+
+class UpstreamBudgetExceeded(Exception):
+    """Raised when a request has made all the Atlas calls its budget allows."""
+
+class UpstreamBudget:
+    """A number of Atlas calls shared by everything one request runs, threads included."""
+
+    def __init__(self, calls):
+        self._lock = threading.Lock()
+        self.calls = calls
+        self.remaining = calls
+
+    def charge(self):
+        with self._lock:
+            if self.remaining <= 0:
+                raise UpstreamBudgetExceeded(f"The request already made the {self.calls} Atlas calls it is allowed.")
+            self.remaining -= 1
+
+# Budget of the Atlas calls made by the current request or task, if it has one.
+# Like upstream_priority, thread pools and tasks it starts inherit it.
+upstream_budget = contextvars.ContextVar('upstream_budget', default=None)
+
+@contextmanager
+def upstream_budget_scope(budget):
+    """Charges the enclosed Atlas calls to the given UpstreamBudget."""
+    token = upstream_budget.set(budget)
+    try:
+        yield
+    finally:
+        upstream_budget.reset(token)
+
+def charge_upstream_budget():
+    """Counts one Atlas call against the current budget; raises UpstreamBudgetExceeded when it is spent.
+
+    Charged where a route starts a call rather than per attempt, so 429
+    retries and coalesced GETs count once, and an exhausted budget never
+    fails a call another request has joined.
+    """
+    budget = upstream_budget.get()
+    if budget is not None:
+        budget.charge()
+
+class TokenBucket:
+    """Token bucket for one (atlas_host, project), with its callers queued by priority."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiters = []
+        self.condition = threading.Condition()
+        # Queue entry -> callback waking a caller that does not wait on the condition (a coroutine).
+        self.wakers = {}
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wake(self):
+        """Wakes every queued caller to re-check the queue. Caller holds the condition."""
+        self.condition.notify_all()
+        for waker in list(self.wakers.values()):
+            waker()
+
+class UpstreamScheduler:
+    """Admits Atlas calls through per-(atlas_host, project) token buckets.
+
+    Callers of the same project queue in priority order, so interactive
+    requests overtake bulk actions and background polling that are already
+    waiting. A 429 from Atlas blocks the whole bucket for the Retry-After
+    period instead of only the call that received it. The buckets belong
+    to one process; with several workers each one is built with its share
+    of the limit (see SERVER_WORKERS).
+    """
+
+    def __init__(self, rate, burst, max_wait, max_buckets=1024):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+        self.max_buckets = max_buckets
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self.admitted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.wait_seconds = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.timeouts = 0
+        self.throttled = 0
+        self.retries = 0
+        self.gave_up = 0
+        self.max_queue_depth = 0
+
+    def _bucket(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_buckets:
+                    self._prune()
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[key] = bucket
+            self._sequence += 1
+            return bucket, self._sequence
+
+    def _prune(self):
+        # Drops buckets that nobody waits on; a new bucket starts full, as they would be by now.
+        now = time.monotonic()
+        for key, bucket in list(self._buckets.items()):
+            if not bucket.waiters and bucket.blocked_until <= now:
+                del self._buckets[key]
+
+    def acquire(self, key, priority=PRIORITY_INTERACTIVE):
+        """Blocks until the caller may send one request for key.
+
+        Raises UpstreamQueueTimeout after max_wait seconds.
+        """
+        if self.rate <= 0:
+            return
+        bucket, entry, started = self.enqueue(key, priority)
+        try:
+            with bucket.condition:
+                while True:
+                    delay = self.poll(key, bucket, entry, started)
+                    if delay is None:
+                        break
+                    bucket.condition.wait(delay)
+        finally:
+            self.dequeue(bucket, entry)
+        self.record_admission(priority, started)
+
+    def enqueue(self, key, priority, waker=None):
+        """Queues a caller for key; returns (bucket, entry, started) for poll() and dequeue().
+
+        A caller that waits other than on bucket.condition passes a waker,
+        called (with the condition held) whenever the queue changes.
+        """
+        bucket, sequence = self._bucket(key)
+        entry = (priority, sequence)
+        with bucket.condition:
+            heapq.heappush(bucket.waiters, entry)
+            if waker is not None:
+                bucket.wakers[entry] = waker
+            self.max_queue_depth = max(self.max_queue_depth, len(bucket.waiters))
+            # A new head of the queue has to recompute how long to sleep.
+            bucket.wake()
+        return bucket, entry, time.monotonic()
+
+    def poll(self, key, bucket, entry, started):
+        """Checks once whether a queued caller may go. Caller holds bucket.condition.
+
+        Takes a token and returns None when the caller is at the head of the
+        queue and a token is available; otherwise returns the seconds to wait
+        before checking again. Raises UpstreamQueueTimeout after max_wait.
+        """
+        now = time.monotonic()
+        bucket.refill(now)
+        if bucket.waiters[0] == entry:
+            if now < bucket.blocked_until:
+                delay = bucket.blocked_until - now
+            elif bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return None
+            else:
+                delay = (1 - bucket.tokens) / bucket.rate
+        else:
+            delay = None
+        remaining = started + self.max_wait - now
+        if remaining <= 0:
+            with self._lock:
+                self.timeouts += 1
+            raise UpstreamQueueTimeout(
+                f"Waited more than {self.max_wait:g}s for the Atlas rate limit of project {key[1]} on {key[0]}.")
+        return remaining if delay is None else min(delay, remaining)
+
+    def dequeue(self, bucket, entry):
+        """Removes a caller from the queue, admitted or not, and lets the next one re-check."""
+        with bucket.condition:
+            bucket.wakers.pop(entry, None)
+            if entry in bucket.waiters:
+                bucket.waiters.remove(entry)
+                heapq.heapify(bucket.waiters)
+            bucket.wake()
+
+    def record_admission(self, priority, started):
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        with self._lock:
+            self.admitted[name] = self.admitted.get(name, 0) + 1
+            self.wait_seconds[name] = self.wait_seconds.get(name, 0.0) + time.monotonic() - started
+
+    def penalize(self, key, delay):
+        """Holds every caller for key back for delay seconds after Atlas answered 429.
+
+        Returns the seconds the caller still has to wait itself: the whole
+        delay when rate limiting is off, as there is no bucket to hold back.
+        """
+        with self._lock:
+            self.throttled += 1
+            self.retries += 1
+        if self.rate <= 0:
+            return delay
+        bucket, _ = self._bucket(key)
+        with bucket.condition:
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + delay)
+            bucket.tokens = 0.0
+            bucket.wake()
+        return 0
+
+    def record_gave_up(self):
+        with self._lock:
+            self.gave_up += 1
+
+    def stats(self):
+        with self._lock:
+            buckets = list(self._buckets.values())
+            admitted = dict(self.admitted)
+            wait_seconds = dict(self.wait_seconds)
+        now = time.monotonic()
+        waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+        blocked = 0
+        for bucket in buckets:
+            with bucket.condition:
+                for priority, _ in bucket.waiters:
+                    name = PRIORITY_NAMES.get(priority, str(priority))
+                    waiting[name] = waiting.get(name, 0) + 1
+                blocked += bucket.blocked_until > now
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "buckets": len(buckets),
+            "blocked_buckets": blocked,
+            "queue_depth": sum(waiting.values()),
+            "waiting": waiting,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": admitted,
+            "avg_wait_seconds": {name: round(wait_seconds[name] / count, 4) if count else 0.0
+                                 for name, count in admitted.items()},
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "gave_up": self.gave_up,
+            "timeouts": self.timeouts,
+        }
+
+def retry_after_seconds(response):
+    """Parses a Retry-After header (seconds or an HTTP date); returns None if absent or invalid."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def rate_limit_delay(response, attempt):
+    """Seconds to wait before retrying a 429: Retry-After if given, else jittered exponential backoff."""
+    retry_after = retry_after_seconds(response)
+    if retry_after is not None:
+        # A little jitter keeps callers that were told the same time from retrying in lockstep.
+        return retry_after + random.uniform(0, 0.1 + retry_after * 0.1)
+    return random.uniform(0, min(ATLAS_RETRY_MAX_BACKOFF, ATLAS_RETRY_BASE_DELAY * 2 ** attempt))
+
+def scheduler_key(url):
+    """Identifies the rate-limited scope of an Atlas URL: its host and project (group) ID."""
+    parts = urlsplit(url)
+    match = re.search(r'/groups/([^/]+)', parts.path)
+    return parts.netloc, match.group(1) if match else None
+
+upstream_scheduler = UpstreamScheduler(ATLAS_RATE_LIMIT_PER_SECOND / SERVER_WORKERS,
+                                       ATLAS_RATE_LIMIT_BURST // SERVER_WORKERS, SCHEDULER_MAX_WAIT)
+
+# --- Request Coalescing ---
+
+def shared_exception(error):
+    """Returns a copy of the exception of a shared call, for one more caller to raise.
+
+    Raising an exception sets its traceback, so callers in other threads
+    must not raise the same object. Exceptions that cannot be copied are
+    returned as they are.
+    """
+    try:
+        return copy.copy(error)
+    except Exception:
+        return error
+
+class SingleFlight:
+    """Shares one in-flight call among concurrent callers asking for the same key.
+
+    The first caller runs the call; callers arriving while it is in flight
+    wait for it and receive the same result, or a copy of its exception.
+    Only callers in the same process are coalesced: with several workers,
+    each one makes its own call for the same key.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, func):
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            try:
+                return future.result()
+            except BaseException as error:
+                raise shared_exception(error) from error
+        try:
+            result = func()
+        except BaseException as error:
+            self._finish(key)
+            future.set_exception(error)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result
+
+    def _finish(self, key):
+        # Removed before the result is published so later callers start a fresh call.
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
+
+upstream_gets = SingleFlight()
+
+def coalesced_get(url, public_key, private_key, accept_header, params=None):
+    """Sends a GET through send_atlas_request, sharing it with identical concurrent GETs.
+
+    The key covers the URL, query parameters, Accept header and credential,
+    so callers only share responses they could have fetched themselves. It
+    also covers the upstream priority, so an interactive request never waits
+    in the scheduler behind a bulk or background call it joined. The shared
+    requests.Response is fully read; callers parse it independently.
+    """
+    key = (url, tuple(sorted((params or {}).items())), accept_header, upstream_priority.get(),
+           *credential_fingerprint(public_key, private_key))
+    return upstream_gets.do(key, lambda: send_atlas_request('GET', url, public_key, private_key, accept_header, params=params))
+
+# --- Metrics ---
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class ShardedMetrics:
+    """Prometheus counters, gauges and histograms recorded into per-thread shards.
+
+    Each thread only writes its own dictionaries, so recording takes no lock;
+    a scrape sums the shards. Shards of threads that have exited are folded
+    into a retired total so that worker churn does not grow the shard list.
+    Gauges are counters that also go down, which lets one thread raise an
+    in-flight gauge and another lower it.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired_values = {}
+        self._retired_histograms = {}
+        self._families = {}
+
+    def declare(self, name, kind, help_text, buckets=None):
+        self._families[name] = (kind, help_text, buckets)
+
+    def kind(self, name):
+        return self._families[name][0]
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = (threading.current_thread(), {}, {})
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name, labels=(), amount=1):
+        values = self._shard()[1]
+        key = (name, labels)
+        values[key] = values.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        histograms = self._shard()[2]
+        key = (name, labels)
+        buckets = self._families[name][2]
+        counts = histograms.get(key)
+        if counts is None:
+            # One count per bucket, one for +Inf, then the running sum.
+            counts = histograms[key] = [0] * (len(buckets) + 2)
+        counts[bisect.bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+    def collect(self):
+        """Returns ({(name, labels): value}, {(name, labels): counts}) summed over all threads."""
+        with self._lock:
+            live = []
+            for shard in self._shards:
+                if shard[0].is_alive():
+                    live.append(shard)
+                else:
+                    merge_metric_values(self._retired_values, shard[1])
+                    merge_metric_histograms(self._retired_histograms, shard[2])
+            self._shards = live
+            values = dict(self._retired_values)
+            histograms = {key: list(counts) for key, counts in self._retired_histograms.items()}
+        for _, shard_values, shard_histograms in live:
+            # dict.copy() runs without releasing the GIL, so it is safe against the owner's writes.
+            merge_metric_values(values, shard_values.copy())
+            merge_metric_histograms(histograms, shard_histograms.copy())
+        return values, histograms
+
+    def render(self, extra=(), collected=None):
+        """Renders every metric (plus extra (name, kind, help, [(labels, value)]) families) as Prometheus text.
+
+        collected, a (values, histograms) pair as returned by collect(), is
+        rendered instead of this process's own metrics when given.
+        """
+        values, histograms = collected if collected is not None else self.collect()
+        by_family = {}
+        for (name, labels), value in values.items():
+            by_family.setdefault(name, []).append((labels, value))
+        lines = []
+        for name, (kind, help_text, buckets) in self._families.items():
+            if kind == 'histogram':
+                samples = sorted((labels, counts) for (family, labels), counts in histograms.items() if family == name)
+            else:
+                samples = sorted(by_family.get(name, []))
+            if samples:
+                lines.extend(metric_header(name, kind, help_text))
+            for labels, sample in samples:
+                if kind != 'histogram':
+                    lines.append(f"{name}{format_labels(labels)} {format_metric_value(sample)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float('inf'),), sample[:-1]):
+                    cumulative += count
+                    bound_label = '+Inf' if bound == float('inf') else format_metric_value(bound)
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', bound_label),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_metric_value(sample[-1])}")
+                lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        for name, kind, help_text, samples in extra:
+            lines.extend(metric_header(name, kind, help_text))
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(labels)} {format_metric_value(value)}")
+        return "\n".join(lines) + "\n"
+
+def merge_metric_values(target, source):
+    for key, value in source.items():
+        target[key] = target.get(key, 0) + value
+
+def merge_metric_histograms(target, source):
+    for key, counts in source.items():
+        merged = target.get(key)
+        if merged is None:
+            target[key] = list(counts)
+        else:
+            for index, count in enumerate(counts):
+                merged[index] += count
+
+def metric_header(name, kind, help_text):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+def format_metric_value(value):
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+        return str(int(value))
+    return repr(float(value))
+
+metrics = ShardedMetrics()
+metrics.declare('asp_ui_http_requests_total', 'counter', 'Requests served, by route, method and status code.')
+metrics.declare('asp_ui_http_request_duration_seconds', 'histogram',
+                'Time to produce a response, by route (streamed bodies are not included).', LATENCY_BUCKETS)
+metrics.declare('asp_ui_http_requests_in_flight', 'gauge', 'Requests being handled, by route.')
+metrics.declare('asp_ui_http_request_bytes_total', 'counter', 'Request body bytes received, by route.')
+metrics.declare('asp_ui_http_response_bytes_total', 'counter', 'Response body bytes sent with a known length, by route.')
+metrics.declare('asp_ui_upstream_requests_total', 'counter',
+                'Atlas API calls, by endpoint family, method and status ("error" or "timeout" without a response).')
+metrics.declare('asp_ui_upstream_request_duration_seconds', 'histogram',
+                'Atlas API call latency up to the response headers, by endpoint family and method.', LATENCY_BUCKETS)
+metrics.declare('asp_ui_upstream_in_flight', 'gauge', 'Atlas API calls waiting for a response, by endpoint family.')
+metrics.declare('asp_ui_upstream_request_bytes_total', 'counter', 'Request body bytes sent to Atlas, by endpoint family.')
+metrics.declare('asp_ui_upstream_response_bytes_total', 'counter',
+                'Response body bytes received from Atlas (as reported by Content-Length), by endpoint family.')
+metrics.declare('asp_ui_upstream_retries_total', 'counter', 'Atlas API calls retried after a 429, by endpoint family.')
+metrics.declare('asp_ui_upstream_timeouts_total', 'counter', 'Atlas API calls that timed out, by endpoint family.')
+
+# Path segments of Atlas URLs kept verbatim in endpoint families; the others are names.
+ATLAS_PATH_WORDS = {'streams', 'processors', 'processor', 'connections'}
+
+def atlas_endpoint_family(url):
+    """Templates an Atlas URL for metric labels, e.g. /streams/{instance}/processor/{name}:start."""
+    match = re.match(r'/api/atlas/v2/groups/[^/]+(.*)', urlsplit(url).path)
+    if not match:
+        return 'other'
+    parts = []
+    previous = None
+    for segment in match.group(1).split('/')[1:]:
+        name, _, action = segment.partition(':')
+        if name in ATLAS_PATH_WORDS:
+            part = name
+        else:
+            part = '{instance}' if previous == 'streams' else '{name}'
+        parts.append(f"{part}:{action}" if action else part)
+        previous = name
+    return '/' + '/'.join(parts)
+
+def record_upstream_call(labels, method, started, status, response=None):
+    """Records one Atlas call attempt under its endpoint family labels."""
+    metrics.inc('asp_ui_upstream_requests_total', labels + (('method', method), ('status', str(status))))
+    metrics.observe('asp_ui_upstream_request_duration_seconds', labels + (('method', method),),
+                    time.perf_counter() - started)
+    if response is None:
+        return
+    body = response.request.body if response.request is not None else None
+    if body:
+        metrics.inc('asp_ui_upstream_request_bytes_total', labels, len(body))
+    length = response.headers.get('Content-Length')
+    if length and length.isdigit():
+        metrics.inc('asp_ui_upstream_response_bytes_total', labels, int(length))
+
+def request_route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    metrics.inc('asp_ui_http_requests_in_flight', (('route', request_route()),))
+
+@app.after_request
+def record_request_metrics(response):
+    route = request_route()
+    metrics.inc('asp_ui_http_requests_total',
+                (('route', route), ('method', request.method), ('status', str(response.status_code))))
+    metrics.observe('asp_ui_http_request_duration_seconds', (('route', route),),
+                    time.perf_counter() - g.metrics_started)
+    if request.content_length:
+        metrics.inc('asp_ui_http_request_bytes_total', (('route', route),), request.content_length)
+    if response.content_length:
+        metrics.inc('asp_ui_http_response_bytes_total', (('route', route),), response.content_length)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error):
+    if 'metrics_started' not in g:
+        return
+    route = request_route()
+    metrics.inc('asp_ui_http_requests_in_flight', (('route', route),), -1)
+    if error is not None:
+        # after_request does not run for unhandled errors.
+        metrics.inc('asp_ui_http_requests_total', (('route', route), ('method', request.method), ('status', '500')))
+
+def component_metrics():
+    """Pool, digest auth, coalescing, cache and scheduler statistics of this process as extra metric families."""
+    pool = atlas_session_pool.stats()
+    digest = digest_auth_stats()
+    coalescing = upstream_gets.stats()
+    cache = response_cache.stats()
+    revalidation = cache_revalidator.stats()
+    scheduler = upstream_scheduler.stats()
+    families = [
+        ('asp_ui_pool_sessions_total', 'counter', 'Upstream session checkouts, by outcome.',
+         [((('outcome', 'hit'),), pool['hits']), ((('outcome', 'miss'),), pool['misses'])]),
+        ('asp_ui_pool_evictions_total', 'counter', 'Upstream sessions closed by the pool.', [((), pool['evictions'])]),
+        ('asp_ui_pool_sessions', 'gauge', 'Upstream sessions by state.',
+         [((('state', 'in_use'),), pool['in_use']), ((('state', 'idle'),), pool['idle'])]),
+        ('asp_ui_digest_auth_signatures_total', 'counter', 'Digest-signed requests, by whether a 401 challenge was needed.',
+         [((('mode', 'preemptive'),), digest['preemptive']), ((('mode', 'challenged'),), digest['challenged'])]),
+        ('asp_ui_coalesced_gets_total', 'counter', 'GETs that shared an identical in-flight Atlas call.',
+         [((), coalescing['coalesced'])]),
+        ('asp_ui_cache_lookups_total', 'counter', 'Response cache lookups, by result.',
+         [((('result', 'hit'),), cache['hits']), ((('result', 'stale'),), cache['stale_hits']),
+          ((('result', 'miss'),), cache['misses'])]),
+        ('asp_ui_cache_removals_total', 'counter', 'Response cache entries removed, by reason.',
+         [((('reason', 'eviction'),), cache['evictions']), ((('reason', 'expiration'),), cache['expirations']),
+          ((('reason', 'invalidation'),), cache['invalidations'])]),
+        ('asp_ui_cache_entries', 'gauge', 'Response cache entries.', [((), cache['entries'])]),
+        ('asp_ui_cache_revalidations_total', 'counter', 'Background cache refreshes, by outcome.',
+         [((('outcome', 'scheduled'),), revalidation['scheduled']),
+          ((('outcome', 'deduplicated'),), revalidation['deduplicated']),
+          ((('outcome', 'failed'),), revalidation['failed'])]),
+        ('asp_ui_scheduler_queue_depth', 'gauge', 'Atlas calls waiting for a rate-limit token, by priority.',
+         [((('priority', name),), depth) for name, depth in scheduler['waiting'].items()]),
+        ('asp_ui_scheduler_admitted_total', 'counter', 'Atlas calls admitted by the rate limiter, by priority.',
+         [((('priority', name),), count) for name, count in scheduler['admitted'].items()]),
+        ('asp_ui_scheduler_throttled_total', 'counter', 'Rate-limit buckets held back after a 429.',
+         [((), scheduler['throttled'])]),
+        ('asp_ui_scheduler_gave_up_total', 'counter', '429 responses returned to the caller without a retry.',
+         [((), scheduler['gave_up'])]),
+        ('asp_ui_scheduler_timeouts_total', 'counter', 'Atlas calls that waited too long for a rate-limit token.',
+         [((), scheduler['timeouts'])]),
+    ]
+    return families
+
+def session_metrics():
+    """Login session statistics as extra metric families; they come from the shared store when there is one."""
+    try:
+        sessions = credential_sessions.stats()
+    except SessionStoreUnavailable:
+        # The rest of the scrape is still worth having while the store restarts.
+        return []
+    return [
+        ('asp_ui_sessions', 'gauge', 'Active login sessions.', [((), sessions['active'])]),
+        ('asp_ui_session_lookups_total', 'counter', 'Session token lookups, by result.',
+         [((('result', 'resolved'),), sessions['resolved']), ((('result', 'rejected'),), sessions['rejected'])]),
+    ]
+
+class MetricsPublisher:
+    """Pushes the metrics of this worker to the shared store, which sums those of every worker.
+
+    A background thread pushes every METRICS_PUSH_INTERVAL seconds, and a
+    scrape pushes before it renders the totals, so /metrics on any worker
+    reports the whole server, with the other workers at most one interval
+    behind. Counters and histograms are sent as what they gained since the
+    last push that reached the store (see MetricsBoard), so a push that
+    fails is made up by the next one. Without a shared store, or while it
+    cannot be reached, a scrape reports this process alone.
+    """
+
+    def __init__(self, metrics, board):
+        self.metrics = metrics
+        self.board = board
+        self.worker = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._pushed_values = {}
+        self._pushed_histograms = {}
+        if board is not None:
+            threading.Thread(target=self._run, name='metrics-publisher', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(METRICS_PUSH_INTERVAL)
+            try:
+                self.push(component_metrics())
+            except SessionStoreUnavailable:
+                # The next push carries these increments.
+                pass
+
+    def push(self, extra):
+        """Pushes this process's metrics and extra families; returns the board's (workers, values, histograms)."""
+        values, histograms = self.metrics.collect()
+        gauges = {key: value for key, value in values.items() if self.metrics.kind(key[0]) == 'gauge'}
+        values = {key: value for key, value in values.items() if key not in gauges}
+        for name, kind, _, samples in extra:
+            for labels, value in samples:
+                (gauges if kind == 'gauge' else values)[(name, labels)] = value
+        # Held across the call, so two pushes never send the same increments.
+        with self._lock:
+            increments = {key: value - self._pushed_values.get(key, 0) for key, value in values.items()
+                          if value != self._pushed_values.get(key, 0)}
+            histogram_increments = {}
+            for key, counts in histograms.items():
+                pushed = self._pushed_histograms.get(key)
+                if pushed is None:
+                    histogram_increments[key] = counts
+                elif pushed != counts:
+                    histogram_increments[key] = [count - before for count, before in zip(counts, pushed)]
+            totals = self.board.push(self.worker, increments, histogram_increments, gauges)
+            self._pushed_values, self._pushed_histograms = values, histograms
+        return totals
+
+    def render(self):
+        """Renders the metrics of every worker, or of this process alone, as Prometheus text."""
+        extra = component_metrics()
+        workers, collected = 1, None
+        if self.board is not None:
+            try:
+                workers, values, histograms = self.push(extra)
+            except SessionStoreUnavailable:
+                pass
+            else:
+                by_family = {}
+                for (name, labels), value in values.items():
+                    by_family.setdefault(name, []).append((labels, value))
+                # The extra families now carry the totals; the declared ones stay in values.
+                extra = [(name, kind, help_text, sorted(by_family.get(name, [])))
+                         for name, kind, help_text, _ in extra]
+                names = {family[0] for family in extra}
+                collected = ({key: value for key, value in values.items() if key[0] not in names}, histograms)
+        extra = extra + [('asp_ui_metrics_workers', 'gauge', 'Worker processes whose metrics this scrape includes.',
+                          [((), workers)])]
+        return self.metrics.render(extra + session_metrics(), collected)
+
+metrics_publisher = MetricsPublisher(metrics, connect_metrics_board())
+
+# --- Request Tracing ---
+
+# Phases reported in the Server-Timing header, in this order.
+TRACE_PHASES = ('parse', 'queue', 'digest', 'upstream', 'decode', 'serialize')
+# Incoming X-Request-ID values that are reused instead of generating one.
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+trace_logger = logging.getLogger('asp_ui.trace')
+if TRACE_SAMPLE_RATE > 0 and not trace_logger.handlers:
+    trace_handler = logging.StreamHandler()
+    trace_handler.setFormatter(logging.Formatter('%(message)s'))
+    trace_logger.addHandler(trace_handler)
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+
+class RequestTrace:
+    """Spans recorded while one request is handled, possibly by several threads.
+
+    Spans are (name, start offset, duration, attributes) tuples; list.append
+    is atomic, so worker threads can add spans without a lock.
+    """
+
+    def __init__(self, request_id, sampled):
+        self.request_id = request_id
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def add(self, name, started, duration, **attributes):
+        self.spans.append((name, started - self.started, duration, attributes))
+
+    def server_timing(self):
+        """Formats the summed duration of each phase as a Server-Timing header value."""
+        totals = {}
+        counts = {}
+        for name, _, duration, _ in list(self.spans):
+            totals[name] = totals.get(name, 0.0) + duration
+            counts[name] = counts.get(name, 0) + 1
+        parts = []
+        for name in TRACE_PHASES:
+            if name in totals:
+                # Upstream calls may overlap, so their sum can exceed the total.
+                description = f';desc="{counts[name]} spans"' if counts[name] > 1 else ''
+                parts.append(f"{name};dur={totals[name] * 1000:.1f}{description}")
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def log(self, route, method, status_code):
+        trace_logger.info(json.dumps({
+            "event": "request",
+            "request_id": self.request_id,
+            "method": method,
+            "route": route,
+            "status": status_code,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "spans": [{"name": name, "start_ms": round(offset * 1000, 3), "duration_ms": round(duration * 1000, 3),
+                       **attributes} for name, offset, duration, attributes in list(self.spans)],
+        }))
+
+# The trace of the request being handled; copied into worker threads with the rest of the context.
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+@contextmanager
+def trace_span(name, **attributes):
+    """Records the enclosed block as a span of the current request's trace, if there is one."""
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, started, time.perf_counter() - started, **attributes)
+
+def record_upstream_spans(auth, started, url):
+    """Adds the digest challenge (if one happened) and Atlas round trip of a call to the trace."""
+    trace = current_trace.get()
+    if trace is None:
+        return
+    ended = time.perf_counter()
+    challenge_received = auth.challenge_received_at()
+    if challenge_received is not None and challenge_received >= started:
+        trace.add('digest', started, challenge_received - started)
+        started = challenge_received
+    trace.add('upstream', started, ended - started, endpoint=atlas_endpoint_family(url))
+
+class TracedJSONProvider(DefaultJSONProvider):
+    """Flask's default JSON provider, recording jsonify() time as the "serialize" phase."""
+
+    def dumps(self, obj, **kwargs):
+        with trace_span('serialize'):
+            return super().dumps(obj, **kwargs)
+
+app.json = TracedJSONProvider(app)
+
+def new_request_trace(request_id):
+    """Starts the trace of a request, or returns None when neither Server-Timing nor sampling needs one.
+
+    request_id is the client's X-Request-ID; a new ID replaces a missing or malformed one.
+    """
+    sampled = TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+    if not (SERVER_TIMING_ENABLED or sampled):
+        return None
+    if not REQUEST_ID_PATTERN.match(request_id):
+        request_id = uuid.uuid4().hex
+    return RequestTrace(request_id, sampled)
+
+@app.before_request
+def start_request_trace():
+    trace = new_request_trace(request.headers.get('X-Request-ID', ''))
+    if trace is not None:
+        g.trace_token = current_trace.set(trace)
+
+@app.after_request
+def finish_request_trace(response):
+    trace = current_trace.get()
+    if trace is None:
+        return response
+    response.headers['X-Request-ID'] = trace.request_id
+    if SERVER_TIMING_ENABLED:
+        response.headers['Server-Timing'] = trace.server_timing()
+    if trace.sampled:
+        trace.log(request_route(), request.method, response.status_code)
+        trace.sampled = False
+    return response
+
+@app.teardown_request
+def reset_request_trace(error):
+    token = g.pop('trace_token', None)
+    if token is None:
+        return
+    trace = current_trace.get()
+    if error is not None and trace is not None and trace.sampled:
+        trace.log(request_route(), request.method, 500)
+    current_trace.reset(token)
+
+# --- Response Cache ---
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a per-entry TTL.
+
+    Expired entries stay in place (until replaced or evicted) so that
+    get_stale() can still serve them under stale-while-revalidate.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Returns the cached value for the key, or None when missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= now:
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get_stale(self, key, max_stale):
+        """Returns (value, age_seconds, is_fresh) even for an expired entry.
+
+        Entries that expired more than max_stale seconds ago count as missing.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] + max_stale <= now:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            fresh = entry[2] > now
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return entry[0], now - entry[1], fresh
+
+    def set(self, key, value, ttl):
+        """Stores a value for ttl seconds, evicting the least recently used entries."""
+        with self._lock:
+            now = time.monotonic()
+            self._entries[key] = (value, now, now + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drops a single key."""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_prefix(self, prefix):
+        """Drops every tuple key that starts with the given prefix tuple."""
+        with self._lock:
+            doomed = [key for key in self._entries if key[:len(prefix)] == prefix]
+            for key in doomed:
+                del self._entries[key]
+            self.invalidations += len(doomed)
+
+    def clear(self):
+        """Drops every entry."""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        """Returns a snapshot of the cache counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+response_cache = TTLCache(CACHE_MAX_ENTRIES)
+
+class CacheInvalidator:
+    """Drops response cache entries in this process and, through the shared store, in every other worker.
+
+    Invalidations are published to the store's InvalidationLog. Before a
+    cache lookup, sync() compares the log's shared counter with the last
+    sequence number this process applied, and only asks the store for the
+    entries it missed when they differ. When the log cannot say what was
+    missed (the store restarted, or this process fell too far behind) the
+    whole cache is cleared. Without a shared store only the local cache is
+    touched.
+    """
+
+    def __init__(self, cache, shared):
+        self.cache = cache
+        self.log, self.counter = shared or (None, None)
+        self._lock = threading.Lock()
+        self.epoch = None
+        self.sequence = None
+        self.published = 0
+        self.applied = 0
+        self.resets = 0
+
+    def drop(self, entry):
+        kind, key = entry
+        if kind == 'prefix':
+            self.cache.invalidate_prefix(key)
+        else:
+            self.cache.invalidate(key)
+
+    def invalidate(self, entries):
+        """Drops ('key', cache_key) and ('prefix', key_prefix) entries everywhere."""
+        for entry in entries:
+            self.drop(entry)
+        if self.log is None:
+            return
+        epoch, sequence = self.log.publish(entries)
+        with self._lock:
+            self.published += len(entries)
+            if epoch == self.epoch and sequence - len(entries) == self.sequence:
+                # Nobody published in between, so this process is still in step.
+                self.sequence = sequence
+
+    def behind(self):
+        """True when other workers published invalidations this process has not applied yet."""
+        return self.log is not None and self.counter.value() != self.sequence
+
+    def sync(self):
+        """Applies the invalidations other workers published since the last sync."""
+        if not self.behind():
+            return
+        with self._lock:
+            epoch, sequence, entries = self.log.since(self.epoch, self.sequence or 0)
+            if entries is None and self.epoch is None:
+                # Everything cached before the first sync was fetched after this process started.
+                pass
+            elif entries is None:
+                self.cache.clear()
+                self.resets += 1
+            else:
+                for entry in entries:
+                    self.drop(entry)
+                self.applied += len(entries)
+            self.epoch, self.sequence = epoch, sequence
+
+    def stats(self):
+        with self._lock:
+            return {"shared": self.log is not None, "sequence": self.sequence, "published": self.published,
+                    "applied": self.applied, "resets": self.resets}
+
+cache_invalidator = CacheInvalidator(response_cache, connect_invalidation_log())
+
+class Revalidator:
+    """Runs background cache refreshes, at most one in flight per cache key."""
+
+    def __init__(self, max_workers):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='revalidate')
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.scheduled = 0
+        self.deduplicated = 0
+        self.failed = 0
+
+    def schedule(self, key, refresh):
+        """Starts refresh() for the key unless one is already running."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.deduplicated += 1
+                return future
+            future = self._executor.submit(self._run, key, refresh)
+            self._inflight[key] = future
+            self.scheduled += 1
+            return future
+
+    def _run(self, key, refresh):
+        try:
+            refresh()
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def wait(self, key, timeout):
+        """Blocks until the refresh in flight for the key (if any) has finished."""
+        with self._lock:
+            future = self._inflight.get(key)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._inflight),
+                "scheduled": self.scheduled,
+                "deduplicated": self.deduplicated,
+                "failed": self.failed,
+            }
+
+cache_revalidator = Revalidator(SWR_WORKERS)
+# Credentials Atlas recently accepted for a project. Cached responses are
+# shared between operators, so they are only served to credentials in here.
+authorized_credentials = TTLCache(CACHE_MAX_ENTRIES)
+
+def atlas_cache_key(data, instance_name, *resource):
+    """Builds a response cache key scoped to host, project and instance."""
+    return (data['atlas_host'], data['project_id'], instance_name) + resource
+
+def credential_cache_key(data):
+    return (data['atlas_host'], data['project_id']) + credential_fingerprint(data['public_key'], data['private_key'])
+
+def cache_readable(data, ttl):
+    """True when cached responses with this TTL may be served to the request's credentials."""
+    return ttl > 0 and bool(authorized_credentials.get(credential_cache_key(data)))
+
+def cached_entry(data, cache_key, refresh):
+    """Looks up a cached payload for a request that passed cache_readable().
+
+    Returns (payload, 200, cache_headers), or None on a miss. An expired
+    entry is only returned with "stale_while_revalidate", after refresh()
+    has been handed to the background revalidator.
+    """
+    cache_invalidator.sync()
+    if data.get('stale_while_revalidate'):
+        entry = response_cache.get_stale(cache_key, SWR_MAX_STALE)
+    else:
+        payload = response_cache.get(cache_key)
+        entry = (payload, 0, True) if payload is not None else None
+    if entry is None:
+        return None
+    payload, age, fresh = entry
+    if fresh:
+        return payload, 200, {'X-Cache': 'HIT', 'Age': str(int(age))}
+    cache_revalidator.schedule(cache_key, refresh)
+    return payload, 200, {'X-Cache': 'STALE', 'Age': str(int(age)), 'X-Cache-Revalidating': '1'}
+
+def store_fetched(data, cache_key, ttl, payload, status_code):
+    """Caches a freshly fetched payload if it succeeded; returns its cache headers."""
+    cache_headers = {}
+    if status_code == 200:
+        authorized_credentials.set(credential_cache_key(data), True, CACHE_AUTH_TTL)
+        if ttl > 0:
+            response_cache.set(cache_key, payload, ttl)
+            cache_headers['X-Cache'] = 'MISS'
+    return cache_headers
+
+def cached_atlas_payload(data, cache_key, ttl, fetch):
+    """Reads a GET result through the response cache, calling fetch() on a miss.
+
+    fetch returns a (payload, status_code) tuple; only successful payloads
+    are cached. Cached payloads are shared and must not be mutated. Returns
+    (payload, status_code, cache_headers).
+
+    With "stale_while_revalidate" in the request, an expired entry is
+    returned immediately (with an Age header) while a background refresh
+    runs; a follow-up request with "wait_for_revalidation" blocks until that
+    refresh has landed in the cache.
+    """
+    cached = cached_lookup(data, cache_key, ttl, fetch)
+    if cached is not None:
+        return cached
+
+    payload, status_code = fetch()
+    return payload, status_code, store_fetched(data, cache_key, ttl, payload, status_code)
+
+def cached_lookup(data, cache_key, ttl, fetch):
+    """The cache side of cached_atlas_payload: its result on a hit, None when fetch() has to run."""
+    if not cache_readable(data, ttl):
+        return None
+    if data.get('wait_for_revalidation'):
+        cache_revalidator.wait(cache_key, timeout=SWR_WAIT_TIMEOUT)
+    return cached_entry(data, cache_key, lambda: refresh_cached(cache_key, ttl, fetch))
+
+def listing_target(data, instance_name, resource):
+    """Returns the Atlas (url, accept_header, cache_ttl) for the 'processors', 'connections' or 'spis' listing."""
+    base_url = f"{ATLAS_API_SCHEME}://{data['atlas_host']}/api/atlas/v2/groups/{data['project_id']}/streams"
+    if resource == 'processors':
+        return f"{base_url}/{instance_name}/processors", "application/vnd.atlas.2024-05-30+json", CACHE_TTL_PROCESSORS
+    if resource == 'connections':
+        return f"{base_url}/{instance_name}/connections", "application/vnd.atlas.2023-02-01+json", CACHE_TTL_CONNECTIONS
+    return base_url, "application/vnd.atlas.2023-02-01+json", CACHE_TTL_SPIS
+
+def fetch_listing(data, instance_name, resource):
+    """Fetches every page of a listing through the response cache.
+
+    Returns (payload, status_code, cache_headers) like cached_atlas_payload.
+    """
+    url, accept_header, ttl = listing_target(data, instance_name, resource)
+    cache_key = atlas_cache_key(data, instance_name, resource)
+    return cached_atlas_payload(data, cache_key, ttl,
+                                lambda: fetch_all_pages(url, data['public_key'], data['private_key'], accept_header))
+
+# The error of a listing request without the instance whose listing it asks for.
+LISTING_INSTANCE_ERRORS = {
+    'processors': "Missing 'instance_name' for fetching processors.",
+    'connections': "Missing 'instance_name' for listing connections.",
+}
+
+def listing_request(data, resource):
+    """Validates the body of a listing route; returns (instance_name, query), see parse_listing_query."""
+    instance_name = None
+    if resource in LISTING_INSTANCE_ERRORS:
+        instance_name, = required_fields(data, ('instance_name',), LISTING_INSTANCE_ERRORS[resource])
+    return instance_name, requested_listing_query(data)
+
+def listing_result(data, resource):
+    """Answers a listing route as a JSON document: returns (payload, status_code, headers).
+
+    Successful listings carry a "version" token; a request with "since" set
+    to an earlier token gets only the entries that changed since then.
+    "filter", "sort", "offset" and "limit" narrow the response to a window
+    of the listing, answered from its cached index.
+    """
+    instance_name, query = listing_request(data, resource)
+    payload, status_code, cache_headers = fetch_listing(data, instance_name, resource)
+    if status_code == 200:
+        payload = versioned_listing(atlas_cache_key(data, instance_name, resource), payload, data.get('since'), query)
+    return payload, status_code, cache_headers
+
+def result_response(result):
+    """Builds the response of a (payload, status_code, headers) result; bytes are sent as they are."""
+    payload, status_code, headers = result
+    response = Response(payload) if isinstance(payload, bytes) else jsonify(payload)
+    response.status_code = status_code
+    response.headers.update(headers)
+    return response
+
+def listing_response(data, resource):
+    """Serves a listing route through the response cache, see listing_result.
+
+    With Accept: application/x-ndjson the listing is streamed instead, see
+    listing_ndjson_response.
+    """
+    if wants_ndjson():
+        instance_name, query = listing_request(data, resource)
+        return listing_ndjson_response(data, instance_name, resource, query)
+    return result_response(listing_result(data, resource))
+
+def cached_document_result(data, target):
+    """Answers a route passing one Atlas document through, via the response cache.
+
+    target is the (url, accept_header, cache_key, ttl, fields) of a
+    *_target builder; the cache stores the raw bytes. With fields (see
+    parse_fields) the body is parsed and projected instead. Returns
+    (payload, status_code, headers): a successful payload is the body as
+    bytes, with its Content-Type among the headers.
+    """
+    url, accept_header, cache_key, ttl, fields = target
+    payload, status_code, cache_headers = cached_atlas_payload(
+        data, cache_key, ttl, lambda: atlas_request_raw('GET', url, data['public_key'], data['private_key'], accept_header))
+    if status_code != 200:
+        return payload, status_code, {}
+    body, content_type = payload
+    if fields is not None:
+        body, content_type = project_body(cache_key, body, content_type, fields, ttl)
+    return body, 200, {**cache_headers, 'Content-Type': content_type}
+
+def processor_stats_result(data):
+    """Answers /api/get_processor_stats, see cached_document_result."""
+    return cached_document_result(data, processor_stats_target(data))
+
+def connection_details_result(data):
+    """Answers /api/get_connection_details, see cached_document_result."""
+    return cached_document_result(data, connection_details_target(data))
+
+def listing_ndjson_response(data, instance_name, resource, query):
+    """Serves a listing route as NDJSON: one line per entry, then a "_meta" line.
+
+    "_meta" holds the other fields of the JSON response ("totalCount",
+    "version", and for a diff "since" and "removed"); a diff's lines are its
+    added and changed entries. A whole listing that is not cached is
+    streamed page by page as Atlas returns it. If a later page fails, the
+    "_meta" line carries its "status_code" and "error" instead.
+    """
+    url, accept_header, ttl = listing_target(data, instance_name, resource)
+    cache_key = atlas_cache_key(data, instance_name, resource)
+    fetch = lambda: fetch_all_pages(url, data['public_key'], data['private_key'], accept_header)
+    cached = cached_lookup(data, cache_key, ttl, fetch)
+    if cached is None and query is None and not data.get('since'):
+        pages = iter_listing_pages(url, data['public_key'], data['private_key'], accept_header)
+        first_page, status_code = next(pages)
+        if status_code != 200:
+            pages.close()
+            return jsonify(first_page), status_code
+        headers = {'X-Cache': 'MISS'} if ttl > 0 else {}
+        writer = ListingPageWriter(data, cache_key, ttl, first_page)
+        return Response(stream_listing_pages(writer, first_page, pages), mimetype='application/x-ndjson', headers=headers)
+
+    if cached is None:
+        payload, status_code = fetch()
+        cache_headers = store_fetched(data, cache_key, ttl, payload, status_code)
+    else:
+        payload, status_code, cache_headers = cached
+    if status_code != 200:
+        return jsonify(payload), status_code
+    document = versioned_listing(cache_key, payload, data.get('since'), query)
+    return Response(listing_ndjson_chunks(document), mimetype='application/x-ndjson', headers=cache_headers)
+
+def listing_ndjson_chunks(document):
+    """Yields a listing response document as NDJSON, a page of entries per chunk, then its "_meta" line."""
+    entries = document['results'] if 'results' in document else document['added'] + document['changed']
+    for start in range(0, len(entries), ATLAS_PAGE_SIZE):
+        yield ndjson_lines(entries[start:start + ATLAS_PAGE_SIZE])
+    yield ndjson_lines([{"_meta": {key: value for key, value in document.items()
+                                   if key not in ('results', 'added', 'changed')}}])
+
+class ListingPageWriter:
+    """Turns the pages of a listing into NDJSON as they arrive, caching and versioning it once complete.
+
+    The entries are only held on to when the listing is cached and has at
+    most CACHE_STREAMED_MAX_ENTRIES of them; otherwise just their hashes are
+    kept, for the version token, and the listing is not cached.
+    """
+
+    def __init__(self, data, cache_key, ttl, first_page):
+        self.data = data
+        self.cache_key = cache_key
+        self.ttl = ttl
+        self.first_page = {key: value for key, value in first_page.items() if key != 'results'}
+        self.total_count = first_page.get('totalCount')
+        self.results = [] if ttl > 0 and (self.total_count or 0) <= CACHE_STREAMED_MAX_ENTRIES else None
+        self.hashes = {}
+        self.count = 0
+
+    def page(self, page):
+        """Returns the NDJSON lines of one page's entries."""
+        entries = page.get('results', [])
+        if self.results is not None and self.count + len(entries) > CACHE_STREAMED_MAX_ENTRIES:
+            self.forget_results()
+        if self.results is not None:
+            self.results.extend(entries)
+        else:
+            for position, entry in enumerate(entries, self.count):
+                self.hashes[listing_entry_name(entry, position)] = hash_listing_entry(entry)
+        self.count += len(entries)
+        return ndjson_lines(entries)
+
+    def forget_results(self):
+        """Keeps only the hashes of the entries held so far; the listing will not be cached."""
+        for position, entry in enumerate(self.results):
+            self.hashes[listing_entry_name(entry, position)] = hash_listing_entry(entry)
+        self.results = None
+
+    def failed(self, page, status_code):
+        """Returns the "_meta" line ending a listing whose page failed."""
+        return ndjson_lines([{"_meta": {"status_code": status_code, **page}}])
+
+    def finish(self):
+        """Caches and versions the complete listing; returns its "_meta" line."""
+        total_count = self.count if self.total_count is None else self.total_count
+        if self.results is not None:
+            payload = merged_listing(self.first_page, self.results, total_count)
+            store_fetched(self.data, self.cache_key, self.ttl, payload, 200)
+            version = listing_versions.index(self.cache_key, payload).version
+        else:
+            # With a TTL of 0 this only records that Atlas accepted the credentials.
+            store_fetched(self.data, self.cache_key, 0, None, 200)
+            version = listing_version(self.hashes)
+            listing_versions.remember(self.cache_key, version, self.hashes)
+        listing_versions.record(False)
+        extra = {key: value for key, value in self.first_page.items() if key not in ('links', 'totalCount')}
+        return ndjson_lines([{"_meta": {**extra, "totalCount": total_count, "version": version}}])
+
+def stream_listing_pages(writer, first_page, pages):
+    """Yields the NDJSON of a listing from iter_listing_pages, a page per chunk, then its "_meta" line."""
+    try:
+        for page, status_code in itertools.chain([(first_page, 200)], pages):
+            if status_code != 200:
+                yield writer.failed(page, status_code)
+                return
+            yield writer.page(page)
+    finally:
+        pages.close()
+    yield writer.finish()
+
+def refresh_cached(cache_key, ttl, fetch):
+    """Re-fetches a cache entry in the background; failures keep the stale copy."""
+    payload, status_code = fetch()
+    if status_code == 200:
+        response_cache.set(cache_key, payload, ttl)
+
+def invalidate_cached(data, instance_name, *resources):
+    """Drops the cached responses a mutation may have made out of date, in every worker."""
+    cache_invalidator.invalidate([('key', atlas_cache_key(data, instance_name, *resource)) for resource in resources])
+
+def invalidate_cached_instance(data, instance_name):
+    """Drops the instance listing and every cached response of one instance, in every worker."""
+    cache_invalidator.invalidate([('key', atlas_cache_key(data, None, 'spis')),
+                                  ('prefix', atlas_cache_key(data, instance_name))])
+
+# --- Credential Sessions ---
+# Tokens from /api/login stand in for the keys; see session_store.py.
+
+credential_sessions = connect_session_store()
+# Credentials of recently used sessions, by token, so most requests skip the store round trip.
+session_lookups = TTLCache(SESSION_MAX_ENTRIES)
+
+# Request fields that identify the Atlas credential and project.
+CREDENTIAL_FIELDS = ('public_key', 'private_key', 'project_id', 'atlas_host')
+
+# Returned with 401 when a request names a session that no longer exists.
+SESSION_EXPIRED_ERROR = {"error": "Session expired or unknown. Please log in again.", "session_expired": True}
+# Returned with 503 while the shared session store process cannot be reached.
+SESSION_STORE_UNAVAILABLE_ERROR = {"error": "The session store is unavailable, try again shortly."}
+
+def bearer_token(authorization):
+    """Returns the token of an "Authorization: Bearer <token>" header, or None."""
+    scheme, _, token = (authorization or '').partition(' ')
+    if scheme.lower() != 'bearer':
+        return None
+    return token.strip() or None
+
+def session_credentials(authorization):
+    """Returns the credentials of the session named by an Authorization header.
+
+    Returns {} when the request names no session and None when its token
+    is unknown or expired. Raises SessionStoreUnavailable when the shared
+    store process cannot be reached.
+    """
+    token = bearer_token(authorization)
+    if token is None:
+        return {}
+    credentials = session_lookups.get(token)
+    if credentials is None:
+        credentials = stored_session_credentials(token)
+    return credentials
+
+def stored_session_credentials(token):
+    """Looks a session up in the store, which also extends its idle timeout, and caches its credentials.
+
+    The cached copy is used for SESSION_CACHE_TTL seconds; a session that
+    ends in the meantime through another worker is still accepted here
+    until then.
+    """
+    credentials = credential_sessions.get(token)
+    if credentials is not None:
+        remember_session(token, credentials)
+    return credentials
+
+def remember_session(token, credentials):
+    """Caches a session's credentials in this worker for SESSION_CACHE_TTL seconds."""
+    if SESSION_CACHE_TTL > 0:
+        session_lookups.set(token, credentials, SESSION_CACHE_TTL)
+
+# --- Listing Change Feed ---
+
+# Entry fields a listing can be sorted by; prefix with "-" for descending order.
+LISTING_SORT_FIELDS = ('name', 'state', 'type')
+
+def listing_entry_name(entry, index):
+    """Returns the key a listing entry is diffed by: its name, or its position if unnamed."""
+    name = entry.get('name') if isinstance(entry, dict) else None
+    return name if name is not None else str(index)
+
+def hash_listing_entry(entry):
+    """Returns a short content hash of one listing entry."""
+    encoded = json.dumps(entry, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+def listing_version(hashes):
+    """Returns the version token of a {name: entry_hash} mapping, in its order."""
+    digest = hashlib.blake2b(digest_size=12)
+    for name, entry_hash in hashes.items():
+        digest.update(f"{name}\0{entry_hash}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def sort_value(value, descending=False):
+    """Sort key that orders missing values last and never compares mixed types.
+
+    For a descending sort (sorted(..., reverse=True)) missing values are
+    flagged the other way round, so they still come last.
+    """
+    return (value is None) != descending, str(value)
+
+def check_name_regex(pattern):
+    """Rejects "name_regex" patterns that could take very long to match: overlong ones and nested quantifiers.
+
+    A group that contains a repetition and is itself repeated, as in (a+)+
+    or (a*b?)*, can backtrack exponentially. Raises ValueError.
+    """
+    if len(pattern) > LISTING_REGEX_MAX_LENGTH:
+        raise ValueError(f"name_regex must not be longer than {LISTING_REGEX_MAX_LENGTH} characters")
+    # One flag per open group: whether it contains a repetition.
+    groups = [False]
+    position = 0
+    while position < len(pattern):
+        char = pattern[position]
+        if char == '\\':
+            position += 1
+        elif char == '[':
+            # Skips a character class; a "]" right after "[" or "[^" is literal.
+            position += 2 if pattern.startswith('[^', position) else 1
+            if pattern.startswith(']', position):
+                position += 1
+            while position < len(pattern) and pattern[position] != ']':
+                position += 2 if pattern[position] == '\\' else 1
+        elif char == '(':
+            groups.append(False)
+        elif char == ')' and len(groups) > 1:
+            repeated = groups.pop()
+            if repeated and pattern[position + 1:position + 2] in ('*', '+', '{'):
+                raise ValueError("name_regex must not repeat a group that contains a repetition")
+            groups[-1] = groups[-1] or repeated
+        elif char in '*+{':
+            groups[-1] = True
+        position += 1
+
+def parse_listing_filter(spec):
+    """Parses {"name_prefix", "name_regex", "state"} into (prefix, compiled regex or None, set of states or None).
+
+    "state" may be a single state or a list of states. Raises re.error for
+    an invalid regex, ValueError for one check_name_regex rejects and
+    TypeError for a malformed spec.
+    """
+    if not isinstance(spec, dict):
+        raise TypeError("filter must be an object")
+    name_prefix = spec.get('name_prefix') or ''
+    if not isinstance(name_prefix, str):
+        raise TypeError("name_prefix must be a string")
+    name_regex = spec.get('name_regex') or None
+    if name_regex is not None:
+        if not isinstance(name_regex, str):
+            raise TypeError("name_regex must be a string")
+        check_name_regex(name_regex)
+        name_regex = re.compile(name_regex)
+    states = spec.get('state')
+    if isinstance(states, str):
+        states = [states]
+    return name_prefix, name_regex, set(states) if states else None
+
+def parse_listing_query(data):
+    """Reads the "filter", "sort", "offset" and "limit" request fields.
+
+    Returns None when the request asks for the whole listing, otherwise
+    (filter, sort, offset, limit). Raises ValueError, TypeError or re.error
+    for invalid values.
+    """
+    if not any(data.get(field) is not None for field in ('filter', 'sort', 'offset', 'limit')):
+        return None
+    name_filter = parse_listing_filter(data.get('filter') or {})
+    sort = data.get('sort') or None
+    if sort is not None and (not isinstance(sort, str) or sort.lstrip('-') not in LISTING_SORT_FIELDS):
+        raise ValueError(f"sort must be one of {', '.join(LISTING_SORT_FIELDS)}, optionally prefixed with '-'")
+    offset = int(data.get('offset') or 0)
+    limit = int(data['limit']) if data.get('limit') is not None else None
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError("offset and limit must not be negative")
+    return name_filter, sort, offset, limit
+
+class ListingIndex:
+    """Read-only index over one listing payload.
+
+    The entry hashes and version are computed up front; the name, state and
+    sort orders used by query() are built on first use and then reused for
+    as long as the payload stays cached.
+    """
+
+    def __init__(self, payload):
+        self.entries = payload.get('results', [])
+        self.names = [listing_entry_name(entry, index) for index, entry in enumerate(self.entries)]
+        self.hashes = {name: hash_listing_entry(entry) for name, entry in zip(self.names, self.entries)}
+        self.version = listing_version(self.hashes)
+        self._lock = threading.Lock()
+        self._orders = {}
+        self._sorted_names = None
+        self._by_state = None
+
+    def order(self, sort):
+        """Entry positions in a sort order ("field" or "-field"), ties broken by ascending name."""
+        with self._lock:
+            order = self._orders.get(sort)
+            if order is None:
+                by_name = self._orders.get('name')
+                if by_name is None:
+                    by_name = self._orders['name'] = sorted(range(len(self.entries)), key=self.names.__getitem__)
+                field = sort.lstrip('-')
+                descending = sort.startswith('-')
+                value = self.names.__getitem__ if field == 'name' else lambda index: self.entries[index].get(field)
+                # sorted() is stable, also with reverse=True, so entries with equal values stay in name order.
+                order = by_name if sort == 'name' else sorted(
+                    by_name, key=lambda index: sort_value(value(index), descending), reverse=descending)
+                self._orders[sort] = order
+            return order
+
+    def _build_lookups(self):
+        by_name = self.order('name')
+        with self._lock:
+            if self._by_state is None:
+                self._sorted_names = [self.names[index] for index in by_name]
+                by_state = {}
+                for index, entry in enumerate(self.entries):
+                    by_state.setdefault(entry.get('state'), []).append(index)
+                self._by_state = by_state
+
+    def select(self, name_prefix, name_regex, states):
+        """Returns the set of entry positions matching a parsed filter, or None if nothing is filtered."""
+        if not (name_prefix or name_regex or states):
+            return None
+        self._build_lookups()
+        candidates = None
+        if name_prefix:
+            by_name = self.order('name')
+            low = bisect.bisect_left(self._sorted_names, name_prefix)
+            high = bisect.bisect_left(self._sorted_names, name_prefix + '\U0010ffff')
+            candidates = set(by_name[low:high])
+        if states:
+            in_states = set()
+            for state in states:
+                in_states.update(self._by_state.get(state, ()))
+            candidates = in_states if candidates is None else candidates & in_states
+        if name_regex is not None:
+            pool = range(len(self.entries)) if candidates is None else candidates
+            candidates = {index for index in pool if name_regex.search(self.names[index])}
+        return candidates
+
+    def query(self, name_filter, sort, offset, limit):
+        """Returns (entries, matched_count) for a parsed filter, sort field and window."""
+        selected = self.select(*name_filter)
+        if sort:
+            order = self.order(sort)
+        else:
+            order = range(len(self.entries))
+        if selected is not None:
+            order = [index for index in order if index in selected]
+        end = None if limit is None else offset + limit
+        return [self.entries[index] for index in order[offset:end]], len(order)
+
+class ListingVersions:
+    """Indexes of cached listing payloads plus the entry hashes of recent versions.
+
+    A version is a hash over the (name, entry hash) pairs of a listing, so
+    identical content always gets the same token. Only hashes are kept per
+    version, which is enough to tell which entries a client holding that
+    version needs.
+    """
+
+    def __init__(self, max_snapshots):
+        self.max_snapshots = max_snapshots
+        self._lock = threading.Lock()
+        self._indexed = OrderedDict()
+        self._snapshots = OrderedDict()
+        self.diffs = 0
+        self.full = 0
+
+    def index(self, listing_key, payload):
+        """Returns the ListingIndex of a listing payload, recording its version as a snapshot."""
+        with self._lock:
+            indexed = self._indexed.get(listing_key)
+            if indexed is not None and indexed[0] is payload:
+                # Cached payloads are shared objects, so the last index can be reused. Its
+                # snapshot may have been evicted by other versions meanwhile; it is put back.
+                index = indexed[1]
+                self._indexed.move_to_end(listing_key)
+                self._remember(listing_key, index.version, index.hashes)
+                return index
+        index = ListingIndex(payload)
+        with self._lock:
+            self._indexed[listing_key] = (payload, index)
+            self._indexed.move_to_end(listing_key)
+            while len(self._indexed) > self.max_snapshots:
+                self._indexed.popitem(last=False)
+            self._remember(listing_key, index.version, index.hashes)
+        return index
+
+    def remember(self, key, version, hashes):
+        """Keeps the entry hashes of a listing (or listing view) version for later diffs."""
+        with self._lock:
+            self._remember(key, version, hashes)
+
+    def _remember(self, key, version, hashes):
+        """remember() for a caller holding the lock."""
+        self._snapshots[(key, version)] = hashes
+        self._snapshots.move_to_end((key, version))
+        while len(self._snapshots) > self.max_snapshots:
+            self._snapshots.popitem(last=False)
+
+    def snapshot(self, key, version):
+        """Returns the entry hashes of an earlier version, or None if it is unknown or evicted."""
+        with self._lock:
+            hashes = self._snapshots.get((key, version))
+            if hashes is not None:
+                self._snapshots.move_to_end((key, version))
+            return hashes
+
+    def record(self, diffed):
+        with self._lock:
+            if diffed:
+                self.diffs += 1
+            else:
+                self.full += 1
+
+    def stats(self):
+        with self._lock:
+            return {"snapshots": len(self._snapshots), "indexed": len(self._indexed),
+                    "diffs": self.diffs, "full": self.full}
+
+listing_versions = ListingVersions(LISTING_SNAPSHOTS)
+
+def versioned_listing(listing_key, payload, since=None, query=None):
+    """Adds a version token to a listing payload, or reduces it to a diff against version since.
+
+    With a parsed query (see parse_listing_query) the payload is first cut
+    down to the matching window, reported with "matchedCount", "offset" and
+    "limit"; its version then covers that view only.
+
+    The diff has "added" and "changed" entries, "removed" names, the new
+    "version" and "totalCount". When since is unknown the full listing is
+    returned, so clients tell the two apart by the presence of "results".
+    """
+    index = listing_versions.index(listing_key, payload)
+    view = {}
+    if query is None:
+        key, entries, version, hashes = listing_key, index.entries, index.version, index.hashes
+    else:
+        name_filter, sort, offset, limit = query
+        entries, matched = index.query(name_filter, sort, offset, limit)
+        view = {"matchedCount": matched, "offset": offset, "limit": limit}
+        key = listing_key + (json.dumps([name_filter[0], name_filter[1] and name_filter[1].pattern,
+                                         sorted(name_filter[2] or ()), sort, offset, limit]),)
+        hashes = {}
+        for position, entry in enumerate(entries):
+            name = listing_entry_name(entry, position)
+            hashes[name] = index.hashes.get(name) or hash_listing_entry(entry)
+        version = listing_version(hashes)
+        listing_versions.remember(key, version, hashes)
+
+    previous = listing_versions.snapshot(key, since) if since else None
+    listing_versions.record(previous is not None)
+    if previous is None:
+        if query is None:
+            return {**payload, "version": version}
+        return {"results": entries, "totalCount": payload.get('totalCount', len(index.entries)),
+                "version": version, **view}
+    added, changed = [], []
+    for position, entry in enumerate(entries):
+        name = listing_entry_name(entry, position)
+        if name not in previous:
+            added.append(entry)
+        elif previous[name] != hashes[name]:
+            changed.append(entry)
+    return {
+        "version": version,
+        "since": since,
+        "added": added,
+        "removed": [name for name in previous if name not in hashes],
+        "changed": changed,
+        "totalCount": payload.get('totalCount', len(index.entries)),
+        **view,
+    }
+
+# --- Field Projection ---
+
+def parse_fields(spec):
+    """Normalizes a "fields" value, a comma-separated string or a list of dotted paths, to a sorted tuple.
+
+    Raises TypeError or ValueError for a malformed value.
+    """
+    if isinstance(spec, str):
+        spec = spec.split(',')
+    if not isinstance(spec, list) or not all(isinstance(path, str) for path in spec):
+        raise TypeError("fields must be a comma-separated string or a list of paths")
+    paths = {path.strip() for path in spec if path.strip()}
+    for path in paths:
+        name = path[1:] if path.startswith('-') else path
+        # A single leading "-" marks a removal; "--a" is a typo rather than a field.
+        if name.startswith('-') or not all(name.split('.')):
+            raise ValueError(f"Invalid field path '{path}'.")
+    if not paths:
+        raise ValueError("fields must name at least one path")
+    return tuple(sorted(paths))
+
+def projection_tree(paths):
+    """Builds {key: subtree} from dotted paths; True marks a whole subtree."""
+    tree = {}
+    for path in paths:
+        node = tree
+        *parents, leaf = path.split('.')
+        for key in parents:
+            child = node.setdefault(key, {})
+            if child is True:
+                break
+            node = child
+        else:
+            node[leaf] = True
+    return tree
+
+def include_fields(value, tree):
+    """Keeps only the paths in tree; lists are projected element by element."""
+    if isinstance(value, list):
+        return [include_fields(item, tree) for item in value if isinstance(item, (dict, list))]
+    return {key: item if tree[key] is True else include_fields(item, tree[key])
+            for key, item in value.items()
+            if key in tree and (tree[key] is True or isinstance(item, (dict, list)))}
+
+def exclude_fields(value, tree):
+    """Drops the paths in tree; lists are projected element by element."""
+    if isinstance(value, list):
+        return [exclude_fields(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {key: exclude_fields(item, tree[key]) if key in tree else item
+            for key, item in value.items() if tree.get(key) is not True}
+
+@functools.lru_cache(maxsize=PROJECTION_CACHE_SIZE)
+def compile_projection(paths):
+    """Returns a function applying a parse_fields() projection to a JSON document.
+
+    Paths prefixed with "-" are removed. When any path is not prefixed,
+    only those paths are kept, before the removals apply.
+    """
+    included = projection_tree([path for path in paths if not path.startswith('-')])
+    excluded = projection_tree([path[1:] for path in paths if path.startswith('-')])
+
+    def project(document):
+        if not isinstance(document, (dict, list)):
+            return document
+        if included:
+            document = include_fields(document, included)
+        if excluded:
+            document = exclude_fields(document, excluded)
+        return document
+    return project
+
+# Projected bodies by (cache key, paths), valid while the raw body they came from is the cached one.
+projected_bodies = TTLCache(CACHE_MAX_ENTRIES)
+
+def project_body(cache_key, body, content_type, paths, ttl):
+    """Applies a projection to a raw JSON body; returns the projected (body, content_type).
+
+    A body that is not JSON is returned unchanged with its own content type.
+    """
+    memo = projected_bodies.get(cache_key + (paths,)) if ttl > 0 else None
+    if memo is not None and memo[0] is body:
+        return memo[1], 'application/json'
+    try:
+        with trace_span('decode'):
+            document = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return body, content_type
+    with trace_span('serialize'):
+        projected = json.dumps(compile_projection(paths)(document), separators=(",", ":")).encode('utf-8')
+    if ttl > 0:
+        projected_bodies.set(cache_key + (paths,), (body, projected), ttl)
+    return projected, 'application/json'
+
+# --- Processor Stats Sampler ---
+
+# Numeric processor stats that are sampled, as (dotted path, is_counter).
+# Counters only grow while a processor runs, so they also get per-second rates.
+STATS_FIELDS = (
+    ('inputMessageCount', True),
+    ('inputMessageSize', True),
+    ('outputMessageCount', True),
+    ('outputMessageSize', True),
+    ('dlqMessageCount', True),
+    ('dlqMessageSize', True),
+    ('stateSize', False),
+    ('memoryTrackerBytes', False),
+    ('changeStreamTimeDifferenceSecs', False),
+    ('latency.p50', False),
+    ('latency.p99', False),
+)
+STATS_FIELD_NAMES = [name for name, _ in STATS_FIELDS]
+STATS_COUNTER_COLUMNS = np.array([index for index, (_, is_counter) in enumerate(STATS_FIELDS) if is_counter])
+
+def extract_stats_vector(processor):
+    """Returns the STATS_FIELDS of a processor document as floats, NaN where absent."""
+    stats = processor.get('stats') or {}
+    vector = []
+    for path in STATS_FIELD_NAMES:
+        value = stats
+        for part in path.split('.'):
+            value = value.get(part) if isinstance(value, dict) else None
+        is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+        vector.append(float(value) if is_number else np.nan)
+    return vector
+
+def column_to_json(values):
+    """Converts a float array to a list with NaN replaced by None (JSON null)."""
+    return np.where(np.isnan(values), None, np.round(values, 6)).tolist()
+
+class StatsRingBuffer:
+    """Fixed-size, array-backed history of stats samples for one processor."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = np.full(capacity, np.nan)
+        self.values = np.full((capacity, len(STATS_FIELDS)), np.nan)
+        self.next = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def append(self, timestamp, vector):
+        with self._lock:
+            self.timestamps[self.next] = timestamp
+            self.values[self.next] = vector
+            self.next = (self.next + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def window(self, since):
+        """Returns (timestamps, values) of the samples taken at or after since, oldest first."""
+        with self._lock:
+            order = (np.arange(self.count) + self.next - self.count) % self.capacity
+            timestamps = self.timestamps[order]
+            values = self.values[order]
+        keep = timestamps >= since
+        return timestamps[keep], values[keep]
+
+def stats_history(buffer, since):
+    """Builds the JSON history for one processor, with per-second rates for the counters.
+
+    Rates are aligned with timestamps[1:]; a counter that went backwards
+    (e.g. the processor restarted) has no rate for that interval.
+    """
+    timestamps, values = buffer.window(since)
+    counters = values[:, STATS_COUNTER_COLUMNS]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = np.diff(counters, axis=0) / np.diff(timestamps)[:, None]
+    rates[rates < 0] = np.nan
+    counter_names = [STATS_FIELD_NAMES[index] for index in STATS_COUNTER_COLUMNS]
+    return {
+        "timestamps": timestamps.tolist(),
+        "samples": {name: column_to_json(values[:, index]) for index, name in enumerate(STATS_FIELD_NAMES)},
+        "rates_per_second": {name: column_to_json(rates[:, index]) for index, name in enumerate(counter_names)},
+        "latest_rates_per_second": {name: (column_to_json(rates[-1:, index]) or [None])[0]
+                                    for index, name in enumerate(counter_names)},
+    }
+
+class StatsSampler:
+    """Background thread polling stats for selected processors of one instance."""
+
+    def __init__(self, data, instance_name, interval):
+        self.data = data
+        self.instance_name = instance_name
+        self.interval = interval
+        self.buffers = {}
+        self.errors = {}
+        self.last_read = time.monotonic()
+        self.last_sample = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"stats-sampler-{instance_name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def add(self, processor_names):
+        with self._lock:
+            for name in processor_names:
+                if name not in self.buffers and len(self.buffers) < STATS_SAMPLER_MAX_PROCESSORS:
+                    self.buffers[name] = StatsRingBuffer(STATS_SAMPLER_CAPACITY)
+
+    def remove(self, processor_names):
+        with self._lock:
+            for name in processor_names:
+                self.buffers.pop(name, None)
+                self.errors.pop(name, None)
+            return len(self.buffers)
+
+    def _run(self):
+        upstream_priority.set(PRIORITY_BACKGROUND)
+        while not self._stop.is_set():
+            if time.monotonic() - self.last_read > STATS_SAMPLER_IDLE_TIMEOUT:
+                self.stop()
+                break
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        """Takes one sample of every selected processor."""
+        with self._lock:
+            names = list(self.buffers)
+            data = self.data
+        accept_header = "application/vnd.atlas.2024-05-30+json"
+
+        def fetch(name):
+            url = f"{ATLAS_API_SCHEME}://{data['atlas_host']}/api/atlas/v2/groups/{data['project_id']}/streams/{self.instance_name}/processor/{name}"
+            return name, time.time(), atlas_request('GET', url, data['public_key'], data['private_key'], accept_header)
+
+        for name, timestamp, (payload, status_code) in run_concurrently(fetch, names, STATS_SAMPLER_MAX_PARALLEL):
+            with self._lock:
+                buffer = self.buffers.get(name)
+                if buffer is None:
+                    continue
+                if status_code == 200:
+                    self.errors.pop(name, None)
+                else:
+                    self.errors[name] = {"status_code": status_code, **payload}
+            if status_code == 200:
+                buffer.append(timestamp, extract_stats_vector(payload))
+        self.last_sample = time.time()
+
+    def history(self, processor_names, since):
+        """Returns stats_history() for the given (or all) sampled processors."""
+        self.last_read = time.monotonic()
+        with self._lock:
+            buffers = dict(self.buffers)
+        names = processor_names or list(buffers)
+        return {name: stats_history(buffers[name], since) for name in names if name in buffers}
+
+    def status(self):
+        with self._lock:
+            return {
+                "instance_name": self.instance_name,
+                "running": self.running,
+                "interval_seconds": self.interval,
+                "capacity": STATS_SAMPLER_CAPACITY,
+                "processors": sorted(self.buffers),
+                "last_sample": self.last_sample,
+                "errors": dict(self.errors),
+            }
+
+class StatsSamplerRegistry:
+    """The running StatsSamplers, keyed by credentials and instance like the response cache.
+
+    With several worker processes one elected worker runs the registry for
+    all of them (see ElectedService in session_store.py), so a sampler
+    started through one worker can be read and stopped through any other.
+    The methods therefore take and return plain, picklable values.
+    """
+
+    def __init__(self):
+        self._samplers = {}
+        self._lock = threading.Lock()
+
+    def start(self, key, credentials, instance_name, processor_names, interval):
+        """Starts sampling processors, or adds them to a running sampler.
+
+        Returns the sampler's status, or None when STATS_SAMPLER_MAX_INSTANCES
+        other samplers are already running.
+        """
+        with self._lock:
+            sampler = self._samplers.get(key)
+            if sampler is None or not sampler.running:
+                if sum(1 for other in self._samplers.values() if other.running) >= STATS_SAMPLER_MAX_INSTANCES:
+                    return None
+                sampler = StatsSampler(credentials, instance_name, interval)
+                self._samplers[key] = sampler
+                sampler.add(processor_names)
+                sampler.start()
+            else:
+                sampler.data = credentials
+                sampler.interval = interval
+                sampler.last_read = time.monotonic()
+                sampler.add(processor_names)
+        return sampler.status()
+
+    def stop(self, key, processor_names):
+        """Stops sampling some (or, without processor_names, all) processors; returns the status or None."""
+        with self._lock:
+            sampler = self._samplers.get(key)
+            if sampler is None:
+                return None
+            if not processor_names or sampler.remove(processor_names) == 0:
+                sampler.stop()
+                del self._samplers[key]
+        return sampler.status()
+
+    def history(self, key, processor_names, since):
+        """Returns a sampler's status and StatsSampler.history(), or None when it is not running."""
+        with self._lock:
+            sampler = self._samplers.get(key)
+        if sampler is None:
+            return None
+        history = sampler.history(processor_names, since)
+        return {"sampler": sampler.status(), "processors": history}
+
+stats_samplers = connect_stats_samplers(StatsSamplerRegistry)
+
+def ensure_authorized(data):
+    """Checks that Atlas accepts the request's credentials for its project.
+
+    Server-side state gathered with someone else's credentials (cached or
+    sampled data) is only shared with verified credentials. Raises
+    RequestRejected with Atlas's error when they are not.
+    """
+    if authorized_credentials.get(credential_cache_key(data)):
+        return
+    payload, status_code, _ = fetch_listing(data, None, 'spis')
+    if status_code != 200:
+        raise RequestRejected(payload, status_code)
+
+def stats_history_result(data):
+    """Answers /api/get_stats_history: returns (payload, status_code, headers)."""
+    instance_name, = required_fields(data, ('instance_name',), "Missing 'instance_name' for stats history.")
+    try:
+        window_seconds = float(data.get('window_seconds', 300))
+    except (TypeError, ValueError):
+        raise RequestRejected({"error": "'window_seconds' must be a number."})
+    ensure_authorized(data)
+
+    history = stats_samplers.history(atlas_cache_key(data, instance_name), data.get('processor_names'),
+                                     time.time() - window_seconds)
+    if history is None:
+        return {"error": f"No stats sampler is running for '{instance_name}'."}, 404, {}
+    return {"sampler": history['sampler'], "window_seconds": window_seconds, "processors": history['processors']}, 200, {}
+
+# --- Instance Stats Summary ---
+
+# Stats that add up meaningfully across processors (counters plus memory use).
+STATS_SUMMED_COLUMNS = np.array([index for index, (name, is_counter) in enumerate(STATS_FIELDS)
+                                 if is_counter or name in ('stateSize', 'memoryTrackerBytes')])
+# Columns ranked for the top-N lists: (label, column used from counts, column used from rates).
+STATS_TOP_COLUMNS = (
+    ('throughput', STATS_FIELD_NAMES.index('inputMessageCount'), True),
+    ('dlq', STATS_FIELD_NAMES.index('dlqMessageCount'), False),
+    ('lag', STATS_FIELD_NAMES.index('changeStreamTimeDifferenceSecs'), False),
+)
+
+# Last stats table per instance, so the next summary can turn counters into rates.
+stats_summary_snapshots = TTLCache(STATS_SAMPLER_MAX_INSTANCES)
+
+def counter_rates(names, timestamp, values, previous):
+    """Per-second counter rates against an earlier (timestamp, names, values) table.
+
+    Returns (rates, interval_seconds), or (None, None) without a usable
+    earlier table. Processors missing from it, or whose counters went
+    backwards, get NaN.
+    """
+    if previous is None:
+        return None, None
+    previous_timestamp, previous_names, previous_values = previous
+    interval = timestamp - previous_timestamp
+    if interval <= 0:
+        return None, None
+    positions = {name: position for position, name in enumerate(previous_names)}
+    aligned = np.full((len(names), values.shape[1]), np.nan)
+    present = [row for row, name in enumerate(names) if name in positions]
+    aligned[present] = previous_values[[positions[names[row]] for row in present]]
+    rates = np.full(values.shape, np.nan)
+    rates[:, STATS_COUNTER_COLUMNS] = (values[:, STATS_COUNTER_COLUMNS] - aligned[:, STATS_COUNTER_COLUMNS]) / interval
+    rates[rates < 0] = np.nan
+    return rates, interval
+
+def top_processors(names, column, top_n):
+    """The top_n processors by a stats column, highest first, skipping missing values."""
+    # A stable sort of the negated values keeps ties in listing order.
+    ranked = np.argsort(-np.where(np.isnan(column), -np.inf, column), kind='stable')[:top_n]
+    return [{"processor_name": names[row], "value": round(float(column[row]), 6)}
+            for row in ranked if not np.isnan(column[row])]
+
+def summarize_stats(names, values, rates, top_n, percentiles):
+    """Builds totals, percentile distributions and top-N lists over a (processors x STATS_FIELDS) table."""
+    with warnings.catch_warnings():
+        # Columns no processor reports are all NaN; they come out as null.
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if len(names):
+            distribution = np.nanpercentile(values, percentiles, axis=0)
+        else:
+            distribution = np.full((len(percentiles), values.shape[1]), np.nan)
+        rate_totals = np.nansum(rates, axis=0) if rates is not None else None
+    counts = (~np.isnan(values)).sum(axis=0)
+    totals = np.where(counts > 0, np.nansum(values, axis=0), np.nan)
+    summary = {
+        "totals": {STATS_FIELD_NAMES[index]: column_to_json(totals[[index]])[0] for index in STATS_SUMMED_COLUMNS},
+        "percentiles": {
+            name: dict(zip((f"p{percentile:g}" for percentile in percentiles), column_to_json(distribution[:, index])))
+            for index, name in enumerate(STATS_FIELD_NAMES)
+        },
+        "top": {},
+    }
+    if rates is not None:
+        summary["total_rates_per_second"] = {STATS_FIELD_NAMES[index]: column_to_json(rate_totals[[index]])[0]
+                                             for index in STATS_COUNTER_COLUMNS}
+    for label, index, use_rate in STATS_TOP_COLUMNS:
+        column = rates[:, index] if use_rate and rates is not None else values[:, index]
+        summary["top"][label] = top_processors(names, column, top_n)
+    return summary
+
+# --- Live Processor Stream ---
+
+def processor_summary(processor):
+    """The part of a processor listing entry that the live stream tracks."""
+    return {"name": processor.get('name'), "state": processor.get('state'), "stats": processor.get('stats')}
+
+def processor_deltas(previous, current):
+    """Diffs two {name: summary} snapshots into added/removed/changed lists.
+
+    Changed entries only carry the fields ("state", "stats") that differ.
+    """
+    added = [summary for name, summary in current.items() if name not in previous]
+    removed = [name for name in previous if name not in current]
+    changed = []
+    for name, summary in current.items():
+        old = previous.get(name)
+        if old is None:
+            continue
+        fields = {field: summary[field] for field in ('state', 'stats') if summary[field] != old[field]}
+        if fields:
+            changed.append({"name": name, **fields})
+    if not (added or removed or changed):
+        return None
+    return {"added": added, "removed": removed, "changed": changed}
+
+class StreamSubscriber:
+    """Per-client event buffer; a client that falls behind is resynchronized with a snapshot."""
+
+    def __init__(self, notify=None):
+        self._lock = threading.Lock()
+        self._events = deque()
+        self._ready = threading.Event()
+        # Called from the watcher thread after each push, for readers that do not block in drain().
+        self._notify = notify
+        self.needs_snapshot = False
+
+    def push(self, event):
+        with self._lock:
+            if len(self._events) >= STREAM_QUEUE_SIZE:
+                self._events.clear()
+                self.needs_snapshot = True
+            else:
+                self._events.append(event)
+            self._ready.set()
+        if self._notify is not None:
+            self._notify()
+
+    def resync(self):
+        """Drops the buffered events and has the reader send a full snapshot instead."""
+        with self._lock:
+            self._events.clear()
+            self.needs_snapshot = True
+            self._ready.set()
+        if self._notify is not None:
+            self._notify()
+
+    def drain(self, timeout):
+        """Waits up to timeout seconds, then returns (events, needs_snapshot)."""
+        self._ready.wait(timeout)
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            self._ready.clear()
+            needs_snapshot, self.needs_snapshot = self.needs_snapshot, False
+        return events, needs_snapshot
+
+def apply_processor_delta(snapshot, delta):
+    """Applies a processor_deltas() result to a {name: summary} snapshot in place."""
+    for name in delta['removed']:
+        snapshot.pop(name, None)
+    for summary in delta['added']:
+        snapshot[summary['name']] = summary
+    for change in delta['changed']:
+        snapshot[change['name']] = {**snapshot.get(change['name'], {}), **change}
+
+class ProcessorPoller:
+    """Polls one instance's processor listing and keeps a numbered log of the changes.
+
+    Atlas is polled once per interval, using the credentials of the most
+    recent reader, and polling stops once nobody has read the log for a
+    few intervals.
+    """
+
+    def __init__(self, data, instance_name, snapshot):
+        self.data = data
+        self.instance_name = instance_name
+        self.sequence = 0
+        self.last_read = time.monotonic()
+        self._condition = threading.Condition()
+        self._snapshot = snapshot
+        self._events = deque(maxlen=STREAM_QUEUE_SIZE)
+        self._last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"processor-poller-{instance_name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    @property
+    def running(self):
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def position(self):
+        """Returns (sequence, snapshot) for a reader that starts following the log."""
+        with self._condition:
+            self.last_read = time.monotonic()
+            return self.sequence, dict(self._snapshot)
+
+    def events(self, sequence, timeout):
+        """Waits up to timeout seconds for events after sequence; returns (sequence, events, snapshot).
+
+        snapshot is None unless the log no longer reaches back to sequence,
+        in which case events is empty and the reader starts over from it.
+        """
+        with self._condition:
+            self.last_read = time.monotonic()
+            if sequence == self.sequence:
+                self._condition.wait(timeout)
+            oldest = self._events[0][0] if self._events else self.sequence + 1
+            if sequence + 1 < oldest:
+                return self.sequence, [], dict(self._snapshot)
+            return self.sequence, [event for number, event in self._events if number > sequence], None
+
+    def _publish(self, event):
+        with self._condition:
+            self.sequence += 1
+            self._events.append((self.sequence, event))
+            self._condition.notify_all()
+
+    def _run(self):
+        upstream_priority.set(PRIORITY_BACKGROUND)
+        while not self._stop.wait(STREAM_POLL_INTERVAL):
+            if time.monotonic() - self.last_read > 3 * STREAM_POLL_INTERVAL:
+                self._stop.set()
+                break
+            data = self.data
+            url, accept_header, ttl = listing_target(data, self.instance_name, 'processors')
+            payload, status_code = fetch_all_pages(url, data['public_key'], data['private_key'], accept_header)
+            if status_code != 200:
+                error = {"status_code": status_code, **payload}
+                if error != self._last_error:
+                    self._last_error = error
+                    self._publish(('error', error))
+                continue
+            self._last_error = None
+            if ttl > 0:
+                # Keep the cached listing warm for regular list requests too.
+                response_cache.set(atlas_cache_key(data, self.instance_name, 'processors'), payload, ttl)
+            current = {processor.get('name'): processor_summary(processor) for processor in payload.get('results', [])}
+            with self._condition:
+                delta = processor_deltas(self._snapshot, current)
+                self._snapshot = current
+            if delta:
+                self._publish(('delta', delta))
+
+class ProcessorPollers:
+    """The running ProcessorPollers, keyed by credentials and instance like the response cache.
+
+    With several worker processes one elected worker polls for all of them
+    (see ElectedService in session_store.py), so Atlas is polled once per
+    interval per instance however many workers have subscribers. The
+    methods therefore take and return plain, picklable values.
+    """
+
+    def __init__(self):
+        self._pollers = {}
+        self._lock = threading.Lock()
+
+    def watch(self, key, data, instance_name, snapshot):
+        """Starts polling an instance from snapshot unless it is polled already; returns ProcessorPoller.position()."""
+        with self._lock:
+            poller = self._pollers.get(key)
+            if poller is None or not poller.running:
+                poller = ProcessorPoller(data, instance_name, snapshot)
+                self._pollers[key] = poller
+                poller.start()
+            else:
+                poller.data = data
+        return poller.position()
+
+    def events(self, key, data, sequence, timeout):
+        """Returns ProcessorPoller.events() of an instance, or None when it is no longer polled."""
+        with self._lock:
+            poller = self._pollers.get(key)
+        if poller is None or not poller.running:
+            return None
+        poller.data = data
+        return poller.events(sequence, timeout)
+
+processor_pollers = connect_processor_pollers(ProcessorPollers)
+
+class ProcessorWatcher:
+    """Relays the changes of one instance from processor_pollers to this process's subscribers.
+
+    However many browsers are subscribed, the thread waits on one poller
+    and keeps its own copy of the snapshot for subscribers that join or
+    fall behind.
+    """
+
+    def __init__(self, key, data, instance_name, snapshot):
+        self.key = key
+        self.data = data
+        self.instance_name = instance_name
+        self.subscribers = set()
+        self._lock = threading.Lock()
+        self._snapshot = snapshot
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"processor-watcher-{instance_name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._snapshot.values())
+
+    def add_subscriber(self, subscriber):
+        with self._lock:
+            self.subscribers.add(subscriber)
+
+    def remove_subscriber(self, subscriber):
+        """Removes a subscriber and returns how many remain."""
+        with self._lock:
+            self.subscribers.discard(subscriber)
+            return len(self.subscribers)
+
+    def _broadcast(self, event):
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.push(event)
+
+    def _resynchronize(self, snapshot):
+        with self._lock:
+            self._snapshot = snapshot
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.resync()
+
+    def _run(self):
+        sequence = None
+        while not self._stop.is_set():
+            try:
+                if sequence is None:
+                    with self._lock:
+                        current = dict(self._snapshot)
+                    sequence, snapshot = processor_pollers.watch(self.key, self.data, self.instance_name, current)
+                    if snapshot != current:
+                        self._resynchronize(snapshot)
+                    continue
+                result = processor_pollers.events(self.key, self.data, sequence, STREAM_POLL_INTERVAL)
+            except SessionStoreUnavailable as error:
+                self._broadcast(('error', {"error": "Live updates are unavailable.", "details": str(error), "status_code": 503}))
+                self._stop.wait(STREAM_POLL_INTERVAL)
+                continue
+            if result is None:
+                # The poller stopped, or the worker running it exited; start it again from this snapshot.
+                sequence = None
+                continue
+            sequence, events, snapshot = result
+            if snapshot is not None:
+                self._resynchronize(snapshot)
+            for event, payload in events:
+                if event == 'delta':
+                    with self._lock:
+                        apply_processor_delta(self._snapshot, payload)
+                self._broadcast((event, payload))
+
+processor_watchers = {}
+processor_watchers_lock = threading.Lock()
+
+def subscribe_processor_watcher(data, instance_name, listing, notify=None):
+    """Registers a subscriber with the instance's watcher, starting one if needed."""
+    key = atlas_cache_key(data, instance_name)
+    credentials = {field: data[field] for field in CREDENTIAL_FIELDS}
+    subscriber = StreamSubscriber(notify)
+    with processor_watchers_lock:
+        watcher = processor_watchers.get(key)
+        if watcher is None:
+            snapshot = {processor.get('name'): processor_summary(processor) for processor in listing.get('results', [])}
+            watcher = ProcessorWatcher(key, credentials, instance_name, snapshot)
+            processor_watchers[key] = watcher
+            watcher.start()
+        else:
+            watcher.data = credentials
+        watcher.add_subscriber(subscriber)
+    return watcher, subscriber
+
+def unsubscribe_processor_watcher(data, instance_name, watcher, subscriber):
+    """Removes a subscriber, stopping the watcher once nobody is listening."""
+    with processor_watchers_lock:
+        if watcher.remove_subscriber(subscriber) == 0:
+            watcher.stop()
+            processor_watchers.pop(atlas_cache_key(data, instance_name), None)
+
+def sse_event(event, payload):
+    """Formats one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+# --- Request Batching ---
+
+# Routes a /api/batch operation may name, with the function answering each: routes that only read,
+# taking the usual JSON body. Routes that fan out over many processors or instances on pools of their
+# own are left out.
+BATCH_OPERATIONS = {
+    'fetch_data': functools.partial(listing_result, resource='processors'),
+    'list_connections': functools.partial(listing_result, resource='connections'),
+    'list_spis': functools.partial(listing_result, resource='spis'),
+    'get_processor_stats': processor_stats_result,
+    'get_connection_details': connection_details_result,
+    'get_stats_history': stats_history_result,
+}
+# Response headers passed on with an operation's result.
+BATCH_RESULT_HEADERS = ('X-Cache', 'Age', 'X-Cache-Revalidating')
+
+def parse_batch_request(data):
+    """Validates a /api/batch body; returns (operations, max_parallel) or raises RequestRejected."""
+    def invalid(details):
+        return RequestRejected({"error": "Invalid batch.", "details": details})
+
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        raise invalid("'operations' must be a non-empty list.")
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        raise invalid(f"At most {BATCH_MAX_OPERATIONS} operations are allowed per batch.")
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in BATCH_OPERATIONS:
+            raise invalid(f"Operation {index} must be an object whose 'op' is one of: {', '.join(BATCH_OPERATIONS)}.")
+    try:
+        max_parallel = min(int(data.get('max_parallel', BATCH_MAX_PARALLEL)), BATCH_MAX_PARALLEL)
+    except (TypeError, ValueError):
+        raise invalid("'max_parallel' must be an integer.")
+    return operations, max(1, max_parallel)
+
+def batch_operation_body(data, operation):
+    """Builds an operation's request body: the batch's shared fields, its own fields, then the batch's credentials."""
+    body = {key: value for key, value in data.items() if key not in ('operations', 'max_parallel')}
+    body.update((key, value) for key, value in operation.items() if key != 'op')
+    body.update((field, data[field]) for field in CREDENTIAL_FIELDS if field in data)
+    return body
+
+def batch_record(index, op, status_code, headers, body, is_json):
+    """Serializes one operation result as a single JSON line.
+
+    A JSON body is spliced in as received, so large listings are not parsed
+    and serialized a second time; only bodies spanning several lines are.
+    """
+    body = body.strip()
+    if not is_json:
+        body = json.dumps(body.decode('utf-8', errors='replace')).encode('utf-8')
+    elif b"\n" in body:
+        body = json.dumps(json.loads(body), separators=(",", ":")).encode('utf-8')
+    head = {"index": index, "op": op, "status": status_code}
+    if headers:
+        head["headers"] = headers
+    return json.dumps(head, separators=(",", ":"))[:-1].encode('utf-8') + b',"body":' + (body or b'null') + b"}"
+
+def is_json_mimetype(content_type):
+    """Tells whether a Content-Type header names JSON, vendor types such as application/vnd.atlas+json included."""
+    mimetype = content_type.split(';', 1)[0].strip().lower()
+    return mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))
+
+def batch_result_record(index, op, result):
+    """Serializes the (payload, status_code, headers) result of an operation; returns (index, status_code, record)."""
+    payload, status_code, headers = result
+    if isinstance(payload, bytes):
+        body, is_json = payload, is_json_mimetype(headers.get('Content-Type', ''))
+    else:
+        body, is_json = app.json.dumps(payload, separators=(",", ":")).encode('utf-8'), True
+    headers = {name: headers[name] for name in BATCH_RESULT_HEADERS if name in headers}
+    return index, status_code, batch_record(index, op, status_code, headers, body, is_json)
+
+def run_batch_operation(data, index, operation, budget):
+    """Runs one operation through the function answering its route; returns (index, status_code, record).
+
+    Its Atlas calls are charged to the batch's UpstreamBudget.
+    """
+    op = operation['op']
+    try:
+        with upstream_budget_scope(budget):
+            try:
+                result = BATCH_OPERATIONS[op](batch_operation_body(data, operation))
+            except RequestRejected as rejected:
+                result = rejected.payload, rejected.status_code, {}
+        return batch_result_record(index, op, result)
+    except Exception as e:
+        app.logger.exception("Batch operation %s failed", op)
+        body = json.dumps({"error": "Batch operation failed.", "details": str(e)}).encode('utf-8')
+        return index, 500, batch_record(index, op, 500, None, body, True)
+
+def batch_document(results, total):
+    """Joins (index, status_code, record) results into one JSON document, in request order."""
+    records = [None] * total
+    failed = 0
+    for index, status_code, record in results:
+        records[index] = record
+        failed += status_code >= 400
+    return (b'{"results":[' + b",".join(records)
+            + f'],"total":{total},"succeeded":{total - failed},"failed":{failed}}}\n'.encode('utf-8'))
+
+# --- Frontend Delivery ---
+
+def build_index_page():
+    """Renders HTML_TEMPLATE once and pre-compresses it.
+
+    Returns a dict mapping each content coding to its (body, etag) pair.
+    The ETags are strong, so each coding gets its own.
+    """
+    with app.app_context():
+        html = render_template_string(HTML_TEMPLATE).encode('utf-8')
+    bodies = {'identity': html, 'gzip': gzip.compress(html, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        bodies['br'] = brotli.compress(html, quality=11)
+    digest = hashlib.sha256(html).hexdigest()[:32]
+    return {coding: (body, f"{digest}-{coding}") for coding, body in bodies.items()}
+
+INDEX_PAGE = build_index_page()
+
+# --- Route Requests ---
+# What the API routes accept and answer, kept apart from the I/O so the Flask
+# routes below and the async handlers of asgi.py validate requests, address
+# Atlas and build documents the same way. Nothing here calls Atlas.
+
+class RequestRejected(Exception):
+    """Raised for a request body a route answers with a JSON error, 400 unless given."""
+
+    def __init__(self, payload, status_code=400):
+        super().__init__(payload['error'])
+        self.payload = payload
+        self.status_code = status_code
+
+def request_data_error(data):
+    """The error payload for a body without the credentials every Atlas route needs, or None."""
+    if not data:
+        return {"error": "Invalid request format. Expected JSON."}
+    atlas_host = data.get('atlas_host', 'cloud.mongodb.com')
+    if not all([data.get('public_key'), data.get('private_key'), data.get('project_id'), atlas_host]):
+        return {"error": "Missing required fields."}
+    return None
+
+def required_fields(data, names, error):
+    """Returns the values of the named fields; raises RequestRejected with error when one is empty."""
+    values = [data.get(name) for name in names]
+    if not all(values):
+        raise RequestRejected({"error": error})
+    return values
+
+def requested_fields(data):
+    """The parsed "fields" of a request (see parse_fields), or None when it has none."""
+    try:
+        return parse_fields(data['fields']) if 'fields' in data else None
+    except (TypeError, ValueError) as e:
+        raise RequestRejected({"error": "Invalid fields.", "details": str(e)})
+
+def requested_listing_query(data):
+    """The parsed listing query of a request (see parse_listing_query)."""
+    try:
+        return parse_listing_query(data)
+    except (TypeError, ValueError, re.error) as e:
+        raise RequestRejected({"error": "Invalid listing query.", "details": str(e)})
+
+def streams_url(data, path=''):
+    """The Atlas URL of the project's stream processing API, plus path."""
+    return f"{ATLAS_API_SCHEME}://{data['atlas_host']}/api/atlas/v2/groups/{data['project_id']}/streams{path}"
+
+def processor_action_target(data, instance_name, processor_name, action):
+    """Maps a processor action to its Atlas (method, url), or None for an unknown action."""
+    base_url = streams_url(data, f"/{instance_name}/processor/{processor_name}")
+    if action == 'start':
+        return 'POST', f"{base_url}:start"
+    if action == 'stop':
+        return 'POST', f"{base_url}:stop"
+    if action == 'delete':
+        return 'DELETE', base_url
+    return None
+
+def compile_listing_filter(spec):
+    """Builds a predicate over listing entries from a filter spec (see parse_listing_filter)."""
+    name_prefix, name_regex, states = parse_listing_filter(spec)
+
+    def matches(entry):
+        name = entry.get('name') or ''
+        return (name.startswith(name_prefix)
+                and (name_regex is None or name_regex.search(name) is not None)
+                and (states is None or entry.get('state') in states))
+    return matches
+
+# Each *_call builder validates the body of a route that changes Atlas state and
+# returns (call, invalidate): call holds the (method, url, accept_header,
+# json_body, content_type_header) of the Atlas request, and invalidate(),
+# which does blocking I/O, drops the cached responses the change makes stale.
+
+def manage_processor_call(data):
+    instance_name, processor_name, action = required_fields(
+        data, ('instance_name', 'processor_name', 'action'), "Missing required fields for processor management.")
+    target = processor_action_target(data, instance_name, processor_name, action)
+    if target is None:
+        raise RequestRejected({"error": "Invalid action specified."})
+    method, url = target
+    return ((method, url, "application/vnd.atlas.2024-05-30+json", None, None),
+            functools.partial(invalidate_cached, data, instance_name, ('processors',), ('processor', processor_name)))
+
+def create_processor_call(data):
+    instance_name, processor_body = required_fields(
+        data, ('instance_name', 'processor_body'), "Missing instance_name or processor_body for create.")
+    return (('POST', streams_url(data, f"/{instance_name}/processor"), "application/vnd.atlas.2024-05-30+json",
+             processor_body, None),
+            functools.partial(invalidate_cached, data, instance_name, ('processors',)))
+
+def create_spi_call(data):
+    spi_body = data.get('spi_body')
+    if not spi_body or not isinstance(spi_body, dict):
+        raise RequestRejected({"error": "Missing or invalid 'spi_body' in request."})
+    return (('POST', streams_url(data), "application/vnd.atlas.2023-02-01+json", spi_body, None),
+            functools.partial(invalidate_cached, data, None, ('spis',)))
+
+def delete_spi_call(data):
+    instance_name, = required_fields(data, ('instance_name',), "Missing 'instance_name' to delete.")
+    return (('DELETE', streams_url(data, f"/{instance_name}"), "application/vnd.atlas.2023-02-01+json", None, None),
+            functools.partial(invalidate_cached_instance, data, instance_name))
+
+def create_connection_call(data):
+    instance_name, connection_body = required_fields(
+        data, ('instance_name', 'connection_body'), "Missing instance_name or connection_body for create.")
+    return (('POST', streams_url(data, f"/{instance_name}/connections"), "application/vnd.atlas.2023-02-01+json",
+             connection_body, "application/vnd.atlas.2023-02-01+json"),
+            functools.partial(invalidate_cached, data, instance_name, ('connections',)))
+
+def manage_connection_call(data):
+    instance_name, connection_name, action = required_fields(
+        data, ('instance_name', 'connection_name', 'action'), "Missing required fields for connection management.")
+    if action != 'delete':
+        raise RequestRejected({"error": "Invalid action specified for connection."})
+    return (('DELETE', streams_url(data, f"/{instance_name}/connections/{connection_name}"),
+             "application/vnd.atlas.2023-02-01+json", None, None),
+            functools.partial(invalidate_cached, data, instance_name, ('connections',), ('connection', connection_name)))
+
+# The routes passing one cached Atlas document through; each returns the
+# (url, accept_header, cache_key, ttl, fields) to serve.
+
+def processor_stats_target(data):
+    instance_name, processor_name = required_fields(
+        data, ('instance_name', 'processor_name'), "Missing instance_name or processor_name for stats task.")
+    fields = requested_fields(data)
+    return (streams_url(data, f"/{instance_name}/processor/{processor_name}"), "application/vnd.atlas.2024-05-30+json",
+            atlas_cache_key(data, instance_name, 'processor', processor_name), CACHE_TTL_PROCESSOR_STATS, fields)
+
+def connection_details_target(data):
+    instance_name, connection_name = required_fields(
+        data, ('instance_name', 'connection_name'), "Missing instance_name or connection_name for details task.")
+    fields = requested_fields(data)
+    return (streams_url(data, f"/{instance_name}/connections/{connection_name}"), "application/vnd.atlas.2023-02-01+json",
+            atlas_cache_key(data, instance_name, 'connection', connection_name), CACHE_TTL_CONNECTION_DETAILS, fields)
+
+def parse_bulk_request(data):
+    """Validates a /api/bulk_manage_processors body.
+
+    Returns (instance_name, action, processor_names, matches, max_parallel);
+    matches is the predicate of "filter", or None without one.
+    """
+    instance_name = data.get('instance_name')
+    action = data.get('action')
+    processor_names = data.get('processor_names')
+    name_filter = data.get('filter')
+
+    if not all([instance_name, action]) or not (processor_names or name_filter):
+        raise RequestRejected({"error": "Missing instance_name, action, or processor_names/filter for bulk management."})
+    if processor_action_target(data, instance_name, 'probe', action) is None:
+        raise RequestRejected({"error": "Invalid action specified."})
+    if processor_names is not None and not (isinstance(processor_names, list) and all(isinstance(name, str) for name in processor_names)):
+        raise RequestRejected({"error": "'processor_names' must be a list of names."})
+
+    try:
+        max_parallel = min(int(data.get('max_parallel', BULK_MAX_PARALLEL)), BULK_MAX_PARALLEL)
+    except (TypeError, ValueError):
+        raise RequestRejected({"error": "'max_parallel' must be an integer."})
+
+    matches = None
+    if name_filter:
+        try:
+            matches = compile_listing_filter(name_filter)
+        except (TypeError, ValueError, re.error) as e:
+            raise RequestRejected({"error": "Invalid filter.", "details": str(e)})
+    return instance_name, action, processor_names, matches, max(1, max_parallel)
+
+def select_bulk_targets(listing, matches, processor_names):
+    """The names of the listed processors matching a bulk filter, narrowed to processor_names when given."""
+    # An entry without a name cannot be acted on, so it is never selected.
+    selected = [processor.get('name') for processor in listing.get('results', []) if matches(processor)]
+    selected = [name for name in selected if isinstance(name, str) and name]
+    if processor_names:
+        selected = [name for name in selected if name in set(processor_names)]
+    return selected
+
+def bulk_result(processor_name, action, result, status_code):
+    """One processor's entry in a bulk action's results."""
+    return {"processor_name": processor_name, "action": action, "ok": status_code == 200,
+            "status_code": status_code, "result": result}
+
+def bulk_document(results):
+    """The /api/bulk_manage_processors document of bulk_result entries."""
+    failed = sum(1 for result in results if not result['ok'])
+    return {"results": results, "total": len(results), "succeeded": len(results) - failed, "failed": failed}
+
+class InventoryDocument:
+    """Builds an /api/inventory response from the instance listing and each instance's listings as they arrive.
+
+    Created right after the instance listing was fetched, with the time the
+    request started; jobs lists the (instance_name, resource) listings to fetch.
+    """
+
+    def __init__(self, data, spis, started):
+        self.project_id = data['project_id']
+        self.started = started
+        self.list_spis_ms = (time.perf_counter() - started) * 1000
+        self.instances = {}
+        for spi in spis.get('results', []):
+            # The listings of an instance without a name cannot be fetched.
+            if spi.get('name'):
+                self.instances[spi['name']] = {"name": spi['name'], "instance": spi, "connections": [], "processors": [],
+                                               "timings_ms": {}, "errors": {}}
+        self.jobs = [(name, resource) for name in self.instances for resource in ('connections', 'processors')]
+        self.fan_out_started = time.perf_counter()
+
+    def instance_records(self):
+        """The NDJSON lines sent before any listing arrives, one per instance."""
+        return [{"name": entry['name'], "instance": entry['instance']} for entry in self.instances.values()]
+
+    def add(self, instance_name, resource, payload, status_code, elapsed_ms):
+        """Files one listing (or its error) under its instance; returns its NDJSON line."""
+        entry = self.instances[instance_name]
+        record = {"name": instance_name, "resource": resource, "timings_ms": round(elapsed_ms, 1)}
+        entry['timings_ms'][resource] = record['timings_ms']
+        if status_code == 200:
+            entry[resource] = record['results'] = payload.get('results', [])
+        else:
+            entry['errors'][resource] = record['error'] = {"status_code": status_code, **payload}
+        return record
+
+    def meta(self):
+        """Every field of the document except "instances", as sent in the NDJSON "_meta" line."""
+        return {
+            "project_id": self.project_id,
+            "instanceCount": len(self.instances),
+            "failedInstances": [entry['name'] for entry in self.instances.values() if entry['errors']],
+            "timings_ms": {
+                "list_spis": round(self.list_spis_ms, 1),
+                "fan_out": round((time.perf_counter() - self.fan_out_started) * 1000, 1),
+                "total": round((time.perf_counter() - self.started) * 1000, 1),
+            },
+        }
+
+    def document(self):
+        meta = self.meta()
+        return {"project_id": meta.pop('project_id'), "instances": list(self.instances.values()), **meta}
+
+def parse_summary_request(data):
+    """Validates an /api/instance_stats_summary body.
+
+    Returns (instance_name, top_n, max_parallel, percentiles, matches);
+    matches is the predicate of "filter", or None without one.
+    """
+    instance_name, = required_fields(data, ('instance_name',), "Missing 'instance_name' for the stats summary.")
+    try:
+        top_n = int(data.get('top_n', 5))
+        if top_n < 0:
+            raise ValueError("top_n must not be negative")
+        top_n = min(top_n, SUMMARY_MAX_TOP_N)
+        max_parallel = min(int(data.get('max_parallel', SUMMARY_MAX_PARALLEL)), SUMMARY_MAX_PARALLEL)
+        if max_parallel < 1:
+            raise ValueError("max_parallel must be at least 1")
+        percentiles = [float(percentile) for percentile in data.get('percentiles', [50, 90, 99])]
+        if not all(0 <= percentile <= 100 for percentile in percentiles):
+            raise ValueError("percentiles must be between 0 and 100")
+        matches = compile_listing_filter(data['filter']) if data.get('filter') else None
+    except (TypeError, ValueError, re.error) as e:
+        raise RequestRejected({"error": "Invalid summary options.", "details": str(e)})
+    return instance_name, top_n, max_parallel, percentiles, matches
+
+class StatsSummary:
+    """Collects the stats of an instance's processors as they arrive and builds the /api/instance_stats_summary document.
+
+    Created right after the processor listing was fetched, with the time the
+    request started; processor_names lists the processors to fetch stats for.
+    Raises RequestRejected when the filtered listing has too many processors.
+    """
+
+    def __init__(self, data, instance_name, listing, matches, top_n, percentiles, started):
+        self.processors = [processor for processor in listing.get('results', []) if matches is None or matches(processor)]
+        if len(self.processors) > SUMMARY_MAX_PROCESSORS:
+            raise RequestRejected({"error": f"The summary is limited to {SUMMARY_MAX_PROCESSORS} processors; narrow it with 'filter'."})
+        self.data = data
+        self.instance_name = instance_name
+        self.filtered = matches is not None
+        self.top_n = top_n
+        self.percentiles = percentiles
+        self.started = started
+        self.listing_ms = (time.perf_counter() - started) * 1000
+        # An entry without a name has no stats to fetch, so it is left out of the sample.
+        self.processor_names = [processor.get('name') for processor in self.processors]
+        self.processor_names = [name for name in self.processor_names if isinstance(name, str) and name]
+        self.vectors, self.failures = {}, {}
+        self.fan_out_started = time.perf_counter()
+
+    def stats_url(self, name):
+        return streams_url(self.data, f"/{self.instance_name}/processor/{name}")
+
+    def add(self, name, payload, status_code):
+        """Files one processor's stats vector (or error)."""
+        if status_code == 200:
+            self.vectors[name] = extract_stats_vector(payload)
+        else:
+            self.failures[name] = {"processor_name": name, "status_code": status_code, "error": payload.get('error')}
+
+    def record(self, name):
+        """The NDJSON line of a processor already added."""
+        if name in self.failures:
+            return self.failures[name]
+        return {"processor_name": name, "stats": dict(zip(STATS_FIELD_NAMES, column_to_json(np.array(self.vectors[name]))))}
+
+    def document(self):
+        # Aggregated in listing order, whatever order the stats arrived in.
+        names = [name for name in self.processor_names if name in self.vectors]
+        rows = [self.vectors[name] for name in names]
+        errors = [self.failures[name] for name in self.processor_names if name in self.failures]
+        fan_out_ms = (time.perf_counter() - self.fan_out_started) * 1000
+
+        timestamp = time.time()
+        values = np.array(rows, dtype=float).reshape(len(rows), len(STATS_FIELDS))
+        snapshot_key = atlas_cache_key(self.data, self.instance_name, 'stats_summary')
+        previous = None if self.filtered else stats_summary_snapshots.get(snapshot_key)
+        rates, interval = counter_rates(names, timestamp, values, previous)
+        if not self.filtered and names:
+            stats_summary_snapshots.set(snapshot_key, (timestamp, names, values), SUMMARY_RATE_WINDOW)
+
+        states = {}
+        for processor in self.processors:
+            state = processor.get('state') or 'UNKNOWN'
+            states[state] = states.get(state, 0) + 1
+        summary = summarize_stats(names, values, rates, self.top_n, self.percentiles)
+        return {
+            "instance_name": self.instance_name,
+            "processorCount": len(self.processors),
+            "sampled": len(names),
+            "failed": len(errors),
+            "errors": errors,
+            "states": states,
+            "throughput_basis": "rate" if rates is not None else "count",
+            "rate_interval_seconds": round(interval, 3) if interval else None,
+            **summary,
+            "timings_ms": {
+                "listing": round(self.listing_ms, 1),
+                "fan_out": round(fan_out_ms, 1),
+                "total": round((time.perf_counter() - self.started) * 1000, 1),
+            },
+        }
+
+# --- Flask Routes ---
+
+@app.route('/')
+def index():
+    """Serves the pre-rendered main HTML page, compressed when the browser allows it."""
+    coding = 'identity'
+    for candidate in ('br', 'gzip'):
+        if candidate in INDEX_PAGE and request.accept_encodings[candidate]:
+            coding = candidate
+            break
+    body, etag = INDEX_PAGE[coding]
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='text/html')
+        if coding != 'identity':
+            response.headers['Content-Encoding'] = coding
+    response.set_etag(etag)
+    # Always revalidate; an unchanged page costs a 304 with no body.
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def send_atlas_request(method, url, public_key, private_key, accept_header, json_body=None, content_type_header=None, params=None, stream=False):
+    """Sends a request to the Atlas API over a pooled session.
+
+    Returns the requests.Response and raises requests.exceptions.HTTPError
+    for error statuses, like response.raise_for_status(). With stream=True
+    the body is left unread and the session stays checked out until the
+    caller invokes response.release_session(completed).
+
+    Every attempt is admitted by the upstream scheduler at the priority of
+    the current context; a 429 is retried after Retry-After (or a jittered
+    exponential backoff) up to ATLAS_MAX_RETRIES times. Each attempt is
+    recorded in the upstream metrics under its endpoint family.
+    """
+    key = scheduler_key(url)
+    priority = upstream_priority.get()
+    labels = (('endpoint', atlas_endpoint_family(url)),)
+    attempt = 0
+    while True:
+        with trace_span('queue'):
+            upstream_scheduler.acquire(key, priority)
+        started = time.perf_counter()
+        metrics.inc('asp_ui_upstream_in_flight', labels)
+        try:
+            response = send_atlas_request_once(method, url, public_key, private_key, accept_header,
+                                               json_body, content_type_header, params, stream)
+        except requests.exceptions.HTTPError as http_err:
+            record_upstream_call(labels, method, started, http_err.response.status_code, http_err.response)
+            if http_err.response.status_code != 429:
+                raise
+            delay = rate_limit_delay(http_err.response, attempt)
+            if attempt >= ATLAS_MAX_RETRIES or delay > ATLAS_RETRY_MAX_DELAY:
+                upstream_scheduler.record_gave_up()
+                raise
+            metrics.inc('asp_ui_upstream_retries_total', labels)
+            time.sleep(upstream_scheduler.penalize(key, delay))
+            attempt += 1
+        except requests.exceptions.Timeout:
+            record_upstream_call(labels, method, started, 'timeout')
+            metrics.inc('asp_ui_upstream_timeouts_total', labels)
+            raise
+        except Exception:
+            record_upstream_call(labels, method, started, 'error')
+            raise
+        else:
+            record_upstream_call(labels, method, started, response.status_code, response)
+            return response
+        finally:
+            metrics.inc('asp_ui_upstream_in_flight', labels, -1)
+
+def send_atlas_request_once(method, url, public_key, private_key, accept_header, json_body, content_type_header, params, stream):
+    """Makes a single attempt of send_atlas_request."""
+    if content_type_header is None:
+        content_type_header = "application/json"
+
+    headers = {"Accept": accept_header, "Content-Type": content_type_header}
+    atlas_host = urlsplit(url).netloc
+    pool_key = (atlas_host, public_key)
+    session = atlas_session_pool.acquire(pool_key)
+    auth = get_digest_auth(atlas_host, public_key, private_key)
+    auth.start_timing()
+    started = time.perf_counter()
     try:
-        response = requests.request(
-            method,
-            url,
-            headers=headers,
-            auth=HTTPDigestAuth(public_key, private_key),
-            json=json_body,
-            timeout=30
-        )
+        try:
+            response = session.request(
+                method,
+                url,
+                headers=headers,
+                auth=auth,
+                json=json_body,
+                params=params,
+                timeout=30,
+                stream=stream
+            )
+        finally:
+            record_upstream_spans(auth, started, url)
         response.raise_for_status()
-        if response.status_code == 204:
-            return jsonify({"success": True, "message": "Action completed successfully."}), 200
-        return jsonify(response.json())
     except requests.exceptions.HTTPError as http_err:
-        error_details = {"error": f"HTTP Error: {http_err.response.status_code} {http_err.response.reason}"}
+        # Error bodies are small; read them so the connection can be reused.
+        http_err.response.content
+        atlas_session_pool.release(pool_key, session)
+        raise
+    except BaseException:
+        atlas_session_pool.release(pool_key, session, discard=True)
+        raise
+    if not stream:
+        atlas_session_pool.release(pool_key, session)
+        return response
+
+    def release_session(completed):
+        response.close()
+        atlas_session_pool.release(pool_key, session, discard=not completed)
+    response.release_session = release_session
+    return response
+
+def atlas_error_payload(error):
+    """Converts an exception raised by an Atlas call into an (error_details, status_code) tuple."""
+    if isinstance(error, requests.exceptions.HTTPError):
+        error_details = {"error": f"HTTP Error: {error.response.status_code} {error.response.reason}"}
         try:
-            error_details['details'] = http_err.response.json()
+            error_details['details'] = error.response.json()
         except json.JSONDecodeError:
-            error_details['details'] = http_err.response.text
-        
-        if http_err.request:
-            request_headers = {k: v for k, v in http_err.request.headers.items()}
+            error_details['details'] = error.response.text
+
+        if error.request:
+            request_headers = {k: v for k, v in error.request.headers.items()}
             error_details['debug_info'] = {
-                'method': http_err.request.method,
-                'url': http_err.request.url,
+                'method': error.request.method,
+                'url': error.request.url,
                 'headers': request_headers
             }
-            
-        return jsonify(error_details), http_err.response.status_code
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": "A network error occurred.", "details": str(e)}), 500
+
+        return error_details, error.response.status_code
+    if isinstance(error, UpstreamQueueTimeout):
+        return {"error": "Atlas rate limit queue is full, try again later.", "details": str(error)}, 503
+    if isinstance(error, UpstreamBudgetExceeded):
+        return {"error": "Too many Atlas calls for one request.", "details": str(error)}, 429
+    if isinstance(error, requests.exceptions.RequestException):
+        return {"error": "A network error occurred.", "details": str(error)}, 500
+    return {"error": "An unexpected server error occurred.", "details": str(error)}, 500
+
+def atlas_request(method, url, public_key, private_key, accept_header, json_body=None, content_type_header=None, params=None):
+    """Makes a request to the Atlas API and returns a (payload, status_code) tuple.
+
+    Unlike make_atlas_request this does not need a Flask context, so it can
+    run on worker threads.
+    """
+    try:
+        charge_upstream_budget()
+        if method == 'GET':
+            response = coalesced_get(url, public_key, private_key, accept_header, params=params)
+        else:
+            response = send_atlas_request(method, url, public_key, private_key, accept_header,
+                                          json_body=json_body, content_type_header=content_type_header, params=params)
+        if response.status_code == 204:
+            return {"success": True, "message": "Action completed successfully."}, 200
+        with trace_span('decode'):
+            return response.json(), 200
+    except Exception as e:
+        return atlas_error_payload(e)
+
+ACTION_COMPLETED_BODY = json.dumps({"success": True, "message": "Action completed successfully."}).encode('utf-8')
+
+def atlas_request_raw(method, url, public_key, private_key, accept_header, json_body=None, content_type_header=None):
+    """Makes a request to the Atlas API without parsing a successful body.
+
+    Returns ((body_bytes, content_type), 200) on success, or the same
+    (error_details, status_code) tuple as atlas_request on failure.
+    """
+    try:
+        charge_upstream_budget()
+        if method == 'GET':
+            response = coalesced_get(url, public_key, private_key, accept_header)
+        else:
+            response = send_atlas_request(method, url, public_key, private_key, accept_header,
+                                          json_body=json_body, content_type_header=content_type_header)
+        if response.status_code == 204:
+            return (ACTION_COMPLETED_BODY, "application/json"), 200
+        return (response.content, response.headers.get('Content-Type', 'application/json')), 200
+    except Exception as e:
+        return atlas_error_payload(e)
+
+def make_atlas_request(method, url, public_key, private_key, accept_header, json_body=None, content_type_header=None):
+    """Helper function to make requests to the Atlas API.
+
+    Successful bodies are streamed to the client as received from Atlas,
+    with the original content type and length, without being parsed.
+    """
+    try:
+        charge_upstream_budget()
+        response = send_atlas_request(method, url, public_key, private_key, accept_header,
+                                      json_body=json_body, content_type_header=content_type_header, stream=True)
     except Exception as e:
-        return jsonify({"error": "An unexpected server error occurred.", "details": str(e)}), 500
+        payload, status_code = atlas_error_payload(e)
+        return jsonify(payload), status_code
+    return passthrough_response(response)
+
+def passthrough_response(response):
+    """Streams a successful upstream response to the client without parsing it.
+
+    A compressed upstream body is forwarded still compressed when the client
+    accepts that coding, and decoded on the fly otherwise.
+    """
+    if response.status_code == 204:
+        response.release_session(True)
+        return Response(ACTION_COMPLETED_BODY, mimetype='application/json'), 200
+
+    headers, encoded = passthrough_headers(response.headers, lambda coding: bool(request.accept_encodings[coding]))
+    if encoded:
+        chunks = response.raw.stream(PASSTHROUGH_CHUNK_SIZE, decode_content=False)
+    else:
+        chunks = response.iter_content(PASSTHROUGH_CHUNK_SIZE)
+
+    completed = False
+
+    def generate():
+        nonlocal completed
+        yield from chunks
+        completed = True
+        release()
+
+    def release_upstream():
+        response.release_session(completed)
+
+    content_type = response.headers.get('Content-Type', 'application/json')
+    passthrough = Response(generate(), status=200, headers=headers, content_type=content_type)
+    # Runs once: when the body is done, when the server closes the response (even
+    # before the first chunk), or when a response that was never closed is collected.
+    release = weakref.finalize(passthrough, release_upstream)
+    passthrough.call_on_close(release)
+    return passthrough
+
+def passthrough_headers(upstream_headers, accepts_encoding):
+    """Returns the headers of a passed-through Atlas body, and whether its bytes are forwarded as received.
+
+    They are unless the body is compressed with a coding the client does
+    not take (accepts_encoding(coding) is false); it is then decoded on the
+    way, and its length is no longer known up front.
+    """
+    headers = {}
+    content_encoding = upstream_headers.get('Content-Encoding')
+    if content_encoding and not accepts_encoding(content_encoding):
+        return headers, False
+    if content_encoding:
+        headers['Content-Encoding'] = content_encoding
+    if 'Content-Length' in upstream_headers:
+        headers['Content-Length'] = upstream_headers['Content-Length']
+    return headers, True
+
+def run_concurrently(func, items, max_workers):
+    """Calls func for every item on a bounded thread pool and returns the results in input order."""
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        # Each call runs in a copy of the caller's context so it keeps its upstream priority.
+        futures = [executor.submit(contextvars.copy_context().run, func, item) for item in items]
+        return [future.result() for future in futures]
+
+def iter_concurrently(func, items, max_workers):
+    """Calls func for every item on a bounded thread pool, yielding results as they complete.
+
+    At most max_workers items are submitted at a time; the next one is
+    submitted as a result is handed on, so a slow consumer holds the calls
+    back. Closing the generator early cancels the calls that have not started.
+    """
+    items = list(items)
+    workers = max(1, min(max_workers, len(items) or 1))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    remaining = iter(items)
+
+    def submit(item):
+        return executor.submit(contextvars.copy_context().run, func, item)
+    pending = {submit(item) for item in itertools.islice(remaining, workers)}
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.update(submit(item) for item in itertools.islice(remaining, 1))
+                yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def iter_in_order(func, items, max_workers):
+    """Calls func for every item on a bounded thread pool, yielding the results in input order.
+
+    At most max_workers items are submitted and not yet handed on: a slow
+    item holds back the ones after it rather than letting their results
+    pile up. Closing the generator early cancels the calls that have not started.
+    """
+    items = list(items)
+    workers = max(1, min(max_workers, len(items) or 1))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    remaining = iter(items)
+
+    def submit(item):
+        return executor.submit(contextvars.copy_context().run, func, item)
+    window = deque(submit(item) for item in itertools.islice(remaining, workers))
+    try:
+        while window:
+            result = window.popleft().result()
+            window.extend(submit(item) for item in itertools.islice(remaining, 1))
+            yield result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def merged_listing(first_page, results, total_count):
+    """Returns a listing merged from its pages: the first page's other top-level fields, all results and the count.
+
+    The first page's "links" are dropped, since they only point at its neighbours.
+    """
+    payload = {key: value for key, value in first_page.items() if key != 'links'}
+    payload['results'] = results
+    payload['totalCount'] = total_count
+    return payload
+
+def fetch_all_pages(url, public_key, private_key, accept_header):
+    """Fetches every page of an Atlas list endpoint and returns a (payload, status_code) tuple.
+
+    The first page reports totalCount; the remaining pages are then fetched
+    concurrently and merged in page order into a single "results" list
+    (see merged_listing).
+    """
+    def fetch_page(page_num):
+        params = {'pageNum': page_num, 'itemsPerPage': ATLAS_PAGE_SIZE, 'includeCount': 'true'}
+        return atlas_request('GET', url, public_key, private_key, accept_header, params=params)
+
+    payload, status_code = fetch_page(1)
+    if status_code != 200:
+        return payload, status_code
+    results = list(payload.get('results', []))
+
+    if 'totalCount' not in payload:
+        # Without a count, keep walking until a short page comes back.
+        page_num = 1
+        page = payload
+        while len(page.get('results', [])) == ATLAS_PAGE_SIZE:
+            page_num += 1
+            page, status_code = fetch_page(page_num)
+            if status_code != 200:
+                return page, status_code
+            results.extend(page.get('results', []))
+        return merged_listing(payload, results, len(results)), 200
+
+    total_count = payload['totalCount']
+    page_count = -(-total_count // ATLAS_PAGE_SIZE)
+    for page, status_code in run_concurrently(fetch_page, range(2, page_count + 1), ATLAS_PAGE_WORKERS):
+        if status_code != 200:
+            return page, status_code
+        results.extend(page.get('results', []))
+    return merged_listing(payload, results, total_count), 200
+
+def iter_listing_pages(url, public_key, private_key, accept_header):
+    """Yields the pages of an Atlas list endpoint in order, as (payload, status_code) tuples.
+
+    Pages are fetched like fetch_all_pages does, but each one is handed on
+    as soon as it and the pages before it have arrived. At most
+    ATLAS_PAGE_WORKERS pages are requested ahead of the consumer. Nothing
+    follows a failed page.
+    """
+    def fetch_page(page_num):
+        params = {'pageNum': page_num, 'itemsPerPage': ATLAS_PAGE_SIZE, 'includeCount': 'true'}
+        return atlas_request('GET', url, public_key, private_key, accept_header, params=params)
+
+    page, status_code = fetch_page(1)
+    yield page, status_code
+    if status_code != 200:
+        return
+
+    if 'totalCount' not in page:
+        page_num = 1
+        while len(page.get('results', [])) == ATLAS_PAGE_SIZE:
+            page_num += 1
+            page, status_code = fetch_page(page_num)
+            yield page, status_code
+            if status_code != 200:
+                return
+        return
+
+    page_count = -(-page['totalCount'] // ATLAS_PAGE_SIZE)
+    for page, status_code in iter_in_order(fetch_page, range(2, page_count + 1), ATLAS_PAGE_WORKERS):
+        yield page, status_code
+        if status_code != 200:
+            return
+
+def wants_ndjson():
+    """True when the client prefers newline-delimited JSON over a single document."""
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    return best == 'application/x-ndjson'
+
+def ndjson_lines(records):
+    """Serializes JSON-serializable records as newline-delimited JSON."""
+    return "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+
+def ndjson_response(records):
+    """Streams an iterable of JSON-serializable records, one per line."""
+    def generate():
+        for record in records:
+            yield ndjson_lines([record])
+    return Response(generate(), mimetype='application/x-ndjson')
 
 def get_request_data(request):
-    """Helper to extract and validate common fields from the request JSON."""
-    data = request.get_json()
-    if not data: return None, jsonify({"error": "Invalid request format. Expected JSON."}), 400
-    
-    public_key = data.get('public_key')
-    private_key = data.get('private_key')
-    project_id = data.get('project_id')
-    atlas_host = data.get('atlas_host', 'cloud.mongodb.com')
-    
-    if not all([public_key, private_key, project_id, atlas_host]):
-        return None, jsonify({"error": "Missing required fields."}), 400
-        
+    """Helper to extract and validate common fields from the request JSON.
+
+    With an "Authorization: Bearer <token>" header from /api/login, the
+    session's credentials replace any sent in the body.
+    """
+    with trace_span('parse'):
+        data = request.get_json()
+    credentials = session_credentials(request.headers.get('Authorization'))
+    if credentials is None:
+        return None, jsonify(SESSION_EXPIRED_ERROR), 401
+    if credentials and isinstance(data, dict):
+        data.update(credentials)
+    error = request_data_error(data)
+    if error:
+        return None, jsonify(error), 400
     return data, None, None
 
+def mutation_response(data, call, invalidate):
+    """Passes through the Atlas response to a *_call's request, then drops the cached responses it made stale."""
+    method, url, accept_header, json_body, content_type_header = call
+    response = make_atlas_request(method, url, data['public_key'], data['private_key'], accept_header,
+                                  json_body=json_body, content_type_header=content_type_header)
+    invalidate()
+    return response
+
+@app.errorhandler(SessionStoreUnavailable)
+def session_store_unavailable(error):
+    """Answers 503 when the shared session store (which also runs the samplers) cannot be reached."""
+    app.logger.warning("%s", error)
+    return jsonify({**SESSION_STORE_UNAVAILABLE_ERROR, "details": str(error)}), 503
+
+@app.errorhandler(RequestRejected)
+def request_rejected(error):
+    """Answers a request body that a route's parser rejected."""
+    return jsonify(error.payload), error.status_code
+
+@app.route('/api/login', methods=['POST'])
+def login():
+    """API endpoint exchanging Atlas credentials for a short-lived session token.
+
+    The credentials are verified with the (cached) instance listing. Later
+    requests send "Authorization: Bearer <token>" instead of the keys.
+    """
+    data, error_response, status_code = get_request_data(request)
+    if error_response: return error_response, status_code
+
+    data['atlas_host'] = data.get('atlas_host', 'cloud.mongodb.com')
+    listing, status_code, _ = fetch_listing(data, None, 'spis')
+    if status_code != 200:
+        return jsonify(listing), status_code
+
+    credentials = {field: data[field] for field in CREDENTIAL_FIELDS}
+    token = credential_sessions.create(credentials)
+    remember_session(token, credentials)
+    return jsonify({"session_token": token, "expires_in": SESSION_IDLE_TIMEOUT, "max_lifetime": SESSION_MAX_LIFETIME})
+
+@app.route('/api/logout', methods=['POST'])
+def logout():
+    """API endpoint ending the session named by the Authorization header."""
+    token = bearer_token(request.headers.get('Authorization'))
+    if token is not None:
+        session_lookups.invalidate(token)
+    return jsonify({"logged_out": token is not None and credential_sessions.revoke(token)})
+
 @app.route('/api/fetch_data', methods=['POST'])
 def fetch_data():
-    """API endpoint to fetch all stream processors."""
+    """API endpoint to fetch all stream processors, across every page."""
     data, error_response, status_code = get_request_data(request)
     if error_response: return error_response, status_code
-    
-    instance_name = data.get('instance_name')
-    if not instance_name:
-        return jsonify({"error": "Missing 'instance_name' for fetching processors."}), 400
 
-    url = f"https://{data['atlas_host']}/api/atlas/v2/groups/{data['project_id']}/streams/{instance_name}/processors"
-    accept_header = "application/vnd.atlas.2024-05-30+json"
-    return make_atlas_request('GET', url, data['public_key'], data['private_key'], accept_header)
+    return listing_response(data, 'processors')
 
 @app.route('/api/manage_processor', methods=['POST'])
 def manage_processor():
@@ -966,29 +5323,41 @@ def manage_processor():
     data, error_response, status_code = get_request_data(request)
     if error_response: return error_response, status_code
 
-    instance_name = data.get('instance_name')
-    processor_name = data.get('processor_name')
-    action = data.get('action')
+    return mutation_response(data, *manage_processor_call(data))
 
-    if not all([instance_name, processor_name, action]):
-        return jsonify({"error": "Missing required fields for processor management."}), 400
+@app.route('/api/bulk_manage_processors', methods=['POST'])
+def bulk_manage_processors():
+    """API endpoint to Start, Stop, or Delete many stream processors concurrently.
+
+    Targets are either "processor_names" or a "filter" ({"name_prefix",
+    "name_regex", "state"}) applied to the current listing. Results are
+    returned in completion order, streamed as NDJSON when the client
+    accepts application/x-ndjson.
+    """
+    data, error_response, status_code = get_request_data(request)
+    if error_response: return error_response, status_code
+
+    instance_name, action, processor_names, matches, max_parallel = parse_bulk_request(data)
+    if matches is not None:
+        list_url, list_accept_header, _ = listing_target(data, instance_name, 'processors')
+        payload, status_code = fetch_all_pages(list_url, data['public_key'], data['private_key'], list_accept_header)
+        if status_code != 200:
+            return jsonify(payload), status_code
+        processor_names = select_bulk_targets(payload, matches, processor_names)
 
-    base_url = f"https://{data['atlas_host']}/api/atlas/v2/groups/{data['project_id']}/streams/{instance_name}/processor/{processor_name}"
-    
-    if action == 'start':
-        url = f"{base_url}:start"
-        method = 'POST'
-    elif action == 'stop':
-        url = f"{base_url}:stop"
-        method = 'POST'
-    elif action == 'delete':
-        url = base_url
-        method = 'DELETE'
-    else:
-        return jsonify({"error": "Invalid action specified."}), 400
-    
     accept_header = "application/vnd.atlas.2024-05-30+json"
-    return make_atlas_request(method, url, data['public_key'], data['private_key'], accept_header)
+
+    def run_action(processor_name):
+        method, url = processor_action_target(data, instance_name, processor_name, action)
+        with upstream_priority_scope(PRIORITY_BULK):
+            result, status_code = atlas_request(method, url, data['public_key'], data['private_key'], accept_header)
+        invalidate_cached(data, instance_name, ('processors',), ('processor', processor_name))
+        return bulk_result(processor_name, action, result, status_code)
+
+    results = iter_concurrently(run_action, dict.fromkeys(processor_names), max_parallel)
+    if wants_ndjson():
+        return ndjson_response(results)
+    return jsonify(bulk_document(list(results)))
 
 @app.route('/api/create_processor', methods=['POST'])
 def create_processor():
@@ -996,29 +5365,18 @@ def create_processor():
     data, error_response, status_code = get_request_data(request)
     if error_response: return error_response, status_code
 
-    instance_name = data.get('instance_name')
-    processor_body = data.get('processor_body')
-    if not all([instance_name, processor_body]):
-        return jsonify({"error": "Missing instance_name or processor_body for create."}), 400
-
-    url = f"https://{data['atlas_host']}/api/atlas/v2/groups/{data['project_id']}/streams/{instance_name}/processor"
-    accept_header = "application/vnd.atlas.2024-05-30+json"
-    return make_atlas_request('POST', url, data['public_key'], data['private_key'], accept_header, json_body=processor_body)
+    return mutation_response(data, *create_processor_call(data))
 
 @app.route('/api/get_processor_stats', methods=['POST'])
 def get_processor_stats():
-    """API endpoint to get stats for a single stream processor."""
+    """API endpoint to get stats for a single stream processor.
+
+    "fields" (see parse_fields) trims the document to the given paths.
+    """
     data, error_response, status_code = get_request_data(request)
     if error_response: return error_response, status_code
 
-    instance_name = data.get('instance_name')
-    processor_name = data.get('processor_name')
-    if not all([instance_name, processor_name]):
-        return jsonify({"error": "Missing instance_name or processor_name for stats task."}), 400
-
-    url = f"https://{data['atlas_host']}/api/atlas/v2/groups/{data['project_id']}/streams/{instance_name}/processor/{processor_name}"
-    accept_header = "application/vnd.atlas.2024-05-30+json"
-    return make_atlas_request('GET', url, data['public_key'], data['private_key'], accept_header)
+    return result_response(processor_stats_result(data))
 
 @app.route('/api/create_spi', methods=['POST'])
 def create_spi():
@@ -1026,13 +5384,7 @@ def create_spi():
     data, error_response, status_code = get_request_data(request)
     if error_response: return error_response, status_code
 
-    spi_body = data.get('spi_body')
-    if not spi_body or not isinstance(spi_body, dict):
-        return jsonify({"error": "Missing or invalid 'spi_body' in request."}), 400
-
-    url = f"https://{data['atlas_host']}/api/atlas/v2/groups/{data['project_id']}/streams"
-    accept_header = "application/vnd.atlas.2023-02-01+json"
-    return make_atlas_request('POST', url, data['public_key'], data['private_key'], accept_header, json_body=spi_body)
+    return mutation_response(data, *create_spi_call(data))
 
 @app.route('/api/delete_spi', methods=['POST'])
 def delete_spi():
@@ -1040,13 +5392,7 @@ def delete_spi():
     data, error_response, status_code = get_request_data(request)
     if error_response: return error_response, status_code
 
-    instance_name = data.get('instance_name')
-    if not instance_name:
-        return jsonify({"error": "Missing 'instance_name' to delete."}), 400
-
-    url = f"https://{data['atlas_host']}/api/atlas/v2/groups/{data['project_id']}/streams/{instance_name}"
-    accept_header = "application/vnd.atlas.2023-02-01+json"
-    return make_atlas_request('DELETE', url, data['public_key'], data['private_key'], accept_header)
+    return mutation_response(data, *delete_spi_call(data))
 
 @app.route('/api/create_connection', methods=['POST'])
 def create_connection():
@@ -1054,15 +5400,7 @@ def create_connection():
     data, error_response, status_code = get_request_data(request)
     if error_response: return error_response, status_code
 
-    instance_name = data.get('instance_name')
-    connection_body = data.get('connection_body')
-    if not all([instance_name, connection_body]):
-        return jsonify({"error": "Missing instance_name or connection_body for create."}), 400
-
-    url = f"https://{data['atlas_host']}/api/atlas/v2/groups/{data['project_id']}/streams/{instance_name}/connections"
-    accept_header = "application/vnd.atlas.2023-02-01+json"
-    content_type_header = "application/vnd.atlas.2023-02-01+json"
-    return make_atlas_request('POST', url, data['public_key'], data['private_key'], accept_header, json_body=connection_body, content_type_header=content_type_header)
+    return mutation_response(data, *create_connection_call(data))
 
 @app.route('/api/list_connections', methods=['POST'])
 def list_connections():
@@ -1070,28 +5408,18 @@ def list_connections():
     data, error_response, status_code = get_request_data(request)
     if error_response: return error_response, status_code
 
-    instance_name = data.get('instance_name')
-    if not instance_name:
-        return jsonify({"error": "Missing 'instance_name' for listing connections."}), 400
-
-    url = f"https://{data['atlas_host']}/api/atlas/v2/groups/{data['project_id']}/streams/{instance_name}/connections"
-    accept_header = "application/vnd.atlas.2023-02-01+json"
-    return make_atlas_request('GET', url, data['public_key'], data['private_key'], accept_header)
+    return listing_response(data, 'connections')
 
 @app.route('/api/get_connection_details', methods=['POST'])
 def get_connection_details():
-    """API endpoint to get details for a single connection."""
+    """API endpoint to get details for a single connection.
+
+    "fields" (see parse_fields) trims the document to the given paths.
+    """
     data, error_response, status_code = get_request_data(request)
     if error_response: return error_response, status_code
 
-    instance_name = data.get('instance_name')
-    connection_name = data.get('connection_name')
-    if not all([instance_name, connection_name]):
-        return jsonify({"error": "Missing instance_name or connection_name for details task."}), 400
-
-    url = f"https://{data['atlas_host']}/api/atlas/v2/groups/{data['project_id']}/streams/{instance_name}/connections/{connection_name}"
-    accept_header = "application/vnd.atlas.2023-02-01+json"
-    return make_atlas_request('GET', url, data['public_key'], data['private_key'], accept_header)
+    return result_response(connection_details_result(data))
 
 @app.route('/api/manage_connection', methods=['POST'])
 def manage_connection():
@@ -1099,21 +5427,7 @@ def manage_connection():
     data, error_response, status_code = get_request_data(request)
     if error_response: return error_response, status_code
 
-    instance_name = data.get('instance_name')
-    connection_name = data.get('connection_name')
-    action = data.get('action')
-
-    if not all([instance_name, connection_name, action]):
-        return jsonify({"error": "Missing required fields for connection management."}), 400
-
-    if action == 'delete':
-        url = f"https://{data['atlas_host']}/api/atlas/v2/groups/{data['project_id']}/streams/{instance_name}/connections/{connection_name}"
-        method = 'DELETE'
-    else:
-        return jsonify({"error": "Invalid action specified for connection."}), 400
-    
-    accept_header = "application/vnd.atlas.2023-02-01+json"
-    return make_atlas_request(method, url, data['public_key'], data['private_key'], accept_header)
+    return mutation_response(data, *manage_connection_call(data))
 
 @app.route('/api/list_spis', methods=['POST'])
 def list_spis():
@@ -1121,9 +5435,248 @@ def list_spis():
     data, error_response, status_code = get_request_data(request)
     if error_response: return error_response, status_code
 
-    url = f"https://{data['atlas_host']}/api/atlas/v2/groups/{data['project_id']}/streams"
-    accept_header = "application/vnd.atlas.2023-02-01+json"
-    return make_atlas_request('GET', url, data['public_key'], data['private_key'], accept_header)
+    return listing_response(data, 'spis')
+
+@app.route('/api/inventory', methods=['POST'])
+def inventory():
+    """API endpoint to list every stream processing instance with its connections and processors.
+
+    The per-instance listings are fetched concurrently; an instance whose
+    listing fails is still returned, with the failure under "errors".
+
+    With Accept: application/x-ndjson, one line per instance ({"name",
+    "instance"}) comes first, then one per listing as it arrives ({"name",
+    "resource", "timings_ms"} plus "results" or "error"), then a "_meta"
+    line with the remaining fields.
+    """
+    data, error_response, status_code = get_request_data(request)
+    if error_response: return error_response, status_code
+
+    started = time.perf_counter()
+    spis, status_code, _ = fetch_listing(data, None, 'spis')
+    if status_code != 200:
+        return jsonify(spis), status_code
+    document = InventoryDocument(data, spis, started)
+
+    def load(job):
+        instance_name, resource = job
+        job_started = time.perf_counter()
+        payload, status_code, _ = fetch_listing(data, instance_name, resource)
+        return instance_name, resource, payload, status_code, (time.perf_counter() - job_started) * 1000
+
+    if wants_ndjson():
+        def generate():
+            yield from document.instance_records()
+            for result in iter_concurrently(load, document.jobs, INVENTORY_MAX_PARALLEL):
+                yield document.add(*result)
+            yield {"_meta": document.meta()}
+        return ndjson_response(generate())
+
+    for result in run_concurrently(load, document.jobs, INVENTORY_MAX_PARALLEL):
+        document.add(*result)
+    return jsonify(document.document())
+
+@app.route('/api/start_stats_sampler', methods=['POST'])
+def start_stats_sampler():
+    """API endpoint to start sampling stats for processors in the background."""
+    data, error_response, status_code = get_request_data(request)
+    if error_response: return error_response, status_code
+
+    instance_name = data.get('instance_name')
+    processor_names = data.get('processor_names')
+    if not instance_name or not processor_names or not isinstance(processor_names, list):
+        return jsonify({"error": "Missing instance_name or processor_names for stats sampling."}), 400
+    try:
+        interval = max(float(data.get('interval_seconds', STATS_SAMPLER_INTERVAL)), STATS_SAMPLER_MIN_INTERVAL)
+    except (TypeError, ValueError):
+        return jsonify({"error": "'interval_seconds' must be a number."}), 400
+
+    ensure_authorized(data)
+
+    credentials = {field: data[field] for field in CREDENTIAL_FIELDS}
+    status = stats_samplers.start(atlas_cache_key(data, instance_name), credentials, instance_name,
+                                  processor_names, interval)
+    if status is None:
+        return jsonify({"error": "Too many stats samplers are running."}), 429
+    return jsonify(status)
+
+@app.route('/api/stop_stats_sampler', methods=['POST'])
+def stop_stats_sampler():
+    """API endpoint to stop sampling some (or, without processor_names, all) processors of an instance."""
+    data, error_response, status_code = get_request_data(request)
+    if error_response: return error_response, status_code
+
+    instance_name = data.get('instance_name')
+    if not instance_name:
+        return jsonify({"error": "Missing 'instance_name' to stop stats sampling."}), 400
+
+    ensure_authorized(data)
+
+    status = stats_samplers.stop(atlas_cache_key(data, instance_name), data.get('processor_names'))
+    if status is None:
+        return jsonify({"error": f"No stats sampler is running for '{instance_name}'."}), 404
+    return jsonify(status)
+
+@app.route('/api/get_stats_history', methods=['POST'])
+def get_stats_history():
+    """API endpoint returning sampled stats history and per-second rates for processors."""
+    data, error_response, status_code = get_request_data(request)
+    if error_response: return error_response, status_code
+
+    return result_response(stats_history_result(data))
+
+@app.route('/api/instance_stats_summary', methods=['POST'])
+def instance_stats_summary():
+    """API endpoint aggregating the stats of every processor of an instance.
+
+    Stats are fetched concurrently (at most "max_parallel" at a time) and
+    combined into totals, percentiles and top-N lists. Throughput is ranked
+    by input rate once an earlier summary of the instance is available,
+    otherwise by input count. Processors whose stats fail are listed under
+    "errors" and left out of the aggregates.
+
+    With Accept: application/x-ndjson, each processor's "stats" (or its
+    error) is streamed as one line as it arrives, followed by a "_meta" line
+    holding the summary document.
+    """
+    data, error_response, status_code = get_request_data(request)
+    if error_response: return error_response, status_code
+
+    instance_name, top_n, max_parallel, percentiles, matches = parse_summary_request(data)
+
+    started = time.perf_counter()
+    listing, status_code, _ = fetch_listing(data, instance_name, 'processors')
+    if status_code != 200:
+        return jsonify(listing), status_code
+    summary = StatsSummary(data, instance_name, listing, matches, top_n, percentiles, started)
+    accept_header = "application/vnd.atlas.2024-05-30+json"
+
+    def fetch(name):
+        with upstream_priority_scope(PRIORITY_BULK):
+            return name, atlas_request('GET', summary.stats_url(name), data['public_key'], data['private_key'], accept_header)
+
+    def collect():
+        """Files each processor's stats as they arrive, yielding its name."""
+        for name, (payload, status_code) in iter_concurrently(fetch, summary.processor_names, max_parallel):
+            summary.add(name, payload, status_code)
+            yield name
+
+    if wants_ndjson():
+        def generate():
+            for name in collect():
+                yield summary.record(name)
+            yield {"_meta": summary.document()}
+        return ndjson_response(generate())
+    for _ in collect():
+        pass
+    return jsonify(summary.document())
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """API endpoint running several read operations in one round trip.
+
+    "operations" lists objects naming a route in "op" (see BATCH_OPERATIONS)
+    together with that route's own fields; credentials and other top-level
+    fields are shared by every operation. The operations run concurrently,
+    at most "max_parallel" at a time, and make at most
+    BATCH_MAX_UPSTREAM_CALLS Atlas calls together; calls beyond that fail
+    with 429. Results are returned in request order, or with Accept:
+    application/x-ndjson streamed one line per operation as each completes.
+    Each result holds the operation's "index", "op", "status", cache
+    "headers" and response "body".
+    """
+    data, error_response, status_code = get_request_data(request)
+    if error_response: return error_response, status_code
+
+    operations, max_parallel = parse_batch_request(data)
+
+    budget = UpstreamBudget(BATCH_MAX_UPSTREAM_CALLS)
+    results = iter_concurrently(lambda item: run_batch_operation(data, *item, budget), enumerate(operations), max_parallel)
+    if wants_ndjson():
+        return Response((record + b"\n" for _, _, record in results), mimetype='application/x-ndjson')
+    results = list(results)
+    with trace_span('serialize'):
+        body = batch_document(results, len(operations))
+    return Response(body, mimetype='application/json')
+
+@app.route('/api/stream/processors', methods=['POST'])
+def stream_processors():
+    """API endpoint streaming live processor state/stats changes as Server-Sent Events.
+
+    Sends a "snapshot" event first, then "delta" events with only the
+    added, removed and changed processors. POST is used so credentials stay
+    out of the URL; browsers read the stream with fetch(). Each open stream
+    holds one server thread for as long as the browser keeps it open; see
+    asgi.py for a server that does not.
+    """
+    data, error_response, status_code = get_request_data(request)
+    if error_response: return error_response, status_code
+
+    instance_name, = required_fields(data, ('instance_name',), "Missing 'instance_name' for streaming processors.")
+
+    # Also verifies the credentials before any shared state is handed out.
+    listing, status_code, _ = fetch_listing(data, instance_name, 'processors')
+    if status_code != 200:
+        return jsonify(listing), status_code
+
+    watcher, subscriber = subscribe_processor_watcher(data, instance_name, listing)
+
+    def generate():
+        try:
+            yield sse_event('snapshot', {"results": watcher.snapshot()})
+            while True:
+                events, needs_snapshot = subscriber.drain(STREAM_HEARTBEAT_INTERVAL)
+                if needs_snapshot:
+                    yield sse_event('snapshot', {"results": watcher.snapshot()})
+                    continue
+                if not events:
+                    yield ": keep-alive\n\n"
+                for event, payload in events:
+                    yield sse_event(event, payload)
+        finally:
+            unsubscribe_processor_watcher(data, instance_name, watcher, subscriber)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/pool_stats', methods=['GET'])
+def pool_stats():
+    """API endpoint reporting upstream connection pool, digest auth and GET coalescing counters."""
+    stats = atlas_session_pool.stats()
+    stats['digest_auth'] = digest_auth_stats()
+    stats['coalescing'] = upstream_gets.stats()
+    return jsonify(stats)
+
+@app.route('/api/cache_stats', methods=['GET'])
+def cache_stats():
+    """API endpoint reporting response cache hit, miss and eviction counters."""
+    stats = response_cache.stats()
+    stats['revalidation'] = cache_revalidator.stats()
+    stats['shared_invalidations'] = cache_invalidator.stats()
+    stats['listing_versions'] = listing_versions.stats()
+    compiled = compile_projection.cache_info()
+    stats['projections'] = {"compiled": compiled.currsize, "compile_hits": compiled.hits,
+                            "compile_misses": compiled.misses, "bodies": projected_bodies.stats()}
+    return jsonify(stats)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus endpoint with request, upstream, pool, cache and scheduler metrics of every worker."""
+    return Response(metrics_publisher.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/scheduler_stats', methods=['GET'])
+def scheduler_stats():
+    """API endpoint reporting upstream rate-limit queue depths, waits and 429 retries."""
+    return jsonify(upstream_scheduler.stats())
+
+@app.route('/api/session_stats', methods=['GET'])
+def session_stats():
+    """API endpoint reporting login session counts and token lookups, plus this worker's session cache under "worker_cache"."""
+    stats = credential_sessions.stats()
+    stats['worker_cache'] = session_lookups.stats()
+    return jsonify(stats)
 
 
 # --- Main Execution Block ---